@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 
+from decouple import Csv, config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,10 +49,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'ganado.compresion.CompresionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ganado.auditoria.AuditoriaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,12 +82,102 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Perfil elegido por variables de entorno (o .env): DB_ENGINE=sqlite|postgres
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+# Timeout por defecto de cada sentencia en PostgreSQL (ms, 0 = sin límite).
+# Las vistas pueden definir el suyo con StatementTimeoutMixin.statement_timeout_ms
+DB_STATEMENT_TIMEOUT_MS = config('DB_STATEMENT_TIMEOUT_MS', default=5000, cast=int)
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='gestion_agro'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # Conexiones persistentes: se reutilizan entre requests del mismo worker
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+                'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}',
+            },
+        }
     }
-}
+    if config('DB_POOL', default=False, cast=bool):
+        # Pool de conexiones de psycopg 3; reemplaza a las conexiones persistentes
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+    if config('DB_PGBOUNCER', default=False, cast=bool):
+        # pgbouncer en modo transaction no soporta cursores del lado del servidor
+        # ni parámetros de inicio: el timeout por defecto se fija en el rol
+        # (ALTER ROLE ... SET statement_timeout) y el de cada vista con SET LOCAL
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+        del DATABASES['default']['OPTIONS']['options']
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+    if config('DB_SQLITE_CONCURRENTE', default=False, cast=bool):
+        # Modo para instalaciones locales con varios usuarios escribiendo a la vez:
+        # WAL permite lecturas concurrentes con una escritura, synchronous=NORMAL
+        # evita un fsync por commit y BEGIN IMMEDIATE toma el lock de escritura al
+        # inicio de la transacción en vez de fallar con "database is locked" al final.
+        busy_timeout_ms = config('DB_SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int)
+        DATABASES['default']['OPTIONS'] = {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f"PRAGMA mmap_size={config('DB_SQLITE_MMAP_MB', default=256, cast=int) * 1024 * 1024};"
+                f"PRAGMA cache_size=-{config('DB_SQLITE_CACHE_MB', default=64, cast=int) * 1024};"
+                f'PRAGMA busy_timeout={busy_timeout_ms};'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': busy_timeout_ms / 1000,
+        }
+
+# Sharding por usuario: DB_SHARDS=shard1,shard2 agrega un alias por shard con la
+# misma configuración que 'default' salvo nombre/host (DB_SHARD1_NAME, DB_SHARD1_HOST).
+# La asignación usuario → shard está en ganado.ShardUsuario (ver mover_tenant).
+DATABASE_SHARDS = config('DB_SHARDS', default='', cast=Csv())
+for _alias in DATABASE_SHARDS:
+    _prefijo = f'DB_{_alias.upper()}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'NAME': config(f'{_prefijo}_NAME', default=str(BASE_DIR / f'{_alias}.sqlite3')),
+        'HOST': config(f'{_prefijo}_HOST', default=DATABASES['default'].get('HOST', '')),
+    }
+
+# Réplicas de lectura: DB_REPLICAS=replica1 agrega un alias por réplica
+# (DB_REPLICA1_NAME, DB_REPLICA1_HOST) de la base indicada en DB_REPLICA1_PRIMARIA
+# (por defecto 'default'). Los GET de las vistas de ganado leen de las réplicas
+# salvo durante DB_REPLICA_STICKY_SEGUNDOS después de una escritura del usuario.
+DATABASE_REPLICAS = {}
+for _alias in config('DB_REPLICAS', default='', cast=Csv()):
+    _prefijo = f'DB_{_alias.upper()}'
+    _primaria = config(f'{_prefijo}_PRIMARIA', default='default')
+    DATABASES[_alias] = {
+        **DATABASES[_primaria],
+        'NAME': config(f'{_prefijo}_NAME', default=DATABASES[_primaria]['NAME']),
+        'HOST': config(f'{_prefijo}_HOST', default=DATABASES[_primaria].get('HOST', '')),
+        'TEST': {'MIRROR': _primaria},
+    }
+    DATABASE_REPLICAS.setdefault(_primaria, []).append(_alias)
+REPLICA_STICKY_SEGUNDOS = config('DB_REPLICA_STICKY_SEGUNDOS', default=10, cast=int)
+
+DATABASE_ROUTERS = ['ganado.routers.ReplicaRouter'] if DATABASE_SHARDS or DATABASE_REPLICAS else []
 
 
 # Password validation
@@ -130,12 +224,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'ganado.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_FILTER_BACKENDS': [
+        'ganado.filtros.FiltrosGanado',
+        'ganado.filtros.CamposSerializer',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Cambiar a IsAuthenticated para proteger APIs
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'ganado.limites.LimiteFichas',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100
 }
@@ -147,6 +248,96 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# Cache de Django. Por defecto es la LocMemCache de cada proceso: con varios
+# workers de gunicorn (o comandos como actualizar_ciclos) las invalidaciones
+# de un proceso no llegan a los demás. Para compartirla configurar, por ejemplo,
+# CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache y
+# CACHE_LOCATION=ganado_cache (más `manage.py createcachetable`) o
+# django.core.cache.backends.redis.RedisCache con la URL de Redis.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Analítica: tiempo de vida (segundos) de los resúmenes cacheados por usuario.
+# Las escrituras sobre ganado invalidan la cache a través de la versión de datos;
+# con la cache por proceso la invalidación no llega a otros workers, así que se
+# usa el tiempo más corto ANALYTICS_CACHE_TIMEOUT_LOCAL.
+ANALYTICS_CACHE_TIMEOUT = 300
+ANALYTICS_CACHE_TIMEOUT_LOCAL = 30
+
+# Cache del usuario autenticado por JWT (segundos). TIMEOUT=0 vuelve a consultar
+# la base en cada request. Cada proceso guarda el usuario TIMEOUT_LOCAL segundos,
+# lo que acota cuánto tarda otro worker en ver una baja o un cambio de contraseña;
+# TIMEOUT es la vida en la cache de Django y solo se usa si es compartida (CACHES).
+# MAX_LOCAL acota los usuarios de la cache de cada proceso (se descarta el menos usado).
+JWT_USER_CACHE = {
+    'TIMEOUT': config('JWT_USER_CACHE_TIMEOUT', default=300, cast=int),
+    'TIMEOUT_LOCAL': config('JWT_USER_CACHE_TIMEOUT_LOCAL', default=30, cast=int),
+    'MAX_LOCAL': config('JWT_USER_CACHE_MAX_LOCAL', default=10000, cast=int),
+}
+
+# Compresión de respuestas (ganado.compresion). Niveles por Content-Type; un
+# prefijo terminado en '/' aplica a todos sus subtipos. Los tipos que no
+# figuran (imágenes, xlsx, pdf: ya comprimidos) se envían tal cual. text/html
+# queda afuera a propósito: las páginas del admin llevan el token CSRF y
+# comprimirlas las expone a BREACH.
+COMPRESION = {
+    'MINIMO_BYTES': config('COMPRESION_MINIMO_BYTES', default=1024, cast=int),
+    'FLUSH_BYTES': 64 * 1024,
+    'TIPOS': {
+        'application/json': {'br': 5, 'gzip': 6},
+        'text/csv': {'br': 5, 'gzip': 6},
+        'text/plain': {'br': 5, 'gzip': 6},
+        'application/javascript': {'br': 9, 'gzip': 9},
+        'text/css': {'br': 9, 'gzip': 9},
+    },
+}
+
+# Reportes XLSX/PDF (ganado.reportes). Los arma el worker `manage.py
+# procesar_reportes` y quedan en DIRECTORIO, uno por usuario, reporte, período
+# y versión de datos. Un pedido en proceso hace más de PROCESANDO_SEGUNDOS se
+# considera abandonado (worker caído) y otro worker lo retoma.
+REPORTES = {
+    'DIRECTORIO': config('REPORTES_DIR', default=str(BASE_DIR / 'reportes')),
+    'PROCESANDO_SEGUNDOS': config('REPORTES_PROCESANDO_SEGUNDOS', default=600, cast=int),
+}
+
+# Límite de requests por usuario (ganado.limites). Cada usuario tiene un balde
+# de CAPACIDAD fichas que se repone a RECARGA por segundo; cada request gasta
+# el costo de su endpoint (basename.accion en COSTOS, 1 si no figura). Los
+# endpoints con costo tienen además un balde propio por usuario de
+# ENDPOINT_CAPACIDAD requests que se repone a ENDPOINT_RECARGA por segundo.
+# BACKEND 'local' limita en cada proceso; 'cache' comparte los baldes entre
+# workers a través de la cache CACHE (conviene una cache compartida, ej. Redis).
+LIMITES = {
+    'ACTIVO': config('LIMITES_ACTIVO', default=True, cast=bool),
+    'BACKEND': config('LIMITES_BACKEND', default='local'),
+    'CACHE': 'default',
+    'CAPACIDAD': config('LIMITES_CAPACIDAD', default=300, cast=int),
+    'RECARGA': config('LIMITES_RECARGA', default=5.0, cast=float),
+    'ENDPOINT_CAPACIDAD': config('LIMITES_ENDPOINT_CAPACIDAD', default=5, cast=int),
+    'ENDPOINT_RECARGA': config('LIMITES_ENDPOINT_RECARGA', default=0.2, cast=float),
+    'COSTOS': {
+        'dashboard.stats': 10,
+        'opciones.all': 10,
+        'opciones.lotes_debug': 20,
+        'bootstrap.list': 10,
+        'sync.list': 5,
+        'analytics.ventas': 5,
+        'analytics.valoracion': 5,
+        'analytics.ganancia': 5,
+        'analytics.proyeccion': 20,
+        'campos.plan_pastoreo': 5,
+        'reportes.create': 10,
+        'reportes.descargar': 5,
+        'pesadas.importar': 10,
+        'precios-mercado.importar': 10,
+    },
+}
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Vite development server
@@ -1,10 +1,20 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 
+from .busqueda import buscar
+from .consultas import campo_en_fecha
+from .db import filas_estimadas
 from .models import (
+    Auditoria,
     Campo,
     EstadiaAnimal,
     EstadoVacuno,
+    Pesada,
     PrecioMercado,
+    SolicitudReporte,
     Transferencia,
     Vacuna,
     Vacunacion,
@@ -12,32 +22,109 @@ from .models import (
     Venta,
 )
 
+# Desde esta cantidad de filas el listado sin filtros usa el conteo estimado
+UMBRAL_CONTEO_ESTIMADO = 10000
+
+
+class PaginadorEstimado(Paginator):
+    """Paginator que, sin filtros, toma la cantidad de filas de las estadísticas de la base"""
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimado = filas_estimadas(self.object_list.model, self.object_list.db)
+            if estimado is not None and estimado >= UMBRAL_CONTEO_ESTIMADO:
+                return estimado
+        return super().count
+
+
+class GanadoAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin para tablas grandes: conteo estimado sin filtros, sin el
+    COUNT(*) extra del total y búsqueda resuelta con los índices de
+    ganado.busqueda en vez de icontains sobre toda la tabla.
+    """
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    # ruta hasta un modelo con índice de búsqueda ('' es el propio modelo) -> modelo
+    busqueda_indexada = {}
+    # Columnas de tablas chicas que se buscan con icontains
+    busqueda_directa = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not self.busqueda_indexada:
+            return super().get_search_results(request, queryset, search_term)
+        condicion = Q()
+        for ruta, modelo in self.busqueda_indexada.items():
+            # Sin ranking: el admin ordena por sus columnas y muestra todas las coincidencias
+            ids = buscar(modelo.objects.all(), search_term, ordenar=False).values('pk')
+            condicion |= Q(**{f'{ruta}__in' if ruta else 'pk__in': ids})
+        for campo in self.busqueda_directa:
+            condicion |= Q(**{f'{campo}__icontains': search_term})
+        return queryset.filter(condicion), False
+
 
 @admin.register(Campo)
-class CampoAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'ubicacion', 'hectareas', 'capacidad_actual']
+class CampoAdmin(GanadoAdmin):
+    list_display = ['nombre', 'ubicacion', 'hectareas', 'capacidad_actual', 'animales_actuales']
     search_fields = ['nombre', 'ubicacion']
+    busqueda_indexada = {'': Campo}
     list_filter = ['hectareas']
 
+    def get_queryset(self, request):
+        abiertas = EstadiaAnimal.objects.filter(campo=OuterRef('pk'), fecha_salida__isnull=True).values('campo')
+        return super().get_queryset(request).annotate(
+            lotes_actuales=Coalesce(
+                Subquery(abiertas.annotate(total=Count('pk')).values('total'), output_field=IntegerField()), 0
+            ),
+            cabezas_actuales=Coalesce(
+                Subquery(abiertas.annotate(total=Sum('animal__cantidad')).values('total'),
+                         output_field=IntegerField()), 0
+            ),
+        )
+
+    @admin.display(description="Capacidad actual", ordering='lotes_actuales')
+    def capacidad_actual(self, obj):
+        return obj.lotes_actuales
+
+    @admin.display(description="Animales", ordering='cabezas_actuales')
+    def animales_actuales(self, obj):
+        return obj.cabezas_actuales
+
 @admin.register(Vacuno)
-class VacunoAdmin(admin.ModelAdmin):
+class VacunoAdmin(GanadoAdmin):
     list_display = ['lote_id', 'raza', 'cantidad', 'sexo', 'fecha_nacimiento', 'fecha_ingreso', 'campo_actual']
     search_fields = ['lote_id', 'raza']
+    busqueda_indexada = {'': Vacuno}
     list_filter = ['sexo', 'raza', 'fecha_ingreso']
     date_hierarchy = 'fecha_ingreso'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(campo_actual_nombre=campo_en_fecha('campo__nombre'))
+
+    @admin.display(description="Campo actual", ordering='campo_actual_nombre')
+    def campo_actual(self, obj):
+        return obj.campo_actual_nombre
+
 @admin.register(EstadoVacuno)
-class EstadoVacunoAdmin(admin.ModelAdmin):
+class EstadoVacunoAdmin(GanadoAdmin):
+    # Sin date_hierarchy: su SELECT DISTINCT de fechas recorre toda la tabla
     list_display = ['vacuno', 'fecha', 'ciclo_productivo', 'estado_salud', 'estado_general']
     list_filter = ['ciclo_productivo', 'estado_salud', 'estado_general', 'fecha']
-    search_fields = ['vacuno__caravana']
-    date_hierarchy = 'fecha'
+    list_select_related = ['vacuno']
+    search_fields = ['vacuno__lote_id']
+    busqueda_indexada = {'vacuno': Vacuno}
+    raw_id_fields = ['vacuno']
 
 @admin.register(EstadiaAnimal)
-class EstadiaAnimalAdmin(admin.ModelAdmin):
+class EstadiaAnimalAdmin(GanadoAdmin):
     list_display = ['animal', 'campo', 'fecha_entrada', 'fecha_salida']
     list_filter = ['campo', 'fecha_entrada']
-    search_fields = ['animal__caravana', 'campo__nombre']
+    list_select_related = ['animal', 'campo']
+    search_fields = ['animal__lote_id', 'campo__nombre']
+    busqueda_indexada = {'animal': Vacuno, 'campo': Campo}
+    raw_id_fields = ['animal']
 
 @admin.register(Vacuna)
 class VacunaAdmin(admin.ModelAdmin):
@@ -45,26 +132,69 @@ class VacunaAdmin(admin.ModelAdmin):
     search_fields = ['nombre', 'laboratorio']
 
 @admin.register(Vacunacion)
-class VacunacionAdmin(admin.ModelAdmin):
+class VacunacionAdmin(GanadoAdmin):
     list_display = ['animal', 'vacuna', 'fecha', 'dosis']
     list_filter = ['vacuna', 'fecha']
-    search_fields = ['animal__caravana', 'vacuna__nombre']
+    list_select_related = ['animal', 'vacuna']
+    search_fields = ['animal__lote_id', 'vacuna__nombre']
+    busqueda_indexada = {'animal': Vacuno}
+    busqueda_directa = ['vacuna__nombre']
+    raw_id_fields = ['animal']
     date_hierarchy = 'fecha'
 
 @admin.register(Transferencia)
-class TransferenciaAdmin(admin.ModelAdmin):
+class TransferenciaAdmin(GanadoAdmin):
     list_display = ['animal', 'campo_origen', 'campo_destino', 'fecha']
     list_filter = ['campo_origen', 'campo_destino', 'fecha']
-    search_fields = ['animal__caravana']
+    list_select_related = ['animal', 'campo_origen', 'campo_destino']
+    search_fields = ['animal__lote_id']
+    busqueda_indexada = {'animal': Vacuno}
+    raw_id_fields = ['animal']
     date_hierarchy = 'fecha'
 
 @admin.register(Venta)
-class VentaAdmin(admin.ModelAdmin):
+class VentaAdmin(GanadoAdmin):
     list_display = ['animal', 'comprador', 'precio', 'fecha']
     list_filter = ['fecha', 'comprador']
-    search_fields = ['animal__caravana', 'comprador']
+    list_select_related = ['animal']
+    search_fields = ['animal__lote_id', 'comprador']
+    busqueda_indexada = {'animal': Vacuno, '': Venta}
+    raw_id_fields = ['animal']
+    date_hierarchy = 'fecha'
+
+@admin.register(Pesada)
+class PesadaAdmin(GanadoAdmin):
+    list_display = ['animal', 'fecha', 'peso_promedio', 'cabezas']
+    list_filter = ['fecha']
+    list_select_related = ['animal']
+    search_fields = ['animal__lote_id']
+    busqueda_indexada = {'animal': Vacuno}
+    raw_id_fields = ['animal']
     date_hierarchy = 'fecha'
 
+@admin.register(Auditoria)
+class AuditoriaAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'usuario', 'autor', 'accion', 'modelo', 'objeto_id']
+    list_filter = ['accion', 'modelo']
+    list_select_related = ['usuario', 'autor']
+    raw_id_fields = ['usuario', 'autor']
+    search_fields = ['usuario__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(SolicitudReporte)
+class SolicitudReporteAdmin(admin.ModelAdmin):
+    list_display = ['usuario', 'reporte', 'periodo', 'formato', 'estado', 'creado', 'terminado']
+    list_filter = ['reporte', 'formato', 'estado']
+    list_select_related = ['usuario']
+    search_fields = ['usuario__username']
+    readonly_fields = ['version', 'archivo', 'error', 'creado', 'iniciado', 'terminado']
+    date_hierarchy = 'creado'
+
 @admin.register(PrecioMercado)
 class PrecioMercadoAdmin(admin.ModelAdmin):
     list_display = ['categoria', 'precio', 'fecha']
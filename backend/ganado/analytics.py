@@ -0,0 +1,164 @@
+"""
+Analítica de ventas calculada con consultas agrupadas.
+
+Todas las agregaciones se resuelven en SQL: el campo de origen, la
+categoría del lote y el precio de mercado de referencia de cada venta
+se obtienen con subconsultas correlacionadas (as-of join) en lugar de
+buscarlos fila por fila en Python.
+"""
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Lower, TruncMonth
+
+from .cache import clave_usuario, timeout_analytics
+from .consultas import campo_en_fecha, ciclo_en_fecha
+from .models import PrecioMercado, Venta
+
+
+def precio_mercado_en_fecha(ref_usuario, ref_categoria, ref_fecha):
+    """
+    Precio de mercado de la categoría más cercano a una fecha.
+    Usa el precio vigente (último publicado en o antes de la fecha) y,
+    si no hay ninguno anterior, el primero publicado después.
+    """
+    precios = PrecioMercado.objects.annotate(
+        categoria_normalizada=Lower('categoria'),
+    ).filter(
+        usuario=OuterRef(ref_usuario),
+        categoria_normalizada=Lower(OuterRef(ref_categoria)),
+    )
+    vigente = precios.filter(fecha__lte=OuterRef(ref_fecha)).order_by('-fecha')
+    posterior = precios.filter(fecha__gt=OuterRef(ref_fecha)).order_by('fecha')
+    return Coalesce(
+        Subquery(vigente.values('precio')[:1]),
+        Subquery(posterior.values('precio')[:1]),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def _totales(fila):
+    ingresos = float(fila['ingresos'] or 0)
+    animales = fila['animales'] or 0
+    return {
+        'ingresos': round(ingresos, 2),
+        'animales': animales,
+        'ventas': fila['ventas'],
+        'ingreso_por_animal': round(ingresos / animales, 2) if animales else 0,
+    }
+
+
+def _agrupar(ventas, *campos):
+    return ventas.values(*campos).annotate(
+        ingresos=Sum('precio'),
+        animales=Sum('animal__cantidad'),
+        ventas=Count('id'),
+    ).order_by(*campos)
+
+
+def _comparacion_mercado(ventas):
+    filas = ventas.annotate(
+        precio_mercado=precio_mercado_en_fecha('animal__usuario', 'categoria', 'fecha'),
+    ).values('categoria').annotate(
+        ingresos=Sum('precio'),
+        animales=Sum('animal__cantidad'),
+        ventas=Count('id'),
+        valor_mercado=Sum(F('precio_mercado') * F('animal__cantidad')),
+        animales_con_precio=Sum('animal__cantidad', filter=Q(precio_mercado__isnull=False)),
+        ingresos_con_precio=Sum('precio', filter=Q(precio_mercado__isnull=False)),
+    ).order_by('categoria')
+
+    comparacion = []
+    for fila in filas:
+        datos = _totales(fila)
+        valor_mercado = float(fila['valor_mercado'] or 0)
+        ingresos_con_precio = float(fila['ingresos_con_precio'] or 0)
+        animales_con_precio = fila['animales_con_precio'] or 0
+        diferencia = ingresos_con_precio - valor_mercado
+        datos.update({
+            'categoria': fila['categoria'] or 'sin_categoria',
+            'precio_mercado_promedio': (
+                round(valor_mercado / animales_con_precio, 2) if animales_con_precio else None
+            ),
+            'valor_mercado': round(valor_mercado, 2),
+            'diferencia': round(diferencia, 2),
+            'diferencia_porcentual': (
+                round(diferencia / valor_mercado * 100, 1) if valor_mercado else None
+            ),
+            'animales_sin_precio': datos['animales'] - animales_con_precio,
+        })
+        comparacion.append(datos)
+    return comparacion
+
+
+def calcular_resumen_ventas(usuario, fecha_desde=None, fecha_hasta=None):
+    """Resumen de ingresos por venta del usuario en el período indicado"""
+    ventas = Venta.objects.filter(animal__usuario=usuario)
+    if fecha_desde:
+        ventas = ventas.filter(fecha__gte=fecha_desde)
+    if fecha_hasta:
+        ventas = ventas.filter(fecha__lte=fecha_hasta)
+
+    ventas = ventas.annotate(
+        mes=TruncMonth('fecha'),
+        campo_origen_id=campo_en_fecha('campo_id', ref='animal', fecha=OuterRef('fecha')),
+        campo_origen_nombre=campo_en_fecha('campo__nombre', ref='animal', fecha=OuterRef('fecha')),
+        # Si el lote no tenía ciclo registrado a la fecha se usa el último conocido
+        categoria=Coalesce(
+            ciclo_en_fecha(ref='animal', fecha=OuterRef('fecha')),
+            ciclo_en_fecha(ref='animal'),
+        ),
+    )
+
+    totales = ventas.aggregate(
+        ingresos=Sum('precio'),
+        animales=Sum('animal__cantidad'),
+        ventas=Count('id'),
+    )
+
+    por_mes = []
+    for fila in _agrupar(ventas, 'mes'):
+        datos = _totales(fila)
+        datos['mes'] = fila['mes'].strftime('%Y-%m')
+        por_mes.append(datos)
+
+    por_comprador = []
+    for fila in _agrupar(ventas, 'comprador'):
+        datos = _totales(fila)
+        datos['comprador'] = fila['comprador']
+        por_comprador.append(datos)
+
+    por_raza = []
+    for fila in _agrupar(ventas, 'animal__raza'):
+        datos = _totales(fila)
+        datos['raza'] = fila['animal__raza']
+        por_raza.append(datos)
+
+    por_campo = []
+    for fila in _agrupar(ventas, 'campo_origen_id', 'campo_origen_nombre'):
+        datos = _totales(fila)
+        datos['campo_id'] = fila['campo_origen_id']
+        datos['campo'] = fila['campo_origen_nombre'] or 'Sin campo'
+        por_campo.append(datos)
+
+    return {
+        'periodo': {
+            'desde': fecha_desde.isoformat() if fecha_desde else None,
+            'hasta': fecha_hasta.isoformat() if fecha_hasta else None,
+        },
+        'totales': _totales(totales),
+        'por_mes': por_mes,
+        'por_comprador': por_comprador,
+        'por_raza': por_raza,
+        'por_campo': por_campo,
+        'comparacion_mercado': _comparacion_mercado(ventas),
+    }
+
+
+def resumen_ventas(usuario, fecha_desde=None, fecha_hasta=None):
+    """Versión cacheada por usuario y período de calcular_resumen_ventas"""
+    clave = clave_usuario(usuario.id, 'analytics_ventas', fecha_desde, fecha_hasta)
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = calcular_resumen_ventas(usuario, fecha_desde, fecha_hasta)
+        cache.set(clave, resumen, timeout_analytics())
+    return resumen
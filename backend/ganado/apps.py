@@ -1,6 +1,27 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _sincronizar_busqueda(sender, using, **kwargs):
+    """Recrea los triggers FTS5 y R*Tree que SQLite pierde al reconstruir tablas en migraciones"""
+    from django.db import connections, router
+
+    from .busqueda import MODELOS_BUSQUEDA, crear_indices_sqlite
+    from .geo import crear_indice_sqlite, tiene_rtree
+
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and router.allow_migrate_model(using, MODELOS_BUSQUEDA[0]):
+        crear_indices_sqlite(connection)
+        # La tabla R*Tree la crea la migración 0012; antes no hay columnas bbox
+        if tiene_rtree(using):
+            crear_indice_sqlite(connection)
 
 
 class GanadoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ganado'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(_sincronizar_busqueda, sender=self)
@@ -0,0 +1,222 @@
+"""
+Registro de auditoría de las escrituras de ganado: quién cambió qué lote,
+estadía, venta o transferencia, y qué cambió.
+
+Las señales de guardado y borrado de los modelos auditados, y las
+escrituras masivas (sync.actualizar, ciclos), arman entradas con las
+diferencias en JSON compacto: en un alta los valores no vacíos, en un
+cambio {campo: [antes, después]} solo de los campos que cambiaron y en
+una baja los valores que tenía la fila. Los valores previos son los que
+la instancia leyó de la base (ConValoresCargados): no hay consulta extra.
+
+Las entradas no se insertan una por una. Dentro de una transacción
+esperan a su commit (transaction.on_commit, así lo deshecho por un
+rollback o un savepoint no queda registrado) y se acumulan en el lote
+del request (AuditoriaMiddleware) o de un bloque `with lote()`, que al
+terminar se guarda con un solo bulk_create por base. Fuera de un lote
+cada escritura se guarda al confirmarse.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import (
+    Auditoria,
+    Campo,
+    EstadiaAnimal,
+    EstadoVacuno,
+    Transferencia,
+    Vacunacion,
+    Vacuno,
+    Venta,
+)
+from .routers import usuario_actual
+
+MODELOS_AUDITADOS = [
+    Campo,
+    Vacuno,
+    EstadoVacuno,
+    EstadiaAnimal,
+    Vacunacion,
+    Transferencia,
+    Venta,
+]
+# El dueño ya está en la entrada y el resto se deriva de otros campos
+CAMPOS_EXCLUIDOS = {'usuario_id', 'updated_at', 'bbox_oeste', 'bbox_sur', 'bbox_este', 'bbox_norte'}
+# Entradas que junta un lote antes de guardarlas sin esperar al final
+MAX_ENTRADAS_LOTE = 1000
+
+_lote_actual = ContextVar('auditoria_lote', default=None)
+
+
+def es_auditado(modelo):
+    return modelo in MODELOS_AUDITADOS
+
+
+class Lote:
+    """Entradas confirmadas pendientes de guardar, por alias de base"""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.entradas = defaultdict(list)
+        self.cantidad = 0
+
+    def autor_id(self):
+        usuario = getattr(self.request, 'user', None)
+        return usuario.id if usuario is not None and usuario.is_authenticated else None
+
+    def agregar(self, entradas, alias):
+        self.entradas[alias].extend(entradas)
+        self.cantidad += len(entradas)
+        if self.cantidad >= MAX_ENTRADAS_LOTE:
+            self.guardar()
+
+    def guardar(self):
+        entradas, self.entradas, self.cantidad = self.entradas, defaultdict(list), 0
+        for alias, filas in entradas.items():
+            Auditoria.objects.using(alias).bulk_create(filas)
+
+
+@contextmanager
+def lote(request=None):
+    """Junta las entradas del bloque y las guarda al salir; anidado, usa el lote de afuera"""
+    if _lote_actual.get() is not None:
+        yield _lote_actual.get()
+        return
+    actual = Lote(request)
+    token = _lote_actual.set(actual)
+    try:
+        yield actual
+    finally:
+        _lote_actual.reset(token)
+        actual.guardar()
+
+
+class AuditoriaMiddleware:
+    """Guarda la auditoría del request al final, en un bulk_create"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with lote(request):
+            return self.get_response(request)
+
+
+def _confirmar(entradas, alias):
+    actual = _lote_actual.get()
+    if actual is None:
+        Auditoria.objects.using(alias).bulk_create(entradas)
+    else:
+        actual.agregar(entradas, alias)
+
+
+def _registrar(modelo, usuario_id, filas, alias=None):
+    """Arma las entradas [(objeto_id, accion, cambios)] y las confirma con la transacción"""
+    alias = alias or router.db_for_write(modelo)
+    actual = _lote_actual.get()
+    autor_id = (actual.autor_id() if actual else None) or usuario_actual.get()
+    fecha = timezone.now()
+    entradas = [
+        Auditoria(
+            usuario_id=usuario_id, autor_id=autor_id, modelo=modelo._meta.model_name,
+            objeto_id=objeto_id, accion=accion, cambios=cambios, fecha=fecha,
+        )
+        for objeto_id, accion, cambios in filas
+    ]
+    if not entradas:
+        return
+    if connections[alias].in_atomic_block:
+        transaction.on_commit(partial(_confirmar, entradas, alias), using=alias)
+    else:
+        _confirmar(entradas, alias)
+
+
+def _campos(modelo):
+    return [
+        campo for campo in modelo._meta.concrete_fields
+        if not campo.primary_key and campo.attname not in CAMPOS_EXCLUIDOS
+    ]
+
+
+def _normalizar(campo, valor):
+    """Valor con el tipo del campo (ej. '10.5' -> Decimal) para comparar con el leído"""
+    try:
+        return campo.to_python(valor)
+    except ValidationError:
+        return valor
+
+
+def _valores(instance):
+    """Valores no vacíos cargados en la instancia (sin tocar campos diferidos)"""
+    return {
+        campo.attname: instance.__dict__[campo.attname] for campo in _campos(type(instance))
+        if instance.__dict__.get(campo.attname) not in (None, '')
+    }
+
+
+def _guardar_valores(instance):
+    instance._valores_cargados = {
+        campo.attname: instance.__dict__[campo.attname]
+        for campo in type(instance)._meta.concrete_fields if campo.attname in instance.__dict__
+    }
+
+
+def auditar_guardado(instance, usuario_id, creado, update_fields=None):
+    """Entrada de alta o de cambio (solo si algo cambió) para un save()"""
+    if creado:
+        _registrar(type(instance), usuario_id, [(instance.pk, 'alta', _valores(instance))], instance._state.db)
+        _guardar_valores(instance)
+        return
+
+    anteriores = getattr(instance, '_valores_cargados', None)
+    if isinstance(anteriores, tuple):
+        anteriores = dict(zip(*anteriores, strict=True))
+    cambios = {}
+    for campo in _campos(type(instance)):
+        if campo.attname not in instance.__dict__:
+            continue
+        if update_fields is not None and campo.name not in update_fields and campo.attname not in update_fields:
+            continue
+        nuevo = _normalizar(campo, instance.__dict__[campo.attname])
+        if anteriores is None:
+            # Instancia armada sin leerla: el valor previo es desconocido
+            if nuevo not in (None, ''):
+                cambios[campo.attname] = [None, nuevo]
+        elif campo.attname in anteriores and anteriores[campo.attname] != nuevo:
+            cambios[campo.attname] = [anteriores[campo.attname], nuevo]
+    if cambios:
+        _registrar(type(instance), usuario_id, [(instance.pk, 'cambio', cambios)], instance._state.db)
+    _guardar_valores(instance)
+
+
+def auditar_borrado(instance, usuario_id):
+    _registrar(type(instance), usuario_id, [(instance.pk, 'baja', _valores(instance))], instance._state.db)
+
+
+def auditar_altas(modelo, objetos, usuario_id, using=None):
+    """Altas de un bulk_create, que no emite señales"""
+    _registrar(modelo, usuario_id, [(objeto.pk, 'alta', _valores(objeto)) for objeto in objetos], using)
+
+
+def auditar_actualizacion(modelo, anteriores, valores, usuario_id, using=None):
+    """
+    Cambios de un queryset.update(valores); `anteriores` tiene los valores
+    previos de esos campos por pk: {pk: {attname: valor}}
+    """
+    campos = {nombre: modelo._meta.get_field(nombre) for nombre in valores}
+    filas = []
+    for pk, previos in anteriores.items():
+        cambios = {}
+        for nombre, campo in campos.items():
+            nuevo = _normalizar(campo, getattr(valores[nombre], 'pk', valores[nombre]))
+            if previos[campo.attname] != nuevo:
+                cambios[campo.attname] = [previos[campo.attname], nuevo]
+        if cambios:
+            filas.append((pk, 'cambio', cambios))
+    _registrar(modelo, usuario_id, filas, using)
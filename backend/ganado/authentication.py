@@ -0,0 +1,122 @@
+"""
+Autenticación JWT sin consulta del usuario en cada request.
+
+JWTAuthentication busca el User en la base en cada llamada a la API.
+CachedJWTAuthentication valida firma y claims igual que la original,
+pero resuelve el usuario desde una cache en proceso de vida corta
+(TIMEOUT_LOCAL, a lo sumo MAX_LOCAL usuarios, descartando el menos
+usado) y, si la cache de Django es compartida entre workers, desde esa
+cache (TIMEOUT). Se cachean solo los valores de las columnas del
+usuario: cada request recibe una instancia nueva, así que lo que una
+vista le cambie no pasa a otros requests. Las entradas se invalidan al
+guardar o borrar el usuario (ver ganado.signals), así que una baja o un
+cambio de contraseña rige de inmediato en el proceso que lo hace y, en
+los demás workers, al vencer el TTL local. Con la cache de cada proceso
+no se usa la segunda capa: su invalidación no llegaría a los otros
+workers.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import cache_compartida
+
+# user_id -> (vencimiento, valores), del menos al más usado
+_usuarios_locales = OrderedDict()
+_lock = threading.Lock()
+
+
+def _clave(user_id):
+    return f'ganado:auth:usuario:{user_id}'
+
+
+def invalidar_usuario_cacheado(user_id):
+    """Descarta el usuario de la cache local y de la compartida"""
+    with _lock:
+        _usuarios_locales.pop(str(user_id), None)
+    cache.delete(_clave(user_id))
+
+
+def _columnas(modelo):
+    return [campo.attname for campo in modelo._meta.concrete_fields]
+
+
+def _valores(user):
+    """Valores de las columnas del usuario (inmutables, se comparten entre requests)"""
+    return tuple(getattr(user, columna) for columna in _columnas(type(user)))
+
+
+def _instancia(modelo, valores):
+    """Usuario nuevo armado con los valores cacheados, como si viniera de la base"""
+    return modelo.from_db(DEFAULT_DB_ALIAS, _columnas(modelo), valores)
+
+
+def _valores_cacheados(user_id):
+    ahora = time.monotonic()
+    clave = str(user_id)
+    with _lock:
+        entrada = _usuarios_locales.get(clave)
+        if entrada is not None:
+            if entrada[0] > ahora:
+                _usuarios_locales.move_to_end(clave)
+                return entrada[1]
+            del _usuarios_locales[clave]
+    if not cache_compartida():
+        return None
+
+    valores = cache.get(_clave(user_id))
+    if valores is not None:
+        _guardar_local(user_id, valores)
+    return valores
+
+
+def _guardar_local(user_id, valores):
+    vencimiento = time.monotonic() + settings.JWT_USER_CACHE['TIMEOUT_LOCAL']
+    clave = str(user_id)
+    with _lock:
+        _usuarios_locales[clave] = (vencimiento, valores)
+        _usuarios_locales.move_to_end(clave)
+        while len(_usuarios_locales) > settings.JWT_USER_CACHE['MAX_LOCAL']:
+            _usuarios_locales.popitem(last=False)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication que resuelve el usuario desde cache"""
+
+    def get_user(self, validated_token):
+        if not settings.JWT_USER_CACHE['TIMEOUT']:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        valores = _valores_cacheados(user_id)
+        if valores is None:
+            user = super().get_user(validated_token)
+            valores = _valores(user)
+            if cache_compartida():
+                cache.set(_clave(user_id), valores, settings.JWT_USER_CACHE['TIMEOUT'])
+            _guardar_local(user_id, valores)
+            return user
+
+        user = _instancia(self.user_model, valores)
+
+        # Mismas verificaciones que JWTAuthentication sobre el usuario cacheado
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,98 @@
+"""
+Carga inicial del frontend en un solo request (/api/bootstrap/).
+
+Cada recurso pedido se ejecuta en proceso con la vista que lo sirve
+normalmente, sobre una copia del request ya autenticado: el JWT se
+valida una sola vez y las vistas comparten un CacheRequest con los
+campos y lotes del usuario (con su estado y campo actual) ya resueltos.
+"""
+import copy
+import io
+import json
+
+from django.db.models import Exists, OuterRef
+from django.http import QueryDict
+from django.urls import reverse
+
+from .consultas import (
+    prefetch_estadia_abierta,
+    prefetch_estado_actual,
+    prefetch_vacunos_actuales,
+)
+from .models import Campo, Vacuno, Venta
+
+
+class CacheRequest:
+    """Consultas de campos y lotes del usuario, resueltas una vez por request"""
+
+    def __init__(self, usuario):
+        self.usuario = usuario
+        self._campos = None
+        self._lotes = None
+
+    def campos(self):
+        """Campos del usuario con sus lotes actuales prefetcheados"""
+        if self._campos is None:
+            self._campos = list(
+                Campo.objects.filter(usuario=self.usuario).prefetch_related(prefetch_vacunos_actuales())
+            )
+        return self._campos
+
+    def lotes(self):
+        """Lotes del usuario con estado y campo actual, y `tiene_venta` anotado"""
+        if self._lotes is None:
+            self._lotes = list(
+                Vacuno.objects.filter(usuario=self.usuario).annotate(
+                    tiene_venta=Exists(Venta.objects.filter(animal=OuterRef('pk')))
+                ).prefetch_related(prefetch_estado_actual(), prefetch_estadia_abierta())
+            )
+        return self._lotes
+
+
+def cache_request(request):
+    """CacheRequest del request en curso, compartido con los sub-requests del bootstrap"""
+    django_request = getattr(request, '_request', request)
+    cache = getattr(django_request, 'ganado_cache', None)
+    if cache is None or cache.usuario.pk != request.user.pk:
+        cache = CacheRequest(request.user)
+        django_request.ganado_cache = cache
+    return cache
+
+
+def ejecutar_recurso(request, viewset, accion, url_name, params=None, metodo='get', datos=None, **kwargs):
+    """
+    Ejecuta la acción de la vista con `params` como query string y `datos`
+    como cuerpo JSON; devuelve (status, data).
+    """
+    # La copia comparte el CacheRequest del request original
+    cache_request(request)
+    sub = copy.copy(request._request)
+    sub.method = metodo.upper()
+    sub.path = sub.path_info = reverse(url_name, kwargs=kwargs or None)
+    sub.GET = QueryDict(mutable=True)
+    for nombre, valor in (params or {}).items():
+        sub.GET[nombre] = valor
+    for atributo in ('_body', '_post', '_files'):
+        sub.__dict__.pop(atributo, None)
+    cuerpo = json.dumps(datos).encode() if datos is not None else b''
+    sub.META = {**sub.META, 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(cuerpo))}
+    sub._stream = io.BytesIO(cuerpo)
+    sub._read_started = False
+    # El usuario ya está autenticado: el sub-request no vuelve a validar el JWT
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    # Ya pasó por el límite de requests como parte del request original
+    sub.ganado_interno = True
+
+    respuesta = viewset.as_view({metodo: accion})(sub, **kwargs)
+    return respuesta.status_code, getattr(respuesta, 'data', None)
+
+
+def parametros_recursos(query_params, nombres):
+    """Separa los parámetros `<recurso>.<param>` por recurso"""
+    params = {nombre: {} for nombre in nombres}
+    for clave, valor in query_params.items():
+        recurso, separador, param = clave.partition('.')
+        if separador and recurso in params:
+            params[recurso][param] = valor
+    return params
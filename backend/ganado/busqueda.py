@@ -0,0 +1,248 @@
+"""
+Búsqueda de texto (?q=) sobre lotes, campos y ventas.
+
+En PostgreSQL se combina búsqueda full-text (to_tsvector en español) con
+coincidencia parcial por trigramas (pg_trgm); ambas condiciones usan
+índices GIN creados en la migración 0007. En SQLite cada modelo tiene una
+tabla virtual FTS5 con tokenizer trigram, mantenida por triggers, y el
+orden de relevancia lo da bm25. Sin FTS5 disponible se cae a icontains.
+
+Un término muy frecuente (más de UMBRAL_FRECUENTE coincidencias en la
+tabla, ej. una raza) casi no discrimina y bm25 tiene que recorrer todas
+sus apariciones: en SQLite se devuelven sin rankear sus
+UMBRAL_FRECUENTE coincidencias más recientes, para que la consulta no
+crezca con la tabla. Agregar otro término acota la búsqueda.
+"""
+import operator
+from functools import reduce
+
+from django.db import OperationalError, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest, Upper
+
+from .models import Campo, Vacuno, Venta
+
+CAMPOS_BUSQUEDA = {
+    'vacuno': ('lote_id', 'raza', 'observaciones'),
+    'campo': ('nombre', 'ubicacion'),
+    'venta': ('comprador', 'destino'),
+}
+MODELOS_BUSQUEDA = [Vacuno, Campo, Venta]
+CONFIGURACION_FTS = 'spanish'
+# Coincidencias ordenadas por relevancia en SQLite; las demás van después, por id
+LIMITE_RESULTADOS = 500
+# Coincidencias a partir de las cuales un término se considera frecuente en SQLite
+UMBRAL_FRECUENTE = 5_000
+# El tokenizer trigram de FTS5 no encuentra términos de menos de 3 caracteres
+MINIMO_TRIGRAMA = 3
+
+
+def _campos(modelo):
+    return CAMPOS_BUSQUEDA[modelo._meta.model_name]
+
+
+def _coincide(campos, termino):
+    return reduce(operator.or_, [Q(**{f'{campo}__icontains': termino}) for campo in campos])
+
+
+def buscar(queryset, texto, ordenar=True):
+    """
+    Filtra el queryset por el texto y lo ordena por relevancia. Con
+    ordenar=False solo filtra (ej. para una subconsulta de ids).
+    """
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+
+    campos = _campos(queryset.model)
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return _buscar_postgresql(queryset, campos, texto, ordenar)
+    if vendor == 'sqlite' and tiene_fts(queryset.db, queryset.model):
+        return _buscar_sqlite(queryset, campos, texto, ordenar)
+
+    for termino in texto.split():
+        queryset = queryset.filter(_coincide(campos, termino))
+    return queryset
+
+
+def _buscar_postgresql(queryset, campos, texto, ordenar):
+    from django.contrib.postgres.search import (
+        SearchQuery,
+        SearchRank,
+        SearchVector,
+        TrigramWordSimilarity,
+    )
+
+    vector = SearchVector(*campos, config=CONFIGURACION_FTS)
+    consulta = SearchQuery(texto, config=CONFIGURACION_FTS, search_type='websearch')
+    coincidencias = queryset.annotate(busqueda=vector).filter(Q(busqueda=consulta) | _coincide(campos, texto))
+    if not ordenar:
+        return coincidencias
+    similitud = [TrigramWordSimilarity(texto, campo) for campo in campos]
+    return coincidencias.annotate(
+        relevancia=SearchRank(vector, consulta) + Greatest(*similitud),
+    ).order_by('-relevancia')
+
+
+def _expresion_fts(terminos):
+    """Consulta MATCH de FTS5: cada término como frase literal, todos obligatorios"""
+    return ' '.join('"{}"'.format(termino.replace('"', '""')) for termino in terminos)
+
+
+def _buscar_sqlite(queryset, campos, texto, ordenar):
+    terminos = texto.split()
+    cortos = [t for t in terminos if len(t) < MINIMO_TRIGRAMA]
+    largos = [t for t in terminos if len(t) >= MINIMO_TRIGRAMA]
+
+    for termino in cortos:
+        queryset = queryset.filter(_coincide(campos, termino))
+    if not largos:
+        return queryset
+
+    tabla = tabla_fts(queryset.model)
+    expresion = _expresion_fts(largos)
+    # El MATCH usa el índice FTS y cada coincidencia se valida contra el
+    # queryset (usuario y demás filtros) por clave primaria. Un "rowid IN
+    # (subquery)" haría que FTS5 evalúe el MATCH una vez por fila del usuario.
+    filas = queryset.order_by().filter(pk=RawSQL(f'{tabla}.rowid', ())).values('pk')
+    del_queryset, parametros = filas.query.get_compiler(using=queryset.db).as_sql()
+    coincide = f'{tabla} MATCH %s AND EXISTS ({del_queryset})'
+
+    # Todas las coincidencias: el MATCH se evalúa una vez como subconsulta
+    # no correlacionada y filtra el queryset, así conteo y páginas son exactos
+    coincidencias = queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {tabla} WHERE {tabla} MATCH %s', [expresion]))
+    if not ordenar:
+        return coincidencias
+
+    if _es_frecuente(queryset.db, tabla, expresion):
+        # Las más recientes primero: FTS5 recorre los rowid en orden y corta en el LIMIT
+        recientes = RawSQL(
+            f'SELECT rowid FROM {tabla} WHERE {coincide} ORDER BY rowid DESC LIMIT %s',
+            [expresion, *parametros, UMBRAL_FRECUENTE],
+        )
+        return queryset.filter(pk__in=recientes).order_by('-pk')
+
+    # Las LIMITE_RESULTADOS más relevantes (bm25) van primero
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {tabla} WHERE {coincide} ORDER BY rank LIMIT %s',
+            [expresion, *parametros, LIMITE_RESULTADOS],
+        )
+        ids = [fila[0] for fila in cursor.fetchall()]
+
+    if not ids:
+        return queryset.none()
+    return coincidencias.annotate(
+        relevancia=Case(
+            *[When(pk=pk, then=Value(posicion)) for posicion, pk in enumerate(ids)],
+            default=Value(len(ids)),
+            output_field=IntegerField(),
+        )
+    ).order_by('relevancia', 'pk')
+
+
+def _es_frecuente(alias, tabla, expresion):
+    """Si la expresión tiene al menos UMBRAL_FRECUENTE coincidencias (recorre a lo sumo esas)"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f'SELECT count(*) FROM (SELECT 1 FROM {tabla} WHERE {tabla} MATCH %s LIMIT %s)',
+            [expresion, UMBRAL_FRECUENTE],
+        )
+        return cursor.fetchone()[0] >= UMBRAL_FRECUENTE
+
+
+# --- Índices -----------------------------------------------------------------
+
+def tabla_fts(modelo):
+    return f'{modelo._meta.db_table}_fts'
+
+
+_fts_disponible = {}
+
+
+def tiene_fts(alias, modelo):
+    clave = (alias, modelo._meta.db_table)
+    if clave not in _fts_disponible:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [tabla_fts(modelo)]
+            )
+            _fts_disponible[clave] = cursor.fetchone() is not None
+    return _fts_disponible[clave]
+
+
+def _sentencias_sqlite(modelo):
+    tabla = modelo._meta.db_table
+    fts = tabla_fts(modelo)
+    campos = _campos(modelo)
+    columnas = ', '.join(campos)
+    nuevos = ', '.join(f'new.{campo}' for campo in campos)
+    viejos = ', '.join(f'old.{campo}' for campo in campos)
+    borrar = f"INSERT INTO {fts}({fts}, rowid, {columnas}) VALUES ('delete', old.id, {viejos});"
+    insertar = f"INSERT INTO {fts}(rowid, {columnas}) VALUES (new.id, {nuevos});"
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN {insertar} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN {borrar} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tabla} BEGIN {borrar} {insertar} END',
+    ]
+
+
+def crear_indices_sqlite(connection, modelos=MODELOS_BUSQUEDA):
+    """
+    Crea (si faltan) las tablas FTS5 y sus triggers de sincronización.
+
+    SQLite reconstruye la tabla en cada ALTER de una migración y los
+    triggers se pierden con la tabla vieja; por eso también se llama
+    después de cada migrate y reindexa cuando faltaba algún trigger.
+    """
+    with connection.cursor() as cursor:
+        for modelo in modelos:
+            fts = tabla_fts(modelo)
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+                [fts, f'{fts}_ai', f'{fts}_ad', f'{fts}_au'],
+            )
+            if len(cursor.fetchall()) == 4:
+                continue
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{', '.join(_campos(modelo))}, content='{modelo._meta.db_table}', "
+                    f"content_rowid='id', tokenize='trigram')"
+                )
+            except OperationalError:
+                # SQLite compilado sin FTS5 o sin tokenizer trigram: queda icontains
+                return
+            for sentencia in _sentencias_sqlite(modelo):
+                cursor.execute(sentencia)
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    _fts_disponible.clear()
+
+
+def borrar_indices_sqlite(connection, modelos=MODELOS_BUSQUEDA):
+    with connection.cursor() as cursor:
+        for modelo in modelos:
+            fts = tabla_fts(modelo)
+            for sufijo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{sufijo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+    _fts_disponible.clear()
+
+
+def indices_postgresql(modelo):
+    """Índices GIN full-text y trigram con las mismas expresiones que usa buscar()"""
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.search import SearchVector
+
+    campos = _campos(modelo)
+    prefijo = f'busq_{modelo._meta.model_name}'
+    indices = [GinIndex(SearchVector(*campos, config=CONFIGURACION_FTS), name=f'{prefijo}_fts')]
+    # icontains se traduce a UPPER(col::text) LIKE UPPER(...): el índice trigram
+    # sobre UPPER(col) permite resolverlo sin recorrer la tabla
+    indices += [
+        GinIndex(OpClass(Upper(campo), name='gin_trgm_ops'), name=f'{prefijo}_{campo}_trgm')
+        for campo in campos
+    ]
+    return indices
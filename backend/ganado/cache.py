@@ -0,0 +1,49 @@
+"""
+Versionado de datos por usuario para invalidar respuestas cacheadas.
+
+Cada escritura sobre los modelos de ganado incrementa la versión del
+usuario dueño; las claves de cache incluyen esa versión, de modo que
+una escritura invalida todas las entradas del usuario sin tener que
+enumerarlas. La versión vive en la cache de Django: solo invalida en
+todos los workers si esa cache es compartida (ver settings.CACHES).
+"""
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def cache_compartida(alias='default'):
+    """Indica si la cache la ven todos los procesos (no es la de memoria de cada uno)"""
+    return not isinstance(caches[alias], LocMemCache | DummyCache)
+
+
+def timeout_analytics():
+    """Vida de los resúmenes cacheados: más corta si otro proceso no puede invalidarlos"""
+    if cache_compartida():
+        return settings.ANALYTICS_CACHE_TIMEOUT
+    return min(settings.ANALYTICS_CACHE_TIMEOUT, settings.ANALYTICS_CACHE_TIMEOUT_LOCAL)
+
+
+def _clave_version(usuario_id):
+    return f'ganado:version:{usuario_id}'
+
+
+def version_datos(usuario_id):
+    """Versión actual de los datos del usuario"""
+    return cache.get_or_set(_clave_version(usuario_id), 1, None)
+
+
+def invalidar_usuario(usuario_id):
+    """Incrementa la versión de datos del usuario"""
+    try:
+        cache.incr(_clave_version(usuario_id))
+    except ValueError:
+        cache.set(_clave_version(usuario_id), 2, None)
+
+
+def clave_usuario(usuario_id, *partes):
+    """Arma una clave de cache ligada a la versión de datos del usuario"""
+    version = version_datos(usuario_id)
+    sufijo = ':'.join('' if parte is None else str(parte) for parte in partes)
+    return f'ganado:{usuario_id}:v{version}:{sufijo}'
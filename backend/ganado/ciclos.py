@@ -0,0 +1,142 @@
+"""
+Avance automático del ciclo productivo de los lotes según su edad.
+
+La edad y el ciclo que corresponde a cada lote se calculan en SQL en una
+sola pasada (Case/When sobre fecha_nacimiento) y solo se insertan, con
+bulk_create, estados nuevos para los lotes cuyo ciclo cambió. Con una
+ejecución previa registrada se consideran únicamente los lotes que
+cruzaron algún umbral de edad desde entonces.
+"""
+import operator
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import reduce
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, CharField, Q, Value, When
+
+from .auditoria import auditar_altas, lote
+from .cache import invalidar_usuario
+from .consultas import ciclo_en_fecha, estado_en_fecha
+from .models import CICLOS_POR_EDAD, EjecucionProceso, EstadoVacuno, Vacuno
+from .routers import usuarios_en_base
+from .sync import registrar_cambios
+
+NOMBRE_PROCESO = 'actualizar_ciclos'
+ESTADOS_SIN_AVANCE = ('vendido', 'muerto')
+
+
+def _ciclo_objetivo(fecha):
+    """Expresión SQL con el ciclo que corresponde a cada lote a la fecha"""
+    condiciones = []
+    for sexo, tramos in CICLOS_POR_EDAD.items():
+        for edad_hasta, ciclo in tramos:
+            filtro = Q(sexo=sexo)
+            if edad_hasta is not None:
+                filtro &= Q(fecha_nacimiento__gt=fecha - timedelta(days=edad_hasta))
+            condiciones.append(When(filtro, then=Value(ciclo)))
+    return Case(*condiciones, default=Value(''), output_field=CharField())
+
+
+def _cruzaron_umbral(desde, hasta):
+    """Lotes cuya edad cruzó algún umbral entre dos fechas (desde excluida)"""
+    return reduce(operator.or_, [
+        Q(
+            sexo=sexo,
+            fecha_nacimiento__lte=hasta - timedelta(days=edad_hasta),
+            fecha_nacimiento__gt=desde - timedelta(days=edad_hasta),
+        )
+        for sexo, tramos in CICLOS_POR_EDAD.items()
+        for edad_hasta, _ in tramos
+        if edad_hasta is not None
+    ])
+
+
+def _orden(sexo, ciclo):
+    ciclos = [c for _, c in CICLOS_POR_EDAD.get(sexo, [])]
+    return ciclos.index(ciclo) if ciclo in ciclos else -1
+
+
+def lotes_a_actualizar(fecha, desde=None, using=DEFAULT_DB_ALIAS):
+    """Lotes activos de la base `using` cuyo ciclo debe avanzar a la fecha"""
+    lotes = Vacuno.objects.using(using).filter(fecha_nacimiento__isnull=False)
+    if settings.DATABASE_SHARDS:
+        lotes = lotes.filter(usuarios_en_base(using))
+    if desde is not None:
+        lotes = lotes.filter(_cruzaron_umbral(desde, fecha))
+
+    lotes = lotes.annotate(
+        ciclo_objetivo=_ciclo_objetivo(fecha),
+        ciclo_actual=ciclo_en_fecha(),
+        estado_general=estado_en_fecha('estado_general'),
+        estado_salud=estado_en_fecha('estado_salud'),
+    ).values(
+        'id', 'usuario_id', 'sexo', 'ciclo_objetivo', 'ciclo_actual',
+        'estado_general', 'estado_salud',
+    )
+
+    # Solo se avanza: un ciclo cargado a mano por delante de la edad se respeta
+    return [
+        lote for lote in lotes.iterator()
+        if lote['estado_general'] not in ESTADOS_SIN_AVANCE
+        and lote['ciclo_objetivo']
+        and _orden(lote['sexo'], lote['ciclo_objetivo']) > _orden(lote['sexo'], lote['ciclo_actual'])
+    ]
+
+
+def actualizar_ciclos(fecha=None, completo=False, tamano_lote=1000):
+    """
+    Inserta un EstadoVacuno con el nuevo ciclo para cada lote que lo cambió,
+    en 'default' y en cada shard. Devuelve la cantidad de lotes actualizados.
+    """
+    fecha = fecha or date.today()
+    ejecucion = EjecucionProceso.objects.filter(nombre=NOMBRE_PROCESO).first()
+    desde = None if completo or ejecucion is None else ejecucion.ultima_ejecucion
+
+    # La ejecución se registra después de todas las bases: si una falla, la
+    # próxima vuelve a revisar desde la fecha anterior y las bases ya
+    # actualizadas no repiten estados (solo se avanza de ciclo)
+    actualizados = sum(
+        _actualizar_base(alias, fecha, desde, tamano_lote)
+        for alias in [DEFAULT_DB_ALIAS, *settings.DATABASE_SHARDS]
+    )
+    EjecucionProceso.objects.update_or_create(nombre=NOMBRE_PROCESO, defaults={'ultima_ejecucion': fecha})
+    return actualizados
+
+
+def _actualizar_base(alias, fecha, desde, tamano_lote):
+    lotes = lotes_a_actualizar(fecha, desde, using=alias)
+    estados = [
+        EstadoVacuno(
+            vacuno_id=lote['id'],
+            ciclo_productivo=lote['ciclo_objetivo'],
+            estado_salud=lote['estado_salud'] or '',
+            estado_general=lote['estado_general'] or 'activo',
+            observaciones=(
+                f"Cambio automático de ciclo: {lote['ciclo_actual'] or 'sin ciclo'} "
+                f"→ {lote['ciclo_objetivo']}"
+            ),
+        )
+        for lote in lotes
+    ]
+    if not estados:
+        return 0
+
+    usuarios = {lote['id']: lote['usuario_id'] for lote in lotes}
+    with lote(), transaction.atomic(using=alias):
+        EstadoVacuno.objects.using(alias).bulk_create(estados, batch_size=tamano_lote)
+        # bulk_create no emite post_save: registrar a mano los cambios para /api/sync/
+        # y la auditoría
+        por_usuario = defaultdict(list)
+        for estado in estados:
+            por_usuario[usuarios[estado.vacuno_id]].append(estado)
+        for usuario_id, estados_usuario in por_usuario.items():
+            registrar_cambios(EstadoVacuno, [estado.pk for estado in estados_usuario], usuario_id, using=alias)
+            auditar_altas(EstadoVacuno, estados_usuario, usuario_id, using=alias)
+
+    # ...e invalidar la cache de los usuarios
+    for usuario_id in set(usuarios.values()):
+        invalidar_usuario(usuario_id)
+
+    return len(estados)
@@ -0,0 +1,167 @@
+"""
+Compresión de respuestas con brotli o gzip según Accept-Encoding.
+
+A diferencia de django.middleware.gzip, el algoritmo, el umbral de tamaño
+y el nivel por tipo de contenido se configuran en settings.COMPRESION, y
+las respuestas en streaming se comprimen por chunk con flush, así el
+cliente recibe datos a medida que se generan.
+"""
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin el paquete se usa solo gzip
+    brotli = None
+
+RE_CODIFICACION = re.compile(r'^\s*([a-z*]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def codificaciones_aceptadas(accept_encoding):
+    """Codificaciones del header Accept-Encoding con q > 0"""
+    aceptadas = set()
+    for parte in accept_encoding.lower().split(','):
+        match = RE_CODIFICACION.match(parte)
+        if match is None:
+            continue
+        nombre, q = match.groups()
+        try:
+            if q is None or float(q) > 0:
+                aceptadas.add(nombre)
+        except ValueError:
+            continue
+    return aceptadas
+
+
+def niveles_para(content_type):
+    """Niveles {'br': n, 'gzip': n} configurados para el tipo, o None si no se comprime"""
+    tipo = content_type.split(';', 1)[0].strip().lower()
+    tipos = settings.COMPRESION['TIPOS']
+    if tipo in tipos:
+        return tipos[tipo]
+    # Prefijos como 'text/' aplican a todos los subtipos sin entrada propia
+    for patron, niveles in tipos.items():
+        if patron.endswith('/') and tipo.startswith(patron):
+            return niveles
+    return None
+
+
+class _Gzip:
+    def __init__(self, nivel):
+        # wbits=31: formato gzip (cabecera y CRC) en vez de zlib crudo
+        self.compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos):
+        return self.compresor.compress(datos)
+
+    def vaciar(self):
+        return self.compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self):
+        return self.compresor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, nivel):
+        self.compresor = brotli.Compressor(quality=nivel)
+
+    def comprimir(self, datos):
+        return self.compresor.process(datos)
+
+    def vaciar(self):
+        return self.compresor.flush()
+
+    def terminar(self):
+        return self.compresor.finish()
+
+
+COMPRESORES = {'br': _Brotli, 'gzip': _Gzip}
+
+
+def elegir_codificacion(request, niveles):
+    aceptadas = codificaciones_aceptadas(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for codificacion in ('br', 'gzip'):
+        if codificacion == 'br' and brotli is None:
+            continue
+        if codificacion in aceptadas and niveles.get(codificacion) is not None:
+            return codificacion
+    return None
+
+
+class CompresionMiddleware:
+    """Comprime respuestas (normales y en streaming) con brotli o gzip"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.procesar(request, self.get_response(request))
+
+    def procesar(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code == 304:
+            return response
+        niveles = niveles_para(response.get('Content-Type', ''))
+        if niveles is None:
+            return response
+
+        # La respuesta depende de Accept-Encoding aunque este cliente no comprima
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codificacion = elegir_codificacion(request, niveles)
+        if codificacion is None:
+            return response
+        compresor = COMPRESORES[codificacion](niveles[codificacion])
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._comprimir_async(response.streaming_content, compresor)
+            else:
+                response.streaming_content = self._comprimir_stream(response.streaming_content, compresor)
+            # El largo final no se conoce de antemano
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESION['MINIMO_BYTES']:
+                return response
+            comprimido = compresor.comprimir(response.content) + compresor.terminar()
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers['Content-Length'] = str(len(comprimido))
+
+        # Misma semántica que GZipMiddleware: el ETag fuerte pasa a débil
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codificacion
+        return response
+
+    # En streaming se vacía el compresor cada FLUSH_BYTES de entrada: vaciar
+    # en cada chunk (una fila de CSV, por ejemplo) empeora mucho la compresión
+
+    @staticmethod
+    def _comprimir_stream(contenido, compresor):
+        pendientes = 0
+        for chunk in contenido:
+            datos = compresor.comprimir(chunk)
+            pendientes += len(chunk)
+            if pendientes >= settings.COMPRESION['FLUSH_BYTES']:
+                datos += compresor.vaciar()
+                pendientes = 0
+            if datos:
+                yield datos
+        yield compresor.terminar()
+
+    @staticmethod
+    async def _comprimir_async(contenido, compresor):
+        pendientes = 0
+        async for chunk in contenido:
+            datos = compresor.comprimir(chunk)
+            pendientes += len(chunk)
+            if pendientes >= settings.COMPRESION['FLUSH_BYTES']:
+                datos += compresor.vaciar()
+                pendientes = 0
+            if datos:
+                yield datos
+        yield compresor.terminar()
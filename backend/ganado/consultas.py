@@ -0,0 +1,72 @@
+"""
+Subconsultas reutilizables para resolver el estado de los lotes en SQL.
+
+Evitan recorrer los vacunos en Python llamando a estado_actual() o
+campo_actual() por cada fila (N+1).
+"""
+from django.db.models import OuterRef, Prefetch, Q, Subquery
+
+from .models import EstadiaAnimal, EstadoVacuno
+
+
+def estado_en_fecha(campo, ref='pk', fecha=None):
+    """Valor de `campo` del último EstadoVacuno del lote (opcionalmente a una fecha)"""
+    estados = EstadoVacuno.objects.filter(vacuno=OuterRef(ref))
+    if fecha is not None:
+        estados = estados.filter(fecha__lte=fecha)
+    return Subquery(estados.order_by('-fecha', '-id').values(campo)[:1])
+
+
+def ciclo_en_fecha(ref='pk', fecha=None):
+    """Último ciclo productivo registrado del lote, ignorando estados sin ciclo"""
+    estados = EstadoVacuno.objects.filter(vacuno=OuterRef(ref)).exclude(ciclo_productivo='')
+    if fecha is not None:
+        estados = estados.filter(fecha__lte=fecha)
+    return Subquery(estados.order_by('-fecha', '-id').values('ciclo_productivo')[:1])
+
+
+def campo_en_fecha(campo='campo_id', ref='pk', fecha=None):
+    """
+    Valor de `campo` de la estadía del lote vigente a una fecha.
+    Sin fecha devuelve la estadía abierta (fecha_salida nula).
+    Una estadía cerrada el mismo día cuenta como vigente, así una venta
+    conserva el campo de donde salió el lote.
+    """
+    estadias = EstadiaAnimal.objects.filter(animal=OuterRef(ref))
+    if fecha is None:
+        estadias = estadias.filter(fecha_salida__isnull=True)
+    else:
+        estadias = estadias.filter(fecha_entrada__lte=fecha).filter(
+            Q(fecha_salida__isnull=True) | Q(fecha_salida__gte=fecha)
+        )
+    return Subquery(estadias.order_by('-fecha_entrada', '-id').values(campo)[:1])
+
+
+def prefetch_estado_actual():
+    """Prefetch del último EstadoVacuno de cada lote en `estado_actual_prefetch`"""
+    ultimo = EstadoVacuno.objects.filter(vacuno=OuterRef('vacuno')).order_by('-fecha', '-id')
+    return Prefetch(
+        'historial_estados',
+        queryset=EstadoVacuno.objects.filter(pk=Subquery(ultimo.values('pk')[:1])),
+        to_attr='estado_actual_prefetch',
+    )
+
+
+def prefetch_estadia_abierta():
+    """Prefetch de la estadía abierta de cada lote (con su campo) en `estadia_abierta_prefetch`"""
+    return Prefetch(
+        'estadias',
+        queryset=EstadiaAnimal.objects.filter(fecha_salida__isnull=True).select_related('campo').only(
+            'id', 'animal', 'campo__id', 'campo__nombre'
+        ),
+        to_attr='estadia_abierta_prefetch',
+    )
+
+
+def prefetch_vacunos_actuales():
+    """Prefetch de las estadías abiertas de cada campo (con su lote) en `estadias_abiertas`"""
+    return Prefetch(
+        'estadiaanimal_set',
+        queryset=EstadiaAnimal.objects.filter(fecha_salida__isnull=True).select_related('animal'),
+        to_attr='estadias_abiertas',
+    )
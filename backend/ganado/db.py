@@ -0,0 +1,111 @@
+"""
+Utilidades de base de datos compartidas por las vistas.
+"""
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, router, transaction
+
+from .models import Vacuno
+
+# Instrucciones de la VM de SQLite entre chequeos del tiempo límite
+PASOS_PROGRESO_SQLITE = 10000
+
+
+@contextmanager
+def limite_de_tiempo(alias, milisegundos):
+    """
+    Cancela las consultas a la base `alias` que tarden más de `milisegundos`
+    dentro del bloque.
+
+    En PostgreSQL el bloque corre en una transacción y el límite se fija con
+    SET LOCAL: al terminar la transacción vuelve solo al default, así que no
+    se filtra a otros clientes aunque pgbouncer (modo transaction) comparta
+    la conexión del servidor. En SQLite la consulta se interrumpe desde el
+    progress handler.
+    """
+    conexion = connections[alias]
+    if conexion.vendor == 'postgresql':
+        with transaction.atomic(using=alias):
+            with conexion.cursor() as cursor:
+                cursor.execute('SET LOCAL statement_timeout = %s', [milisegundos])
+            yield
+    elif conexion.vendor == 'sqlite':
+        conexion.ensure_connection()
+        vence = time.monotonic() + milisegundos / 1000
+        conexion.connection.set_progress_handler(lambda: time.monotonic() > vence, PASOS_PROGRESO_SQLITE)
+        try:
+            yield
+        finally:
+            conexion.connection.set_progress_handler(None, 0)
+    else:
+        yield
+
+
+def bases_de_lectura(modelo):
+    """Base primaria de la que lee `modelo` en el request en curso y sus réplicas"""
+    alias = router.db_for_read(modelo) or DEFAULT_DB_ALIAS
+    for primaria, replicas in settings.DATABASE_REPLICAS.items():
+        if alias in replicas:
+            alias = primaria
+    return [alias, *settings.DATABASE_REPLICAS.get(alias, [])]
+
+
+class StatementTimeoutMixin:
+    """
+    Aplica un statement_timeout propio de la vista (ver limite_de_tiempo)
+    en las bases del tenant. Va antes de TenantMixin en las bases de la
+    vista, para que el tenant ya esté fijado al elegirlas.
+    """
+    statement_timeout_ms = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.statement_timeout_ms is not None:
+            self._limites = ExitStack()
+            for alias in bases_de_lectura(Vacuno):
+                self._limites.enter_context(limite_de_tiempo(alias, self.statement_timeout_ms))
+
+    def _cerrar_limites(self, exc=None):
+        limites = getattr(self, '_limites', None)
+        if limites is not None:
+            self._limites = None
+            if exc is None:
+                limites.close()
+            else:
+                limites.__exit__(type(exc), exc, exc.__traceback__)
+
+    def handle_exception(self, exc):
+        # Con un error la transacción del límite se deshace antes de responder
+        self._cerrar_limites(exc)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        self._cerrar_limites()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def filas_estimadas(modelo, alias):
+    """
+    Cantidad de filas de la tabla según las estadísticas del planificador
+    (ANALYZE), o None si no hay estadísticas. Evita un COUNT(*) completo.
+    """
+    conexion = connections[alias]
+    tabla = modelo._meta.db_table
+    try:
+        with conexion.cursor() as cursor:
+            if conexion.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [tabla])
+                fila = cursor.fetchone()
+                # reltuples es -1 en tablas nunca analizadas
+                return fila[0] if fila and fila[0] >= 0 else None
+            if conexion.vendor == 'sqlite':
+                # El primer número de cada fila de sqlite_stat1 es la cantidad de filas
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [tabla])
+                fila = cursor.fetchone()
+                return int(fila[0].split()[0]) if fila else None
+    except DatabaseError:
+        # sqlite_stat1 no existe hasta el primer ANALYZE
+        return None
+    return None
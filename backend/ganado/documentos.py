@@ -0,0 +1,223 @@
+"""
+Escritura de documentos XLSX y PDF con la biblioteca estándar.
+
+Los reportes son tablas: una lista de hojas (nombre, encabezados, filas).
+El XLSX es el mínimo paquete OOXML que abren Excel y LibreOffice (textos
+inline, encabezados en negrita) y el PDF usa la fuente Courier estándar
+con codificación WinAnsi, una tabla de ancho fijo por hoja y las
+páginas comprimidas con zlib. Así los reportes no agregan dependencias.
+"""
+import zipfile
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+MAX_NOMBRE_HOJA = 31
+MAX_ANCHO_COLUMNA = 28
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{hojas}</Types>'
+)
+_HOJA_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{numero}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_ESTILOS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, date | datetime):
+        return valor.isoformat()
+    if isinstance(valor, float):
+        return f'{valor:.2f}'
+    return str(valor)
+
+
+def _columna(indice):
+    """Letra de la columna (0 -> A, 26 -> AA)"""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celda(referencia, valor, estilo=0):
+    atributo = f' s="{estilo}"' if estilo else ''
+    if isinstance(valor, int | float | Decimal) and not isinstance(valor, bool):
+        return f'<c r="{referencia}"{atributo}><v>{valor}</v></c>'
+    return f'<c r="{referencia}" t="inlineStr"{atributo}><is><t>{escape(_texto(valor))}</t></is></c>'
+
+
+def _hoja_xml(encabezados, filas):
+    partes = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+              '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>']
+    for numero, (fila, estilo) in enumerate([(encabezados, 1)] + [(fila, 0) for fila in filas], start=1):
+        celdas = ''.join(
+            _celda(f'{_columna(columna)}{numero}', valor, estilo) for columna, valor in enumerate(fila)
+        )
+        partes.append(f'<row r="{numero}">{celdas}</row>')
+    partes.append('</sheetData></worksheet>')
+    return ''.join(partes)
+
+
+def _nombres_hojas(hojas):
+    """Nombres válidos y únicos para Excel (31 caracteres, sin []:*?/\\)"""
+    nombres = []
+    for nombre, _, _ in hojas:
+        limpio = ''.join('-' if caracter in '[]:*?/\\' else caracter for caracter in nombre)[:MAX_NOMBRE_HOJA]
+        limpio = base = limpio or 'Hoja'
+        sufijo = 2
+        while limpio in nombres:
+            limpio = f'{base[:MAX_NOMBRE_HOJA - 3]} {sufijo}'
+            sufijo += 1
+        nombres.append(limpio)
+    return nombres
+
+
+def escribir_xlsx(hojas, archivo):
+    """Escribe las hojas [(nombre, encabezados, filas)] como XLSX en `archivo` (ruta o binario)"""
+    nombres = _nombres_hojas(hojas)
+    with zipfile.ZipFile(archivo, 'w', zipfile.ZIP_DEFLATED) as paquete:
+        paquete.writestr('[Content_Types].xml', _CONTENT_TYPES.format(hojas=''.join(
+            _HOJA_CONTENT_TYPE.format(numero=numero) for numero in range(1, len(hojas) + 1)
+        )))
+        paquete.writestr('_rels/.rels', _RELS)
+        paquete.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(
+                f'<sheet name="{escape(nombre, {chr(34): "&quot;"})}" sheetId="{numero}" r:id="rId{numero}"/>'
+                for numero, nombre in enumerate(nombres, start=1)
+            )
+            + '</sheets></workbook>'
+        ))
+        paquete.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(
+                f'<Relationship Id="rId{numero}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{numero}.xml"/>'
+                for numero in range(1, len(hojas) + 1)
+            )
+            + f'<Relationship Id="rId{len(hojas) + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/></Relationships>'
+        ))
+        paquete.writestr('xl/styles.xml', _ESTILOS)
+        for numero, (_, encabezados, filas) in enumerate(hojas, start=1):
+            paquete.writestr(f'xl/worksheets/sheet{numero}.xml', _hoja_xml(encabezados, filas))
+
+
+# PDF: A4 apaisado, Courier 8 (ancho 0,6 em por carácter)
+ANCHO_PAGINA, ALTO_PAGINA = 842, 595
+MARGEN = 36
+TAMANO_FUENTE = 8
+INTERLINEADO = 10
+CARACTERES_POR_LINEA = int((ANCHO_PAGINA - 2 * MARGEN) / (TAMANO_FUENTE * 0.6))
+LINEAS_POR_PAGINA = int((ALTO_PAGINA - 2 * MARGEN) / INTERLINEADO)
+
+
+def _lineas_tabla(nombre, encabezados, filas):
+    textos = [[_texto(valor) for valor in fila] for fila in filas]
+    anchos = [
+        min(MAX_ANCHO_COLUMNA, max([len(str(encabezado))] + [len(fila[columna]) for fila in textos]))
+        for columna, encabezado in enumerate(encabezados)
+    ]
+
+    def formatear(valores):
+        celdas = []
+        for valor, ancho in zip(valores, anchos, strict=True):
+            valor = valor if len(valor) <= ancho else valor[:ancho - 1] + '~'
+            celdas.append(valor.ljust(ancho))
+        return '  '.join(celdas).rstrip()[:CARACTERES_POR_LINEA]
+
+    separador = '-' * min(CARACTERES_POR_LINEA, sum(anchos) + 2 * (len(anchos) - 1))
+    return [nombre.upper(), formatear([str(e) for e in encabezados]), separador] + [
+        formatear(fila) for fila in textos
+    ] + ['']
+
+
+def _literal_pdf(texto):
+    datos = texto.encode('cp1252', errors='replace')
+    return b'(' + datos.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def escribir_pdf(titulo, hojas, archivo):
+    """Escribe el título y las hojas [(nombre, encabezados, filas)] como tablas en un PDF"""
+    lineas = []
+    for hoja in hojas:
+        lineas.extend(_lineas_tabla(*hoja))
+    paginas = [lineas[i:i + LINEAS_POR_PAGINA - 2] for i in range(0, len(lineas), LINEAS_POR_PAGINA - 2)] or [[]]
+
+    # Objetos: 1 catálogo, 2 páginas, 3 fuente y por cada página (página, contenido)
+    objetos = [None, None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>']
+    hijos = []
+    for numero, contenido in enumerate(paginas, start=1):
+        encabezado = f'{titulo} - página {numero} de {len(paginas)}'
+        flujo = [f'BT /F1 {TAMANO_FUENTE} Tf {INTERLINEADO} TL {MARGEN} {ALTO_PAGINA - MARGEN} Td'.encode()]
+        for linea in [encabezado, ''] + contenido:
+            flujo.append(_literal_pdf(linea) + b" '")
+        flujo.append(b'ET')
+        comprimido = zlib.compress(b'\n'.join(flujo))
+        pagina_id = len(objetos) + 1
+        objetos.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {ANCHO_PAGINA} {ALTO_PAGINA}] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {pagina_id + 1} 0 R >>'.encode()
+        )
+        objetos.append(
+            f'<< /Length {len(comprimido)} /Filter /FlateDecode >>\nstream\n'.encode() + comprimido + b'\nendstream'
+        )
+        hijos.append(f'{pagina_id} 0 R')
+    objetos[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objetos[1] = f'<< /Type /Pages /Kids [{" ".join(hijos)}] /Count {len(hijos)} >>'.encode()
+
+    salida = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    posiciones = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += f'{numero} 0 obj\n'.encode() + objeto + b'\nendobj\n'
+    inicio_xref = len(salida)
+    salida += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode()
+    for posicion in posiciones:
+        salida += f'{posicion:010d} 00000 n \n'.encode()
+    salida += f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n'.encode()
+
+    if hasattr(archivo, 'write'):
+        archivo.write(bytes(salida))
+    else:
+        with open(archivo, 'wb') as destino:
+            destino.write(salida)
@@ -0,0 +1,318 @@
+"""
+Filtros declarativos de los endpoints de ganado.
+
+Cada viewset declara en `filtros` un ConjuntoFiltros con los parámetros
+que acepta. Los valores se validan por tipo antes de tocar la base: un
+parámetro inválido responde 400 con el detalle por parámetro en vez de
+un error del ORM. Cada predicado está respaldado por un índice (ver
+Meta.indexes de los modelos); los tests verifican con EXPLAIN que la
+base lo usa en vez de recorrer la tabla.
+"""
+from datetime import date, timedelta
+
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Lower
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .auditoria import MODELOS_AUDITADOS
+from .busqueda import buscar
+from .consultas import ciclo_en_fecha
+from .geo import en_caja
+from .models import Auditoria, EstadiaAnimal, EstadoVacuno, Vacuno, Venta
+
+# Umbrales de animales por hectárea de Campo.estado_ocupacion
+OCUPACION_MEDIA = 0.8
+OCUPACION_ALTA = 2.0
+OCUPACION_CHOICES = (('baja', 'Baja'), ('media', 'Media'), ('alta', 'Alta'))
+# Rango de un bigint en SQLite y PostgreSQL
+MIN_ENTERO = -2 ** 63
+MAX_ENTERO = 2 ** 63 - 1
+# Edad máxima aceptada en los filtros de edad (100 años)
+MAX_EDAD_DIAS = 36500
+
+
+class Filtro:
+    """
+    Filtro de un parámetro: convierte el valor y lo aplica al queryset.
+    Con `metodo`, la aplicación se delega en ese método del conjunto.
+    """
+    mensaje_error = "Valor inválido"
+
+    def __init__(self, campo=None, lookup='exact', metodo=None):
+        self.campo = campo
+        self.lookup = lookup
+        self.metodo = metodo
+        self.nombre = None
+
+    def __set_name__(self, owner, nombre):
+        self.nombre = nombre
+        if self.campo is None:
+            self.campo = nombre
+
+    def convertir(self, valor):
+        return valor
+
+    def aplicar(self, queryset, valor):
+        return queryset.filter(**{f'{self.campo}__{self.lookup}': valor})
+
+
+class FiltroEntero(Filtro):
+    mensaje_error = "Debe ser un número entero"
+
+    def __init__(self, minimo=MIN_ENTERO, maximo=MAX_ENTERO, **kwargs):
+        super().__init__(**kwargs)
+        self.minimo = minimo
+        self.maximo = maximo
+        if (minimo, maximo) != (MIN_ENTERO, MAX_ENTERO):
+            self.mensaje_error = f"Debe ser un número entero entre {minimo} y {maximo}"
+
+    def convertir(self, valor):
+        numero = int(valor)
+        if not self.minimo <= numero <= self.maximo:
+            raise ValueError(valor)
+        return numero
+
+
+class FiltroFecha(Filtro):
+    mensaje_error = "Fecha inválida, usar el formato AAAA-MM-DD"
+
+    def convertir(self, valor):
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise ValueError(valor)
+        return fecha
+
+
+class FiltroBooleano(Filtro):
+    mensaje_error = "Debe ser true o false"
+    VALORES = {'true': True, '1': True, 'false': False, '0': False}
+
+    def convertir(self, valor):
+        return self.VALORES[valor.lower()]
+
+
+class FiltroOpcion(Filtro):
+    def __init__(self, opciones, **kwargs):
+        super().__init__(**kwargs)
+        self.opciones = [opcion for opcion, _ in opciones]
+        self.mensaje_error = f"Debe ser uno de: {', '.join(self.opciones)}"
+
+    def convertir(self, valor):
+        if valor not in self.opciones:
+            raise ValueError(valor)
+        return valor
+
+
+class FiltroTexto(Filtro):
+    """
+    Texto sin distinguir mayúsculas. Por defecto compara el valor completo
+    con un índice sobre LOWER(campo); con lookup='icontains' lo busca dentro
+    del campo (en PostgreSQL con los índices trigram de la migración 0007).
+    """
+
+    def convertir(self, valor):
+        return valor.strip().lower()
+
+    def aplicar(self, queryset, valor):
+        if self.lookup == 'icontains':
+            return super().aplicar(queryset, valor)
+        return queryset.alias(**{f'{self.nombre}_normalizado': Lower(self.campo)}).filter(
+            **{f'{self.nombre}_normalizado': valor}
+        )
+
+
+class FiltroBusqueda(Filtro):
+    """Búsqueda de texto rankeada (ver ganado.busqueda)"""
+
+    def aplicar(self, queryset, valor):
+        return buscar(queryset, valor)
+
+
+class FiltroCaja(Filtro):
+    """Caja oeste,sur,este,norte en grados; filtra con el índice espacial (ver ganado.geo)"""
+    mensaje_error = "Debe ser oeste,sur,este,norte en grados (lon/lat)"
+
+    def convertir(self, valor):
+        oeste, sur, este, norte = (float(parte) for parte in valor.split(','))
+        if not (-180 <= oeste <= este <= 180 and -90 <= sur <= norte <= 90):
+            raise ValueError(valor)
+        return oeste, sur, este, norte
+
+    def aplicar(self, queryset, valor):
+        return en_caja(queryset, *valor)
+
+
+class ConjuntoFiltros:
+    """Conjunto de filtros declarados como atributos de clase"""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.filtros = {}
+        for base in reversed(cls.__mro__):
+            cls.filtros.update({
+                nombre: valor for nombre, valor in vars(base).items() if isinstance(valor, Filtro)
+            })
+
+    def __init__(self, params):
+        self.params = params
+
+    def filtrar(self, queryset):
+        valores = {}
+        errores = {}
+        for nombre, filtro in self.filtros.items():
+            crudo = self.params.get(nombre)
+            if crudo is None or crudo == '':
+                continue
+            try:
+                valores[nombre] = filtro.convertir(crudo)
+            except (ValueError, KeyError, OverflowError):
+                errores[nombre] = [filtro.mensaje_error]
+        if errores:
+            raise ValidationError(errores)
+
+        for nombre, valor in valores.items():
+            filtro = self.filtros[nombre]
+            if filtro.metodo:
+                queryset = getattr(self, filtro.metodo)(queryset, valor)
+            else:
+                queryset = filtro.aplicar(queryset, valor)
+        return queryset
+
+
+class FiltrosGanado(BaseFilterBackend):
+    """Filter backend de DRF que aplica el ConjuntoFiltros `filtros` del viewset"""
+
+    def filter_queryset(self, request, queryset, view):
+        conjunto = getattr(view, 'filtros', None)
+        if conjunto is None:
+            return queryset
+        return conjunto(request.query_params).filtrar(queryset)
+
+
+class CamposSerializer(BaseFilterBackend):
+    """Acota la consulta a los campos que va a devolver el serializer (?fields= / ?omit=)"""
+
+    def filter_queryset(self, request, queryset, view):
+        serializer_class = view.get_serializer_class()
+        if not hasattr(serializer_class, 'optimizar_queryset'):
+            return queryset
+        return serializer_class.optimizar_queryset(queryset, request)
+
+
+class CampoFiltros(ConjuntoFiltros):
+    q = FiltroBusqueda()
+    bbox = FiltroCaja()
+    ocupacion = FiltroOpcion(OCUPACION_CHOICES, metodo='filtrar_ocupacion')
+
+    def filtrar_ocupacion(self, queryset, valor):
+        cabezas = EstadiaAnimal.objects.filter(
+            campo=OuterRef('pk'), fecha_salida__isnull=True
+        ).values('campo').annotate(total=Sum('animal__cantidad')).values('total')
+        queryset = queryset.alias(densidad=Case(
+            When(hectareas__gt=0, then=Coalesce(Subquery(cabezas), 0) * 1.0 / F('hectareas')),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+        if valor == 'baja':
+            return queryset.filter(densidad__lt=OCUPACION_MEDIA)
+        if valor == 'media':
+            return queryset.filter(densidad__gte=OCUPACION_MEDIA, densidad__lte=OCUPACION_ALTA)
+        return queryset.filter(densidad__gt=OCUPACION_ALTA)
+
+
+class VacunoFiltros(ConjuntoFiltros):
+    q = FiltroBusqueda()
+    campo = FiltroEntero(metodo='filtrar_campo')
+    sexo = FiltroOpcion(Vacuno.SEXO_CHOICES)
+    raza = FiltroTexto(lookup='icontains')
+    ciclo = FiltroOpcion(EstadoVacuno.CICLO_PRODUCTIVO_CHOICES, metodo='filtrar_ciclo')
+    vendido = FiltroBooleano(metodo='filtrar_vendido')
+    edad_min = FiltroEntero(minimo=0, maximo=MAX_EDAD_DIAS, metodo='filtrar_edad_min')
+    edad_max = FiltroEntero(minimo=0, maximo=MAX_EDAD_DIAS, metodo='filtrar_edad_max')
+
+    def filtrar_campo(self, queryset, valor):
+        return queryset.filter(Exists(EstadiaAnimal.objects.filter(
+            campo_id=valor, fecha_salida__isnull=True, animal=OuterRef('pk')
+        )))
+
+    def filtrar_ciclo(self, queryset, valor):
+        return queryset.alias(ciclo_actual=ciclo_en_fecha()).filter(ciclo_actual=valor)
+
+    def filtrar_vendido(self, queryset, valor):
+        vendido = Exists(Venta.objects.filter(animal=OuterRef('pk')))
+        return queryset.filter(vendido if valor else ~vendido)
+
+    def filtrar_edad_min(self, queryset, valor):
+        """Edad mínima en días"""
+        return queryset.filter(fecha_nacimiento__lte=date.today() - timedelta(days=valor))
+
+    def filtrar_edad_max(self, queryset, valor):
+        """Edad máxima en días"""
+        return queryset.filter(fecha_nacimiento__gte=date.today() - timedelta(days=valor))
+
+
+class EstadoVacunoFiltros(ConjuntoFiltros):
+    vacuno = FiltroEntero(campo='vacuno_id')
+
+
+class EstadiaAnimalFiltros(ConjuntoFiltros):
+    animal = FiltroEntero(campo='animal_id')
+    campo = FiltroEntero(campo='campo_id')
+    abierta = FiltroBooleano(metodo='filtrar_abierta')
+
+    def filtrar_abierta(self, queryset, valor):
+        return queryset.filter(fecha_salida__isnull=valor)
+
+
+class VacunacionFiltros(ConjuntoFiltros):
+    animal = FiltroEntero(campo='animal_id')
+    vacuna = FiltroEntero(campo='vacuna_id')
+    fecha_desde = FiltroFecha(campo='fecha', lookup='gte')
+    fecha_hasta = FiltroFecha(campo='fecha', lookup='lte')
+
+
+class TransferenciaFiltros(ConjuntoFiltros):
+    animal = FiltroEntero(campo='animal_id')
+    campo_origen = FiltroEntero(campo='campo_origen_id')
+    campo_destino = FiltroEntero(campo='campo_destino_id')
+    fecha_desde = FiltroFecha(campo='fecha', lookup='gte')
+    fecha_hasta = FiltroFecha(campo='fecha', lookup='lte')
+
+
+class VentaFiltros(ConjuntoFiltros):
+    q = FiltroBusqueda()
+    comprador = FiltroTexto(lookup='icontains')
+    fecha_desde = FiltroFecha(campo='fecha', lookup='gte')
+    fecha_hasta = FiltroFecha(campo='fecha', lookup='lte')
+
+
+class PesadaFiltros(ConjuntoFiltros):
+    animal = FiltroEntero(campo='animal_id')
+    fecha_desde = FiltroFecha(campo='fecha', lookup='gte')
+    fecha_hasta = FiltroFecha(campo='fecha', lookup='lte')
+
+
+class PrecioMercadoFiltros(ConjuntoFiltros):
+    categoria = FiltroTexto()
+    fecha_desde = FiltroFecha(campo='fecha', lookup='gte')
+    fecha_hasta = FiltroFecha(campo='fecha', lookup='lte')
+
+
+class AuditoriaFiltros(ConjuntoFiltros):
+    """Por objeto (?modelo=&objeto=) usa el índice auditoria_objeto; si no, auditoria_usuario"""
+    modelo = FiltroOpcion([(modelo._meta.model_name, modelo._meta.verbose_name) for modelo in MODELOS_AUDITADOS])
+    objeto = FiltroEntero(campo='objeto_id')
+    autor = FiltroEntero(campo='autor_id')
+    accion = FiltroOpcion(Auditoria.ACCIONES)
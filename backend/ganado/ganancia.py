@@ -0,0 +1,110 @@
+"""
+Ganancia diaria de peso (GDP) a partir de las pesadas de los lotes.
+
+Todas las pesadas de la ventana se leen en una consulta, ordenadas por
+lote y fecha (el orden del índice pesada_animal_fecha), con el campo en
+el que estaba el lote en cada pesada. El cálculo se hace sobre arrays
+de NumPy: cada par de pesadas consecutivas de un lote es un tramo con
+su ganancia por cabeza y sus días, y los totales por lote, campo y raza
+son sumas agrupadas de los tramos. La GDP de un grupo es kg ganados
+sobre días-cabeza, así los lotes más grandes y los tramos más largos
+pesan más.
+"""
+import numpy as np
+from django.db.models import OuterRef
+
+from .consultas import campo_en_fecha
+from .models import Campo, Pesada
+
+
+def _agrupar(codigos, cantidad, kg, dias_cabeza):
+    """Sumas de los tramos por código de grupo -> (gdp, kg, días-cabeza)"""
+    kg = np.bincount(codigos, weights=kg, minlength=cantidad)
+    dias_cabeza = np.bincount(codigos, weights=dias_cabeza, minlength=cantidad)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gdp = np.where(dias_cabeza > 0, kg / dias_cabeza, np.nan)
+    return gdp, kg, dias_cabeza
+
+
+def _redondear(valor, decimales=3):
+    return None if np.isnan(valor) else round(float(valor), decimales)
+
+
+def ganancia_diaria(usuario, desde=None, hasta=None):
+    """GDP (kg/cabeza/día) por lote, campo y raza entre las pesadas de la ventana"""
+    pesadas = Pesada.objects.filter(animal__usuario=usuario)
+    if desde is not None:
+        pesadas = pesadas.filter(fecha__gte=desde)
+    if hasta is not None:
+        pesadas = pesadas.filter(fecha__lte=hasta)
+    filas = list(pesadas.annotate(
+        campo_id=campo_en_fecha('campo_id', ref='animal_id', fecha=OuterRef('fecha')),
+    ).order_by('animal_id', 'fecha').values_list(
+        'animal_id', 'animal__lote_id', 'animal__raza', 'fecha', 'peso_promedio', 'cabezas', 'campo_id',
+    ))
+
+    resultado = {'pesadas': len(filas), 'total': None, 'lotes': [], 'campos': [], 'razas': []}
+    if not filas:
+        return resultado
+
+    animal, lote_id, raza, fecha, peso, cabezas, campo_id = zip(*filas, strict=True)
+    nombres = dict(Campo.objects.filter(usuario=usuario).values_list('id', 'nombre'))
+    animal = np.array(animal)
+    fecha = np.array([dia.toordinal() for dia in fecha])
+    peso = np.array(peso, dtype=float)
+    cabezas = np.array(cabezas, dtype=float)
+
+    # Tramos: pares de pesadas consecutivas del mismo lote
+    mismo_lote = animal[1:] == animal[:-1]
+    inicio = np.flatnonzero(mismo_lote)
+    fin = inicio + 1
+    dias = (fecha[fin] - fecha[inicio]).astype(float)
+    # Las cabezas de la pesada final son las que hicieron la ganancia
+    kg = (peso[fin] - peso[inicio]) * cabezas[fin]
+    dias_cabeza = dias * cabezas[fin]
+
+    lotes, codigo_lote = np.unique(animal, return_inverse=True)
+    gdp, _, _ = _agrupar(codigo_lote[inicio], len(lotes), kg, dias_cabeza)
+    primera = np.searchsorted(animal, lotes, side='left')
+    ultima = np.searchsorted(animal, lotes, side='right') - 1
+    for posicion, pk in enumerate(lotes):
+        a, b = primera[posicion], ultima[posicion]
+        resultado['lotes'].append({
+            'id': int(pk),
+            'lote_id': lote_id[a],
+            'raza': raza[a],
+            'campo': nombres.get(campo_id[b]),
+            'pesadas': int(b - a + 1),
+            'desde': filas[a][3],
+            'hasta': filas[b][3],
+            'peso_inicial': float(peso[a]),
+            'peso_final': float(peso[b]),
+            'ganancia_diaria': _redondear(gdp[posicion]),
+        })
+
+    # El tramo cuenta para el campo donde estaba el lote al empezar: la
+    # pesada suele hacerse al moverlo, y la estadía nueva ya empieza ese día
+    claves_campo = [(campo_id[i], nombres.get(campo_id[i])) for i in inicio]
+    for nombre, claves in (('campos', claves_campo), ('razas', [raza[i] for i in inicio])):
+        grupos = list(dict.fromkeys(claves))
+        indice = {clave: posicion for posicion, clave in enumerate(grupos)}
+        codigos = np.array([indice[clave] for clave in claves], dtype=np.int64)
+        gdp, kg_grupo, dias_grupo = _agrupar(codigos, len(grupos), kg, dias_cabeza)
+        for posicion, clave in enumerate(grupos):
+            fila = {'id': clave[0], 'nombre': clave[1]} if nombre == 'campos' else {'raza': clave}
+            fila.update({
+                'ganancia_diaria': _redondear(gdp[posicion]),
+                'kg_ganados': round(float(kg_grupo[posicion]), 1),
+                'dias_cabeza': int(dias_grupo[posicion]),
+            })
+            resultado[nombre].append(fila)
+        resultado[nombre].sort(key=lambda fila: -(fila['ganancia_diaria'] or 0))
+
+    total_dias = dias_cabeza.sum()
+    resultado['total'] = {
+        'ganancia_diaria': round(float(kg.sum() / total_dias), 3) if total_dias else None,
+        'kg_ganados': round(float(kg.sum()), 1),
+        'dias_cabeza': int(total_dias),
+        'tramos': len(inicio),
+    }
+    return resultado
@@ -0,0 +1,350 @@
+"""
+Geometría de los campos.
+
+Campo.geometria guarda el perímetro como GeoJSON (Polygon o MultiPolygon
+en lon/lat WGS84). Al guardar el campo se calculan las hectáreas y la
+caja envolvente (columnas bbox_*), que es lo que indexan las consultas
+espaciales: en SQLite una tabla virtual R*Tree mantenida por triggers y
+en PostgreSQL un índice GiST sobre box(...), ambos creados en la
+migración 0012. Sin R*Tree se filtra por las columnas bbox con el índice
+B-tree campo_bbox. La distancia exacta al polígono se calcula en Python
+solo para los candidatos que devuelve el índice.
+"""
+import math
+from itertools import pairwise
+
+from django.db import OperationalError, connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from .models import Campo
+
+# Radio de la esfera de WGS84 en metros
+RADIO_TIERRA = 6378137.0
+KM_POR_GRADO = math.pi * RADIO_TIERRA / 180 / 1000
+# Radio de la primera caja de búsqueda de mas_cercanos(); se cuadruplica hasta encontrar
+RADIO_INICIAL_KM = 25
+TIPOS_GEOMETRIA = ('Polygon', 'MultiPolygon')
+TABLA_RTREE = f'{Campo._meta.db_table}_rtree'
+COLUMNAS_BBOX = ('bbox_oeste', 'bbox_este', 'bbox_sur', 'bbox_norte')
+# Misma expresión en el índice GiST y en la consulta, para que PostgreSQL lo use
+CAJA_POSTGRESQL = 'box(point({t}bbox_oeste, {t}bbox_sur), point({t}bbox_este, {t}bbox_norte))'
+# Mayor superficie que entra en Campo.hectareas (DecimalField)
+_HECTAREAS = Campo._meta.get_field('hectareas')
+MAX_HECTAREAS = 10 ** (_HECTAREAS.max_digits - _HECTAREAS.decimal_places) - 10 ** -_HECTAREAS.decimal_places
+
+
+# --- Polígonos ---------------------------------------------------------------
+
+def poligonos(geometria):
+    """Lista de polígonos (anillo exterior seguido de los huecos) de la geometría"""
+    if geometria['type'] == 'Polygon':
+        return [geometria['coordinates']]
+    return geometria['coordinates']
+
+
+def validar_geometria(geometria):
+    """
+    Valida un Polygon/MultiPolygon GeoJSON cuya superficie entre en
+    Campo.hectareas; lanza ValueError con el motivo
+    """
+    if not isinstance(geometria, dict) or geometria.get('type') not in TIPOS_GEOMETRIA:
+        raise ValueError(f"La geometría debe ser GeoJSON de tipo {' o '.join(TIPOS_GEOMETRIA)}")
+    coordenadas = geometria.get('coordinates')
+    if not isinstance(coordenadas, list) or not coordenadas:
+        raise ValueError("La geometría no tiene coordenadas")
+    for poligono in poligonos(geometria):
+        if not isinstance(poligono, list) or not poligono:
+            raise ValueError("Cada polígono necesita al menos un anillo")
+        for anillo in poligono:
+            if not isinstance(anillo, list) or len(anillo) < 4:
+                raise ValueError("Cada anillo necesita al menos 4 posiciones")
+            for posicion in anillo:
+                if (not isinstance(posicion, list) or len(posicion) < 2
+                        or not all(isinstance(v, int | float) for v in posicion[:2])):
+                    raise ValueError("Cada posición debe ser [longitud, latitud]")
+                lon, lat = posicion[:2]
+                if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+                    raise ValueError(f"Posición fuera de rango: [{lon}, {lat}]")
+            if anillo[0][:2] != anillo[-1][:2]:
+                raise ValueError("Cada anillo debe cerrar en su primera posición")
+    if area_hectareas(geometria) > MAX_HECTAREAS:
+        raise ValueError(f"La superficie supera el máximo de {MAX_HECTAREAS:,.0f} hectáreas".replace(',', '.'))
+    return geometria
+
+
+def _area_anillo(anillo):
+    """Área esférica del anillo en m² (exceso esférico, como turf/d3)"""
+    total = 0.0
+    n = len(anillo)
+    for i in range(n):
+        anterior, actual, siguiente = anillo[i - 1], anillo[i], anillo[(i + 1) % n]
+        total += (math.radians(siguiente[0]) - math.radians(anterior[0])) * math.sin(math.radians(actual[1]))
+    return abs(total) * RADIO_TIERRA ** 2 / 2
+
+
+def area_hectareas(geometria):
+    """Superficie de la geometría en hectáreas (anillos exteriores menos huecos)"""
+    metros = 0.0
+    for exterior, *huecos in poligonos(geometria):
+        # El último punto repite el primero
+        metros += _area_anillo(exterior[:-1]) - sum(_area_anillo(hueco[:-1]) for hueco in huecos)
+    return metros / 10000
+
+
+def caja_envolvente(geometria):
+    """(oeste, sur, este, norte) de la geometría"""
+    lons = [p[0] for poligono in poligonos(geometria) for p in poligono[0]]
+    lats = [p[1] for poligono in poligonos(geometria) for p in poligono[0]]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def simplificar(geometria, tolerancia):
+    """
+    Geometría con los anillos simplificados por Douglas-Peucker (tolerancia en
+    grados). Un anillo que quedaría con menos de 4 posiciones se deja igual.
+    """
+    def anillo_simplificado(anillo):
+        resultado = _douglas_peucker(anillo, tolerancia)
+        return resultado if len(resultado) >= 4 else anillo
+
+    nuevos = [[anillo_simplificado(anillo) for anillo in poligono] for poligono in poligonos(geometria)]
+    return {'type': geometria['type'], 'coordinates': nuevos[0] if geometria['type'] == 'Polygon' else nuevos}
+
+
+def _douglas_peucker(puntos, tolerancia):
+    conservar = [False] * len(puntos)
+    conservar[0] = conservar[-1] = True
+    pendientes = [(0, len(puntos) - 1)]
+    while pendientes:
+        inicio, fin = pendientes.pop()
+        lejano, maximo = None, tolerancia
+        for i in range(inicio + 1, fin):
+            distancia = _distancia_segmento(puntos[i], puntos[inicio], puntos[fin])
+            if distancia > maximo:
+                lejano, maximo = i, distancia
+        if lejano is not None:
+            conservar[lejano] = True
+            pendientes += [(inicio, lejano), (lejano, fin)]
+    return [punto for punto, incluir in zip(puntos, conservar, strict=True) if incluir]
+
+
+def _distancia_segmento(p, a, b):
+    """Distancia en el plano del punto p al segmento ab"""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy)
+
+
+def _dentro(x, y, anillo):
+    """Punto en anillo por ray casting"""
+    adentro = False
+    for (x1, y1), (x2, y2) in pairwise(anillo):
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            adentro = not adentro
+    return adentro
+
+
+def distancia_km(lon, lat, geometria):
+    """
+    Distancia en km del punto al borde de la geometría (0 si está adentro).
+    Usa una proyección equirectangular centrada en el punto, la misma con la
+    que mas_cercanos() arma sus cajas.
+    """
+    escala_x = KM_POR_GRADO * math.cos(math.radians(lat))
+
+    def proyectar(anillo):
+        return [((p[0] - lon) * escala_x, (p[1] - lat) * KM_POR_GRADO) for p in anillo]
+
+    minima = math.inf
+    for exterior, *huecos in poligonos(geometria):
+        exterior = proyectar(exterior)
+        huecos = [proyectar(hueco) for hueco in huecos]
+        if _dentro(0, 0, exterior) and not any(_dentro(0, 0, hueco) for hueco in huecos):
+            return 0.0
+        for anillo in [exterior, *huecos]:
+            for a, b in pairwise(anillo):
+                minima = min(minima, _distancia_segmento((0, 0), a, b))
+    return minima
+
+
+# --- Consultas ---------------------------------------------------------------
+
+def en_caja(queryset, oeste, sur, este, norte):
+    """Campos del queryset cuya caja envolvente se cruza con la caja dada"""
+    queryset = queryset.filter(
+        bbox_oeste__lte=este, bbox_este__gte=oeste, bbox_sur__lte=norte, bbox_norte__gte=sur
+    )
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        caja = CAJA_POSTGRESQL.format(t=f'{connection.ops.quote_name(Campo._meta.db_table)}.')
+        return queryset.filter(RawSQL(
+            f'{caja} && box(point(%s, %s), point(%s, %s))', (oeste, sur, este, norte),
+            output_field=BooleanField(),
+        ))
+    if connection.vendor == 'sqlite' and tiene_rtree(queryset.db):
+        # R*Tree guarda float32 redondeando hacia afuera: devuelve un superconjunto
+        # que el filtro exacto de arriba recorta
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT id FROM {TABLA_RTREE} WHERE oeste <= %s AND este >= %s AND sur <= %s AND norte >= %s',
+            (este, oeste, norte, sur),
+        ))
+    return queryset
+
+
+def caja_alrededor(lon, lat, radio_km):
+    """Caja (oeste, sur, este, norte) que contiene el círculo de radio_km alrededor del punto"""
+    delta_lat = radio_km / KM_POR_GRADO
+    coseno = math.cos(math.radians(lat))
+    delta_lon = radio_km / (KM_POR_GRADO * coseno) if coseno > 1e-9 else 360
+    if delta_lon >= 180:
+        oeste, este = -180, 180
+    else:
+        oeste, este = max(lon - delta_lon, -180), min(lon + delta_lon, 180)
+    return oeste, max(lat - delta_lat, -90), este, min(lat + delta_lat, 90)
+
+
+def mas_cercanos(queryset, lon, lat, cantidad=5):
+    """
+    Los `cantidad` campos con geometría más cercanos al punto, como lista de
+    (campo, distancia_km). Busca en cajas cada vez más grandes: un campo fuera
+    de la caja está a más del radio, así que los encontrados a menos del radio
+    ya son definitivos.
+    """
+    radio = RADIO_INICIAL_KM
+    while True:
+        caja = caja_alrededor(lon, lat, radio)
+        candidatos = sorted(
+            ((campo, distancia_km(lon, lat, campo.geometria)) for campo in en_caja(queryset, *caja)),
+            key=lambda par: par[1],
+        )
+        mundo = caja == (-180, -90, 180, 90)
+        seguros = candidatos if mundo else [par for par in candidatos if par[1] <= radio]
+        if len(seguros) >= cantidad or mundo:
+            return seguros[:cantidad]
+        radio *= 4
+
+
+# --- Índices -----------------------------------------------------------------
+
+_rtree_disponible = {}
+
+
+def tiene_rtree(alias):
+    if alias not in _rtree_disponible:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLA_RTREE])
+            _rtree_disponible[alias] = cursor.fetchone() is not None
+    return _rtree_disponible[alias]
+
+
+def _sentencias_sqlite(tabla):
+    con_caja = ' AND '.join(f'new.{columna} IS NOT NULL' for columna in COLUMNAS_BBOX)
+    valores = ', '.join(f'new.{columna}' for columna in COLUMNAS_BBOX)
+    borrar = f'DELETE FROM {TABLA_RTREE} WHERE id = old.id;'
+    insertar = f'INSERT INTO {TABLA_RTREE} SELECT new.id, {valores} WHERE {con_caja};'
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {TABLA_RTREE}_ai AFTER INSERT ON {tabla} BEGIN {insertar} END',
+        f'CREATE TRIGGER IF NOT EXISTS {TABLA_RTREE}_ad AFTER DELETE ON {tabla} BEGIN {borrar} END',
+        f'CREATE TRIGGER IF NOT EXISTS {TABLA_RTREE}_au AFTER UPDATE ON {tabla} BEGIN {borrar} {insertar} END',
+    ]
+
+
+def crear_indice_sqlite(connection, modelo=Campo):
+    """
+    Crea (si faltan) la tabla R*Tree de las cajas de los campos y sus triggers.
+    Como con los índices FTS5 de ganado.busqueda, también se llama después de
+    cada migrate porque SQLite pierde los triggers al reconstruir la tabla.
+    """
+    tabla = modelo._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [TABLA_RTREE, f'{TABLA_RTREE}_ai', f'{TABLA_RTREE}_ad', f'{TABLA_RTREE}_au'],
+        )
+        if len(cursor.fetchall()) == 4:
+            return
+        try:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_RTREE} USING rtree(id, oeste, este, sur, norte)'
+            )
+        except OperationalError:
+            # SQLite compilado sin R*Tree: en_caja() filtra por las columnas bbox
+            return
+        for sentencia in _sentencias_sqlite(tabla):
+            cursor.execute(sentencia)
+        columnas = ', '.join(COLUMNAS_BBOX)
+        cursor.execute(f'DELETE FROM {TABLA_RTREE}')
+        cursor.execute(
+            f'INSERT INTO {TABLA_RTREE} SELECT id, {columnas} FROM {tabla} '
+            f"WHERE {' AND '.join(f'{columna} IS NOT NULL' for columna in COLUMNAS_BBOX)}"
+        )
+    _rtree_disponible.clear()
+
+
+def borrar_indice_sqlite(connection):
+    with connection.cursor() as cursor:
+        for sufijo in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA_RTREE}_{sufijo}')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLA_RTREE}')
+    _rtree_disponible.clear()
+
+
+def sentencias_postgresql(modelo=Campo):
+    """(crear, borrar) del índice GiST sobre la caja de los campos"""
+    caja = CAJA_POSTGRESQL.format(t='')
+    return (
+        f'CREATE INDEX IF NOT EXISTS campo_bbox_gist ON {modelo._meta.db_table} USING gist (({caja}))',
+        'DROP INDEX IF EXISTS campo_bbox_gist',
+    )
+
+
+# --- Mapa --------------------------------------------------------------------
+
+COLORES_OCUPACION = {'baja': '#2e7d32', 'media': '#f9a825', 'alta': '#c62828'}
+# Campos por respuesta de /api/campos/mapa/ (los de mayor superficie primero)
+LIMITE_MAPA = 2000
+# Ancho en píxeles que se asume para la vista al simplificar las geometrías
+PIXELES_MAPA = 1024
+MAX_CERCANOS = 50
+# Decimales de las coordenadas devueltas (6 ≈ 10 cm)
+DECIMALES_MAPA = 6
+
+
+def _redondear(geometria):
+    coordenadas = [
+        [[[round(v, DECIMALES_MAPA) for v in p[:2]] for p in anillo] for anillo in poligono]
+        for poligono in poligonos(geometria)
+    ]
+    return {
+        'type': geometria['type'],
+        'coordinates': coordenadas[0] if geometria['type'] == 'Polygon' else coordenadas,
+    }
+
+
+def coleccion_mapa(campos, tolerancia=0):
+    """
+    FeatureCollection GeoJSON de los campos con su ocupación actual. Con
+    `tolerancia` (grados) las geometrías se simplifican: usar el tamaño de un
+    píxel de la vista para no mandar vértices que no se llegan a dibujar.
+    """
+    features = []
+    for campo in campos:
+        geometria = simplificar(campo.geometria, tolerancia) if tolerancia else campo.geometria
+        estado = campo.estado_ocupacion()
+        features.append({
+            'type': 'Feature',
+            'id': campo.id,
+            'geometry': _redondear(geometria),
+            'properties': {
+                'nombre': campo.nombre,
+                'hectareas': float(campo.hectareas) if campo.hectareas is not None else None,
+                'total_animales': sum(vacuno.cantidad for vacuno in campo.vacunos_actuales()),
+                'animales_por_hectarea': campo.animales_por_hectarea(),
+                'estado_ocupacion': estado,
+                'color': COLORES_OCUPACION[estado],
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': features}
@@ -0,0 +1,341 @@
+"""
+Importación masiva de precios de mercado y pesadas desde archivos CSV.
+
+Los archivos se leen en streaming y se cargan por lotes con
+bulk_create(update_conflicts=True): cada lote resuelve en una consulta
+qué claves ya existían (para informar actualizaciones) y en un único
+INSERT ... ON CONFLICT inserta o actualiza todas sus filas.
+"""
+import codecs
+import csv
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import router, transaction
+
+from .cache import invalidar_usuario
+from .models import Pesada, PrecioMercado, Vacuno
+from .sync import registrar_cambios
+
+TAMANO_LOTE = 1000
+MAX_ERRORES_REPORTADOS = 100
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+TAMANO_BLOQUE_VALIDACION = 64 * 1024
+# Mayor precio que entra en PrecioMercado.precio (DecimalField)
+_PRECIO = PrecioMercado._meta.get_field('precio')
+MAX_PRECIO = Decimal(10) ** (_PRECIO.max_digits - _PRECIO.decimal_places) - Decimal(10) ** -_PRECIO.decimal_places
+
+
+def _texto(valor):
+    """Valor de una celda o de un campo JSON (que puede ser un número) como texto"""
+    if valor is None:
+        return ''
+    return (valor if isinstance(valor, str) else str(valor)).strip()
+
+
+def parse_fecha(texto):
+    """Interpreta fechas ISO o con formato día/mes/año"""
+    texto = _texto(texto)
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: '{texto}'")
+
+
+def _sin_separadores(texto):
+    """
+    Importe con punto decimal y sin separador de miles. Con punto y coma el
+    último es el decimal; con uno solo repetido es de miles. Un único
+    separador seguido de tres dígitos ('1.850', '1,850') es ambiguo y se
+    rechaza en lugar de adivinar.
+    """
+    separadores = [caracter for caracter in texto if caracter in '.,']
+    if not separadores:
+        return texto
+    if len(set(separadores)) == 2:
+        decimal = separadores[-1]
+        entero, _, fraccion = texto.rpartition(decimal)
+        miles = ',' if decimal == '.' else '.'
+    elif len(separadores) > 1:
+        entero, fraccion, miles = texto, '', separadores[0]
+    else:
+        entero, _, fraccion = texto.partition(separadores[0])
+        if len(fraccion) == 3 and entero.lstrip('-') not in ('', '0'):
+            raise ValueError(f"Importe ambiguo: '{texto}', escribirlo sin separador de miles (ej. 1850 o 1850,00)")
+        miles = None
+    if miles and not re.fullmatch(rf'-?\d{{1,3}}(\{miles}\d{{3}})+', entero):
+        raise ValueError(f"Importe inválido: '{texto}'")
+    entero = entero.replace(miles, '') if miles else entero
+    return f'{entero}.{fraccion}' if fraccion else entero
+
+
+def parse_decimal(texto):
+    """Interpreta importes con punto o coma decimal (ej. 1.850,50, 1,850.50 o 1850.50)"""
+    if isinstance(texto, int | float | Decimal) and not isinstance(texto, bool):
+        texto = str(texto)
+    else:
+        texto = _sin_separadores(_texto(texto).replace('$', '').replace(' ', ''))
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation as e:
+        raise ValueError(f"Importe inválido: '{texto}'") from e
+    if not valor.is_finite():
+        raise ValueError(f"Importe inválido: '{texto}'")
+    if valor < 0:
+        raise ValueError(f"Importe negativo: '{texto}'")
+    return valor
+
+
+def parse_precio(texto):
+    """Interpreta un precio de mercado que entre en la columna de PrecioMercado"""
+    precio = parse_decimal(texto)
+    if precio > MAX_PRECIO:
+        raise ValueError(f"Precio fuera de rango: '{_texto(texto)}' (máximo {MAX_PRECIO})")
+    return precio
+
+
+def parse_peso(texto):
+    """Interpreta un peso en kg (positivo, con punto o coma decimal)"""
+    try:
+        peso = parse_decimal(texto)
+    except ValueError as e:
+        raise ValueError(f"Peso inválido: '{_texto(texto)}'") from e
+    if peso <= 0 or peso >= 10000:
+        raise ValueError(f"Peso inválido: '{_texto(texto)}'")
+    return peso
+
+
+def parse_cabezas(texto):
+    """Animales de la fila; vacío es un solo animal (exportación por animal de la balanza)"""
+    texto = _texto(texto)
+    if not texto:
+        return 1
+    if not texto.isdigit() or int(texto) == 0:
+        raise ValueError(f"Cantidad de cabezas inválida: '{texto}'")
+    return int(texto)
+
+
+def normalizar_categoria(texto):
+    """Normaliza la categoría al formato usado en los precios ('Novillo')"""
+    categoria = _texto(texto).capitalize()
+    if not categoria:
+        raise ValueError("Categoría vacía")
+    return categoria
+
+
+def _validar_utf8(archivo):
+    """Recorre el archivo binario y vuelve al inicio; ValueError si no es UTF-8"""
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE_VALIDACION), b''):
+            decodificador.decode(bloque)
+        decodificador.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise ValueError(
+            "El archivo no está en UTF-8: guardarlo como 'CSV UTF-8' desde la planilla"
+        ) from e
+    finally:
+        archivo.seek(0)
+
+
+def leer_csv(archivo):
+    """
+    Filas de un CSV (archivo binario o de texto) como diccionarios con
+    claves en minúscula. Detecta separador ',' o ';'. Un archivo binario
+    se valida antes de leer ninguna fila: ValueError si no es UTF-8.
+    """
+    if not isinstance(archivo, io.TextIOBase):
+        if archivo.seekable():
+            _validar_utf8(archivo)
+        archivo = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    return _filas_csv(archivo)
+
+
+def _filas_csv(archivo):
+    encabezado = archivo.readline()
+    delimitador = ';' if encabezado.count(';') > encabezado.count(',') else ','
+    columnas = [columna.strip().lower() for columna in next(csv.reader([encabezado], delimiter=delimitador))]
+    for fila in csv.reader(archivo, delimiter=delimitador):
+        if any(valor.strip() for valor in fila):
+            yield dict(zip(columnas, fila, strict=False))
+
+
+def _guardar_lote(usuario, lote, resultado):
+    fechas = {fecha for fecha, _ in lote}
+    categorias = {categoria for _, categoria in lote}
+    existentes = set(
+        PrecioMercado.objects.filter(
+            usuario=usuario, fecha__in=fechas, categoria__in=categorias
+        ).values_list('fecha', 'categoria')
+    )
+
+    with transaction.atomic(using=router.db_for_write(PrecioMercado)):
+        PrecioMercado.objects.bulk_create(
+            [
+                PrecioMercado(usuario=usuario, fecha=fecha, categoria=categoria, precio=precio)
+                for (fecha, categoria), precio in lote.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['usuario', 'fecha', 'categoria'],
+            update_fields=['precio'],
+        )
+
+    actualizados = len(existentes & lote.keys())
+    resultado['actualizados'] += actualizados
+    resultado['creados'] += len(lote) - actualizados
+
+
+def importar_precios(usuario, filas, tamano_lote=TAMANO_LOTE):
+    """
+    Inserta o actualiza precios de mercado a partir de filas con las claves
+    'fecha', 'categoria' y 'precio'. Dentro del archivo, una clave repetida
+    conserva el último valor y se informa como duplicada.
+    """
+    resultado = {
+        'procesadas': 0,
+        'creados': 0,
+        'actualizados': 0,
+        'duplicados': 0,
+        'total_errores': 0,
+        'errores': [],
+    }
+    vistas = set()
+    lote = {}
+
+    for numero, fila in enumerate(filas, start=1):
+        resultado['procesadas'] += 1
+        try:
+            if not isinstance(fila, dict):
+                raise ValueError("Fila con formato inválido")
+            clave = (parse_fecha(fila.get('fecha')), normalizar_categoria(fila.get('categoria')))
+            precio = parse_precio(fila.get('precio'))
+        except ValueError as e:
+            resultado['total_errores'] += 1
+            if len(resultado['errores']) < MAX_ERRORES_REPORTADOS:
+                resultado['errores'].append({'fila': numero, 'error': str(e)})
+            continue
+
+        if clave in vistas:
+            resultado['duplicados'] += 1
+        vistas.add(clave)
+        lote[clave] = precio
+
+        if len(lote) >= tamano_lote:
+            _guardar_lote(usuario, lote, resultado)
+            lote = {}
+
+    if lote:
+        _guardar_lote(usuario, lote, resultado)
+
+    # bulk_create no emite post_save: invalidar a mano la cache del usuario
+    if resultado['creados'] or resultado['actualizados']:
+        invalidar_usuario(usuario.id)
+
+    return resultado
+
+
+def _registrar_error(resultado, numero, error):
+    resultado['total_errores'] += 1
+    if len(resultado['errores']) < MAX_ERRORES_REPORTADOS:
+        resultado['errores'].append({'fila': numero, 'error': str(error)})
+
+
+def _lotes_por_nombre(usuario, nombres):
+    """lote_id -> id del lote, sin los nombres repetidos entre lotes del usuario"""
+    ids = {}
+    for pk, lote_id in Vacuno.objects.filter(usuario=usuario, lote_id__in=nombres).values_list('pk', 'lote_id'):
+        ids[lote_id] = None if lote_id in ids else pk
+    return ids
+
+
+def _guardar_pesadas(usuario, lote, resultado):
+    animales = {animal for animal, _ in lote}
+    fechas = {fecha for _, fecha in lote}
+    existentes = set(
+        Pesada.objects.filter(animal__in=animales, fecha__in=fechas).values_list('animal_id', 'fecha')
+    )
+
+    with transaction.atomic(using=router.db_for_write(Pesada)):
+        Pesada.objects.bulk_create(
+            [
+                Pesada(animal_id=animal, fecha=fecha, peso_promedio=peso, cabezas=cabezas)
+                for (animal, fecha), (peso, cabezas) in lote.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['animal', 'fecha'],
+            update_fields=['peso_promedio', 'cabezas', 'updated_at'],
+        )
+        # bulk_create no emite señales: registrar los cambios para /api/sync/
+        ids = [
+            pk for pk, animal, fecha in Pesada.objects.filter(
+                animal__in=animales, fecha__in=fechas
+            ).values_list('pk', 'animal_id', 'fecha')
+            if (animal, fecha) in lote
+        ]
+        registrar_cambios(Pesada, ids, usuario.id)
+
+    actualizadas = len(existentes & lote.keys())
+    resultado['actualizadas'] += actualizadas
+    resultado['creadas'] += len(lote) - actualizadas
+
+
+def importar_pesadas(usuario, filas, tamano_lote=TAMANO_LOTE):
+    """
+    Inserta o actualiza pesadas a partir de filas con las claves 'lote'
+    (lote_id), 'fecha', 'peso' y opcionalmente 'cabezas'. Las filas de un
+    mismo lote y fecha se promedian ponderadas por cabezas, así que sirve
+    tanto la exportación por animal de la balanza como una fila por lote.
+    Una pesada que ya existía se reemplaza.
+    """
+    resultado = {
+        'procesadas': 0,
+        'creadas': 0,
+        'actualizadas': 0,
+        'total_errores': 0,
+        'errores': [],
+    }
+    # (lote_id, fecha) -> [kg totales, cabezas, primera fila]; las pesadas
+    # son muchas menos que las filas de la balanza
+    pesadas = {}
+    for numero, fila in enumerate(filas, start=1):
+        resultado['procesadas'] += 1
+        try:
+            if not isinstance(fila, dict):
+                raise ValueError("Fila con formato inválido")
+            lote_id = _texto(fila.get('lote'))
+            if not lote_id:
+                raise ValueError("Lote vacío")
+            fecha = parse_fecha(fila.get('fecha'))
+            peso = parse_peso(fila.get('peso'))
+            cabezas = parse_cabezas(fila.get('cabezas'))
+        except ValueError as e:
+            _registrar_error(resultado, numero, e)
+            continue
+
+        acumulado = pesadas.setdefault((lote_id, fecha), [Decimal(0), 0, numero])
+        acumulado[0] += peso * cabezas
+        acumulado[1] += cabezas
+
+    lotes = _lotes_por_nombre(usuario, {lote_id for lote_id, _ in pesadas})
+    lote = {}
+    for (lote_id, fecha), (total, cabezas, numero) in pesadas.items():
+        if lotes.get(lote_id) is None:
+            motivo = "varios lotes con ese nombre" if lote_id in lotes else "no existe"
+            _registrar_error(resultado, numero, f"Lote '{lote_id}': {motivo}")
+            continue
+        lote[(lotes[lote_id], fecha)] = ((total / cabezas).quantize(Decimal('0.1')), cabezas)
+        if len(lote) >= tamano_lote:
+            _guardar_pesadas(usuario, lote, resultado)
+            lote = {}
+
+    if lote:
+        _guardar_pesadas(usuario, lote, resultado)
+
+    if resultado['creadas'] or resultado['actualizadas']:
+        invalidar_usuario(usuario.id)
+
+    return resultado
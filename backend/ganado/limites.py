@@ -0,0 +1,180 @@
+"""
+Límite de requests por usuario con baldes de fichas (token bucket).
+
+Cada usuario (o IP, sin autenticar) tiene un balde de CAPACIDAD fichas que
+se repone a RECARGA fichas por segundo, y cada request gasta el costo de
+su endpoint (`basename.accion` en COSTOS; el resto cuesta 1): los
+endpoints pesados como /api/dashboard/stats/ gastan más. Además, cada
+endpoint con costo tiene su propio balde por usuario (ENDPOINT_CAPACIDAD
+requests, ENDPOINT_RECARGA por segundo): un loop sobre uno solo se corta
+ahí y el usuario sigue pudiendo usar el resto de la API. Un request
+rechazado no gasta fichas y responde 429 con Retry-After.
+
+Los baldes viven en memoria del proceso (BACKEND 'local': sin consultas
+extra; cada worker de gunicorn limita por su cuenta) o en la cache de
+Django (BACKEND 'cache': compartidos entre workers; la lectura y la
+escritura no son atómicas, así que una carrera puede dejar pasar algún
+request de más).
+"""
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from rest_framework.throttling import BaseThrottle
+
+
+def nombre_endpoint(view):
+    """'basename.accion' para los viewsets (ej. 'dashboard.stats'); el nombre de la clase si no"""
+    basename = getattr(view, 'basename', None)
+    accion = getattr(view, 'action', None)
+    if basename and accion:
+        return f'{basename}.{accion}'
+    return type(view).__name__
+
+
+class Baldes:
+    """
+    Estado de los baldes: {clave: (fichas, instante)}. Las subclases
+    definen dónde se guarda y con qué reloj.
+    """
+
+    def olvidar(self, claves):
+        """Descarta los baldes (vuelven a estar llenos)"""
+        with self._bloqueo():
+            self._borrar(claves)
+
+    def consumir(self, pedidos):
+        """
+        Gasta `costo` fichas de cada balde [(clave, costo, capacidad, recarga)]
+        si todos las tienen. Devuelve 0 o los segundos a esperar.
+        """
+        with self._bloqueo():
+            ahora = self._ahora()
+            estados = self._leer([clave for clave, _, _, _ in pedidos])
+            disponibles = []
+            espera = 0
+            for clave, costo, capacidad, recarga in pedidos:
+                fichas, instante = estados.get(clave, (capacidad, ahora))
+                fichas = min(capacidad, fichas + max(0, ahora - instante) * recarga)
+                costo = min(costo, capacidad)
+                if fichas < costo:
+                    espera = max(espera, (costo - fichas) / recarga)
+                disponibles.append((clave, fichas - costo, capacidad / recarga))
+            if espera:
+                return espera
+            self._guardar({clave: (fichas, ahora) for clave, fichas, _ in disponibles},
+                          max(llenado for _, _, llenado in disponibles))
+            return 0
+
+
+class BaldesLocales(Baldes):
+    """Baldes en memoria del proceso"""
+    # Con más baldes se descartan los que ya se llenaron (equivalen a uno nuevo)
+    MAX_BALDES = 10000
+
+    def __init__(self):
+        self._estados = {}
+        self._vencimientos = {}
+        self._lock = threading.Lock()
+
+    def _bloqueo(self):
+        return self._lock
+
+    def _ahora(self):
+        return time.monotonic()
+
+    def _leer(self, claves):
+        return {clave: self._estados[clave] for clave in claves if clave in self._estados}
+
+    def _guardar(self, estados, llenado):
+        ahora = self._ahora()
+        self._estados.update(estados)
+        self._vencimientos.update({clave: ahora + llenado for clave in estados})
+        if len(self._estados) > self.MAX_BALDES:
+            for clave in [clave for clave, vence in self._vencimientos.items() if vence < ahora]:
+                del self._estados[clave], self._vencimientos[clave]
+
+    def _borrar(self, claves):
+        for clave in claves:
+            self._estados.pop(clave, None)
+            self._vencimientos.pop(clave, None)
+
+    def reiniciar(self):
+        with self._lock:
+            self._estados.clear()
+            self._vencimientos.clear()
+
+
+class BaldesCache(Baldes):
+    """Baldes en la cache de Django (LIMITES['CACHE']), compartidos entre procesos"""
+
+    def _bloqueo(self):
+        return nullcontext()
+
+    def _ahora(self):
+        return time.time()
+
+    def _cache(self):
+        return caches[settings.LIMITES['CACHE']]
+
+    def _leer(self, claves):
+        guardados = self._cache().get_many([f'ganado:limite:{clave}' for clave in claves])
+        return {clave[len('ganado:limite:'):]: estado for clave, estado in guardados.items()}
+
+    def _guardar(self, estados, llenado):
+        # Vencida la entrada el balde estaría lleno: es lo mismo que no tenerla
+        self._cache().set_many(
+            {f'ganado:limite:{clave}': estado for clave, estado in estados.items()}, timeout=int(llenado) + 1
+        )
+
+    def _borrar(self, claves):
+        self._cache().delete_many([f'ganado:limite:{clave}' for clave in claves])
+
+
+BACKENDS = {'local': BaldesLocales(), 'cache': BaldesCache()}
+
+
+def _reiniciar_baldes(setting, **kwargs):
+    """Con otros límites (ej. override_settings en tests) los baldes arrancan llenos"""
+    if setting == 'LIMITES':
+        BACKENDS['local'].reiniciar()
+
+
+setting_changed.connect(_reiniciar_baldes, dispatch_uid='ganado_reiniciar_baldes')
+
+
+def olvidar_usuario(usuario_id):
+    """Baldes llenos para el usuario (ej. uno nuevo que reutiliza el id de otro)"""
+    sujeto = f'u{usuario_id}'
+    claves = [sujeto] + [f'{sujeto}:{endpoint}' for endpoint in settings.LIMITES['COSTOS']]
+    BACKENDS[settings.LIMITES['BACKEND']].olvidar(claves)
+
+
+class LimiteFichas(BaseThrottle):
+    """Throttle de DRF con los baldes de settings.LIMITES"""
+
+    def allow_request(self, request, view):
+        ajustes = settings.LIMITES
+        self.espera = 0
+        # Los sub-requests del bootstrap y del sync ya pagaron con el request original
+        if not ajustes['ACTIVO'] or getattr(request._request, 'ganado_interno', False):
+            return True
+
+        if request.user and request.user.is_authenticated:
+            sujeto = f'u{request.user.pk}'
+        else:
+            sujeto = f'ip{self.get_ident(request)}'
+        endpoint = nombre_endpoint(view)
+        costo = ajustes['COSTOS'].get(endpoint)
+        pedidos = [(sujeto, costo or 1, ajustes['CAPACIDAD'], ajustes['RECARGA'])]
+        if costo:
+            pedidos.append((f'{sujeto}:{endpoint}', 1, ajustes['ENDPOINT_CAPACIDAD'], ajustes['ENDPOINT_RECARGA']))
+
+        self.espera = BACKENDS[ajustes['BACKEND']].consumir(pedidos)
+        return not self.espera
+
+    def wait(self):
+        return self.espera
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from ganado.ciclos import actualizar_ciclos
+
+
+class Command(BaseCommand):
+    help = (
+        "Avanza el ciclo productivo de los lotes según su edad. "
+        "Pensado para ejecutarse cada noche (ej. cron: 0 3 * * * manage.py actualizar_ciclos)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help="Fecha de referencia YYYY-MM-DD (por defecto hoy)")
+        parser.add_argument(
+            '--completo', action='store_true',
+            help="Revisar todos los lotes y no solo los que cruzaron un umbral desde la última ejecución"
+        )
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            fecha = parse_date(options['fecha'])
+            if fecha is None:
+                raise CommandError("--fecha debe tener formato YYYY-MM-DD")
+
+        actualizados = actualizar_ciclos(fecha=fecha, completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(f"{actualizados} lotes cambiaron de ciclo productivo"))
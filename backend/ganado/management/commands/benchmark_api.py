@@ -0,0 +1,193 @@
+import random
+import statistics
+import threading
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ganado.models import Vacuna, Vacuno
+
+ENDPOINTS_POR_DEFECTO = [
+    '/api/campos/',
+    '/api/vacunos/',
+    '/api/dashboard/stats/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide requests por segundo y latencia de endpoints de la API ejecutándolos en proceso "
+        "con varios hilos. Para comparar configuraciones de base de datos, correrlo con "
+        "distintas variables de entorno (ej. DB_POOL=0 y DB_POOL=1). Con --inundador otro usuario "
+        "satura un endpoint pesado durante la medición (ej. para comparar LIMITES_ACTIVO=0 y 1)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', required=True, help="Username con el que se autentican los requests")
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints',
+            help="Endpoint a medir (repetible). Por defecto campos, vacunos y dashboard"
+        )
+        parser.add_argument('--requests', type=int, default=200, help="Requests por endpoint")
+        parser.add_argument('--hilos', type=int, default=4, help="Clientes concurrentes")
+        parser.add_argument(
+            '--escrituras', type=float, default=0.0,
+            help="Proporción (0-1) de requests que registran una vacunación en vez de leer"
+        )
+        parser.add_argument(
+            '--inundador', help="Username que satura --endpoint-inundacion mientras se mide (otro tenant)"
+        )
+        parser.add_argument('--endpoint-inundacion', default='/api/dashboard/stats/')
+        parser.add_argument('--hilos-inundacion', type=int, default=4, help="Clientes del inundador")
+
+    def _usuario(self, username):
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist as e:
+            raise CommandError(f"No existe el usuario '{username}'") from e
+
+    def handle(self, *args, **options):
+        if options['hilos'] < 1 or options['requests'] < 1:
+            raise CommandError("--hilos y --requests deben ser al menos 1")
+        usuario = self._usuario(options['usuario'])
+        token = str(AccessToken.for_user(usuario))
+        db = connections['default'].settings_dict
+        self.stdout.write(
+            f"Base: {db['ENGINE'].rsplit('.', 1)[-1]} | CONN_MAX_AGE={db['CONN_MAX_AGE']} | "
+            f"pool={'pool' in db.get('OPTIONS', {})} | hilos={options['hilos']}"
+        )
+
+        escritura = None
+        if options['escrituras'] > 0:
+            escritura = self.escritura_vacunacion(usuario, options['escrituras'])
+
+        inundacion = None
+        if options['inundador']:
+            inundacion = self.inundar(
+                options['endpoint_inundacion'], str(AccessToken.for_user(self._usuario(options['inundador']))),
+                options['hilos_inundacion'],
+            )
+
+        try:
+            for endpoint in options['endpoints'] or ENDPOINTS_POR_DEFECTO:
+                resultado = self.medir(endpoint, token, options['requests'], options['hilos'], escritura)
+                self.stdout.write(
+                    f"{endpoint:<32} {resultado['rps']:>8.1f} req/s  "
+                    f"p50 {resultado['p50']:>7.1f} ms  p95 {resultado['p95']:>7.1f} ms  "
+                    f"escrituras {resultado['escrituras']}  errores {resultado['errores']}"
+                )
+        finally:
+            if inundacion is not None:
+                conteo = inundacion()
+                self.stdout.write(
+                    f"inundación {options['endpoint_inundacion']}: {conteo['requests']} requests, "
+                    f"{conteo['rechazados']} rechazados (429)"
+                )
+
+    def inundar(self, endpoint, token, hilos):
+        """
+        Lanza `hilos` clientes que piden `endpoint` sin pausa. Devuelve la
+        función que los detiene y devuelve {'requests', 'rechazados'}.
+        """
+        detener = threading.Event()
+        conteo = {'requests': 0, 'rechazados': 0}
+        lock = threading.Lock()
+
+        def trabajador():
+            cliente = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+            cliente.raise_request_exception = False
+            requests = rechazados = 0
+            while not detener.is_set():
+                requests += 1
+                if cliente.get(endpoint).status_code == 429:
+                    rechazados += 1
+            connections.close_all()
+            with lock:
+                conteo['requests'] += requests
+                conteo['rechazados'] += rechazados
+
+        threads = [threading.Thread(target=trabajador) for _ in range(hilos)]
+        for thread in threads:
+            thread.start()
+
+        def terminar():
+            detener.set()
+            for thread in threads:
+                thread.join()
+            return conteo
+
+        return terminar
+
+    def escritura_vacunacion(self, usuario, proporcion):
+        """Arma la función que decide y ejecuta una escritura (alta de vacunación)"""
+        lotes = list(Vacuno.objects.filter(usuario=usuario).values_list('id', flat=True))
+        vacuna = Vacuna.objects.filter(usuario=usuario).first()
+        if not lotes or vacuna is None:
+            raise CommandError("--escrituras requiere que el usuario tenga lotes y al menos una vacuna")
+
+        def escribir(cliente):
+            if random.random() >= proporcion:
+                return None
+            return cliente.post('/api/vacunaciones/', {
+                'animal': random.choice(lotes),
+                'vacuna': vacuna.id,
+                'fecha': date.today().isoformat(),
+                'dosis': 'benchmark',
+            }, content_type='application/json')
+
+        return escribir
+
+    def medir(self, endpoint, token, total, hilos, escritura=None):
+        """
+        Ejecuta `total` requests repartidos entre `hilos` clientes y devuelve métricas.
+        Con `escritura`, una parte de los requests se reemplaza por escrituras.
+        """
+        latencias = []
+        errores = []
+        escrituras = []
+        lock = threading.Lock()
+
+        def trabajador(cantidad):
+            cliente = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+            cliente.raise_request_exception = False
+            propias = []
+            fallidas = 0
+            escritas = 0
+            for _ in range(cantidad):
+                inicio = time.perf_counter()
+                respuesta = escritura(cliente) if escritura else None
+                if respuesta is None:
+                    respuesta = cliente.get(endpoint)
+                else:
+                    escritas += 1
+                propias.append((time.perf_counter() - inicio) * 1000)
+                if respuesta.status_code >= 400:
+                    fallidas += 1
+            connections.close_all()
+            with lock:
+                latencias.extend(propias)
+                errores.append(fallidas)
+                escrituras.append(escritas)
+
+        repartos = [total // hilos + (1 if i < total % hilos else 0) for i in range(hilos)]
+        threads = [threading.Thread(target=trabajador, args=(cantidad,)) for cantidad in repartos]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracion = time.perf_counter() - inicio
+
+        latencias.sort()
+        return {
+            'rps': len(latencias) / duracion if duracion else 0,
+            'p50': statistics.median(latencias) if latencias else 0,
+            'p95': latencias[int(len(latencias) * 0.95) - 1] if latencias else 0,
+            'errores': sum(errores),
+            'escrituras': sum(escrituras),
+        }
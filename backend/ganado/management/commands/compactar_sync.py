@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from ganado.models import Cambio, OperacionSync
+
+
+class Command(BaseCommand):
+    help = (
+        "Compacta el registro de cambios de /api/sync/: borra los registros superados por uno "
+        "posterior del mismo objeto (las bajas se conservan) y las claves de idempotencia viejas. "
+        "Pensado para ejecutarse periódicamente (ej. cron: 0 4 * * * manage.py compactar_sync)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias-claves', type=int, default=30,
+            help="Días que se conservan las operaciones aplicadas (claves de idempotencia)"
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['dias_claves'])
+        for alias in [DEFAULT_DB_ALIAS, *settings.DATABASE_SHARDS]:
+            # Un token anterior al registro borrado igual recibe el objeto por el
+            # registro posterior, así que compactar no cambia lo que ve ningún cliente
+            posterior = Cambio.objects.using(alias).filter(
+                modelo=OuterRef('modelo'), objeto_id=OuterRef('objeto_id'), id__gt=OuterRef('id')
+            )
+            cambios, _ = Cambio.objects.using(alias).filter(Exists(posterior)).delete()
+            claves, _ = OperacionSync.objects.using(alias).filter(fecha__lt=limite).delete()
+            self.stdout.write(f"{alias}: {cambios} cambios y {claves} claves borrados")
+
+        self.stdout.write(self.style.SUCCESS("Compactación terminada"))
@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ganado.importacion import TAMANO_LOTE, importar_pesadas, leer_csv
+from ganado.routers import estado_shard, usar_tenant
+
+
+class Command(BaseCommand):
+    help = "Importa pesadas desde el CSV de la balanza (lote, fecha, peso, cabezas) insertando o reemplazando"
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta al archivo CSV")
+        parser.add_argument('--usuario', required=True, help="Username dueño de los lotes")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Pesadas por INSERT")
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser un entero positivo")
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist as e:
+            raise CommandError(f"No existe el usuario '{options['usuario']}'") from e
+
+        if estado_shard(usuario.id, fresco=True)['en_migracion']:
+            raise CommandError(f"Los datos de '{usuario}' se están migrando de shard, reintentar al terminar")
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo, usar_tenant(usuario.id):
+                resultado = importar_pesadas(usuario, leer_csv(archivo), tamano_lote=options['lote'])
+        except OSError as e:
+            raise CommandError(str(e)) from e
+        duracion = time.perf_counter() - inicio
+
+        for error in resultado['errores']:
+            self.stderr.write(f"Fila {error['fila']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['procesadas']} filas en {duracion:.2f}s: "
+            f"{resultado['creadas']} pesadas creadas, {resultado['actualizadas']} reemplazadas, "
+            f"{resultado['total_errores']} errores"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint del WAL y actualización de estadísticas para SQLite. "
+        "Pensado para ejecutarse periódicamente (ej. cron: */30 * * * * manage.py mantenimiento_sqlite)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sin-analyze', action='store_true',
+            help="Solo hacer el checkpoint, sin ANALYZE/optimize"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Este comando solo aplica a bases SQLite")
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            modo = cursor.fetchone()[0]
+            if modo == 'wal':
+                # TRUNCATE deja el archivo -wal en cero para que no crezca sin límite
+                cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                bloqueado, paginas_wal, paginas_copiadas = cursor.fetchone()
+                estado = 'incompleto (hay lectores activos)' if bloqueado else 'completo'
+                self.stdout.write(f"Checkpoint {estado}: {paginas_copiadas}/{paginas_wal} páginas")
+            else:
+                self.stdout.write(f"journal_mode={modo}: no hay WAL para consolidar")
+
+            if not options['sin_analyze']:
+                cursor.execute('ANALYZE')
+                cursor.execute('PRAGMA optimize')
+                self.stdout.write("Estadísticas del planificador actualizadas")
+
+        self.stdout.write(self.style.SUCCESS("Mantenimiento terminado"))
@@ -0,0 +1,161 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from ganado.cache import invalidar_usuario
+from ganado.models import (
+    Auditoria,
+    Cambio,
+    Campo,
+    EstadiaAnimal,
+    EstadoVacuno,
+    OperacionSync,
+    Pesada,
+    PrecioMercado,
+    ShardUsuario,
+    Transferencia,
+    Vacuna,
+    Vacunacion,
+    Vacuno,
+    Venta,
+)
+from ganado.routers import SHARD_CACHE_TIMEOUT, alias_para_usuario, invalidar_shard
+
+# Modelos del tenant en orden de dependencia (padres antes que hijos) y
+# el camino de cada uno hasta el usuario dueño. Cambio y Auditoria van
+# primero para borrarse al final: el borrado de los demás modelos registra bajas.
+MODELOS_TENANT = [
+    (Cambio, 'usuario'),
+    (Auditoria, 'usuario'),
+    (OperacionSync, 'usuario'),
+    (Campo, 'usuario'),
+    (Vacuna, 'usuario'),
+    (PrecioMercado, 'usuario'),
+    (Vacuno, 'usuario'),
+    (EstadoVacuno, 'vacuno__usuario'),
+    (EstadiaAnimal, 'animal__usuario'),
+    (Vacunacion, 'animal__usuario'),
+    (Transferencia, 'animal__usuario'),
+    (Venta, 'animal__usuario'),
+    (Pesada, 'animal__usuario'),
+]
+
+
+def _campos_automaticos(modelo):
+    """Campos auto_now/auto_now_add que bulk_create sobrescribiría"""
+    return [
+        campo.attname for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve todos los datos de ganado de un usuario a otro shard sin detener el servicio. "
+        "Durante la copia las escrituras del usuario responden 503 y las lecturas siguen "
+        "sirviéndose desde el shard de origen. Mientras dura la migración la asignación no se "
+        "cachea, así que después de la espera inicial todos los workers ven el cambio de shard "
+        "enseguida y el origen se borra sin otra espera."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', required=True, help="Username a mover")
+        parser.add_argument('--destino', required=True, help="Alias del shard destino")
+        parser.add_argument('--lote', type=int, default=2000, help="Filas por INSERT")
+        parser.add_argument(
+            '--espera', type=float, default=SHARD_CACHE_TIMEOUT,
+            help="Segundos de espera antes de copiar: terminan las escrituras en curso y vence la "
+                 "asignación cacheada antes de la migración"
+        )
+
+    def handle(self, *args, **options):
+        destino = options['destino']
+        if destino != DEFAULT_DB_ALIAS and destino not in settings.DATABASE_SHARDS:
+            raise CommandError(f"'{destino}' no es un shard configurado (DB_SHARDS)")
+        try:
+            usuario = User.objects.using(DEFAULT_DB_ALIAS).get(username=options['usuario'])
+        except User.DoesNotExist as e:
+            raise CommandError(f"No existe el usuario '{options['usuario']}'") from e
+
+        origen = alias_para_usuario(usuario.id, fresco=True)
+        if origen == destino:
+            self.stdout.write(f"{usuario} ya está en '{destino}'")
+            return
+
+        self._marcar(usuario, origen, en_migracion=True)
+        # Terminan los requests que leyeron la asignación antes de la marca y
+        # vencen las copias cacheadas; desde acá todos la leen de la tabla
+        self.stdout.write(f"Esperando {options['espera']:g} s antes de copiar")
+        time.sleep(options['espera'])
+        try:
+            with transaction.atomic(using=destino):
+                self._copiar(usuario, origen, destino, options['lote'])
+        except Exception:
+            self._marcar(usuario, origen, en_migracion=False)
+            raise
+
+        self._marcar(usuario, destino, en_migracion=False)
+        self._borrar(usuario, origen)
+        invalidar_usuario(usuario.id)
+        self.stdout.write(self.style.SUCCESS(f"{usuario} movido de '{origen}' a '{destino}'"))
+
+    def _marcar(self, usuario, alias, en_migracion):
+        ShardUsuario.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+            usuario=usuario, defaults={'alias': alias, 'en_migracion': en_migracion}
+        )
+        invalidar_shard(usuario.id)
+
+    def _copiar(self, usuario, origen, destino, tamano_lote):
+        # Las FK a User exigen que el usuario también exista en el shard
+        if not User.objects.using(destino).filter(pk=usuario.pk).exists():
+            User.objects.using(destino).bulk_create([usuario])
+
+        for modelo, ruta in MODELOS_TENANT:
+            filas = modelo.objects.using(origen).filter(**{ruta: usuario.id}).order_by('pk')
+            automaticos = _campos_automaticos(modelo)
+            lote = []
+            copiados = 0
+            for objeto in filas.iterator(chunk_size=tamano_lote):
+                lote.append(objeto)
+                if len(lote) >= tamano_lote:
+                    copiados += self._insertar(modelo, lote, destino, automaticos)
+                    lote = []
+            if lote:
+                copiados += self._insertar(modelo, lote, destino, automaticos)
+
+            if copiados != filas.count():
+                raise CommandError(f"{modelo.__name__}: la cantidad copiada no coincide con el origen")
+            self.stdout.write(f"  {modelo.__name__}: {copiados}")
+
+        # Con PKs explícitas las secuencias de PostgreSQL quedan atrasadas
+        conexion = connections[destino]
+        sentencias = conexion.ops.sequence_reset_sql(no_style(), [m for m, _ in MODELOS_TENANT])
+        if sentencias:
+            with conexion.cursor() as cursor:
+                for sentencia in sentencias:
+                    cursor.execute(sentencia)
+
+    def _insertar(self, modelo, lote, destino, automaticos):
+        ids = [objeto.pk for objeto in lote]
+        if modelo.objects.using(destino).filter(pk__in=ids).exists():
+            raise CommandError(
+                f"{modelo.__name__}: hay ids del usuario ya usados en el destino. "
+                "Los shards deben usar rangos de ids disjuntos."
+            )
+        originales = [[getattr(objeto, campo) for campo in automaticos] for objeto in lote]
+        modelo.objects.using(destino).bulk_create(lote)
+        if automaticos:
+            # bulk_create reescribe auto_now/auto_now_add: restaurar las fechas originales
+            for objeto, valores in zip(lote, originales, strict=True):
+                for campo, valor in zip(automaticos, valores, strict=True):
+                    setattr(objeto, campo, valor)
+            modelo.objects.using(destino).bulk_update(lote, automaticos)
+        return len(lote)
+
+    def _borrar(self, usuario, origen):
+        for modelo, ruta in reversed(MODELOS_TENANT):
+            modelo.objects.using(origen).filter(**{ruta: usuario.id}).delete()
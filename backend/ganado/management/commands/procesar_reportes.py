@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ganado.reportes import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de reportes: arma los XLSX/PDF pedidos en /api/reportes/ y los deja en "
+        "settings.REPORTES['DIRECTORIO']. Corre hasta interrumpirlo (ej. como servicio de systemd); "
+        "con --una-vez procesa la cola y termina (ej. desde cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Vaciar la cola y terminar")
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0, help="Segundos de espera cuando la cola está vacía"
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                procesados = procesar_pendientes()
+                total += procesados
+                if procesados:
+                    self.stdout.write(f"{procesados} reportes procesados")
+                if options['una_vez']:
+                    break
+                if not procesados:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"{total} reportes procesados en total"))
@@ -0,0 +1,56 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ganado.proyeccion import RANGOS_PARAMETROS, leer_parametros, proyectar_rodeo
+from ganado.routers import usar_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Corre la proyección del rodeo fuera de un request, sin el tope de escenarios × meses × campos "
+        "de /api/analytics/proyeccion/, y escribe el mismo JSON. Con --procesos reparte los escenarios "
+        "en varios procesos; con --semilla el resultado es el mismo para cualquier cantidad de procesos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', required=True, help="Username dueño del rodeo")
+        parser.add_argument('--procesos', type=int, default=1, help="Procesos entre los que se reparten los escenarios")
+        parser.add_argument('--semilla', type=int, help="Semilla para una corrida reproducible")
+        parser.add_argument('--salida', help="Archivo JSON de salida (por defecto la salida estándar)")
+        for nombre, (_, minimo, maximo) in RANGOS_PARAMETROS.items():
+            parser.add_argument(f"--{nombre.replace('_', '-')}", dest=nombre, help=f"Entre {minimo} y {maximo}")
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 1:
+            raise CommandError("--procesos debe ser un entero positivo")
+        if options['semilla'] is not None and options['semilla'] < 0:
+            raise CommandError("--semilla debe ser un entero positivo")
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist as e:
+            raise CommandError(f"No existe el usuario '{options['usuario']}'") from e
+
+        try:
+            parametros = leer_parametros({nombre: options[nombre] for nombre in RANGOS_PARAMETROS})
+            with usar_tenant(usuario.id):
+                resultado = proyectar_rodeo(
+                    usuario, parametros, options['semilla'], procesos=options['procesos'], acotar=False
+                )
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        contenido = json.dumps(resultado, ensure_ascii=False, indent=2)
+        if not options['salida']:
+            self.stdout.write(contenido)
+            return
+        try:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(contenido)
+        except OSError as e:
+            raise CommandError(str(e)) from e
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['escenarios']} escenarios en {resultado['segundos']}s con "
+            f"{options['procesos']} procesos: {options['salida']}"
+        ))
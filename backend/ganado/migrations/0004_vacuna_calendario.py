@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0003_add_user_relationships'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vacuna',
+            name='edad_maxima_dias',
+            field=models.PositiveIntegerField(blank=True, help_text='Edad máxima (días) para aplicar la vacuna', null=True),
+        ),
+        migrations.AddField(
+            model_name='vacuna',
+            name='edad_minima_dias',
+            field=models.PositiveIntegerField(blank=True, help_text='Edad mínima (días) para la primera dosis', null=True),
+        ),
+        migrations.AddField(
+            model_name='vacuna',
+            name='intervalo_refuerzo_dias',
+            field=models.PositiveIntegerField(blank=True, help_text='Días entre dosis; vacío si es de dosis única', null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0004_vacuna_calendario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionProceso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultima_ejecucion', models.DateField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,92 @@
+from django.db import OperationalError, migrations
+
+# Columnas indexadas al momento de esta migración. Se copian acá para que la
+# migración no cambie si después cambia ganado.busqueda.
+CAMPOS_BUSQUEDA = {
+    'ganado_vacuno': ('lote_id', 'raza', 'observaciones'),
+    'ganado_campo': ('nombre', 'ubicacion'),
+    'ganado_venta': ('comprador', 'destino'),
+}
+
+
+def _sentencias_sqlite(tabla, campos):
+    fts = f'{tabla}_fts'
+    columnas = ', '.join(campos)
+    nuevos = ', '.join(f'new.{campo}' for campo in campos)
+    viejos = ', '.join(f'old.{campo}' for campo in campos)
+    borrar = f"INSERT INTO {fts}({fts}, rowid, {columnas}) VALUES ('delete', old.id, {viejos});"
+    insertar = f"INSERT INTO {fts}(rowid, {columnas}) VALUES (new.id, {nuevos});"
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN {insertar} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN {borrar} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tabla} BEGIN {borrar} {insertar} END',
+    ]
+
+
+def _sentencias_postgresql(tabla, campos):
+    prefijo = f"busq_{tabla.removeprefix('ganado_')}"
+    # Las mismas expresiones que arma buscar(): SearchVector(..., config='spanish')
+    # y el UPPER(col) de icontains, para que el planner use los índices
+    documento = " || ' ' || ".join(f"COALESCE(\"{campo}\", '')" for campo in campos)
+    sentencias = [
+        f"CREATE INDEX {prefijo}_fts ON {tabla} USING gin (to_tsvector('spanish'::regconfig, {documento}))"
+    ]
+    sentencias += [
+        f'CREATE INDEX {prefijo}_{campo}_trgm ON {tabla} USING gin ((UPPER("{campo}")) gin_trgm_ops)'
+        for campo in campos
+    ]
+    return sentencias
+
+
+def crear_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for tabla, campos in CAMPOS_BUSQUEDA.items():
+            fts = f'{tabla}_fts'
+            try:
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{', '.join(campos)}, content='{tabla}', content_rowid='id', tokenize='trigram')"
+                )
+            except OperationalError:
+                # SQLite compilado sin FTS5 o sin tokenizer trigram: queda icontains
+                return
+            for sentencia in _sentencias_sqlite(tabla, campos):
+                schema_editor.execute(sentencia)
+            schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for tabla, campos in CAMPOS_BUSQUEDA.items():
+            for sentencia in _sentencias_postgresql(tabla, campos):
+                schema_editor.execute(sentencia)
+
+
+def borrar_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for tabla in CAMPOS_BUSQUEDA:
+            fts = f'{tabla}_fts'
+            for sufijo in ('ai', 'ad', 'au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{sufijo}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {fts}')
+    elif vendor == 'postgresql':
+        for tabla, campos in CAMPOS_BUSQUEDA.items():
+            prefijo = f"busq_{tabla.removeprefix('ganado_')}"
+            nombres = [f'{prefijo}_fts', *(f'{prefijo}_{campo}_trgm' for campo in campos)]
+            for nombre in nombres:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+    """
+    Índices de búsqueda de texto. Dependen del motor (GIN en PostgreSQL,
+    FTS5 en SQLite), por eso no se declaran en Meta.indexes.
+    """
+
+    dependencies = [
+        ('ganado', '0006_shardusuario'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:55
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0007_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estadiaanimal',
+            index=models.Index(fields=['campo', 'fecha_salida', 'animal'], name='estadia_campo_salida'),
+        ),
+        migrations.AddIndex(
+            model_name='estadiaanimal',
+            index=models.Index(fields=['animal', 'fecha_salida'], name='estadia_animal_salida'),
+        ),
+        migrations.AddIndex(
+            model_name='estadovacuno',
+            index=models.Index(fields=['vacuno', 'fecha', 'id'], name='estado_vacuno_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='preciomercado',
+            index=models.Index(models.F('usuario'), django.db.models.functions.text.Lower('categoria'), models.F('fecha'), name='precio_usuario_categoria'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['animal', 'fecha'], name='transferencia_animal_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['campo_origen', 'fecha'], name='transferencia_origen_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(fields=['campo_destino', 'fecha'], name='transferencia_destino_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='vacunacion',
+            index=models.Index(fields=['animal', 'fecha'], name='vacunacion_animal_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='vacunacion',
+            index=models.Index(fields=['vacuna', 'fecha'], name='vacunacion_vacuna_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='vacuno',
+            index=models.Index(fields=['usuario', 'sexo'], name='vacuno_usuario_sexo'),
+        ),
+        migrations.AddIndex(
+            model_name='vacuno',
+            index=models.Index(fields=['usuario', 'fecha_nacimiento'], name='vacuno_usuario_nacimiento'),
+        ),
+        migrations.AddIndex(
+            model_name='vacuno',
+            index=models.Index(models.F('usuario'), django.db.models.functions.text.Lower('raza'), name='vacuno_usuario_raza'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['animal', 'fecha'], name='venta_animal_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(django.db.models.functions.text.Lower('comprador'), name='venta_comprador'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Modelo sincronizable y camino hasta el usuario dueño, padres antes que hijos
+MODELOS_SYNC = [
+    ('Campo', 'usuario_id'),
+    ('Vacuno', 'usuario_id'),
+    ('EstadoVacuno', 'vacuno__usuario_id'),
+    ('EstadiaAnimal', 'animal__usuario_id'),
+    ('Vacunacion', 'animal__usuario_id'),
+    ('Transferencia', 'animal__usuario_id'),
+    ('Venta', 'animal__usuario_id'),
+]
+TAMANO_LOTE = 5000
+
+
+def registrar_existentes(apps, schema_editor):
+    """Un Cambio por fila existente, para que el token 0 entregue todos los datos"""
+    Cambio = apps.get_model('ganado', 'Cambio')
+    alias = schema_editor.connection.alias
+    for nombre, ruta in MODELOS_SYNC:
+        modelo = apps.get_model('ganado', nombre)
+        filas = modelo.objects.using(alias).order_by('pk').values_list('pk', ruta)
+        lote = []
+        for pk, usuario_id in filas.iterator(chunk_size=TAMANO_LOTE):
+            lote.append(Cambio(usuario_id=usuario_id, modelo=modelo._meta.model_name, objeto_id=pk))
+            if len(lote) >= TAMANO_LOTE:
+                Cambio.objects.using(alias).bulk_create(lote)
+                lote = []
+        Cambio.objects.using(alias).bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0008_indices_filtros'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campo',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='estadiaanimal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='estadovacuno',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='transferencia',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='vacunacion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='vacuno',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='Cambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=30)),
+                ('objeto_id', models.BigIntegerField()),
+                ('eliminado', models.BooleanField(default=False)),
+                ('usuario', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='cambios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'id'], name='cambio_usuario_id'), models.Index(fields=['modelo', 'objeto_id', 'id'], name='cambio_objeto')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OperacionSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('respuesta', models.JSONField(null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operaciones_sync', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'clave'), name='operacion_sync_clave')],
+            },
+        ),
+        migrations.RunPython(registrar_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0009_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estadovacuno',
+            index=models.Index(fields=['fecha', 'id'], name='estado_fecha'),
+        ),
+    ]
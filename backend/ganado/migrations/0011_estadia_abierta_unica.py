@@ -0,0 +1,50 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def cerrar_duplicadas(apps, schema_editor):
+    """
+    Cierra las estadías abiertas de más que dejaron movimientos concurrentes:
+    cada una se cierra en la fecha de entrada de la siguiente y queda abierta
+    la más reciente.
+    """
+    EstadiaAnimal = apps.get_model('ganado', 'EstadiaAnimal')
+    Cambio = apps.get_model('ganado', 'Cambio')
+    alias = schema_editor.connection.alias
+    abiertas = EstadiaAnimal.objects.using(alias).filter(fecha_salida__isnull=True)
+    duplicados = (
+        abiertas.values('animal').annotate(total=models.Count('pk')).filter(total__gt=1).values('animal')
+    )
+    filas = abiertas.filter(animal__in=duplicados).order_by('animal', 'fecha_entrada', 'pk').values_list(
+        'pk', 'animal', 'animal__usuario', 'fecha_entrada'
+    )
+
+    ahora = timezone.now()
+    cambios = []
+    anterior = None
+    for pk, animal_id, usuario_id, fecha_entrada in filas:
+        if anterior is not None and anterior[1] == animal_id:
+            EstadiaAnimal.objects.using(alias).filter(pk=anterior[0]).update(
+                fecha_salida=fecha_entrada, updated_at=ahora
+            )
+            cambios.append(Cambio(usuario_id=usuario_id, modelo='estadiaanimal', objeto_id=anterior[0]))
+        anterior = (pk, animal_id)
+    Cambio.objects.using(alias).bulk_create(cambios)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0010_indice_estado_fecha'),
+    ]
+
+    operations = [
+        migrations.RunPython(cerrar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='estadiaanimal',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('fecha_salida__isnull', True)), fields=('animal',),
+                name='estadia_abierta_unica',
+            ),
+        ),
+    ]
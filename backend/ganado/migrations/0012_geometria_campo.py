@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+from ganado.geo import borrar_indice_sqlite, crear_indice_sqlite, sentencias_postgresql
+
+
+def crear_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        crear_indice_sqlite(connection, apps.get_model('ganado', 'Campo'))
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(sentencias_postgresql(apps.get_model('ganado', 'Campo'))[0])
+
+
+def borrar_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        borrar_indice_sqlite(connection)
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(sentencias_postgresql(apps.get_model('ganado', 'Campo'))[1])
+
+
+class Migration(migrations.Migration):
+    """
+    Geometría de los campos. El índice espacial depende del motor (R*Tree
+    en SQLite, GiST en PostgreSQL), por eso no se declara en Meta.indexes.
+    """
+
+    dependencies = [
+        ('ganado', '0011_estadia_abierta_unica'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campo',
+            name='bbox_este',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='campo',
+            name='bbox_norte',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='campo',
+            name='bbox_oeste',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='campo',
+            name='bbox_sur',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='campo',
+            name='geometria',
+            field=models.JSONField(blank=True, help_text='Perímetro en GeoJSON (Polygon o MultiPolygon, lon/lat WGS84)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='campo',
+            index=models.Index(fields=['usuario', 'bbox_oeste', 'bbox_este', 'bbox_sur', 'bbox_norte'], name='campo_bbox'),
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
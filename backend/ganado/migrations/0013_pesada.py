@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0012_geometria_campo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pesada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('peso_promedio', models.DecimalField(decimal_places=1, help_text='Kg por cabeza', max_digits=6)),
+                ('cabezas', models.PositiveIntegerField(help_text='Animales pesados')),
+                ('observaciones', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('animal', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='pesadas', to='ganado.vacuno')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('animal', 'fecha'), name='pesada_animal_fecha')],
+            },
+        ),
+    ]
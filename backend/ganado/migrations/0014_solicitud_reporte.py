@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0013_pesada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reporte', models.CharField(choices=[('inventario', 'Inventario por campo'), ('ventas', 'Ventas'), ('sanidad', 'Cumplimiento sanitario')], max_length=20)),
+                ('periodo', models.CharField(help_text='Mes del reporte (YYYY-MM)', max_length=7)),
+                ('formato', models.CharField(choices=[('xlsx', 'Excel'), ('pdf', 'PDF')], max_length=4)),
+                ('version', models.CharField(help_text='Versión de los datos con la que se armó', max_length=40)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('listo', 'Listo'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reportes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'id'], name='reporte_estado'), models.Index(fields=['usuario', 'reporte', 'periodo', 'formato', 'version'], name='reporte_clave')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:57
+
+import django.db.models.deletion
+import django.utils.timezone
+import ganado.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ganado', '0014_solicitud_reporte'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Auditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=30)),
+                ('objeto_id', models.BigIntegerField()),
+                ('accion', models.CharField(choices=[('alta', 'Alta'), ('cambio', 'Cambio'), ('baja', 'Baja')], max_length=10)),
+                ('cambios', models.JSONField(default=dict, encoder=ganado.models.JSONCompacto)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('autor', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='auditoria_autor', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='auditoria', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Entrada de auditoría',
+                'verbose_name_plural': 'Auditoría',
+                'indexes': [models.Index(fields=['usuario', 'id'], name='auditoria_usuario'), models.Index(fields=['modelo', 'objeto_id', 'id'], name='auditoria_objeto')],
+            },
+        ),
+    ]
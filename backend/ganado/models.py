@@ -1,27 +1,95 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+# Umbrales de edad (días) del ciclo productivo según sexo: (edad_hasta, ciclo).
+# El último tramo no tiene límite superior.
+CICLOS_POR_EDAD = {
+    'M': [(365, 'ternero'), (730, 'novillo'), (None, 'toro')],
+    'H': [(365, 'ternera'), (1095, 'vaquillona'), (None, 'vaca')],
+}
+
+
+def ciclo_para_edad(sexo, dias):
+    """Ciclo productivo que corresponde a un lote según sexo y edad en días"""
+    tramos = CICLOS_POR_EDAD[sexo]
+    if dias is None:
+        return tramos[0][1]
+    for edad_hasta, ciclo in tramos:
+        if edad_hasta is None or dias < edad_hasta:
+            return ciclo
+
 
+class ConValoresCargados:
+    """
+    Guarda en la instancia los valores leídos de la base: la auditoría los
+    compara al guardar para registrar solo lo que cambió, sin releer la fila.
+    Se guardan tal como llegan (nombres, valores); el dict se arma recién
+    al guardar, así las lecturas no pagan por la auditoría.
+    """
 
-class Campo(models.Model):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._valores_cargados = (field_names, values)
+        return instancia
+
+
+class Campo(ConValoresCargados, models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='campos')
     nombre = models.CharField(max_length=50)
     ubicacion = models.CharField(max_length=255)  # Ej: "La Pampa RN9 KM70"
     hectareas = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     descripcion = models.TextField(blank=True)
+    geometria = models.JSONField(
+        null=True, blank=True, help_text="Perímetro en GeoJSON (Polygon o MultiPolygon, lon/lat WGS84)"
+    )
+    # Caja envolvente de la geometría, calculada al guardar (ver ganado.geo)
+    bbox_oeste = models.FloatField(null=True, blank=True, editable=False)
+    bbox_sur = models.FloatField(null=True, blank=True, editable=False)
+    bbox_este = models.FloatField(null=True, blank=True, editable=False)
+    bbox_norte = models.FloatField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ['usuario', 'nombre']
+        indexes = [
+            models.Index(
+                fields=['usuario', 'bbox_oeste', 'bbox_este', 'bbox_sur', 'bbox_norte'], name='campo_bbox'
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        """Con geometría, las hectáreas y la caja envolvente se calculan del polígono"""
+        from .geo import area_hectareas, caja_envolvente
+
+        if self.geometria:
+            self.bbox_oeste, self.bbox_sur, self.bbox_este, self.bbox_norte = caja_envolvente(self.geometria)
+            self.hectareas = Decimal(area_hectareas(self.geometria)).quantize(Decimal('0.01'))
+        else:
+            self.bbox_oeste = self.bbox_sur = self.bbox_este = self.bbox_norte = None
+        super().save(*args, **kwargs)
+
     def vacunos_actuales(self):
-        """Devuelve los vacunos que están actualmente en este campo"""
+        """
+        Devuelve los vacunos que están actualmente en este campo.
+        Con prefetch_vacunos_actuales() devuelve una lista sin consultar.
+        """
+        if hasattr(self, 'estadias_abiertas'):
+            return [estadia.animal for estadia in self.estadias_abiertas]
         return Vacuno.objects.filter(estadias__campo=self, estadias__fecha_salida__isnull=True)
     
     def capacidad_actual(self):
         """Cantidad de vacunos actualmente en el campo"""
-        return self.vacunos_actuales().count()
+        vacunos = self.vacunos_actuales()
+        return len(vacunos) if isinstance(vacunos, list) else vacunos.count()
     
     def animales_por_hectarea(self):
         """Calcula la densidad de animales por hectárea"""
@@ -40,7 +108,7 @@ class Campo(models.Model):
         else:
             return 'alta'
 
-class Vacuno(models.Model):
+class Vacuno(ConValoresCargados, models.Model):
     SEXO_CHOICES = (
         ("M", "Macho"),
         ("H", "Hembra"),
@@ -56,6 +124,14 @@ class Vacuno(models.Model):
     )
     fecha_ingreso = models.DateField()
     observaciones = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'sexo'], name='vacuno_usuario_sexo'),
+            models.Index(fields=['usuario', 'fecha_nacimiento'], name='vacuno_usuario_nacimiento'),
+            models.Index('usuario', Lower('raza'), name='vacuno_usuario_raza'),
+        ]
 
     def __str__(self):
         return f"Lote {self.lote_id} - {self.raza} ({self.cantidad} animales)"
@@ -68,12 +144,18 @@ class Vacuno(models.Model):
         """
         Devuelve el último estado registrado del vacuno (EstadoVacuno más reciente).
         Utiliza el related_name 'historial_estados' definido en EstadoVacuno.
+        Con prefetch_estado_actual() no consulta la base.
         """
+        if hasattr(self, 'estado_actual_prefetch'):
+            return self.estado_actual_prefetch[0] if self.estado_actual_prefetch else None
         return self.historial_estados.order_by('-fecha', '-id').first()
     
     def campo_actual(self):
         """Devuelve el campo donde se encuentra actualmente el vacuno"""
-        estadia_actual = self.estadias.filter(fecha_salida__isnull=True).first()
+        if hasattr(self, 'estadia_abierta_prefetch'):
+            estadia_actual = self.estadia_abierta_prefetch[0] if self.estadia_abierta_prefetch else None
+        else:
+            estadia_actual = self.estadias.filter(fecha_salida__isnull=True).first()
         return estadia_actual.campo if estadia_actual else None
     
     def edad_aproximada(self):
@@ -84,9 +166,12 @@ class Vacuno(models.Model):
         return None
     
     def vacunas_pendientes(self):
-        """Devuelve las vacunas que no ha recibido este vacuno"""
+        """
+        Devuelve las vacunas del usuario que no ha recibido este vacuno.
+        Para el calendario con refuerzos y ventanas de edad ver ganado.sanidad.
+        """
         vacunas_aplicadas = self.vacunaciones.values_list('vacuna_id', flat=True)
-        return Vacuna.objects.exclude(id__in=vacunas_aplicadas)
+        return Vacuna.objects.filter(usuario_id=self.usuario_id).exclude(id__in=vacunas_aplicadas)
     
     def is_vendido(self):
         """Verifica si el animal está vendido"""
@@ -95,7 +180,7 @@ class Vacuno(models.Model):
 
 
 # Modelo para historial de estados del vacuno
-class EstadoVacuno(models.Model):
+class EstadoVacuno(ConValoresCargados, models.Model):
     CICLO_PRODUCTIVO_CHOICES = (
         ("ternero", "Ternero"),
         ("novillo", "Novillo"),
@@ -135,21 +220,41 @@ class EstadoVacuno(models.Model):
         blank=True
     )
     observaciones = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['vacuno', 'fecha', 'id'], name='estado_vacuno_fecha'),
+            # Orden por defecto (-fecha) del admin y de los listados
+            models.Index(fields=['fecha', 'id'], name='estado_fecha'),
+        ]
         verbose_name = "Estado del Vacuno"
         verbose_name_plural = "Estados de Vacunos"
 
     def __str__(self):
         return f"{self.vacuno} - {self.estado_general} ({self.fecha})"
 
-class EstadiaAnimal(models.Model):
+class EstadiaAnimal(ConValoresCargados, models.Model):
     animal = models.ForeignKey(Vacuno, on_delete=models.CASCADE, related_name="estadias")
     campo = models.ForeignKey(Campo, on_delete=models.CASCADE)
     fecha_entrada = models.DateField()
     fecha_salida = models.DateField(null=True, blank=True)
     observaciones = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['campo', 'fecha_salida', 'animal'], name='estadia_campo_salida'),
+            models.Index(fields=['animal', 'fecha_salida'], name='estadia_animal_salida'),
+        ]
+        constraints = [
+            # Un lote está en un solo campo a la vez
+            models.UniqueConstraint(
+                fields=['animal'], condition=models.Q(fecha_salida__isnull=True),
+                name='estadia_abierta_unica',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.animal} en {self.campo} desde {self.fecha_entrada}"
@@ -159,41 +264,152 @@ class Vacuna(models.Model):
     nombre = models.CharField(max_length=100)
     laboratorio = models.CharField(max_length=100, blank=True)
     descripcion = models.TextField(blank=True)
+    # Calendario sanitario
+    intervalo_refuerzo_dias = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Días entre dosis; vacío si es de dosis única"
+    )
+    edad_minima_dias = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Edad mínima (días) para la primera dosis"
+    )
+    edad_maxima_dias = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Edad máxima (días) para aplicar la vacuna"
+    )
 
     def __str__(self):
         return self.nombre
 
-class Vacunacion(models.Model):
+class Vacunacion(ConValoresCargados, models.Model):
     animal = models.ForeignKey(Vacuno, on_delete=models.CASCADE, related_name="vacunaciones")
     vacuna = models.ForeignKey(Vacuna, on_delete=models.CASCADE)
     fecha = models.DateField()
     dosis = models.CharField(max_length=50, blank=True)
     observaciones = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['animal', 'fecha'], name='vacunacion_animal_fecha'),
+            models.Index(fields=['vacuna', 'fecha'], name='vacunacion_vacuna_fecha'),
+        ]
 
     def __str__(self):
         return f"{self.animal} - {self.vacuna} ({self.fecha})"
 
-class Transferencia(models.Model):
+class Transferencia(ConValoresCargados, models.Model):
     animal = models.ForeignKey(Vacuno, on_delete=models.CASCADE)
     campo_origen = models.ForeignKey(Campo, on_delete=models.CASCADE, related_name="transferencias_salida")
     campo_destino = models.ForeignKey(Campo, on_delete=models.CASCADE, related_name="transferencias_entrada")
     fecha = models.DateField()
     observaciones = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['animal', 'fecha'], name='transferencia_animal_fecha'),
+            models.Index(fields=['campo_origen', 'fecha'], name='transferencia_origen_fecha'),
+            models.Index(fields=['campo_destino', 'fecha'], name='transferencia_destino_fecha'),
+        ]
 
     def __str__(self):
         return f"{self.animal} de {self.campo_origen} a {self.campo_destino} ({self.fecha})"
 
-class Venta(models.Model):
+class Venta(ConValoresCargados, models.Model):
     animal = models.ForeignKey(Vacuno, on_delete=models.CASCADE)
     fecha = models.DateField()
     comprador = models.CharField(max_length=100)
     precio = models.DecimalField(max_digits=12, decimal_places=2)
     destino = models.CharField(max_length=100, blank=True)
     observaciones = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['animal', 'fecha'], name='venta_animal_fecha'),
+            models.Index(Lower('comprador'), name='venta_comprador'),
+        ]
 
     def __str__(self):
         return f"{self.animal} vendido a {self.comprador} ({self.fecha})"
 
+class Pesada(models.Model):
+    """Peso promedio de un lote en una fecha (una fila por lote y día)"""
+    # Sin índice propio: alcanza con el de (animal, fecha)
+    animal = models.ForeignKey(Vacuno, on_delete=models.CASCADE, related_name='pesadas', db_index=False)
+    fecha = models.DateField()
+    peso_promedio = models.DecimalField(max_digits=6, decimal_places=1, help_text="Kg por cabeza")
+    cabezas = models.PositiveIntegerField(help_text="Animales pesados")
+    observaciones = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # El índice de la restricción devuelve la serie de un lote en un solo rango
+        # y es la clave del upsert de la importación
+        constraints = [
+            models.UniqueConstraint(fields=['animal', 'fecha'], name='pesada_animal_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.animal}: {self.peso_promedio} kg ({self.fecha})"
+
+class EjecucionProceso(models.Model):
+    """Registro de la última ejecución de procesos batch incrementales"""
+    nombre = models.CharField(max_length=50, unique=True)
+    ultima_ejecucion = models.DateField()
+
+    def __str__(self):
+        return f"{self.nombre} ({self.ultima_ejecucion})"
+
+class SolicitudReporte(models.Model):
+    """
+    Pedido de un reporte (XLSX/PDF) que arma el worker procesar_reportes.
+    El archivo generado queda en disco, ligado a la versión de los datos.
+    """
+    REPORTES = [
+        ('inventario', 'Inventario por campo'),
+        ('ventas', 'Ventas'),
+        ('sanidad', 'Cumplimiento sanitario'),
+    ]
+    FORMATOS = [('xlsx', 'Excel'), ('pdf', 'PDF')]
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reportes')
+    reporte = models.CharField(max_length=20, choices=REPORTES)
+    periodo = models.CharField(max_length=7, help_text="Mes del reporte (YYYY-MM)")
+    formato = models.CharField(max_length=4, choices=FORMATOS)
+    version = models.CharField(max_length=40, help_text="Versión de los datos con la que se armó")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    archivo = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Cola del worker: pendientes en orden de llegada
+            models.Index(fields=['estado', 'id'], name='reporte_estado'),
+            models.Index(
+                fields=['usuario', 'reporte', 'periodo', 'formato', 'version'], name='reporte_clave'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.reporte} {self.periodo}.{self.formato} de {self.usuario} ({self.estado})"
+
+class ShardUsuario(models.Model):
+    """Base de datos (shard) donde viven los datos de ganado de cada usuario"""
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='shard')
+    alias = models.CharField(max_length=50)
+    en_migracion = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.usuario} → {self.alias}"
+
 class PrecioMercado(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='precios_mercado')
     fecha = models.DateField()
@@ -203,8 +419,92 @@ class PrecioMercado(models.Model):
     class Meta:
         ordering = ['-fecha']
         unique_together = ['usuario', 'fecha', 'categoria']
+        indexes = [
+            models.Index('usuario', Lower('categoria'), 'fecha', name='precio_usuario_categoria'),
+        ]
         verbose_name = "Precio de Mercado"
         verbose_name_plural = "Precios de Mercado"
 
     def __str__(self):
         return f"{self.categoria} - ${self.precio} ({self.fecha})"
+
+class Cambio(models.Model):
+    """
+    Registro de escrituras de los modelos sincronizables (/api/sync/).
+    El id creciente es el token de sincronización; las bajas quedan como
+    tombstones (eliminado=True).
+    """
+    # Sin FK real: los registros no deben impedir ni acompañar el borrado del usuario
+    usuario = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='cambios'
+    )
+    modelo = models.CharField(max_length=30)
+    objeto_id = models.BigIntegerField()
+    eliminado = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'id'], name='cambio_usuario_id'),
+            models.Index(fields=['modelo', 'objeto_id', 'id'], name='cambio_objeto'),
+        ]
+
+    def __str__(self):
+        accion = 'baja' if self.eliminado else 'cambio'
+        return f"{accion} {self.modelo} {self.objeto_id} (#{self.id})"
+
+class OperacionSync(models.Model):
+    """Operación offline ya aplicada, con su respuesta, por clave de idempotencia"""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='operaciones_sync')
+    clave = models.CharField(max_length=64)
+    status = models.PositiveSmallIntegerField()
+    respuesta = models.JSONField(null=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='operacion_sync_clave'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.status})"
+
+class JSONCompacto(DjangoJSONEncoder):
+    """JSON sin espacios entre elementos"""
+    item_separator = ','
+    key_separator = ':'
+
+class Auditoria(models.Model):
+    """
+    Escritura de un lote, estadía, venta, etc. con sus diferencias (ver
+    ganado.auditoria). `usuario` es el dueño de los datos y `autor` quien
+    hizo el cambio (vacío en procesos sin usuario).
+    """
+    ACCIONES = (
+        ('alta', 'Alta'),
+        ('cambio', 'Cambio'),
+        ('baja', 'Baja'),
+    )
+    # Sin FK reales, como en Cambio: el registro sobrevive a los datos
+    usuario = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='auditoria'
+    )
+    autor = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True,
+        related_name='auditoria_autor'
+    )
+    modelo = models.CharField(max_length=30)
+    objeto_id = models.BigIntegerField()
+    accion = models.CharField(max_length=10, choices=ACCIONES)
+    cambios = models.JSONField(encoder=JSONCompacto, default=dict)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'id'], name='auditoria_usuario'),
+            models.Index(fields=['modelo', 'objeto_id', 'id'], name='auditoria_objeto'),
+        ]
+        verbose_name = "Entrada de auditoría"
+        verbose_name_plural = "Auditoría"
+
+    def __str__(self):
+        return f"{self.accion} {self.modelo} {self.objeto_id} (#{self.id})"
@@ -0,0 +1,63 @@
+"""
+Movimientos de lotes entre campos.
+
+Las escrituras que leen la estadía abierta de un lote y la cierran corren
+en una transacción que primero bloquea la fila del lote (select_for_update):
+dos requests concurrentes sobre el mismo lote se ejecutan en serie y no
+pueden dejar dos estadías abiertas. La restricción estadia_abierta_unica
+lo garantiza además en la base. En SQLite no hay bloqueo de filas; con
+DB_SQLITE_CONCURRENTE la transacción toma el lock de escritura al empezar.
+"""
+from contextlib import contextmanager
+
+from django.db import router, transaction
+
+from .models import EstadiaAnimal, EstadoVacuno, Vacuno
+from .sync import actualizar
+
+# Transferencias por request de POST /api/transferencias/masiva/
+MAX_TRANSFERENCIAS_MASIVAS = 1000
+
+
+@contextmanager
+def lote_bloqueado(lote_id):
+    """Transacción con la fila del lote bloqueada hasta el commit; devuelve el lote"""
+    alias = router.db_for_write(Vacuno)
+    with transaction.atomic(using=alias):
+        yield Vacuno.objects.using(alias).select_for_update().get(pk=lote_id)
+
+
+@contextmanager
+def lotes_bloqueados(lote_ids):
+    """
+    Como lote_bloqueado() para varios lotes en una consulta; devuelve {id: lote}.
+    Se bloquean en orden de id para que dos requests no se esperen mutuamente.
+    """
+    alias = router.db_for_write(Vacuno)
+    with transaction.atomic(using=alias):
+        lotes = Vacuno.objects.using(alias).select_for_update().filter(pk__in=lote_ids).order_by('pk')
+        yield {lote.pk: lote for lote in lotes}
+
+
+def cerrar_estadia(lote, fecha):
+    """Cierra a la fecha la estadía abierta del lote, si tiene"""
+    return actualizar(
+        EstadiaAnimal.objects.filter(animal=lote, fecha_salida__isnull=True), lote.usuario_id,
+        fecha_salida=fecha,
+    )
+
+
+def mover_lote(lote, campo, fecha, observaciones=""):
+    """Cierra la estadía abierta del lote y abre una en `campo`. Llamar con el lote bloqueado"""
+    cerrar_estadia(lote, fecha)
+    return EstadiaAnimal.objects.create(animal=lote, campo=campo, fecha_entrada=fecha, observaciones=observaciones)
+
+
+def aplicar_transferencia(transferencia):
+    """Mueve el lote al campo destino y registra el estado transferido. Llamar con el lote bloqueado"""
+    mover_lote(transferencia.animal, transferencia.campo_destino, transferencia.fecha)
+    EstadoVacuno.objects.create(
+        vacuno=transferencia.animal,
+        estado_general='transferido',
+        observaciones=f"Transferido de {transferencia.campo_origen} a {transferencia.campo_destino}"
+    )
@@ -0,0 +1,311 @@
+"""
+Planificador de pastoreo rotativo.
+
+Propone transferencias de lotes para que cada campo quede vacío o con
+ocupación media (OCUPACION_MEDIA a OCUPACION_ALTA animales por hectárea)
+con la menor cantidad de movimientos. Un campo vacío cuya última salida
+fue hace menos de `descanso_dias` está en descanso y no recibe lotes.
+
+El desvío de un campo son las cabezas que le faltan o le sobran para
+estar en rango (0 si está vacío). El plan se arma en tres pasadas sobre
+un estado en memoria, sin consultas:
+
+1. Campos con ocupación alta: se sacan lotes hacia el destino que más
+   reduce el desvío total.
+2. Campos con ocupación baja: se completan con lotes que les sobran a
+   otros campos o se vacían, lo que requiera menos movimientos.
+3. Búsqueda local: lotes movidos que pueden volver a su campo sin
+   empeorar el desvío y reubicaciones que todavía lo reducen, hasta no
+   encontrar mejoras o agotar el tiempo.
+
+Las transferencias propuestas tienen el formato de
+POST /api/transferencias/masiva/.
+"""
+import time
+from datetime import date, timedelta
+
+from django.db.models import Max
+
+from .filtros import OCUPACION_ALTA, OCUPACION_MEDIA
+from .models import Campo, EstadiaAnimal
+
+DESCANSO_DIAS = 30
+MAX_DESCANSO_DIAS = 3650
+# Tiempo máximo del planificador; al agotarse se devuelve el mejor plan hasta ese momento
+TIEMPO_MAXIMO_SEGUNDOS = 5
+
+
+def estado_ocupacion(cabezas, hectareas):
+    """Misma clasificación que Campo.estado_ocupacion"""
+    densidad = round(cabezas / hectareas, 2)
+    if densidad < OCUPACION_MEDIA:
+        return 'baja'
+    if densidad <= OCUPACION_ALTA:
+        return 'media'
+    return 'alta'
+
+
+class PlanPastoreo:
+    """Asignación de lotes a campos con sus totales, modificable y reversible"""
+
+    def __init__(self, hectareas, en_descanso, lotes):
+        """
+        hectareas: {campo_id: hectáreas}; en_descanso: campos que no reciben
+        lotes; lotes: {lote_id: (cantidad, campo_id)}
+        """
+        self.minimo = {campo: OCUPACION_MEDIA * ha for campo, ha in hectareas.items()}
+        self.maximo = {campo: OCUPACION_ALTA * ha for campo, ha in hectareas.items()}
+        self.en_descanso = set(en_descanso)
+        self.cantidad = {lote: cantidad for lote, (cantidad, _) in lotes.items()}
+        self.origen = {lote: campo for lote, (_, campo) in lotes.items()}
+        self.asignacion = dict(self.origen)
+        self.total = dict.fromkeys(hectareas, 0)
+        self.lotes_en = {campo: set() for campo in hectareas}
+        for lote, campo in self.asignacion.items():
+            self.total[campo] += self.cantidad[lote]
+            self.lotes_en[campo].add(lote)
+        self.movimientos = 0
+
+    def desvio(self, campo, total=None):
+        total = self.total[campo] if total is None else total
+        if total == 0:
+            return 0
+        return max(0, self.minimo[campo] - total) + max(0, total - self.maximo[campo])
+
+    def desvio_total(self):
+        return sum(self.desvio(campo) for campo in self.total)
+
+    def fuera_de_rango(self):
+        return [campo for campo in self.total if self.desvio(campo) > 0]
+
+    def puede_recibir(self, campo):
+        # Un campo en descanso deja de estarlo si el plan ya le asignó lotes
+        return campo not in self.en_descanso or self.total[campo] > 0
+
+    def variacion(self, lote, destino):
+        """(cambio en el desvío total, cambio en la cantidad de movimientos) de mover el lote"""
+        actual = self.asignacion[lote]
+        q = self.cantidad[lote]
+        desvio = (
+            self.desvio(actual, self.total[actual] - q) - self.desvio(actual)
+            + self.desvio(destino, self.total[destino] + q) - self.desvio(destino)
+        )
+        movimientos = (destino != self.origen[lote]) - (actual != self.origen[lote])
+        return desvio, movimientos
+
+    def mover(self, lote, destino):
+        """Mueve el lote y devuelve el campo en el que estaba (para deshacer)"""
+        actual = self.asignacion[lote]
+        q = self.cantidad[lote]
+        self.movimientos += (destino != self.origen[lote]) - (actual != self.origen[lote])
+        self.total[actual] -= q
+        self.lotes_en[actual].discard(lote)
+        self.total[destino] += q
+        self.lotes_en[destino].add(lote)
+        self.asignacion[lote] = destino
+        return actual
+
+    def deshacer(self, movidos):
+        for lote, anterior in reversed(movidos):
+            self.mover(lote, anterior)
+
+    def mejor_destino(self, lote, excluir=()):
+        """(variación, destino) del mejor destino para el lote, o None"""
+        # Es el cálculo más repetido: variacion() desarrollada con variables locales
+        actual = self.asignacion[lote]
+        origen = self.origen[lote]
+        q = self.cantidad[lote]
+        base = self.desvio(actual, self.total[actual] - q) - self.desvio(actual)
+        ya_movido = actual != origen
+        total, minimo, maximo = self.total, self.minimo, self.maximo
+        mejor = None
+        for campo, cabezas in total.items():
+            if campo == actual or campo in excluir or (cabezas == 0 and campo in self.en_descanso):
+                continue
+            antes = 0 if cabezas == 0 else max(0, minimo[campo] - cabezas) + max(0, cabezas - maximo[campo])
+            despues = max(0, minimo[campo] - cabezas - q) + max(0, cabezas + q - maximo[campo])
+            candidato = ((base + despues - antes, (campo != origen) - ya_movido), campo)
+            if mejor is None or candidato < mejor:
+                mejor = candidato
+        return mejor
+
+    def mejor_reubicacion(self, lotes, excluir=()):
+        """(variación, lote, destino) que más reduce el desvío entre los lotes dados, o None"""
+        mejor = None
+        for lote in sorted(lotes):
+            destino = self.mejor_destino(lote, excluir)
+            if destino is None:
+                continue
+            (desvio, movimientos), campo = destino
+            # A igual variación, los lotes grandes resuelven con menos movimientos
+            candidato = ((desvio, movimientos, -self.cantidad[lote]), lote, campo)
+            if desvio < 0 and (mejor is None or candidato < mejor):
+                mejor = candidato
+        return mejor
+
+    # --- Pasadas -------------------------------------------------------------
+
+    def descargar_altas(self, limite):
+        altas = [c for c in self.total if self.total[c] > self.maximo[c]]
+        for campo in sorted(altas, key=lambda c: self.maximo[c] - self.total[c]):
+            while self.total[campo] > self.maximo[campo] and time.monotonic() < limite:
+                mejor = self.mejor_reubicacion(self.lotes_en[campo])
+                if mejor is None:
+                    break
+                _, lote, destino = mejor
+                self.mover(lote, destino)
+
+    def _completar(self, campo):
+        """Trae lotes que les sobran a otros campos; devuelve los movimientos hechos"""
+        movidos = []
+        while 0 < self.total[campo] < self.minimo[campo]:
+            mejor = None
+            for lote, actual in self.asignacion.items():
+                if actual == campo:
+                    continue
+                variacion = self.variacion(lote, campo)
+                candidato = (variacion, -self.cantidad[lote], lote)
+                if variacion[0] < 0 and (mejor is None or candidato < mejor):
+                    mejor = candidato
+            if mejor is None:
+                break
+            lote = mejor[2]
+            movidos.append((lote, self.mover(lote, campo)))
+        return movidos
+
+    def _vaciar(self, campo):
+        """Reparte los lotes del campo en otros; devuelve los movimientos hechos"""
+        movidos = []
+        for lote in sorted(self.lotes_en[campo], key=lambda otro: -self.cantidad[otro]):
+            destino = self.mejor_destino(lote, excluir={campo})
+            if destino is None:
+                break
+            movidos.append((lote, self.mover(lote, destino[1])))
+        return movidos
+
+    def completar_bajas(self, limite):
+        bajas = [c for c in self.total if 0 < self.total[c] < self.minimo[c]]
+        for campo in sorted(bajas, key=lambda c: self.total[c] - self.minimo[c]):
+            if time.monotonic() >= limite:
+                return
+            if not 0 < self.total[campo] < self.minimo[campo]:
+                continue
+            inicial = (self.desvio_total(), self.movimientos)
+            opciones = []
+            for estrategia in (self._completar, self._vaciar):
+                movidos = estrategia(campo)
+                opciones.append(((self.desvio_total(), self.movimientos), estrategia))
+                self.deshacer(movidos)
+            resultado, estrategia = min(opciones, key=lambda opcion: opcion[0])
+            if resultado < inicial:
+                estrategia(campo)
+
+    def busqueda_local(self, limite):
+        while time.monotonic() < limite:
+            mejoro = False
+            # Volver al campo de origen ahorra un movimiento si no empeora el desvío
+            for lote in sorted(self.asignacion):
+                origen = self.origen[lote]
+                if (self.asignacion[lote] != origen and self.puede_recibir(origen)
+                        and self.variacion(lote, origen)[0] <= 0):
+                    self.mover(lote, origen)
+                    mejoro = True
+            fuera = self.fuera_de_rango()
+            mejor = self.mejor_reubicacion([lote for campo in fuera for lote in self.lotes_en[campo]])
+            if mejor is not None:
+                _, lote, destino = mejor
+                self.mover(lote, destino)
+                mejoro = True
+            if not mejoro:
+                break
+
+    def resolver(self, tiempo_maximo=TIEMPO_MAXIMO_SEGUNDOS):
+        limite = time.monotonic() + tiempo_maximo
+        self.descargar_altas(limite)
+        self.completar_bajas(limite)
+        self.busqueda_local(limite)
+        return self
+
+    def transferencias(self):
+        """[(lote, campo_origen, campo_destino)] de los lotes que cambian de campo"""
+        return [
+            (lote, self.origen[lote], campo)
+            for lote, campo in sorted(self.asignacion.items()) if campo != self.origen[lote]
+        ]
+
+
+def plan_pastoreo(usuario, fecha=None, descanso_dias=DESCANSO_DIAS, tiempo_maximo=TIEMPO_MAXIMO_SEGUNDOS):
+    """Transferencias propuestas y ocupación de cada campo antes y después"""
+    inicio = time.perf_counter()
+    hoy = fecha or date.today()
+
+    # Sin hectáreas no hay densidad: esos campos y sus lotes quedan fuera del plan
+    campos = {
+        campo['id']: campo
+        for campo in Campo.objects.filter(usuario=usuario, hectareas__gt=0).values('id', 'nombre', 'hectareas')
+    }
+    lotes = {
+        fila['animal_id']: fila
+        for fila in EstadiaAnimal.objects.filter(
+            animal__usuario=usuario, fecha_salida__isnull=True, campo__in=list(campos)
+        ).values('animal_id', 'animal__lote_id', 'animal__cantidad', 'campo_id')
+    }
+    ultimas_salidas = dict(
+        EstadiaAnimal.objects.filter(campo__in=list(campos)).values('campo').annotate(
+            ultima=Max('fecha_salida')
+        ).values_list('campo', 'ultima')
+    )
+    ocupados = {fila['campo_id'] for fila in lotes.values()}
+    en_descanso = {
+        campo for campo, ultima in ultimas_salidas.items()
+        if campo not in ocupados and ultima is not None and ultima > hoy - timedelta(days=descanso_dias)
+    }
+
+    plan = PlanPastoreo(
+        {campo: float(datos['hectareas']) for campo, datos in campos.items()},
+        en_descanso,
+        {lote: (fila['animal__cantidad'], fila['campo_id']) for lote, fila in lotes.items()},
+    )
+    antes = dict(plan.total)
+    plan.resolver(tiempo_maximo)
+
+    def ocupacion(campo, cabezas):
+        hectareas = float(campos[campo]['hectareas'])
+        return {
+            'animales': cabezas,
+            'animales_por_hectarea': round(cabezas / hectareas, 2),
+            'estado_ocupacion': estado_ocupacion(cabezas, hectareas),
+            'vacio': cabezas == 0,
+        }
+
+    return {
+        'fecha': hoy,
+        'descanso_dias': descanso_dias,
+        'movimientos': plan.movimientos,
+        'campos_fuera_de_rango': len(plan.fuera_de_rango()),
+        'transferencias': [
+            {
+                'animal': lote,
+                'lote_id': lotes[lote]['animal__lote_id'],
+                'cantidad': lotes[lote]['animal__cantidad'],
+                'campo_origen': origen,
+                'campo_origen_nombre': campos[origen]['nombre'],
+                'campo_destino': destino,
+                'campo_destino_nombre': campos[destino]['nombre'],
+            }
+            for lote, origen, destino in plan.transferencias()
+        ],
+        'campos': [
+            {
+                'id': campo,
+                'nombre': datos['nombre'],
+                'hectareas': datos['hectareas'],
+                'en_descanso': campo in en_descanso,
+                'actual': ocupacion(campo, antes[campo]),
+                'propuesto': ocupacion(campo, plan.total[campo]),
+                'en_rango': plan.desvio(campo) == 0,
+            }
+            for campo, datos in sorted(campos.items(), key=lambda par: par[1]['nombre'])
+        ],
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
@@ -0,0 +1,206 @@
+"""
+Proyección del rodeo: cabezas y densidad por campo e ingresos por ventas.
+
+Parte del estado actual (lotes activos con su campo, sexo, edad y ciclo)
+y corre escenarios Monte Carlo con ganado.simulacion. El resultado son
+bandas de percentiles por campo y mes. La simulación corre dentro del
+request, así que escenarios × meses × campos se acota a
+MAX_CELDAS_REQUEST (unos pocos segundos de CPU): en rodeos con muchos
+campos se corren menos escenarios. El comando proyectar_rodeo corre la
+proyección sin ese tope y puede repartirla en procesos.
+
+Simplificaciones: no hay ventas planificadas en la base, así que se
+supone que cada macho se vende al cumplir edad_venta_meses y que no se
+venden hembras; el ciclo productivo sale solo de sexo y edad (como en
+actualizar_ciclos), sin cambios manuales de ciclo, y no hay traslados
+entre campos.
+"""
+import time
+from datetime import date
+
+import numpy as np
+
+from .consultas import campo_en_fecha, ciclo_en_fecha, estado_en_fecha
+from .models import Campo, Vacuno, ciclo_para_edad
+from .simulacion import simular
+from .valoracion import ESTADOS_FUERA_DEL_RODEO, cargar_curvas
+
+PERCENTILES = (10, 50, 90)
+MESES_MINIMO = 12
+MESES_MAXIMO = 36
+MAX_ESCENARIOS = 10000
+# Escenarios × meses × campos por request: ~700 mil por segundo de CPU
+MAX_CELDAS_REQUEST = 2_000_000
+# Edad supuesta de los lotes sin fecha de nacimiento, según su ciclo
+EDAD_POR_CICLO_MESES = {
+    'ternero': 6, 'ternera': 6, 'novillo': 18, 'vaquillona': 18, 'toro': 36, 'vaca': 48,
+}
+EDAD_SIN_DATOS_MESES = 24
+DIAS_POR_MES = 365.25 / 12
+
+PARAMETROS_DEFECTO = {
+    'meses': 24,
+    'escenarios': 1000,
+    'mortalidad_anual': 0.02,
+    'mortalidad_terneros_anual': 0.08,
+    'tasa_prenez': 0.8,
+    'edad_primer_parto_meses': 24,
+    'edad_venta_meses': 20,
+}
+
+
+# parámetro -> (tipo, mínimo, máximo)
+RANGOS_PARAMETROS = {
+    'meses': (int, MESES_MINIMO, MESES_MAXIMO),
+    'escenarios': (int, 1, MAX_ESCENARIOS),
+    'mortalidad_anual': (float, 0, 1),
+    'mortalidad_terneros_anual': (float, 0, 1),
+    'tasa_prenez': (float, 0, 1),
+    'edad_primer_parto_meses': (int, 12, 120),
+    'edad_venta_meses': (int, 1, 120),
+}
+
+
+def leer_parametros(datos):
+    """Valida los parámetros de la proyección (p. ej. query params); lanza ValueError si alguno es inválido"""
+    parametros = {}
+    for nombre, (tipo, minimo, maximo) in RANGOS_PARAMETROS.items():
+        valor = datos.get(nombre)
+        if valor in (None, ''):
+            continue
+        try:
+            valor = tipo(valor)
+        except ValueError as e:
+            raise ValueError(f"{nombre} debe ser un número entre {minimo} y {maximo}") from e
+        if not minimo <= valor <= maximo:
+            raise ValueError(f"{nombre} debe ser un número entre {minimo} y {maximo}")
+        parametros[nombre] = valor
+    return parametros
+
+
+def escenarios_permitidos(meses, campos, acotar=True):
+    """
+    Escenarios que entran en MAX_CELDAS_REQUEST con ese horizonte y cantidad
+    de campos; sin `acotar` (fuera de un request), MAX_ESCENARIOS
+    """
+    if not acotar:
+        return MAX_ESCENARIOS
+    return max(1, min(MAX_ESCENARIOS, MAX_CELDAS_REQUEST // (meses * max(1, campos))))
+
+
+def _edad_meses(lote, hoy):
+    if lote['fecha_nacimiento']:
+        return max(0, int((hoy - lote['fecha_nacimiento']).days / DIAS_POR_MES))
+    return EDAD_POR_CICLO_MESES.get(lote['categoria'] or '', EDAD_SIN_DATOS_MESES)
+
+
+def cohortes_actuales(usuario, hoy):
+    """
+    Lotes activos agrupados por (campo, sexo, edad en meses), en arrays para
+    ganado.simulacion. Devuelve (cohortes, campos); el último índice de
+    campo agrupa los lotes sin campo.
+    """
+    campos = list(Campo.objects.filter(usuario=usuario).order_by('nombre').values('id', 'nombre', 'hectareas'))
+    indice = {campo['id']: posicion for posicion, campo in enumerate(campos)}
+    sin_campo = len(campos)
+
+    lotes = Vacuno.objects.filter(usuario=usuario).annotate(
+        estado_general=estado_en_fecha('estado_general'),
+        categoria=ciclo_en_fecha(),
+        campo_id=campo_en_fecha('campo_id'),
+    ).values('cantidad', 'sexo', 'fecha_nacimiento', 'estado_general', 'categoria', 'campo_id')
+
+    grupos = {}
+    for lote in lotes:
+        if lote['estado_general'] in ESTADOS_FUERA_DEL_RODEO:
+            continue
+        clave = (indice.get(lote['campo_id'], sin_campo), lote['sexo'] == 'H', _edad_meses(lote, hoy))
+        grupos[clave] = grupos.get(clave, 0) + lote['cantidad']
+
+    claves = list(grupos)
+    cohortes = {
+        'campo': np.array([clave[0] for clave in claves], dtype=np.int64),
+        'hembra': np.array([clave[1] for clave in claves], dtype=bool),
+        'edad': np.array([clave[2] for clave in claves], dtype=np.int64),
+        'cantidad': np.array([grupos[clave] for clave in claves], dtype=np.int64),
+        'n_campos': len(campos) + 1,
+    }
+    return cohortes, campos
+
+
+def _bandas(valores, decimales=None):
+    """Percentiles sobre el eje de escenarios (1) de un array [meses, escenarios, ...]"""
+    bandas = np.percentile(valores, PERCENTILES, axis=1)
+    if decimales is not None:
+        bandas = np.round(bandas, decimales)
+    return {f'p{percentil}': banda.tolist() for percentil, banda in zip(PERCENTILES, bandas, strict=True)}
+
+
+def _etiquetas_meses(hoy, meses):
+    etiquetas = []
+    anio, mes = hoy.year, hoy.month
+    for _ in range(meses):
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+        etiquetas.append(f'{anio:04d}-{mes:02d}')
+    return etiquetas
+
+
+def proyectar_rodeo(usuario, parametros=None, semilla=None, procesos=1, acotar=True):
+    """
+    Bandas de percentiles de cabezas y densidad por campo y mes, e ingresos
+    por mes. Sin `escenarios` pedidos usa el valor por defecto hasta el
+    máximo permitido; pedir más que el máximo lanza ValueError. `procesos`
+    y `acotar=False` son para correrla fuera de un request.
+    """
+    inicio = time.perf_counter()
+    hoy = date.today()
+    pedidos = parametros or {}
+    parametros = {**PARAMETROS_DEFECTO, **pedidos}
+
+    cohortes, campos = cohortes_actuales(usuario, hoy)
+    maximo = escenarios_permitidos(parametros['meses'], cohortes['n_campos'], acotar)
+    if pedidos.get('escenarios', 0) > maximo:
+        raise ValueError(
+            f"Con {len(campos)} campos y {parametros['meses']} meses se pueden simular hasta {maximo} escenarios"
+        )
+    parametros['escenarios'] = min(parametros['escenarios'], maximo)
+
+    # Los machos se venden con la categoría que tienen al cumplir la edad de venta
+    categoria_venta = ciclo_para_edad('M', int(parametros['edad_venta_meses'] * DIAS_POR_MES))
+    curva = cargar_curvas(usuario, hasta=hoy).get(categoria_venta)
+    precio = curva.precio_en(hoy) if curva else None
+    parametros_simulacion = {**parametros, 'precio_venta': float(precio or 0)}
+
+    escenarios = parametros['escenarios']
+    cabezas, ingresos = simular(cohortes, parametros_simulacion, escenarios, semilla, procesos)
+
+    resultado_campos = []
+    for posicion, campo in enumerate(campos + [{'id': None, 'nombre': 'Sin campo', 'hectareas': None}]):
+        serie = cabezas[:, :, posicion]
+        if campo['id'] is None and not serie.any():
+            continue
+        hectareas = float(campo['hectareas']) if campo['hectareas'] else None
+        resultado_campos.append({
+            'id': campo['id'],
+            'nombre': campo['nombre'],
+            'hectareas': hectareas,
+            'cabezas': _bandas(serie),
+            'densidad': _bandas(serie / hectareas, 2) if hectareas else None,
+        })
+
+    return {
+        'meses': _etiquetas_meses(hoy, parametros['meses']),
+        'escenarios': escenarios,
+        'escenarios_maximos': maximo,
+        'parametros': parametros,
+        'percentiles': list(PERCENTILES),
+        'categoria_venta': categoria_venta,
+        'precio_venta': float(precio) if precio is not None else None,
+        'campos': resultado_campos,
+        'total': {
+            'cabezas': _bandas(cabezas.sum(axis=2)),
+            'ingresos': _bandas(ingresos, 2),
+            'ingresos_acumulados': _bandas(ingresos.cumsum(axis=0), 2),
+        },
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
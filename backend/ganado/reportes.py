@@ -0,0 +1,279 @@
+"""
+Reportes mensuales en XLSX/PDF armados por un worker y guardados en disco.
+
+El pedido (SolicitudReporte) queda en una cola en la base 'default'; el
+worker `manage.py procesar_reportes` lo toma, arma las tablas con las
+mismas consultas agrupadas de la analítica y escribe el archivo en
+settings.REPORTES['DIRECTORIO'].
+
+Cada archivo está ligado a (usuario, reporte, período, versión de
+datos). La versión sale del registro de cambios de sincronización (el
+id del último Cambio del usuario, persistente entre reinicios a
+diferencia de la versión en cache) más una huella de las filas de
+vacunas o de precios de mercado que lee el reporte, que no se registran
+ahí. Mientras la versión no
+cambie, pedir el mismo reporte devuelve el archivo ya generado sin
+volver a consultar los datos.
+"""
+import calendar
+import hashlib
+import os
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .analytics import calcular_resumen_ventas
+from .documentos import escribir_pdf, escribir_xlsx
+from .models import Campo, PrecioMercado, SolicitudReporte, Vacuna, Vacunacion, Venta
+from .routers import usar_tenant
+from .sanidad import calcular_pendientes
+from .sync import token_actual
+from .valoracion import cargar_curvas, lotes_en_rodeo
+
+TITULOS = dict(SolicitudReporte.REPORTES)
+TIPOS_CONTENIDO = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+ESTADOS_VIGENTES = ('pendiente', 'procesando', 'listo')
+
+
+def periodo_fechas(periodo):
+    """
+    Primer y último día del mes 'YYYY-MM'; el mes en curso llega hasta hoy.
+    Lanza ValueError si el período es inválido o futuro.
+    """
+    try:
+        anio, mes = (int(parte) for parte in periodo.split('-'))
+        desde = date(anio, mes, 1)
+    except (AttributeError, ValueError) as e:
+        raise ValueError("periodo debe tener formato YYYY-MM") from e
+    hoy = date.today()
+    if desde > hoy:
+        raise ValueError("periodo no puede ser un mes futuro")
+    return desde, min(hoy, date(anio, mes, calendar.monthrange(anio, mes)[1]))
+
+
+def version_reporte(usuario, reporte, periodo):
+    """Huella de los datos que usa el reporte; cambia con cualquier escritura que lo afecte"""
+    _, hasta = periodo_fechas(periodo)
+    partes = [reporte, hasta.isoformat(), token_actual(usuario.id)]
+    if reporte == 'sanidad':
+        partes.append(list(Vacuna.objects.filter(usuario=usuario).order_by('id').values_list(
+            'id', 'nombre', 'intervalo_refuerzo_dias', 'edad_minima_dias', 'edad_maxima_dias',
+        )))
+    elif reporte in ('inventario', 'ventas'):
+        # Las filas y no un agregado: cambiar la categoría o una fecha vieja también cuenta
+        partes.append(list(PrecioMercado.objects.filter(usuario=usuario, fecha__lte=hasta).order_by('id').values_list(
+            'id', 'fecha', 'categoria', 'precio',
+        )))
+    return hashlib.sha1(repr(partes).encode()).hexdigest()[:16]
+
+
+def ruta_archivo(solicitud):
+    return Path(settings.REPORTES['DIRECTORIO']) / str(solicitud.usuario_id) / (
+        f'{solicitud.reporte}-{solicitud.periodo}-{solicitud.version}.{solicitud.formato}'
+    )
+
+
+def nombre_descarga(solicitud):
+    return f'{solicitud.reporte}-{solicitud.periodo}.{solicitud.formato}'
+
+
+def _inventario(usuario, desde, hasta):
+    fecha = hasta if hasta < date.today() else None
+    lotes = lotes_en_rodeo(usuario, fecha)
+    curvas = cargar_curvas(usuario, hasta=hasta)
+    hectareas = dict(Campo.objects.filter(usuario=usuario).values_list('id', 'hectareas'))
+
+    por_campo = {}
+    filas_lotes = []
+    for lote in sorted(lotes, key=lambda lote: (lote['campo_nombre'] or '', lote['lote_id'])):
+        curva = curvas.get((lote['categoria'] or '').lower())
+        precio = curva.precio_en(hasta) if curva else None
+        valor = float(precio) * lote['cantidad'] if precio is not None else None
+        campo = por_campo.setdefault(lote['campo_id'], {
+            'nombre': lote['campo_nombre'] or 'Sin campo', 'lotes': 0, 'animales': 0, 'valor': 0.0,
+        })
+        campo['lotes'] += 1
+        campo['animales'] += lote['cantidad']
+        campo['valor'] += valor or 0
+        filas_lotes.append([
+            lote['lote_id'], lote['campo_nombre'] or 'Sin campo', lote['categoria'] or '', lote['cantidad'],
+            float(precio) if precio is not None else None, round(valor, 2) if valor is not None else None,
+        ])
+
+    filas_campos = []
+    for campo_id, campo in sorted(por_campo.items(), key=lambda item: item[1]['nombre']):
+        superficie = hectareas.get(campo_id)
+        filas_campos.append([
+            campo['nombre'], float(superficie) if superficie else None, campo['lotes'], campo['animales'],
+            round(campo['animales'] / float(superficie), 2) if superficie else None, round(campo['valor'], 2),
+        ])
+    return [
+        ('Por campo', ['Campo', 'Hectáreas', 'Lotes', 'Animales', 'Animales/ha', 'Valor'], filas_campos),
+        ('Lotes', ['Lote', 'Campo', 'Categoría', 'Animales', 'Precio', 'Valor'], filas_lotes),
+    ]
+
+
+def _ventas(usuario, desde, hasta):
+    resumen = calcular_resumen_ventas(usuario, desde, hasta)
+    totales = resumen['totales']
+    detalle = Venta.objects.filter(
+        animal__usuario=usuario, fecha__gte=desde, fecha__lte=hasta,
+    ).order_by('fecha', 'id').values_list(
+        'fecha', 'animal__lote_id', 'animal__raza', 'animal__cantidad', 'comprador', 'destino', 'precio',
+    )
+    encabezados = ['Ventas', 'Animales', 'Ingresos', 'Ingreso por animal']
+
+    def grupo(clave, filas):
+        return [[fila[clave], fila['ventas'], fila['animales'], fila['ingresos'], fila['ingreso_por_animal']]
+                for fila in filas]
+
+    return [
+        ('Resumen', encabezados, [[
+            totales['ventas'], totales['animales'], totales['ingresos'], totales['ingreso_por_animal'],
+        ]]),
+        ('Por comprador', ['Comprador'] + encabezados, grupo('comprador', resumen['por_comprador'])),
+        ('Por campo', ['Campo'] + encabezados, grupo('campo', resumen['por_campo'])),
+        ('Por raza', ['Raza'] + encabezados, grupo('raza', resumen['por_raza'])),
+        ('Frente al mercado', ['Categoría', 'Animales', 'Ingresos', 'Valor de mercado', 'Diferencia %'], [
+            [fila['categoria'], fila['animales'], fila['ingresos'], fila['valor_mercado'],
+             fila['diferencia_porcentual']]
+            for fila in resumen['comparacion_mercado']
+        ]),
+        ('Detalle', ['Fecha', 'Lote', 'Raza', 'Animales', 'Comprador', 'Destino', 'Precio'], [
+            list(fila) for fila in detalle
+        ]),
+    ]
+
+
+def _sanidad(usuario, desde, hasta):
+    pendientes = calcular_pendientes(usuario, fecha=hasta)
+    aplicadas = Vacunacion.objects.filter(
+        animal__usuario=usuario, fecha__gte=desde, fecha__lte=hasta,
+    ).values('vacuna__nombre').annotate(
+        aplicaciones=Count('id'), lotes=Count('animal', distinct=True), cabezas=Sum('animal__cantidad'),
+    ).order_by('vacuna__nombre')
+
+    filas_campos = []
+    filas_vencidas = []
+    for campo in pendientes['campos']:
+        filas_campos.append([
+            campo['campo'], len(campo['vencidas']), campo['cabezas_vencidas'], len(campo['proximas']),
+        ])
+        filas_vencidas.extend(
+            [campo['campo'], dosis['lote']['lote_id'], dosis['vacuna']['nombre'], dosis['fecha_objetivo'],
+             -dosis['dias'], dosis['lote']['cantidad']]
+            for dosis in campo['vencidas']
+        )
+    return [
+        ('Aplicadas en el período', ['Vacuna', 'Aplicaciones', 'Lotes', 'Cabezas'], [
+            [fila['vacuna__nombre'], fila['aplicaciones'], fila['lotes'], fila['cabezas']] for fila in aplicadas
+        ]),
+        ('Pendientes por campo', ['Campo', 'Dosis vencidas', 'Cabezas con dosis vencidas', 'Próximas 30 días'],
+         filas_campos),
+        ('Dosis vencidas', ['Campo', 'Lote', 'Vacuna', 'Fecha objetivo', 'Días de atraso', 'Cabezas'],
+         filas_vencidas),
+    ]
+
+
+ARMADORES = {'inventario': _inventario, 'ventas': _ventas, 'sanidad': _sanidad}
+
+
+def armar_reporte(usuario, reporte, periodo, formato, destino):
+    """Arma el reporte del período y lo escribe en `destino` (ruta o archivo binario)"""
+    desde, hasta = periodo_fechas(periodo)
+    hojas = ARMADORES[reporte](usuario, desde, hasta)
+    if formato == 'xlsx':
+        escribir_xlsx(hojas, destino)
+    else:
+        titulo = f'{TITULOS[reporte]} - {periodo} (al {hasta.isoformat()}) - {usuario.get_username()}'
+        escribir_pdf(titulo, hojas, destino)
+
+
+def solicitar_reporte(usuario, reporte, periodo, formato):
+    """
+    Devuelve el pedido vigente para la versión actual de los datos: el
+    ya generado si su archivo sigue en disco, el que está en cola, o uno
+    nuevo en estado pendiente.
+    """
+    version = version_reporte(usuario, reporte, periodo)
+    clave = {'usuario': usuario, 'reporte': reporte, 'periodo': periodo, 'formato': formato, 'version': version}
+    for solicitud in SolicitudReporte.objects.filter(estado__in=ESTADOS_VIGENTES, **clave).order_by('-id'):
+        if solicitud.estado != 'listo' or ruta_archivo(solicitud).exists():
+            return solicitud
+    return SolicitudReporte.objects.create(**clave)
+
+
+def _tomar_siguiente():
+    """
+    Marca como 'procesando' el próximo pedido pendiente (o abandonado) y lo
+    devuelve. El UPDATE condicional evita que dos workers tomen el mismo.
+    """
+    vencimiento = timezone.now() - timedelta(seconds=settings.REPORTES['PROCESANDO_SEGUNDOS'])
+    disponibles = SolicitudReporte.objects.filter(
+        Q(estado='pendiente') | Q(estado='procesando', iniciado__lt=vencimiento)
+    )
+    for pk in disponibles.order_by('id').values_list('pk', flat=True)[:10]:
+        tomado = disponibles.filter(pk=pk).update(estado='procesando', iniciado=timezone.now())
+        if tomado:
+            return SolicitudReporte.objects.select_related('usuario').get(pk=pk)
+    return None
+
+
+def _borrar_versiones_anteriores(solicitud):
+    carpeta = ruta_archivo(solicitud).parent
+    prefijo = f'{solicitud.reporte}-{solicitud.periodo}-'
+    for archivo in carpeta.glob(f'{prefijo}*.{solicitud.formato}'):
+        if archivo.name != ruta_archivo(solicitud).name:
+            archivo.unlink(missing_ok=True)
+
+
+def procesar(solicitud):
+    """Arma el archivo del pedido con los datos actuales y lo marca listo (o con error)"""
+    try:
+        with usar_tenant(solicitud.usuario_id):
+            # Los datos pueden haber cambiado desde el pedido: el archivo
+            # queda con la versión con la que se armó
+            solicitud.version = version_reporte(solicitud.usuario, solicitud.reporte, solicitud.periodo)
+            destino = ruta_archivo(solicitud)
+            if not destino.exists():
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                # Escribir aparte y renombrar: nunca se sirve un archivo a medias
+                descriptor, temporal = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+                try:
+                    with os.fdopen(descriptor, 'wb') as archivo:
+                        armar_reporte(
+                            solicitud.usuario, solicitud.reporte, solicitud.periodo, solicitud.formato, archivo
+                        )
+                    os.replace(temporal, destino)
+                except BaseException:
+                    os.unlink(temporal)
+                    raise
+            _borrar_versiones_anteriores(solicitud)
+        solicitud.estado = 'listo'
+        solicitud.archivo = str(destino)
+        solicitud.error = ''
+    except Exception as e:
+        solicitud.estado = 'error'
+        solicitud.error = f'{type(e).__name__}: {e}'
+    solicitud.terminado = timezone.now()
+    solicitud.save(update_fields=['estado', 'version', 'archivo', 'error', 'terminado'])
+    return solicitud
+
+
+def procesar_pendientes(limite=None):
+    """Procesa pedidos de la cola hasta vaciarla (o hasta `limite`); devuelve cuántos procesó"""
+    procesados = 0
+    while limite is None or procesados < limite:
+        solicitud = _tomar_siguiente()
+        if solicitud is None:
+            break
+        procesar(solicitud)
+        procesados += 1
+    return procesados
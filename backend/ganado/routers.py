@@ -0,0 +1,229 @@
+"""
+Ruteo de bases de datos por tenant (usuario) y réplicas de lectura.
+
+Cada usuario se asigna a un shard mediante la tabla ShardUsuario, que
+vive siempre en 'default' junto con las tablas de autenticación. Las
+consultas de los modelos de ganado se envían al shard del usuario del
+request en curso, que las vistas fijan con TenantMixin.
+
+Con réplicas configuradas, los requests de solo lectura leen de una
+réplica de la base primaria del tenant. Después de una escritura el
+usuario lee de la primaria durante una ventana configurable, para no
+ver datos desactualizados por el retraso de replicación.
+
+La asignación se cachea SHARD_CACHE_TIMEOUT segundos en la cache de cada
+proceso, que los demás workers no ven invalidar. Por eso las escrituras
+la leen siempre de la tabla: un request de escritura la lee una vez al
+empezar y queda fijado a ese shard, y fuera de un request cada
+escritura la vuelve a leer. Mientras un usuario se migra su asignación
+no se cachea, así que al cambiarla todos la leen enseguida.
+
+Los procesos que recorren todos los tenants (comandos de management)
+fijan el usuario con usar_tenant() o procesan cada base con
+usuarios_en_base().
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+
+# Modelos globales: siempre en 'default' (no pertenecen a un tenant)
+MODELOS_GLOBALES = {'shardusuario', 'ejecucionproceso', 'solicitudreporte'}
+SHARD_CACHE_TIMEOUT = 60
+
+COOKIE_PRIMARIA = 'ganado_primaria'
+
+usuario_actual = ContextVar('usuario_actual', default=None)
+# (usuario_id, alias) leído de la tabla al empezar un request de escritura
+shard_fijado = ContextVar('shard_fijado', default=None)
+leer_de_replica = ContextVar('leer_de_replica', default=False)
+
+
+class TenantEnMigracion(APIException):
+    status_code = 503
+    default_detail = "Los datos se están migrando de servidor, reintente en unos minutos"
+    default_code = 'tenant_en_migracion'
+
+
+def _clave_shard(usuario_id):
+    return f'ganado:shard:{usuario_id}'
+
+
+def estado_shard(usuario_id, fresco=False):
+    """
+    Alias asignado al usuario ('default' si no tiene shard) y si está en
+    migración. Con `fresco` lo lee de la tabla aunque esté en la cache.
+    """
+    from .models import ShardUsuario
+
+    estado = None if fresco else cache.get(_clave_shard(usuario_id))
+    if estado is None:
+        fila = ShardUsuario.objects.using(DEFAULT_DB_ALIAS).filter(
+            usuario_id=usuario_id
+        ).values('alias', 'en_migracion').first()
+        estado = fila or {'alias': DEFAULT_DB_ALIAS, 'en_migracion': False}
+        if not estado['en_migracion']:
+            cache.set(_clave_shard(usuario_id), estado, SHARD_CACHE_TIMEOUT)
+    return estado
+
+
+def alias_para_usuario(usuario_id, fresco=False):
+    """Alias de base de datos del usuario"""
+    if usuario_id is None:
+        return DEFAULT_DB_ALIAS
+    fijado = shard_fijado.get()
+    if fijado is not None and fijado[0] == usuario_id:
+        return fijado[1]
+    return estado_shard(usuario_id, fresco)['alias']
+
+
+def usuarios_en_base(alias):
+    """
+    Filtro por usuario_id de los tenants cuyos datos viven en `alias`, sin
+    los que se están migrando (sus filas pueden estar en las dos bases)
+    """
+    from .models import ShardUsuario
+
+    asignaciones = ShardUsuario.objects.using(DEFAULT_DB_ALIAS)
+    if alias == DEFAULT_DB_ALIAS:
+        otros = asignaciones.exclude(alias=DEFAULT_DB_ALIAS, en_migracion=False)
+        return ~Q(usuario_id__in=list(otros.values_list('usuario_id', flat=True)))
+    propios = asignaciones.filter(alias=alias, en_migracion=False)
+    return Q(usuario_id__in=list(propios.values_list('usuario_id', flat=True)))
+
+
+def invalidar_shard(usuario_id):
+    cache.delete(_clave_shard(usuario_id))
+
+
+def _clave_primaria(usuario_id):
+    return f'ganado:primaria:{usuario_id}'
+
+
+def marcar_escritura(usuario_id, response):
+    """Fija las lecturas del usuario a la primaria durante la ventana de stickiness"""
+    segundos = settings.REPLICA_STICKY_SEGUNDOS
+    cache.set(_clave_primaria(usuario_id), True, segundos)
+    response.set_cookie(COOKIE_PRIMARIA, '1', max_age=segundos, httponly=True, samesite='Lax')
+
+
+def lee_de_primaria(request):
+    """Indica si el usuario escribió hace poco y debe leer de la primaria"""
+    if request.COOKIES.get(COOKIE_PRIMARIA):
+        return True
+    return bool(cache.get(_clave_primaria(request.user.id)))
+
+
+@contextmanager
+def usar_tenant(usuario_id):
+    """Rutea las consultas de ganado al shard del usuario dentro del bloque"""
+    token = usuario_actual.set(usuario_id)
+    try:
+        yield
+    finally:
+        usuario_actual.reset(token)
+
+
+class TenantMixin:
+    """
+    Fija el usuario autenticado como tenant durante el request.
+    Mientras sus datos se mueven de shard, las escrituras responden 503.
+    Con réplicas, decide si el request lee de una réplica o de la primaria.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not request.user.is_authenticated:
+            return
+        if settings.DATABASE_SHARDS and request.method not in SAFE_METHODS:
+            # Sin cache: otro worker puede haber empezado o terminado una migración
+            estado = estado_shard(request.user.id, fresco=True)
+            if estado['en_migracion']:
+                raise TenantEnMigracion()
+            self._shard_token = shard_fijado.set((request.user.id, estado['alias']))
+        self._tenant_token = usuario_actual.set(request.user.id)
+        if (settings.DATABASE_REPLICAS and request.method in SAFE_METHODS
+                and not lee_de_primaria(request)):
+            self._replica_token = leer_de_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_shard_token', None)
+        if token is not None:
+            shard_fijado.reset(token)
+            self._shard_token = None
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            leer_de_replica.reset(token)
+            self._replica_token = None
+        token = getattr(self, '_tenant_token', None)
+        if token is not None:
+            usuario_actual.reset(token)
+            self._tenant_token = None
+            if (settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS
+                    and response.status_code < 400):
+                marcar_escritura(request.user.id, response)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def es_modelo_tenant(model):
+    return model._meta.app_label == 'ganado' and model._meta.model_name not in MODELOS_GLOBALES
+
+
+class ShardRouter:
+    """Envía los modelos de ganado al shard del tenant en curso"""
+
+    def _alias(self, model, instance=None, fresco=False):
+        if not es_modelo_tenant(model):
+            return None
+        if instance is not None and instance._state.db is not None:
+            return instance._state.db
+        usuario_id = usuario_actual.get()
+        if usuario_id is None:
+            return None
+        return alias_para_usuario(usuario_id, fresco)
+
+    def db_for_read(self, model, **hints):
+        return self._alias(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self._alias(model, hints.get('instance'), fresco=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Los usuarios se replican en cada shard, así que las FK a User son válidas
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'ganado' and model_name in MODELOS_GLOBALES:
+            return db == DEFAULT_DB_ALIAS
+        if db == DEFAULT_DB_ALIAS or db in settings.DATABASE_SHARDS:
+            return True
+        return None
+
+
+class ReplicaRouter(ShardRouter):
+    """
+    ShardRouter que además envía las lecturas de los requests de solo
+    lectura a una réplica de la base primaria del tenant.
+    """
+
+    def db_for_read(self, model, **hints):
+        primaria = super().db_for_read(model, **hints)
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db is not None:
+            return primaria
+        if not es_modelo_tenant(model) or not leer_de_replica.get():
+            return primaria
+        replicas = settings.DATABASE_REPLICAS.get(primaria or DEFAULT_DB_ALIAS)
+        return random.choice(replicas) if replicas else primaria
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación, no por migraciones
+        if any(db in replicas for replicas in settings.DATABASE_REPLICAS.values()):
+            return False
+        return super().allow_migrate(db, app_label, model_name, **hints)
@@ -0,0 +1,107 @@
+"""
+Calendario sanitario: dosis vencidas y próximas de todos los lotes.
+
+Se resuelve con tres consultas fijas (lotes activos con su campo, vacunas
+del usuario y última aplicación por lote y vacuna) y el cruce se hace en
+memoria, sin consultas por lote.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Count, Max
+
+from .consultas import campo_en_fecha, estado_en_fecha
+from .models import Vacuna, Vacunacion, Vacuno
+
+ESTADOS_SIN_CALENDARIO = ('vendido', 'muerto')
+HORIZONTE_DIAS = 30
+MAX_HORIZONTE_DIAS = 3650
+
+
+def _fecha_objetivo(lote, vacuna, aplicacion, hoy):
+    """
+    Próxima fecha en la que corresponde aplicar la vacuna al lote,
+    o None si no corresponde (dosis única aplicada o fuera de la ventana de edad).
+    """
+    nacimiento = lote['fecha_nacimiento']
+
+    if aplicacion is None:
+        if nacimiento and vacuna.edad_minima_dias is not None:
+            objetivo = nacimiento + timedelta(days=vacuna.edad_minima_dias)
+        else:
+            objetivo = nacimiento or lote['fecha_ingreso']
+    elif vacuna.intervalo_refuerzo_dias:
+        objetivo = aplicacion['ultima'] + timedelta(days=vacuna.intervalo_refuerzo_dias)
+    else:
+        return None
+
+    if nacimiento and vacuna.edad_maxima_dias is not None:
+        fin_ventana = nacimiento + timedelta(days=vacuna.edad_maxima_dias)
+        if objetivo > fin_ventana or hoy > fin_ventana:
+            return None
+    return objetivo
+
+
+def calcular_pendientes(usuario, fecha=None, horizonte_dias=HORIZONTE_DIAS):
+    """Dosis vencidas y próximas (dentro del horizonte) agrupadas por campo"""
+    hoy = fecha or date.today()
+    limite = hoy + timedelta(days=horizonte_dias)
+
+    lotes = [
+        lote for lote in Vacuno.objects.filter(usuario=usuario).annotate(
+            estado_general=estado_en_fecha('estado_general'),
+            campo_id=campo_en_fecha('campo_id'),
+            campo_nombre=campo_en_fecha('campo__nombre'),
+        ).values(
+            'id', 'lote_id', 'cantidad', 'fecha_nacimiento', 'fecha_ingreso',
+            'estado_general', 'campo_id', 'campo_nombre',
+        )
+        if lote['estado_general'] not in ESTADOS_SIN_CALENDARIO
+    ]
+    vacunas = list(Vacuna.objects.filter(usuario=usuario).order_by('nombre'))
+    aplicaciones = {
+        (fila['animal_id'], fila['vacuna_id']): fila
+        for fila in Vacunacion.objects.filter(animal__usuario=usuario).values(
+            'animal_id', 'vacuna_id'
+        ).annotate(ultima=Max('fecha'), dosis=Count('id'))
+    }
+
+    campos = {}
+    for lote in lotes:
+        for vacuna in vacunas:
+            aplicacion = aplicaciones.get((lote['id'], vacuna.id))
+            objetivo = _fecha_objetivo(lote, vacuna, aplicacion, hoy)
+            if objetivo is None or objetivo > limite:
+                continue
+
+            grupo = campos.setdefault(lote['campo_id'], {
+                'campo_id': lote['campo_id'],
+                'campo': lote['campo_nombre'] or 'Sin campo',
+                'vencidas': [],
+                'proximas': [],
+                'cabezas_vencidas': 0,
+            })
+            dosis = {
+                'lote': {'id': lote['id'], 'lote_id': lote['lote_id'], 'cantidad': lote['cantidad']},
+                'vacuna': {'id': vacuna.id, 'nombre': vacuna.nombre},
+                'motivo': 'refuerzo' if aplicacion else 'primera_dosis',
+                'dosis_aplicadas': aplicacion['dosis'] if aplicacion else 0,
+                'ultima_aplicacion': aplicacion['ultima'].isoformat() if aplicacion else None,
+                'fecha_objetivo': objetivo.isoformat(),
+                'dias': (objetivo - hoy).days,
+            }
+            if objetivo <= hoy:
+                grupo['vencidas'].append(dosis)
+            else:
+                grupo['proximas'].append(dosis)
+
+    for grupo in campos.values():
+        lotes_vencidos = {d['lote']['id']: d['lote']['cantidad'] for d in grupo['vencidas']}
+        grupo['cabezas_vencidas'] = sum(lotes_vencidos.values())
+        grupo['vencidas'].sort(key=lambda d: d['fecha_objetivo'])
+        grupo['proximas'].sort(key=lambda d: d['fecha_objetivo'])
+
+    return {
+        'fecha': hoy.isoformat(),
+        'horizonte_dias': horizonte_dias,
+        'campos': sorted(campos.values(), key=lambda g: g['campo']),
+    }
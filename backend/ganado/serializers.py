@@ -1,21 +1,122 @@
+from datetime import date
+from decimal import Decimal
+
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.core.validators import validate_email
-from django.core.exceptions import ValidationError
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
+from .consultas import (
+    prefetch_estadia_abierta,
+    prefetch_estado_actual,
+    prefetch_vacunos_actuales,
+)
+from .geo import validar_geometria
+from .importacion import normalizar_categoria
 from .models import (
+    Auditoria,
     Campo,
     EstadiaAnimal,
     EstadoVacuno,
+    Pesada,
+    PrecioMercado,
+    SolicitudReporte,
     Transferencia,
     Vacuna,
     Vacunacion,
     Vacuno,
     Venta,
+    ciclo_para_edad,
 )
+from .movimientos import MAX_TRANSFERENCIAS_MASIVAS
+from .reportes import periodo_fechas
+from .sync import MAX_OPERACIONES_SYNC, MODELOS_SYNC
+
+
+def _lista_param(valor):
+    return {nombre.strip() for nombre in (valor or '').split(',') if nombre.strip()}
+
+
+class CamposDinamicosMixin:
+    """
+    Recorta los campos del serializer con ?fields=a,b y/o ?omit=c en los GET.
+
+    Meta.consultas declara, para los campos calculados, las columnas
+    (`only`) y los prefetches que necesitan. optimizar_queryset() arma la
+    consulta con lo que piden los campos visibles: los prefetches de los
+    campos omitidos no se ejecutan y el SELECT trae solo esas columnas.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Solo el serializer raíz del request: los anidados se declaran sin contexto
+        request = self._context.get('request')
+        visibles = self.campos_visibles(request) if request is not None else None
+        if visibles is not None:
+            for nombre in set(self.fields) - visibles:
+                self.fields.pop(nombre)
 
+    @classmethod
+    def campos_visibles(cls, request):
+        """Nombres de los campos pedidos, o None si no hay que recortar"""
+        if request.method not in SAFE_METHODS:
+            return None
+        pedidos = _lista_param(request.query_params.get('fields'))
+        omitidos = _lista_param(request.query_params.get('omit'))
+        if not pedidos and not omitidos:
+            return None
 
-class CampoSerializer(serializers.ModelSerializer):
+        disponibles = set(cls().fields)
+        desconocidos = (pedidos | omitidos) - disponibles
+        if desconocidos:
+            raise serializers.ValidationError(
+                {'fields': [f"Campos desconocidos: {', '.join(sorted(desconocidos))}"]}
+            )
+        return (pedidos or disponibles) - omitidos
+
+    @classmethod
+    def optimizar_queryset(cls, queryset, request):
+        """Aplica select_related, prefetches y only() según los campos visibles"""
+        if request.method not in SAFE_METHODS:
+            return queryset
+
+        visibles = cls.campos_visibles(request)
+        consultas = getattr(cls.Meta, 'consultas', {})
+        opts = queryset.model._meta
+        columnas = {'pk'}
+        relacionados = set()
+        prefetches = {}
+        for nombre, campo in cls().fields.items():
+            if campo.write_only or (visibles is not None and nombre not in visibles):
+                continue
+            if nombre in consultas:
+                columnas.update(consultas[nombre].get('only', []))
+                prefetches.update({fabrica: None for fabrica in consultas[nombre].get('prefetch', [])})
+                continue
+
+            partes = campo.source.split('.')
+            try:
+                opts.get_field(partes[0])
+            except FieldDoesNotExist:
+                # Propiedad o método sin declarar en Meta.consultas: no se puede acotar
+                columnas = None
+                continue
+            if columnas is not None:
+                columnas.update([partes[0], '__'.join(partes)])
+            if len(partes) > 1:
+                relacionados.add('__'.join(partes[:-1]))
+
+        if relacionados:
+            queryset = queryset.select_related(*relacionados)
+        if prefetches:
+            queryset = queryset.prefetch_related(*[fabrica() for fabrica in prefetches])
+        if columnas is not None:
+            queryset = queryset.only(*columnas)
+        return queryset
+
+
+class CampoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     capacidad_actual = serializers.ReadOnlyField()
     vacunos_actuales = serializers.SerializerMethodField()
     total_animales = serializers.SerializerMethodField()
@@ -24,9 +125,16 @@ class CampoSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Campo
-        fields = ['id', 'nombre', 'ubicacion', 'hectareas', 'descripcion', 
+        fields = ['id', 'nombre', 'ubicacion', 'hectareas', 'descripcion', 'geometria',
                  'capacidad_actual', 'vacunos_actuales', 'total_animales', 
                  'animales_por_hectarea', 'estado_ocupacion']
+        consultas = {
+            'capacidad_actual': {'prefetch': [prefetch_vacunos_actuales]},
+            'vacunos_actuales': {'prefetch': [prefetch_vacunos_actuales]},
+            'total_animales': {'prefetch': [prefetch_vacunos_actuales]},
+            'animales_por_hectarea': {'only': ['hectareas'], 'prefetch': [prefetch_vacunos_actuales]},
+            'estado_ocupacion': {'only': ['hectareas'], 'prefetch': [prefetch_vacunos_actuales]},
+        }
     
     def get_vacunos_actuales(self, obj):
         vacunos = obj.vacunos_actuales()
@@ -42,21 +150,44 @@ class CampoSerializer(serializers.ModelSerializer):
     def get_total_animales(self, obj):
         return sum([v.cantidad for v in obj.vacunos_actuales()])
 
-class EstadoVacunoSerializer(serializers.ModelSerializer):
+    def validate_geometria(self, value):
+        # Con geometría, Campo.save() calcula las hectáreas del polígono
+        if value is None:
+            return value
+        try:
+            return validar_geometria(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e)) from e
+
+class EstadoVacunoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = EstadoVacuno
         fields = ['id', 'vacuno', 'fecha', 'ciclo_productivo', 'estado_salud', 
                  'estado_general', 'observaciones']
 
-class EstadiaAnimalSerializer(serializers.ModelSerializer):
+class EstadiaAnimalSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     campo_nombre = serializers.CharField(source='campo.nombre', read_only=True)
     
     class Meta:
         model = EstadiaAnimal
-        fields = ['id', 'animal', 'campo', 'campo_nombre', 'fecha_entrada', 
+        fields = ['id', 'animal', 'campo', 'campo_nombre', 'fecha_entrada',
                  'fecha_salida', 'observaciones']
 
-class VacunoSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        # La restricción estadia_abierta_unica es condicional y DRF no genera su validador
+        animal = attrs.get('animal', getattr(self.instance, 'animal', None))
+        fecha_salida = attrs.get('fecha_salida', getattr(self.instance, 'fecha_salida', None))
+        if animal is not None and fecha_salida is None:
+            otras = EstadiaAnimal.objects.filter(animal=animal, fecha_salida__isnull=True)
+            if self.instance is not None:
+                otras = otras.exclude(pk=self.instance.pk)
+            if otras.exists():
+                raise serializers.ValidationError(
+                    {'fecha_salida': ["El lote ya tiene una estadía abierta; ciérrela antes de abrir otra"]}
+                )
+        return attrs
+
+class VacunoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     estado_actual_obj = EstadoVacunoSerializer(source='estado_actual', read_only=True)
     campo_actual_obj = serializers.SerializerMethodField()
     edad_aproximada = serializers.ReadOnlyField()
@@ -68,6 +199,12 @@ class VacunoSerializer(serializers.ModelSerializer):
         fields = ['id', 'lote_id', 'raza', 'cantidad', 'sexo', 'fecha_nacimiento', 
                  'fecha_ingreso', 'observaciones', 'estado_actual_obj', 
                  'campo_actual_obj', 'edad_aproximada', 'es_vendido', 'campo_inicial']
+        consultas = {
+            'estado_actual_obj': {'prefetch': [prefetch_estado_actual]},
+            'campo_actual_obj': {'prefetch': [prefetch_estadia_abierta]},
+            'edad_aproximada': {'only': ['fecha_nacimiento']},
+            'es_vendido': {'prefetch': [prefetch_estado_actual]},
+        }
     
     def get_campo_actual_obj(self, obj):
         campo = obj.campo_actual()
@@ -98,7 +235,7 @@ class VacunoSerializer(serializers.ModelSerializer):
         # Crear estado inicial del vacuno
         EstadoVacuno.objects.create(
             vacuno=vacuno,
-            ciclo_productivo='ternero',  # Estado inicial por defecto
+            ciclo_productivo=ciclo_para_edad(vacuno.sexo, vacuno.edad_aproximada()),
             estado_salud='sano',
             estado_general='activo'
         )
@@ -110,12 +247,13 @@ class VacunoSerializer(serializers.ModelSerializer):
         validated_data.pop('campo_inicial', None)
         return super().update(instance, validated_data)
 
-class VacunaSerializer(serializers.ModelSerializer):
+class VacunaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Vacuna
-        fields = ['id', 'nombre', 'laboratorio', 'descripcion']
+        fields = ['id', 'nombre', 'laboratorio', 'descripcion', 'intervalo_refuerzo_dias',
+                 'edad_minima_dias', 'edad_maxima_dias']
 
-class VacunacionSerializer(serializers.ModelSerializer):
+class VacunacionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     animal_lote_id = serializers.CharField(source='animal.lote_id', read_only=True)
     vacuna_nombre = serializers.CharField(source='vacuna.nombre', read_only=True)
     
@@ -124,7 +262,7 @@ class VacunacionSerializer(serializers.ModelSerializer):
         fields = ['id', 'animal', 'animal_lote_id', 'vacuna', 
                  'vacuna_nombre', 'fecha', 'dosis', 'observaciones']
 
-class TransferenciaSerializer(serializers.ModelSerializer):
+class TransferenciaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     animal_lote_id = serializers.CharField(source='animal.lote_id', read_only=True)
     campo_origen_nombre = serializers.CharField(source='campo_origen.nombre', read_only=True)
     campo_destino_nombre = serializers.CharField(source='campo_destino.nombre', read_only=True)
@@ -135,7 +273,56 @@ class TransferenciaSerializer(serializers.ModelSerializer):
                  'campo_origen_nombre', 'campo_destino', 'campo_destino_nombre', 
                  'fecha', 'observaciones']
 
-class VentaSerializer(serializers.ModelSerializer):
+class ItemTransferenciaSerializer(serializers.Serializer):
+    animal = serializers.IntegerField()
+    campo_origen = serializers.IntegerField()
+    campo_destino = serializers.IntegerField()
+
+    def validate(self, attrs):
+        if attrs['campo_origen'] == attrs['campo_destino']:
+            raise serializers.ValidationError("El campo de destino debe ser distinto del de origen")
+        return attrs
+
+
+class TransferenciaMasivaSerializer(serializers.Serializer):
+    """Transferencias de varios lotes con la misma fecha (ver TransferenciaViewSet.masiva)"""
+    fecha = serializers.DateField(default=date.today)
+    observaciones = serializers.CharField(required=False, allow_blank=True, default='')
+    transferencias = ItemTransferenciaSerializer(
+        many=True, allow_empty=False, max_length=MAX_TRANSFERENCIAS_MASIVAS
+    )
+
+    def validate_transferencias(self, items):
+        # Lotes y campos del usuario en dos consultas, en vez de una por item
+        usuario = self.context['request'].user
+        ids_lotes = [item['animal'] for item in items]
+        if len(set(ids_lotes)) != len(ids_lotes):
+            raise serializers.ValidationError("Cada lote puede transferirse una sola vez por request")
+        lotes = Vacuno.objects.filter(usuario=usuario).in_bulk(ids_lotes)
+        ids_campos = {item[clave] for item in items for clave in ('campo_origen', 'campo_destino')}
+        campos = Campo.objects.filter(usuario=usuario).in_bulk(ids_campos)
+
+        errores = []
+        faltantes = sorted(set(ids_lotes) - set(lotes))
+        if faltantes:
+            errores.append(f"Lotes inexistentes: {', '.join(map(str, faltantes))}")
+        faltantes = sorted(ids_campos - set(campos))
+        if faltantes:
+            errores.append(f"Campos inexistentes: {', '.join(map(str, faltantes))}")
+        if errores:
+            raise serializers.ValidationError(errores)
+
+        return [
+            {
+                'animal': lotes[item['animal']],
+                'campo_origen': campos[item['campo_origen']],
+                'campo_destino': campos[item['campo_destino']],
+            }
+            for item in items
+        ]
+
+
+class VentaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     animal_lote_id = serializers.CharField(source='animal.lote_id', read_only=True)
     cantidad_animales = serializers.IntegerField(source='animal.cantidad', read_only=True)
     raza = serializers.CharField(source='animal.raza', read_only=True)
@@ -144,6 +331,64 @@ class VentaSerializer(serializers.ModelSerializer):
         model = Venta
         fields = ['id', 'animal', 'animal_lote_id', 'cantidad_animales', 'raza', 'fecha', 
                  'comprador', 'precio', 'destino', 'observaciones']
+
+class PesadaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    animal_lote_id = serializers.CharField(source='animal.lote_id', read_only=True)
+    cabezas = serializers.IntegerField(min_value=1)
+    peso_promedio = serializers.DecimalField(max_digits=6, decimal_places=1, min_value=Decimal('0.1'))
+
+    class Meta:
+        model = Pesada
+        fields = ['id', 'animal', 'animal_lote_id', 'fecha', 'peso_promedio', 'cabezas', 'observaciones']
+
+class PrecioMercadoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PrecioMercado
+        fields = ['id', 'fecha', 'categoria', 'precio']
+
+    def validate_categoria(self, value):
+        """Misma forma que en la importación ('novillo ' -> 'Novillo')"""
+        try:
+            return normalizar_categoria(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e)) from e
+
+    def validate(self, attrs):
+        # usuario no forma parte del serializer, así que unique_together se valida a mano
+        usuario = self.context['request'].user
+        fecha = attrs.get('fecha', getattr(self.instance, 'fecha', None))
+        categoria = attrs.get('categoria', getattr(self.instance, 'categoria', None))
+        existentes = PrecioMercado.objects.filter(usuario=usuario, fecha=fecha, categoria=categoria)
+        if self.instance is not None:
+            existentes = existentes.exclude(pk=self.instance.pk)
+        if existentes.exists():
+            raise serializers.ValidationError("Ya existe un precio para esa categoría y fecha")
+        return attrs
+
+class PedidoReporteSerializer(serializers.Serializer):
+    reporte = serializers.ChoiceField(choices=SolicitudReporte.REPORTES)
+    periodo = serializers.CharField(max_length=7, help_text="Mes YYYY-MM")
+    formato = serializers.ChoiceField(choices=SolicitudReporte.FORMATOS, default='xlsx')
+
+    def validate_periodo(self, periodo):
+        try:
+            periodo_fechas(periodo)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e)) from e
+        return periodo
+
+class SolicitudReporteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SolicitudReporte
+        fields = ['id', 'reporte', 'periodo', 'formato', 'version', 'estado', 'error', 'creado', 'terminado']
+
+class AuditoriaSerializer(serializers.ModelSerializer):
+    autor_username = serializers.CharField(source='autor.username', read_only=True, default=None)
+
+    class Meta:
+        model = Auditoria
+        fields = ['id', 'modelo', 'objeto_id', 'accion', 'cambios', 'autor', 'autor_username', 'fecha']
+
 # Serializers para estadísticas del dashboard
 class DashboardStatsSerializer(serializers.Serializer):
     total_campos = serializers.IntegerField()
@@ -176,6 +421,26 @@ class OpcionesSerializer(serializers.Serializer):
     estados_generales = serializers.ListField(child=serializers.DictField())
 
 
+class OperacionSyncSerializer(serializers.Serializer):
+    """Operación grabada sin conexión: crear, actualizar o eliminar un registro"""
+    ACCIONES = ('crear', 'actualizar', 'eliminar')
+
+    clave = serializers.CharField(max_length=64, help_text="Clave de idempotencia generada por el dispositivo")
+    recurso = serializers.ChoiceField(choices=list(MODELOS_SYNC))
+    accion = serializers.ChoiceField(choices=ACCIONES)
+    id = serializers.IntegerField(required=False)
+    datos = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['accion'] != 'crear' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': "Requerido para actualizar o eliminar"})
+        return attrs
+
+
+class SubidaSyncSerializer(serializers.Serializer):
+    operaciones = OperacionSyncSerializer(many=True, allow_empty=False, max_length=MAX_OPERACIONES_SYNC)
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=6)
     confirm_password = serializers.CharField(write_only=True)
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+
+from .auditoria import auditar_borrado, auditar_guardado, es_auditado
+from .authentication import invalidar_usuario_cacheado
+from .cache import invalidar_usuario
+from .limites import olvidar_usuario
+from .models import (
+    Campo,
+    EstadiaAnimal,
+    EstadoVacuno,
+    Pesada,
+    PrecioMercado,
+    Transferencia,
+    Vacuna,
+    Vacunacion,
+    Vacuno,
+    Venta,
+)
+from .sync import es_sincronizable, registrar_cambios
+
+
+def usuario_de(instance):
+    """Devuelve el id del usuario dueño de una instancia de ganado"""
+    if hasattr(instance, 'usuario_id'):
+        return instance.usuario_id
+    campo_lote = 'vacuno' if isinstance(instance, EstadoVacuno) else 'animal'
+    if instance._meta.get_field(campo_lote).is_cached(instance):
+        return getattr(instance, campo_lote).usuario_id
+    vacuno_id = getattr(instance, f'{campo_lote}_id')
+    return Vacuno.objects.filter(pk=vacuno_id).values_list('usuario_id', flat=True).first()
+
+
+def _invalidar_cache(sender, instance, **kwargs):
+    usuario_id = usuario_de(instance)
+    if usuario_id is None:
+        return
+    invalidar_usuario(usuario_id)
+    eliminado = kwargs['signal'] is post_delete
+    if es_sincronizable(sender):
+        # El registro va a la misma base que la fila (el shard del usuario)
+        registrar_cambios(sender, [instance.pk], usuario_id, eliminado=eliminado, using=instance._state.db)
+    if es_auditado(sender):
+        if eliminado:
+            auditar_borrado(instance, usuario_id)
+        else:
+            auditar_guardado(instance, usuario_id, kwargs['created'], kwargs['update_fields'])
+
+
+MODELOS_GANADO = [
+    Campo,
+    Vacuno,
+    EstadoVacuno,
+    EstadiaAnimal,
+    Vacuna,
+    Vacunacion,
+    Transferencia,
+    Venta,
+    Pesada,
+    PrecioMercado,
+]
+
+for modelo in MODELOS_GANADO:
+    post_save.connect(_invalidar_cache, sender=modelo, dispatch_uid=f'invalidar_{modelo.__name__}')
+    post_delete.connect(_invalidar_cache, sender=modelo, dispatch_uid=f'invalidar_del_{modelo.__name__}')
+
+
+def _invalidar_usuario_autenticado(sender, instance, **kwargs):
+    invalidar_usuario_cacheado(instance.pk)
+    if kwargs.get('created'):
+        olvidar_usuario(instance.pk)
+
+
+post_save.connect(_invalidar_usuario_autenticado, sender=User, dispatch_uid='invalidar_auth_usuario')
+post_delete.connect(_invalidar_usuario_autenticado, sender=User, dispatch_uid='invalidar_auth_usuario_del')
@@ -0,0 +1,114 @@
+"""
+Simulación Monte Carlo del rodeo, mes a mes, con operaciones de NumPy.
+
+El estado de todos los escenarios es un array de cabezas
+[escenarios, campos, sexo, edad en meses]. La edad llega hasta el último
+umbral que cambia algo (mortalidad de terneros, edad de venta y edad del
+primer parto); el último casillero acumula a los animales mayores. Cada
+mes se envejece el rodeo corriendo el eje de edad y se aplican a todas
+las celdas a la vez mortalidad (binomial), ventas de machos que llegan a
+la edad de venta y nacimientos de las hembras en edad de parir.
+
+Los escenarios se corren en bloques de tamaño fijo, cada uno con su propia
+semilla derivada de la semilla de la corrida: el resultado no depende de
+cuántos procesos los repartan. Este módulo no usa Django, así que los
+bloques corren en procesos hijos sin configurar el proyecto.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MACHO, HEMBRA = 0, 1
+EDAD_ADULTO_MESES = 12
+MAX_CELDAS_BLOQUE = 1_000_000
+ESCENARIOS_POR_BLOQUE = 500
+
+
+def _mensual(tasa_anual):
+    return 1 - (1 - tasa_anual) ** (1 / 12)
+
+
+def _simular_bloque(inicial, parametros, escenarios, semilla):
+    """Corre `escenarios` escenarios desde el rodeo inicial [campos, sexo, edad]"""
+    rng = np.random.default_rng(semilla)
+    meses = parametros['meses']
+    edad_maxima = inicial.shape[2] - 1
+    edad_venta = parametros['edad_venta_meses']
+    edad_parto = parametros['edad_primer_parto_meses']
+    cabezas = np.broadcast_to(inicial, (escenarios, *inicial.shape)).copy()
+
+    supervivencia = np.where(
+        np.arange(edad_maxima + 1) < EDAD_ADULTO_MESES,
+        1 - _mensual(parametros['mortalidad_terneros_anual']),
+        1 - _mensual(parametros['mortalidad_anual']),
+    )
+    prenez_mensual = parametros['tasa_prenez'] / 12
+
+    por_campo = np.zeros((meses, escenarios, inicial.shape[0]), dtype=np.int64)
+    ingresos = np.zeros((meses, escenarios))
+    for mes in range(meses):
+        cabezas[..., edad_maxima] += cabezas[..., edad_maxima - 1]
+        cabezas[..., 1:edad_maxima] = cabezas[..., :edad_maxima - 1]
+        cabezas[..., 0] = 0
+
+        cabezas = rng.binomial(cabezas, supervivencia)
+
+        # Los machos se venden al cumplir la edad de venta
+        ingresos[mes] = cabezas[:, :, MACHO, edad_venta].sum(axis=1) * parametros['precio_venta']
+        cabezas[:, :, MACHO, edad_venta] = 0
+
+        nacimientos = rng.binomial(cabezas[:, :, HEMBRA, edad_parto:].sum(axis=2), prenez_mensual)
+        machos = rng.binomial(nacimientos, 0.5)
+        cabezas[:, :, MACHO, 0] = machos
+        cabezas[:, :, HEMBRA, 0] = nacimientos - machos
+
+        por_campo[mes] = cabezas.sum(axis=(2, 3))
+
+    return por_campo, ingresos
+
+
+def simular(cohortes, parametros, escenarios, semilla=None, procesos=1):
+    """
+    cohortes: arrays de igual largo 'campo' (índice), 'hembra' (bool),
+    'edad' (meses) y 'cantidad', más 'n_campos'. parametros: meses,
+    mortalidad_anual, mortalidad_terneros_anual, tasa_prenez,
+    edad_primer_parto_meses, edad_venta_meses y precio_venta (por cabeza).
+    Con `procesos` > 1 los bloques se reparten en un pool de procesos.
+
+    Devuelve (cabezas [meses, escenarios, campos], ingresos [meses, escenarios]).
+    """
+    # Los machos mayores que la edad de venta (toros) quedan en el último casillero
+    edad_maxima = max(parametros['edad_venta_meses'] + 1, parametros['edad_primer_parto_meses'], EDAD_ADULTO_MESES)
+
+    # Sólo se simulan los campos con animales: sin traslados, el resto queda vacío
+    cantidad = np.asarray(cohortes['cantidad'], dtype=np.int64)
+    con_animales = cantidad > 0
+    campos, campo = np.unique(np.asarray(cohortes['campo'])[con_animales], return_inverse=True)
+    inicial = np.zeros((len(campos), 2, edad_maxima + 1), dtype=np.int64)
+    np.add.at(inicial, (
+        campo,
+        np.where(np.asarray(cohortes['hembra'])[con_animales], HEMBRA, MACHO),
+        np.minimum(np.asarray(cohortes['edad'])[con_animales], edad_maxima),
+    ), cantidad[con_animales])
+
+    por_campo = np.zeros((parametros['meses'], escenarios, cohortes['n_campos']), dtype=np.int64)
+    ingresos = np.zeros((parametros['meses'], escenarios))
+    # Bloques de escenarios, también chicos con rodeos de muchos campos para acotar la memoria
+    bloque = max(1, min(ESCENARIOS_POR_BLOQUE, MAX_CELDAS_BLOQUE // max(1, inicial.size)))
+    inicios = range(0, escenarios, bloque)
+    tamanos = [min(bloque, escenarios - desde) for desde in inicios]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+    argumentos = ([inicial] * len(tamanos), [parametros] * len(tamanos), tamanos, semillas)
+
+    procesos = max(1, min(procesos, len(tamanos)))
+    if procesos > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            resultados = list(pool.map(_simular_bloque, *argumentos))
+    else:
+        resultados = map(_simular_bloque, *argumentos)
+
+    for desde, tamano, (cabezas, ingresos_bloque) in zip(inicios, tamanos, resultados, strict=True):
+        por_campo[:, desde:desde + tamano, campos] = cabezas
+        ingresos[:, desde:desde + tamano] = ingresos_bloque
+    return por_campo, ingresos
+
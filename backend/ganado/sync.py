@@ -0,0 +1,177 @@
+"""
+Sincronización incremental para dispositivos que trabajan sin conexión.
+
+Cada escritura de un modelo sincronizable deja un registro en Cambio
+(por señal, o con registrar_cambios() en las escrituras masivas que no
+emiten señales). El id del último registro entregado es el token: con
+?since=<token> se devuelven solo las filas modificadas o borradas
+después. La migración 0009 registra las filas existentes, así que un
+token 0 entrega todos los datos del usuario, paginados igual que los
+cambios.
+
+Las operaciones grabadas sin conexión se suben en lote y cada una se
+aplica una sola vez por clave de idempotencia: un reintento devuelve la
+respuesta guardada en vez de repetir la escritura.
+
+En PostgreSQL dos transacciones concurrentes del mismo usuario pueden
+confirmarse en distinto orden que sus ids; con las escrituras de un
+usuario serializadas (un dispositivo por vez) no se pierden cambios.
+"""
+import json
+
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .auditoria import auditar_actualizacion, es_auditado
+from .cache import invalidar_usuario
+from .models import (
+    Cambio,
+    Campo,
+    EstadiaAnimal,
+    EstadoVacuno,
+    OperacionSync,
+    Pesada,
+    Transferencia,
+    Vacunacion,
+    Vacuno,
+    Venta,
+)
+
+# Recurso -> modelo, con el mismo nombre que su endpoint
+MODELOS_SYNC = {
+    'campos': Campo,
+    'vacunos': Vacuno,
+    'estados-vacuno': EstadoVacuno,
+    'estadias': EstadiaAnimal,
+    'vacunaciones': Vacunacion,
+    'transferencias': Transferencia,
+    'ventas': Venta,
+    'pesadas': Pesada,
+}
+# Registros de Cambio por respuesta de GET /api/sync/
+LIMITE_CAMBIOS = 1000
+# Operaciones por subida (POST /api/sync/)
+MAX_OPERACIONES_SYNC = 500
+
+
+def es_sincronizable(modelo):
+    return modelo in MODELOS_SYNC.values()
+
+
+def registrar_cambios(modelo, ids, usuario_id, eliminado=False, using=None):
+    """Registra escrituras de `modelo` hechas sin señales (bulk_create, update)"""
+    cambios = [
+        Cambio(usuario_id=usuario_id, modelo=modelo._meta.model_name, objeto_id=pk, eliminado=eliminado)
+        for pk in ids
+    ]
+    if cambios:
+        Cambio.objects.using(using or router.db_for_write(Cambio)).bulk_create(cambios)
+
+
+def actualizar(queryset, usuario_id, **valores):
+    """
+    queryset.update() que actualiza updated_at, registra las filas
+    modificadas y audita los valores previos (leídos junto con los ids)
+    """
+    modelo = queryset.model
+    columnas = [modelo._meta.get_field(nombre).attname for nombre in valores]
+    anteriores = {fila[0]: dict(zip(columnas, fila[1:], strict=True)) for fila in queryset.values_list('pk', *columnas)}
+    if not anteriores:
+        return 0
+    ids = list(anteriores)
+    filas = modelo.objects.filter(pk__in=ids).update(updated_at=timezone.now(), **valores)
+    registrar_cambios(modelo, ids, usuario_id, using=queryset.db)
+    # update() no emite señales: se invalida la cache como en las altas
+    invalidar_usuario(usuario_id)
+    if es_auditado(modelo):
+        auditar_actualizacion(modelo, anteriores, valores, usuario_id, using=queryset.db)
+    return filas
+
+
+def token_actual(usuario_id):
+    """Token del último cambio registrado del usuario (0 si no hay)"""
+    ultimo = Cambio.objects.filter(usuario_id=usuario_id).order_by('-id').values_list('id', flat=True).first()
+    return ultimo or 0
+
+
+def _columnas(modelo):
+    return [campo.name for campo in modelo._meta.concrete_fields if campo.name != 'usuario']
+
+
+def cambios_desde(usuario_id, token, limite=LIMITE_CAMBIOS):
+    """
+    Filas cambiadas y borradas después de `token`, agrupadas por recurso.
+    Con `hay_mas` hay que volver a pedir con el token devuelto.
+    """
+    registros = list(
+        Cambio.objects.filter(usuario_id=usuario_id, id__gt=token).order_by('id').values_list(
+            'id', 'modelo', 'objeto_id', 'eliminado'
+        )[:limite + 1]
+    )
+    hay_mas = len(registros) > limite
+    registros = registros[:limite]
+
+    # Vale el último registro de cada objeto dentro de la página
+    ultimos = {}
+    for _, modelo, objeto_id, eliminado in registros:
+        ultimos[(modelo, objeto_id)] = eliminado
+
+    cambios = {}
+    eliminados = {}
+    for nombre, modelo in MODELOS_SYNC.items():
+        model_name = modelo._meta.model_name
+        vivos = [pk for (m, pk), borrado in ultimos.items() if m == model_name and not borrado]
+        borrados = [pk for (m, pk), borrado in ultimos.items() if m == model_name and borrado]
+        # Un objeto borrado después de esta página no aparece acá: llega como
+        # tombstone en una página siguiente
+        cambios[nombre] = list(modelo.objects.filter(pk__in=vivos).order_by('pk').values(*_columnas(modelo)))
+        eliminados[nombre] = sorted(borrados)
+
+    return {
+        'token': registros[-1][0] if registros else token,
+        'hay_mas': hay_mas,
+        'cambios': cambios,
+        'eliminados': eliminados,
+    }
+
+
+class _Rechazada(Exception):
+    """Operación respondida con error: se deshacen sus escrituras pero se guarda la respuesta"""
+
+
+def aplicar_una_vez(usuario, clave, aplicar):
+    """
+    Ejecuta aplicar() -> (status, data) una sola vez por (usuario, clave).
+    Devuelve (status, data, repetida); las respuestas 4xx también se guardan,
+    salvo un 429 (límite de requests), que se puede reintentar.
+    """
+    alias = router.db_for_write(OperacionSync)
+    previa = OperacionSync.objects.using(alias).filter(usuario=usuario, clave=clave).first()
+    if previa is not None:
+        return previa.status, previa.respuesta, True
+
+    try:
+        with transaction.atomic(using=alias):
+            try:
+                with transaction.atomic(using=alias):
+                    codigo, data = aplicar()
+                    if codigo >= 400:
+                        raise _Rechazada(codigo, data)
+            except _Rechazada as e:
+                codigo, data = e.args
+                if codigo >= 500 or codigo == 429:
+                    # Error del servidor o límite de requests: no se guarda, el cliente puede reintentar
+                    return codigo, data, False
+            # La respuesta guardada tiene que ser JSON (fechas, decimales, ErrorDetail)
+            data = json.loads(JSONRenderer().render(data)) if data is not None else None
+            OperacionSync.objects.using(alias).create(
+                usuario=usuario, clave=clave, status=codigo, respuesta=data
+            )
+    except IntegrityError:
+        # Otro request aplicó la misma clave en paralelo
+        previa = OperacionSync.objects.using(alias).filter(usuario=usuario, clave=clave).first()
+        if previa is None:
+            raise
+        return previa.status, previa.respuesta, True
+    return codigo, data, False
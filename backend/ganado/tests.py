@@ -1,23 +1,109 @@
-from datetime import date
+import gzip
+import io
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    connections,
+    transaction,
+)
+from django.http import HttpResponse, QueryDict, StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
 
+from . import filtros
+from .admin import PaginadorEstimado
+from .authentication import CachedJWTAuthentication, _clave, _usuarios_locales
+from .busqueda import buscar
+from .cache import timeout_analytics, version_datos
+from .ciclos import actualizar_ciclos, lotes_a_actualizar
+from .compresion import CompresionMiddleware
+from .db import StatementTimeoutMixin, filas_estimadas
+from .geo import tiene_rtree
+from .importacion import importar_precios
 from .models import (
+    Auditoria,
     Campo,
     EstadiaAnimal,
     EstadoVacuno,
+    Pesada,
     PrecioMercado,
+    ShardUsuario,
     Transferencia,
     Vacuna,
     Vacunacion,
     Vacuno,
     Venta,
+    ciclo_para_edad,
+)
+from .pastoreo import PlanPastoreo
+from .reportes import procesar_pendientes, version_reporte
+from .routers import (
+    COOKIE_PRIMARIA,
+    ReplicaRouter,
+    ShardRouter,
+    lee_de_primaria,
+    leer_de_replica,
+    usar_tenant,
+)
+from .simulacion import simular
+from .sync import actualizar, aplicar_una_vez, cambios_desde
+from .valoracion import cargar_curvas
+from .views import (
+    CampoViewSet,
+    DashboardViewSet,
+    EstadiaAnimalViewSet,
+    EstadoVacunoViewSet,
+    PrecioMercadoViewSet,
+    TransferenciaViewSet,
+    VacunacionViewSet,
+    VacunoViewSet,
+    VentaViewSet,
 )
 
 
+class ApiAutenticadaTestCase(TestCase):
+    """Base de los tests de API: crea self.user y un self.client autenticado como él"""
+
+    username = 'test'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username=self.username, password='test1234')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+
 class CampoModelTest(TestCase):
     """Tests unitarios para el modelo Campo"""
     
@@ -350,3 +436,1928 @@ class PrecioMercadoModelTest(TestCase):
                 categoria="Novillo",     # Misma categoría
                 precio=Decimal("1900.00")
             )
+
+
+class AnalyticsVentasTest(ApiAutenticadaTestCase):
+    """Tests del endpoint de analítica de ventas"""
+
+    username = 'analytics'
+
+    def setUp(self):
+        super().setUp()
+        self.campo = Campo.objects.create(usuario=self.user, nombre="Campo Norte", ubicacion="Norte")
+        self.vacuno = Vacuno.objects.create(
+            usuario=self.user, lote_id="L-001", raza="Hereford", cantidad=10,
+            sexo="M", fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadoVacuno.objects.create(vacuno=self.vacuno, ciclo_productivo="novillo", estado_general="activo")
+        EstadiaAnimal.objects.create(
+            animal=self.vacuno, campo=self.campo,
+            fecha_entrada=date(2024, 1, 1), fecha_salida=date(2024, 7, 15)
+        )
+        Venta.objects.create(
+            animal=self.vacuno, fecha=date(2024, 7, 15), comprador="Frigorífico",
+            precio=Decimal("2000000.00")
+        )
+        PrecioMercado.objects.create(
+            usuario=self.user, fecha=date(2024, 7, 1), categoria="Novillo", precio=Decimal("180000.00")
+        )
+
+    def test_resumen_agrupado(self):
+        """Test agrupación por mes, comprador, raza y campo de origen"""
+        response = self.client.get('/api/analytics/ventas/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        self.assertEqual(data['totales']['ingresos'], 2000000.0)
+        self.assertEqual(data['totales']['ingreso_por_animal'], 200000.0)
+        self.assertEqual(data['por_mes'][0]['mes'], '2024-07')
+        self.assertEqual(data['por_comprador'][0]['comprador'], 'Frigorífico')
+        self.assertEqual(data['por_raza'][0]['raza'], 'Hereford')
+        self.assertEqual(data['por_campo'][0]['campo'], 'Campo Norte')
+
+    def test_comparacion_precio_mercado(self):
+        """Test comparación contra el precio de mercado vigente a la fecha de venta"""
+        data = self.client.get('/api/analytics/ventas/').json()
+        comparacion = data['comparacion_mercado'][0]
+
+        self.assertEqual(comparacion['categoria'], 'novillo')
+        self.assertEqual(comparacion['valor_mercado'], 1800000.0)
+        self.assertEqual(comparacion['diferencia'], 200000.0)
+
+    def test_cache_invalidada_por_escritura(self):
+        """Test que una nueva venta invalida el resumen cacheado"""
+        self.client.get('/api/analytics/ventas/')
+        otro = Vacuno.objects.create(
+            usuario=self.user, lote_id="L-002", raza="Angus", cantidad=5,
+            sexo="H", fecha_ingreso=date(2024, 1, 1)
+        )
+        Venta.objects.create(animal=otro, fecha=date(2024, 8, 1), comprador="Otro", precio=Decimal("500000.00"))
+
+        data = self.client.get('/api/analytics/ventas/').json()
+        self.assertEqual(data['totales']['ventas'], 2)
+
+    def test_fecha_invalida(self):
+        """Test que una fecha mal formada devuelve 400"""
+        response = self.client.get('/api/analytics/ventas/?fecha_desde=15-07-2024')
+        self.assertEqual(response.status_code, 400)
+
+    def test_vida_cache_segun_backend(self):
+        """Test que con la cache de cada proceso los resúmenes viven menos"""
+        self.assertEqual(timeout_analytics(), 30)
+        compartida = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=compartida):
+            self.assertEqual(timeout_analytics(), 300)
+
+
+class ValoracionRodeoTest(ApiAutenticadaTestCase):
+    """Tests de la valorización del rodeo a precios de mercado"""
+
+    username = 'valoracion'
+
+    def setUp(self):
+        super().setUp()
+        self.campo = Campo.objects.create(usuario=self.user, nombre="Campo Sur", ubicacion="Sur")
+        self.vacuno = Vacuno.objects.create(
+            usuario=self.user, lote_id="V-001", raza="Angus", cantidad=20,
+            sexo="H", fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadoVacuno.objects.create(vacuno=self.vacuno, ciclo_productivo="vaquillona", estado_general="activo")
+        EstadiaAnimal.objects.create(animal=self.vacuno, campo=self.campo, fecha_entrada=date(2024, 1, 1))
+        for fecha, precio in [(date(2024, 1, 1), "100000"), (date(2024, 6, 1), "150000")]:
+            PrecioMercado.objects.create(
+                usuario=self.user, fecha=fecha, categoria="Vaquillona", precio=Decimal(precio)
+            )
+
+    def test_curva_precios_busqueda_binaria(self):
+        """Test resolución del precio vigente por búsqueda binaria"""
+        curva = cargar_curvas(self.user)['vaquillona']
+        self.assertIsNone(curva.precio_en(date(2023, 12, 31)))
+        self.assertEqual(curva.precio_en(date(2024, 3, 1)), Decimal("100000"))
+        self.assertEqual(curva.precio_en(date(2024, 6, 1)), Decimal("150000"))
+
+    def test_curva_con_categorias_en_distinto_caso(self):
+        """Test que la curva queda ordenada por fecha al fusionar categorías en distinto caso"""
+        PrecioMercado.objects.create(
+            usuario=self.user, fecha=date(2024, 3, 1), categoria="vaquillona", precio=Decimal("120000")
+        )
+        curva = cargar_curvas(self.user)['vaquillona']
+        self.assertEqual(curva.fechas, [date(2024, 1, 1), date(2024, 3, 1), date(2024, 6, 1)])
+        self.assertEqual(curva.precio_en(date(2024, 4, 1)), Decimal("120000"))
+        self.assertEqual(curva.precio_en(date(2024, 7, 1)), Decimal("150000"))
+
+    def test_valoracion_actual(self):
+        """Test valor actual por campo y categoría"""
+        data = self.client.get('/api/analytics/valoracion/').json()
+
+        self.assertEqual(data['total']['valor'], 3000000.0)
+        self.assertEqual(data['por_campo'][0]['campo'], 'Campo Sur')
+        self.assertEqual(data['por_categoria'][0]['precio'], 150000.0)
+
+    def test_valoracion_historica(self):
+        """Test valor a una fecha histórica con el precio vigente en ese momento"""
+        data = self.client.get('/api/analytics/valoracion/?fecha=2024-03-01').json()
+        self.assertEqual(data['total']['valor'], 2000000.0)
+
+    def test_lote_vendido_excluido(self):
+        """Test que los lotes vendidos no se valorizan"""
+        EstadoVacuno.objects.create(vacuno=self.vacuno, estado_general="vendido")
+        data = self.client.get('/api/analytics/valoracion/').json()
+        self.assertEqual(data['total']['lotes'], 0)
+
+
+class ImportacionPreciosTest(ApiAutenticadaTestCase):
+    """Tests de la carga masiva de precios de mercado"""
+
+    username = 'precios'
+
+    def test_importar_csv_con_upsert_y_duplicados(self):
+        """Test importación de CSV: inserta, actualiza e informa duplicados y errores"""
+        PrecioMercado.objects.create(
+            usuario=self.user, fecha=date(2024, 7, 1), categoria="Novillo", precio=Decimal("1000.00")
+        )
+        contenido = (
+            b"fecha;categoria;precio\n"
+            b"01/07/2024;novillo;1.850,50\n"
+            b"2024-07-01;Vaca;1500\n"
+            b"2024-07-01;Vaca;1550\n"
+            b"2024-13-01;Toro;1700\n"
+        )
+        archivo = SimpleUploadedFile("precios.csv", contenido, content_type="text/csv")
+
+        response = self.client.post('/api/precios-mercado/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        resultado = response.json()
+
+        self.assertEqual(resultado['creados'], 1)
+        self.assertEqual(resultado['actualizados'], 1)
+        self.assertEqual(resultado['duplicados'], 1)
+        self.assertEqual(resultado['total_errores'], 1)
+        self.assertEqual(resultado['errores'][0]['fila'], 4)
+        self.assertEqual(
+            PrecioMercado.objects.get(usuario=self.user, categoria="Novillo").precio, Decimal("1850.50")
+        )
+        self.assertEqual(PrecioMercado.objects.get(usuario=self.user, categoria="Vaca").precio, Decimal("1550"))
+
+    def test_importar_valores_numericos_y_separadores(self):
+        """Test que acepta precios numéricos en JSON y rechaza separadores de miles ambiguos"""
+        response = self.client.post('/api/precios-mercado/importar/', {'precios': [
+            {'fecha': '2024-07-01', 'categoria': 'Novillo', 'precio': 1850},
+            {'fecha': '2024-07-01', 'categoria': 'Vaca', 'precio': '1,850.50'},
+            {'fecha': '2024-07-01', 'categoria': 'Toro', 'precio': '1.850'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creados'], 2)
+        self.assertEqual(response.data['errores'][0]['fila'], 3)
+        self.assertEqual(PrecioMercado.objects.get(usuario=self.user, categoria="Vaca").precio, Decimal("1850.50"))
+
+    def test_precio_fuera_de_rango(self):
+        """Test que un precio que no entra en la columna es un error de fila y no un 500"""
+        response = self.client.post('/api/precios-mercado/importar/', {'precios': [
+            {'fecha': '2024-07-01', 'categoria': 'Novillo', 'precio': '99999999.99'},
+            {'fecha': '2024-07-01', 'categoria': 'Vaca', 'precio': '100000000'},
+            {'fecha': '2024-07-01', 'categoria': 'Toro', 'precio': 1e20},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual([error['fila'] for error in response.data['errores']], [2, 3])
+
+    def test_comando_rechaza_lote_no_positivo(self):
+        """Test que importar_precios --lote 0 falla con un error del comando"""
+        with self.assertRaisesMessage(CommandError, '--lote'):
+            call_command('importar_precios', 'precios.csv', usuario=self.username, lote=0)
+
+    def test_importar_csv_no_utf8(self):
+        """Test que un CSV en Latin-1 devuelve 400 sin importar filas"""
+        contenido = "fecha;categoria;precio\n2024-07-01;Vaquillona;1500\n2024-07-01;Año;1500\n".encode('latin-1')
+        archivo = SimpleUploadedFile("precios.csv", contenido, content_type="text/csv")
+        response = self.client.post('/api/precios-mercado/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PrecioMercado.objects.filter(usuario=self.user).exists())
+
+    def test_importar_en_varios_lotes(self):
+        """Test que la importación por lotes carga todas las filas"""
+        filas = [
+            {'fecha': f'2024-01-{dia:02d}', 'categoria': categoria, 'precio': '1000'}
+            for dia in range(1, 29) for categoria in ('Novillo', 'Vaca')
+        ]
+        resultado = importar_precios(self.user, filas, tamano_lote=10)
+
+        self.assertEqual(resultado['creados'], 56)
+        self.assertEqual(PrecioMercado.objects.filter(usuario=self.user).count(), 56)
+
+    def test_viewset_filtra_por_usuario(self):
+        """Test que el listado solo muestra precios propios"""
+        otro = User.objects.create_user(username='otro', password='test1234')
+        PrecioMercado.objects.create(usuario=otro, fecha=date(2024, 7, 1), categoria="Vaca", precio=Decimal("1"))
+        self.client.post('/api/precios-mercado/', {'fecha': '2024-07-01', 'categoria': 'Vaca', 'precio': '2'})
+
+        response = self.client.get('/api/precios-mercado/')
+        self.assertEqual(response.json()['count'], 1)
+
+        duplicado = self.client.post('/api/precios-mercado/', {'fecha': '2024-07-01', 'categoria': ' vaca', 'precio': '3'})
+        self.assertEqual(duplicado.status_code, 400)
+
+
+class CalendarioSanitarioTest(ApiAutenticadaTestCase):
+    """Tests del cálculo de vacunas pendientes por campo"""
+
+    username = 'sanidad'
+
+    def setUp(self):
+        super().setUp()
+        self.campo = Campo.objects.create(usuario=self.user, nombre="Potrero 1", ubicacion="Centro")
+        self.vacuno = Vacuno.objects.create(
+            usuario=self.user, lote_id="S-001", raza="Angus", cantidad=15, sexo="M",
+            fecha_nacimiento=date(2024, 1, 1), fecha_ingreso=date(2024, 2, 1)
+        )
+        EstadiaAnimal.objects.create(animal=self.vacuno, campo=self.campo, fecha_entrada=date(2024, 2, 1))
+        self.aftosa = Vacuna.objects.create(usuario=self.user, nombre="Aftosa", intervalo_refuerzo_dias=180)
+        self.brucelosis = Vacuna.objects.create(
+            usuario=self.user, nombre="Brucelosis", edad_minima_dias=90, edad_maxima_dias=240
+        )
+
+    def _pendientes(self, fecha):
+        return self.client.get(f'/api/vacunaciones/pendientes/?fecha={fecha}').json()
+
+    def test_refuerzo_vencido_y_proximo(self):
+        """Test refuerzo según intervalo desde la última aplicación"""
+        Vacunacion.objects.create(animal=self.vacuno, vacuna=self.aftosa, fecha=date(2024, 3, 1))
+
+        campo = self._pendientes('2024-08-10')['campos'][0]
+        self.assertEqual(campo['campo'], 'Potrero 1')
+        self.assertEqual([d['vacuna']['nombre'] for d in campo['proximas']], ['Aftosa'])
+        self.assertEqual([d['vacuna']['nombre'] for d in campo['vencidas']], ['Brucelosis'])
+
+        campo = self._pendientes('2024-09-01')['campos'][0]
+        refuerzo = next(d for d in campo['vencidas'] if d['vacuna']['nombre'] == 'Aftosa')
+        self.assertEqual(refuerzo['motivo'], 'refuerzo')
+        self.assertEqual(campo['cabezas_vencidas'], 15)
+
+    def test_ventana_de_edad(self):
+        """Test que una vacuna fuera de la ventana de edad no se informa"""
+        Vacunacion.objects.create(animal=self.vacuno, vacuna=self.aftosa, fecha=date(2024, 12, 1))
+        self.assertEqual(self._pendientes('2025-01-01')['campos'], [])
+
+    def test_horizonte_fuera_de_rango(self):
+        """Test que un horizonte negativo o enorme responde 400"""
+        for horizonte in (-1, 999999999):
+            response = self.client.get(f'/api/vacunaciones/pendientes/?horizonte={horizonte}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_vacunas_de_otro_usuario(self):
+        """Test que no se mezclan vacunas ni lotes de otros usuarios"""
+        otro = User.objects.create_user(username='otro_sanidad', password='test1234')
+        ajena = Vacuna.objects.create(usuario=otro, nombre="Carbunclo")
+
+        self.assertNotIn(ajena, self.vacuno.vacunas_pendientes())
+        nombres = {
+            d['vacuna']['nombre']
+            for campo in self._pendientes('2024-08-10')['campos']
+            for d in campo['vencidas'] + campo['proximas']
+        }
+        self.assertNotIn('Carbunclo', nombres)
+
+
+class ActualizarCiclosTest(TestCase):
+    """Tests del avance automático de ciclo productivo"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ciclos', password='test1234')
+        self.macho = Vacuno.objects.create(
+            usuario=self.user, lote_id="C-001", raza="Angus", sexo="M",
+            fecha_nacimiento=date(2024, 1, 1), fecha_ingreso=date(2024, 1, 1)
+        )
+        self.hembra = Vacuno.objects.create(
+            usuario=self.user, lote_id="C-002", raza="Angus", sexo="H",
+            fecha_nacimiento=date(2024, 1, 1), fecha_ingreso=date(2024, 1, 1)
+        )
+        for vacuno, ciclo in [(self.macho, "ternero"), (self.hembra, "ternera")]:
+            EstadoVacuno.objects.create(
+                vacuno=vacuno, ciclo_productivo=ciclo, estado_salud="sano", estado_general="activo"
+            )
+
+    def test_ciclo_para_edad(self):
+        """Test umbrales de edad por sexo"""
+        self.assertEqual(ciclo_para_edad("M", 100), "ternero")
+        self.assertEqual(ciclo_para_edad("M", 400), "novillo")
+        self.assertEqual(ciclo_para_edad("H", 800), "vaquillona")
+        self.assertEqual(ciclo_para_edad("H", 1200), "vaca")
+
+    def test_avance_solo_donde_cambia(self):
+        """Test que se inserta un estado nuevo solo para los lotes que cambian de ciclo"""
+        self.assertEqual(actualizar_ciclos(fecha=date(2024, 6, 1)), 0)
+        self.assertEqual(actualizar_ciclos(fecha=date(2025, 1, 10)), 2)
+
+        estado = self.macho.estado_actual()
+        self.assertEqual(estado.ciclo_productivo, "novillo")
+        self.assertEqual(estado.estado_salud, "sano")
+        self.assertEqual(self.hembra.estado_actual().ciclo_productivo, "vaquillona")
+
+    def test_incremental_ignora_lotes_sin_cruce(self):
+        """Test que una ejecución incremental no revisa lotes que no cruzaron umbrales"""
+        actualizar_ciclos(fecha=date(2025, 1, 10))
+        self.assertEqual(actualizar_ciclos(fecha=date(2025, 1, 11)), 0)
+        self.assertEqual(actualizar_ciclos(fecha=date(2026, 1, 5)), 1)
+        self.assertEqual(self.macho.estado_actual().ciclo_productivo, "toro")
+
+    def test_lote_vendido_no_avanza(self):
+        """Test que los lotes vendidos no cambian de ciclo"""
+        EstadoVacuno.objects.create(vacuno=self.macho, estado_general="vendido")
+        self.assertEqual(actualizar_ciclos(fecha=date(2025, 1, 10), completo=True), 1)
+
+    def test_recorre_cada_shard(self):
+        """Test que se procesa cada base solo con los usuarios asignados a ella"""
+        fecha = date(2025, 1, 10)
+        with override_settings(DATABASE_SHARDS=['shard1']):
+            self.assertEqual(len(lotes_a_actualizar(fecha)), 2)
+            asignacion = ShardUsuario.objects.create(usuario=self.user, alias='shard1')
+            self.assertEqual(lotes_a_actualizar(fecha), [])
+            # En migración sus filas pueden estar en las dos bases: no se tocan
+            asignacion.alias, asignacion.en_migracion = 'default', True
+            asignacion.save()
+            self.assertEqual(lotes_a_actualizar(fecha), [])
+
+            with mock.patch('ganado.ciclos._actualizar_base', return_value=1) as actualizar_base:
+                self.assertEqual(actualizar_ciclos(fecha=fecha), 2)
+            self.assertEqual([llamada.args[0] for llamada in actualizar_base.call_args_list], ['default', 'shard1'])
+
+
+class VistaLenta(StatementTimeoutMixin, APIView):
+    """Vista que cuenta hasta `hasta` con una consulta recursiva"""
+
+    permission_classes = []
+    statement_timeout_ms = 50
+    hasta = 100_000_000
+
+    def get(self, request):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_sleep(%s)', [self.hasta / 1_000_000])
+            else:
+                cursor.execute(
+                    'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < %s) '
+                    'SELECT count(*) FROM n', [self.hasta]
+                )
+            cursor.fetchone()
+        return Response({})
+
+
+class StatementTimeoutTest(ApiAutenticadaTestCase):
+    """Tests del timeout de sentencias por vista"""
+
+    username = 'timeout'
+
+    def test_vista_con_timeout_propio(self):
+        """Test que las vistas con timeout propio responden normalmente"""
+        self.assertEqual(DashboardViewSet.statement_timeout_ms, 10000)
+        self.assertEqual(self.client.get('/api/dashboard/stats/').status_code, 200)
+
+    def test_consulta_lenta_se_cancela(self):
+        """Test que una consulta más lenta que el timeout de la vista se cancela"""
+        inicio = time.monotonic()
+        with self.assertRaises(OperationalError):
+            VistaLenta.as_view()(RequestFactory().get('/'))
+        self.assertLess(time.monotonic() - inicio, 5)
+
+        # El límite no queda aplicado a la conexión después del request
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 300000) '
+                'SELECT count(*) FROM n'
+            )
+            self.assertEqual(cursor.fetchone()[0], 300000)
+
+    def test_consulta_dentro_del_timeout(self):
+        """Test que una consulta más rápida que el timeout responde normalmente"""
+        with mock.patch.object(VistaLenta, 'hasta', 1000):
+            self.assertEqual(VistaLenta.as_view()(RequestFactory().get('/')).status_code, 200)
+
+    def test_benchmark_rechaza_cero_hilos(self):
+        """Test que benchmark_api --hilos 0 falla con un error del comando"""
+        with self.assertRaisesMessage(CommandError, '--hilos'):
+            call_command('benchmark_api', usuario=self.username, hilos=0)
+
+
+class MantenimientoSqliteTest(TestCase):
+    """Tests del comando de mantenimiento de SQLite"""
+
+    def test_mantenimiento(self):
+        """Test que el comando corre ANALYZE aunque la base no esté en WAL"""
+        salida = StringIO()
+        call_command('mantenimiento_sqlite', stdout=salida)
+        self.assertIn("Mantenimiento terminado", salida.getvalue())
+
+
+class ShardRouterTest(TestCase):
+    """Tests del ruteo de modelos de ganado al shard del usuario"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tenant', password='test1234')
+        ShardUsuario.objects.create(usuario=self.user, alias='shard1')
+
+    def test_ruteo_por_tenant(self):
+        """Test que los modelos de ganado van al shard del tenant en curso"""
+        router = ShardRouter()
+        self.assertIsNone(router.db_for_read(Campo))
+        with usar_tenant(self.user.id):
+            self.assertEqual(router.db_for_read(Campo), 'shard1')
+            self.assertEqual(router.db_for_write(Vacuno), 'shard1')
+
+    def test_modelos_globales_y_auth_en_default(self):
+        """Test que auth y la tabla de asignación no se rutean a shards"""
+        router = ShardRouter()
+        with usar_tenant(self.user.id):
+            self.assertIsNone(router.db_for_read(User))
+            self.assertIsNone(router.db_for_read(ShardUsuario))
+        with override_settings(DATABASE_SHARDS=['shard1']):
+            self.assertFalse(router.allow_migrate('shard1', 'ganado', 'shardusuario'))
+            self.assertTrue(router.allow_migrate('shard1', 'ganado', 'campo'))
+            self.assertTrue(router.allow_migrate('shard1', 'auth', 'user'))
+
+    def test_instancia_conserva_su_base(self):
+        """Test que una instancia ya cargada se sigue leyendo de su base"""
+        campo = Campo.objects.create(usuario=self.user, nombre="Campo", ubicacion="X")
+        with usar_tenant(self.user.id):
+            self.assertEqual(ShardRouter().db_for_read(Vacuno, instance=campo), 'default')
+
+    def test_escrituras_leen_asignacion_sin_cache(self):
+        """Test que una asignación cambiada por otro proceso vale enseguida para las escrituras"""
+        router = ShardRouter()
+        with usar_tenant(self.user.id):
+            self.assertEqual(router.db_for_read(Campo), 'shard1')
+            # Otro worker movió al usuario: su cache local no se invalidó
+            ShardUsuario.objects.filter(usuario=self.user).update(alias='shard2')
+            self.assertEqual(router.db_for_read(Campo), 'shard1')
+            self.assertEqual(router.db_for_write(Campo), 'shard2')
+
+    def test_asignacion_en_migracion_no_se_cachea(self):
+        """Test que mientras el usuario se migra todos ven enseguida el cambio de shard"""
+        router = ShardRouter()
+        ShardUsuario.objects.filter(usuario=self.user).update(en_migracion=True)
+        with usar_tenant(self.user.id):
+            self.assertEqual(router.db_for_read(Campo), 'shard1')
+            # mover_tenant terminó la copia y cambió la asignación
+            ShardUsuario.objects.filter(usuario=self.user).update(alias='shard2', en_migracion=False)
+            self.assertEqual(router.db_for_read(Campo), 'shard2')
+
+    def test_importacion_rechaza_usuario_en_migracion(self):
+        """Test que los comandos de importación no escriben en un shard que se está migrando"""
+        ShardUsuario.objects.filter(usuario=self.user).update(en_migracion=True)
+        for comando in ('importar_precios', 'importar_pesadas'):
+            with self.assertRaisesMessage(CommandError, 'migrando'):
+                call_command(comando, 'datos.csv', usuario='tenant')
+
+
+class ReplicaRouterTest(ApiAutenticadaTestCase):
+    """Tests del ruteo de lecturas a réplicas con stickiness después de escribir"""
+
+    username = 'replicas'
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_lecturas_a_replica(self):
+        """Test que solo las lecturas de modelos de ganado van a la réplica"""
+        router = ReplicaRouter()
+        with override_settings(DATABASE_REPLICAS={'default': ['replica1']}), usar_tenant(self.user.id):
+            self.assertEqual(router.db_for_read(Campo), 'default')
+            token = leer_de_replica.set(True)
+            try:
+                self.assertEqual(router.db_for_read(Campo), 'replica1')
+                self.assertEqual(router.db_for_write(Campo), 'default')
+                self.assertIsNone(router.db_for_read(User))
+            finally:
+                leer_de_replica.reset(token)
+            self.assertFalse(router.allow_migrate('replica1', 'ganado', 'campo'))
+
+    def test_escritura_fija_lecturas_a_primaria(self):
+        """Test que después de escribir el usuario lee de la primaria"""
+        # La "réplica" apunta a la misma base para poder ejecutar las consultas
+        with override_settings(DATABASE_REPLICAS={'default': ['default']}):
+            self.assertNotIn(COOKIE_PRIMARIA, self.client.get('/api/campos/').cookies)
+
+            response = self.client.post('/api/campos/', {'nombre': 'Nuevo', 'ubicacion': 'X'})
+            self.assertEqual(response.status_code, 201)
+            self.assertIn(COOKIE_PRIMARIA, response.cookies)
+
+            request = type('Request', (), {'COOKIES': {}, 'user': self.user})()
+            self.assertTrue(lee_de_primaria(request))
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    """Tests de la autenticación JWT con el usuario cacheado"""
+
+    def setUp(self):
+        cache.clear()
+        _usuarios_locales.clear()
+        self.user = User.objects.create_user(username='jwt', password='test1234')
+        self.token = AccessToken.for_user(self.user)
+
+    def _autenticar(self):
+        return CachedJWTAuthentication().get_user(self.token)
+
+    def test_cache_evita_consulta_de_usuario(self):
+        """Test que con la cache caliente no se consulta la tabla de usuarios"""
+        with self.assertNumQueries(1):
+            self.assertEqual(self._autenticar().pk, self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._autenticar().pk, self.user.pk)
+
+    def test_sin_cache_compartida_solo_cache_local(self):
+        """Test que con la cache de cada proceso el usuario no se guarda en la cache de Django"""
+        self._autenticar()
+        self.assertIsNone(cache.get(_clave(self.user.pk)))
+        _usuarios_locales.clear()
+        with self.assertNumQueries(1):
+            self._autenticar()
+
+    def test_desactivar_usuario_invalida_cache(self):
+        """Test que un usuario dado de baja deja de autenticar aunque estuviera cacheado"""
+        self._autenticar()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self._autenticar()
+
+    def test_instancia_nueva_por_request(self):
+        """Test que lo que un request cambia en el usuario no llega a los siguientes"""
+        primero = self._autenticar()
+        primero.first_name = 'Cambiado en una vista'
+        segundo = self._autenticar()
+        self.assertIsNot(segundo, primero)
+        self.assertEqual(segundo.first_name, '')
+        self.assertEqual(segundo.pk, self.user.pk)
+        self.assertFalse(segundo._state.adding)
+        self.assertIsNot(self._autenticar(), segundo)
+
+    def test_cache_local_acotada(self):
+        """Test que la cache del proceso descarta el usuario menos usado al llenarse"""
+        otros = [User.objects.create_user(username=f'jwt{i}', password='test1234') for i in range(2)]
+        _usuarios_locales.clear()
+        with override_settings(JWT_USER_CACHE={'TIMEOUT': 300, 'TIMEOUT_LOCAL': 30, 'MAX_LOCAL': 2}):
+            self._autenticar()
+            CachedJWTAuthentication().get_user(AccessToken.for_user(otros[0]))
+            self._autenticar()
+            CachedJWTAuthentication().get_user(AccessToken.for_user(otros[1]))
+        self.assertEqual(list(_usuarios_locales), [str(self.user.pk), str(otros[1].pk)])
+
+    def test_request_autenticado_por_header(self):
+        """Test que la API acepta el token con la clase cacheada"""
+        response = self.client.get('/api/campos/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 200)
+
+
+class BusquedaTest(ApiAutenticadaTestCase):
+    """Tests de la búsqueda ?q= sobre lotes, campos y ventas"""
+
+    username = 'busqueda'
+
+    def setUp(self):
+        super().setUp()
+        self.otro = User.objects.create_user(username='otro_busqueda', password='test1234')
+
+        def lote(usuario, lote_id, raza, observaciones=''):
+            return Vacuno.objects.create(
+                usuario=usuario, lote_id=lote_id, raza=raza, sexo='M',
+                fecha_ingreso=date(2024, 1, 1), observaciones=observaciones,
+            )
+
+        self.angus = lote(self.user, 'L-100', 'Aberdeen Angus', 'Lote de Angus para invernada')
+        self.hereford = lote(self.user, 'L-200', 'Hereford', 'cruza con angus')
+        lote(self.user, 'L-300', 'Brangus')
+        lote(self.otro, 'L-400', 'Angus')
+
+    def _ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [fila['id'] for fila in response.data['results']]
+
+    def test_busqueda_lotes_del_usuario(self):
+        """Test que la búsqueda encuentra coincidencias parciales solo del usuario"""
+        ids = self._ids('/api/vacunos/?q=angus')
+        # Brangus contiene "angus"; el lote del otro usuario no aparece
+        brangus = Vacuno.objects.get(usuario=self.user, raza='Brangus')
+        self.assertCountEqual(ids, [self.angus.id, self.hereford.id, brangus.id])
+
+    def test_busqueda_varios_terminos(self):
+        """Test que todos los términos deben coincidir, incluidos los cortos"""
+        self.assertEqual(self._ids('/api/vacunos/?q=hereford angus'), [self.hereford.id])
+        self.assertEqual(self._ids('/api/vacunos/?q=L-1'), [self.angus.id])
+
+    def test_indice_se_actualiza_al_editar(self):
+        """Test que el índice de búsqueda sigue los cambios de los registros"""
+        self.hereford.raza = 'Shorthorn'
+        self.hereford.observaciones = ''
+        self.hereford.save()
+        self.assertNotIn(self.hereford.id, self._ids('/api/vacunos/?q=angus'))
+        self.assertEqual(self._ids('/api/vacunos/?q=shorthorn'), [self.hereford.id])
+
+        self.angus.delete()
+        self.assertEqual(len(self._ids('/api/vacunos/?q=angus')), 1)
+
+    def test_busqueda_campos_y_ventas(self):
+        """Test de la búsqueda en campos (nombre, ubicación) y ventas (comprador, destino)"""
+        campo = Campo.objects.create(usuario=self.user, nombre="La Esperanza", ubicacion="Tandil")
+        Campo.objects.create(usuario=self.user, nombre="El Ombú", ubicacion="Azul")
+        venta = Venta.objects.create(
+            animal=self.angus, fecha=date(2024, 5, 1), comprador="Frigorífico Rioplatense",
+            precio=Decimal('1000'), destino="Faena",
+        )
+        self.assertEqual(self._ids('/api/campos/?q=tandil'), [campo.id])
+        self.assertEqual(self._ids('/api/ventas/?q=rioplat'), [venta.id])
+        self.assertEqual(self._ids('/api/ventas/?q=exportacion'), [])
+
+    def test_busqueda_sin_tope_de_resultados(self):
+        """Test que el conteo incluye todas las coincidencias aunque solo las primeras se rankeen"""
+        with mock.patch('ganado.busqueda.LIMITE_RESULTADOS', 1):
+            response = self.client.get('/api/vacunos/?q=angus')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len({fila['id'] for fila in response.data['results']}), 3)
+
+    def test_termino_frecuente_acotado(self):
+        """Test que un término frecuente devuelve sus coincidencias más recientes sin rankear"""
+        brangus = Vacuno.objects.get(usuario=self.user, raza='Brangus')
+        with mock.patch('ganado.busqueda.UMBRAL_FRECUENTE', 2):
+            response = self.client.get('/api/vacunos/?q=angus')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([fila['id'] for fila in response.data['results']], [brangus.id, self.hereford.id])
+
+    def test_termino_frecuente_dentro_del_objetivo(self):
+        """Test que buscar un término presente en todos los lotes responde en menos de 50 ms"""
+        Vacuno.objects.bulk_create(
+            Vacuno(
+                usuario=self.user, lote_id=f'H-{numero}', raza='Hereford', sexo='H',
+                fecha_ingreso=date(2024, 1, 1),
+            )
+            for numero in range(20_000)
+        )
+        mejor = math.inf
+        for _ in range(3):
+            inicio = time.perf_counter()
+            resultados = buscar(Vacuno.objects.filter(usuario=self.user), 'hereford')
+            resultados.count()
+            list(resultados[:50])
+            mejor = min(mejor, time.perf_counter() - inicio)
+        self.assertLess(mejor, 0.05)
+
+
+class FiltrosTest(ApiAutenticadaTestCase):
+    """Tests de los filtros declarativos de los endpoints"""
+
+    username = 'filtros'
+
+    # Restricción que debe aparecer en un SEARCH del plan para cada filtro
+    PREDICADOS = {
+        ('CampoFiltros', 'ocupacion'): '(campo_id=? AND fecha_salida=?)',
+        ('CampoFiltros', 'bbox'): 'ganado_campo_rtree VIRTUAL TABLE INDEX',
+        ('VacunoFiltros', 'campo'): '(campo_id=? AND fecha_salida=? AND animal_id=?)',
+        ('VacunoFiltros', 'sexo'): '(usuario_id=? AND sexo=?)',
+        ('VacunoFiltros', 'raza'): '(usuario_id=?)',
+        ('VacunoFiltros', 'ciclo'): 'estado_vacuno_fecha (vacuno_id=?)',
+        ('VacunoFiltros', 'vendido'): '(animal_id=?)',
+        ('VacunoFiltros', 'edad_min'): '(usuario_id=? AND fecha_nacimiento<?)',
+        ('VacunoFiltros', 'edad_max'): '(usuario_id=? AND fecha_nacimiento>?)',
+        ('EstadoVacunoFiltros', 'vacuno'): '(vacuno_id=?)',
+        ('EstadiaAnimalFiltros', 'animal'): '(animal_id=?)',
+        ('EstadiaAnimalFiltros', 'campo'): '(campo_id=?)',
+        ('EstadiaAnimalFiltros', 'abierta'): '(animal_id=? AND fecha_salida=?)',
+        ('VacunacionFiltros', 'animal'): '(animal_id=?)',
+        ('VacunacionFiltros', 'vacuna'): '(vacuna_id=?)',
+        ('VacunacionFiltros', 'fecha_desde'): 'fecha>?',
+        ('VacunacionFiltros', 'fecha_hasta'): 'fecha<?',
+        ('TransferenciaFiltros', 'animal'): '(animal_id=?)',
+        ('TransferenciaFiltros', 'campo_origen'): '(campo_origen_id=?)',
+        ('TransferenciaFiltros', 'campo_destino'): '(campo_destino_id=?)',
+        ('TransferenciaFiltros', 'fecha_desde'): 'fecha>?',
+        ('TransferenciaFiltros', 'fecha_hasta'): 'fecha<?',
+        ('VentaFiltros', 'comprador'): '(animal_id=?)',
+        ('VentaFiltros', 'fecha_desde'): 'fecha>?',
+        ('VentaFiltros', 'fecha_hasta'): 'fecha<?',
+        ('PrecioMercadoFiltros', 'categoria'): '(usuario_id=? AND <expr>=?)',
+        ('PrecioMercadoFiltros', 'fecha_desde'): '(usuario_id=? AND fecha>?)',
+        ('PrecioMercadoFiltros', 'fecha_hasta'): '(usuario_id=? AND fecha<?)',
+    }
+
+    def _lote(self, lote_id, **datos):
+        datos.setdefault('raza', 'Angus')
+        datos.setdefault('sexo', 'M')
+        return Vacuno.objects.create(
+            usuario=self.user, lote_id=lote_id, fecha_ingreso=date(2024, 1, 1), **datos
+        )
+
+    def _ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(fila['id'] for fila in response.data['results'])
+
+    def test_filtros_de_lotes(self):
+        """Test de los filtros nuevos de lotes: sexo, raza, ciclo, vendido, edad y campo"""
+        campo = Campo.objects.create(usuario=self.user, nombre="Norte", ubicacion="X", hectareas=10)
+        hoy = date.today()
+        ternero = self._lote('T1', fecha_nacimiento=hoy - timedelta(days=100))
+        vaca = self._lote('V1', sexo='H', raza='Hereford', fecha_nacimiento=hoy - timedelta(days=2000))
+        EstadoVacuno.objects.create(vacuno=ternero, ciclo_productivo='ternero', estado_general='activo')
+        EstadoVacuno.objects.create(vacuno=vaca, ciclo_productivo='vaca', estado_general='activo')
+        EstadiaAnimal.objects.create(animal=ternero, campo=campo, fecha_entrada=date(2024, 1, 1))
+        Venta.objects.create(animal=vaca, fecha=hoy, comprador="Frigorífico", precio=Decimal('10'))
+
+        self.assertEqual(self._ids('/api/vacunos/?sexo=H'), [vaca.id])
+        self.assertEqual(self._ids('/api/vacunos/?raza=HEREFORD'), [vaca.id])
+        self.assertEqual(self._ids('/api/vacunos/?raza=ref'), [vaca.id])
+        self.assertEqual(self._ids('/api/ventas/?comprador=frigo'), [Venta.objects.get(animal=vaca).id])
+        self.assertEqual(self._ids('/api/vacunos/?ciclo=ternero'), [ternero.id])
+        self.assertEqual(self._ids('/api/vacunos/?vendido=true'), [vaca.id])
+        self.assertEqual(self._ids('/api/vacunos/?vendido=false'), [ternero.id])
+        self.assertEqual(self._ids('/api/vacunos/?edad_max=365'), [ternero.id])
+        self.assertEqual(self._ids('/api/vacunos/?edad_min=365'), [vaca.id])
+        self.assertEqual(self._ids(f'/api/vacunos/?campo={campo.id}'), [ternero.id])
+        self.assertEqual(self._ids('/api/campos/?ocupacion=baja'), [campo.id])
+        self.assertEqual(self._ids('/api/campos/?ocupacion=alta'), [])
+
+    def test_parametros_invalidos_responden_400(self):
+        """Test que los valores inválidos responden 400 con el detalle por parámetro"""
+        response = self.client.get('/api/ventas/?fecha_desde=ayer&fecha_hasta=2024-13-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fecha_desde', response.data)
+        self.assertIn('fecha_hasta', response.data)
+
+        response = self.client.get('/api/vacunos/?sexo=X&vendido=quizas&campo=uno')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'sexo', 'vendido', 'campo'})
+
+        # Fuera de rango: antes desbordaban timedelta o el entero de la base
+        response = self.client.get('/api/vacunos/?edad_min=99999999&edad_max=-99999999&campo=99999999999999999999999')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'edad_min', 'edad_max', 'campo'})
+
+    def _explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Sin recorrido secuencial posible, un Seq Scan en el plan indica
+            # que ningún índice sirve para esa tabla
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+                try:
+                    return queryset.explain()
+                finally:
+                    cursor.execute('RESET enable_seqscan')
+        return queryset.explain()
+
+    def _assert_plan(self, conjunto, nombre, filtro, queryset):
+        plan = self._explain(queryset)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan)
+            if isinstance(filtro, filtros.FiltroTexto) and filtro.lookup == 'icontains':
+                # La coincidencia parcial sola tiene que poder resolverse con el índice trigram
+                modelo = queryset.model
+                plan = self._explain(modelo.objects.filter(**{f'{filtro.campo}__icontains': 'angus'}))
+                self.assertIn(f'busq_{modelo._meta.model_name}_{filtro.campo}_trgm', plan)
+            return
+        # El R*Tree figura como SCAN aunque busca por su índice
+        self.assertNotRegex(plan, r'\bSCAN\b(?! \w+ VIRTUAL TABLE INDEX)')
+        self.assertIn(self.PREDICADOS[(conjunto.__name__, nombre)], plan)
+
+    def test_todos_los_filtros_usan_indices(self):
+        """
+        Test con EXPLAIN que cada filtro se resuelve con un índice y que
+        ninguna tabla se recorre completa. Las tablas están vacías y sin
+        estadísticas, así que SQLite planifica como para tablas grandes;
+        en PostgreSQL se deshabilita el recorrido secuencial.
+        """
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest("Los planes esperados están escritos para SQLite y PostgreSQL")
+
+        muestras = {
+            filtros.FiltroEntero: '1',
+            filtros.FiltroFecha: '2024-01-01',
+            filtros.FiltroBooleano: 'true',
+            filtros.FiltroTexto: 'angus',
+            filtros.FiltroCaja: '-64,-36,-63,-35',
+        }
+        viewsets = [
+            CampoViewSet, VacunoViewSet, EstadoVacunoViewSet, EstadiaAnimalViewSet,
+            VacunacionViewSet, TransferenciaViewSet, VentaViewSet, PrecioMercadoViewSet,
+        ]
+        for viewset in viewsets:
+            vista = viewset()
+            vista.request = type('Request', (), {'user': self.user})()
+            conjunto = viewset.filtros
+            for nombre, filtro in conjunto.filtros.items():
+                if isinstance(filtro, filtros.FiltroBusqueda):
+                    continue
+                with self.subTest(filtros=conjunto.__name__, filtro=nombre):
+                    if isinstance(filtro, filtros.FiltroOpcion):
+                        valor = filtro.opciones[0]
+                    else:
+                        valor = muestras[type(filtro)]
+                    queryset = conjunto(QueryDict(f'{nombre}={valor}')).filtrar(vista.get_queryset())
+                    self._assert_plan(conjunto, nombre, filtro, queryset)
+
+
+class CamposDinamicosTest(ApiAutenticadaTestCase):
+    """Tests de ?fields= y ?omit= en los serializers de ganado"""
+
+    username = 'campos'
+
+    def setUp(self):
+        super().setUp()
+        self.campo = Campo.objects.create(usuario=self.user, nombre="Sur", ubicacion="X", hectareas=100)
+        for i in range(5):
+            lote = Vacuno.objects.create(
+                usuario=self.user, lote_id=f'L{i}', raza='Angus', sexo='M', cantidad=10,
+                fecha_ingreso=date(2024, 1, 1), fecha_nacimiento=date(2023, 1, 1),
+            )
+            EstadoVacuno.objects.create(vacuno=lote, ciclo_productivo='ternero', estado_general='activo')
+            EstadiaAnimal.objects.create(animal=lote, campo=self.campo, fecha_entrada=date(2024, 1, 1))
+
+    def test_fields_recorta_respuesta_y_consultas(self):
+        """Test que ?fields= devuelve solo esos campos sin consultas por lote"""
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/vacunos/?fields=id,lote_id,raza')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'lote_id', 'raza'})
+        # count de la paginación + la página; sin prefetches de estado ni campo
+        self.assertEqual(len(consultas), 2)
+        self.assertNotIn('observaciones', consultas[-1]['sql'])
+
+    def test_respuesta_completa_sin_n_mas_1(self):
+        """Test que sin recorte los campos calculados se resuelven con prefetches"""
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/vacunos/')
+        fila = response.data['results'][0]
+        self.assertEqual(fila['campo_actual_obj']['nombre'], 'Sur')
+        self.assertEqual(fila['estado_actual_obj']['ciclo_productivo'], 'ternero')
+        self.assertFalse(fila['es_vendido'])
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/campos/')
+        fila = response.data['results'][0]
+        self.assertEqual(fila['capacidad_actual'], 5)
+        self.assertEqual(fila['total_animales'], 50)
+        self.assertEqual(fila['animales_por_hectarea'], 0.5)
+
+    def test_omit_y_campos_desconocidos(self):
+        """Test de ?omit= y de los nombres de campo inválidos"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/campos/?omit=vacunos_actuales,capacidad_actual,'
+                                       'total_animales,animales_por_hectarea,estado_ocupacion')
+        self.assertEqual(
+            set(response.data['results'][0]), {'id', 'nombre', 'ubicacion', 'hectareas', 'descripcion', 'geometria'}
+        )
+
+        response = self.client.get('/api/vacunos/?fields=id,caravana')
+        self.assertEqual(response.status_code, 400)
+
+
+class CompresionTest(ApiAutenticadaTestCase):
+    """Tests del middleware de compresión de respuestas"""
+
+    username = 'compresion'
+
+    def setUp(self):
+        super().setUp()
+        Vacuno.objects.bulk_create([
+            Vacuno(usuario=self.user, lote_id=f'L{i}', raza='Angus', sexo='M', fecha_ingreso=date(2024, 1, 1))
+            for i in range(50)
+        ])
+
+    def test_json_con_brotli_y_gzip(self):
+        """Test que el JSON se comprime con brotli si se acepta y si no con gzip"""
+        import brotli
+
+        plano = self.client.get('/api/vacunos/')
+        self.assertNotIn('Content-Encoding', plano)
+        self.assertIn('Accept-Encoding', plano['Vary'])
+
+        response = self.client.get('/api/vacunos/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertLess(len(response.content), len(plano.content) / 3)
+        self.assertEqual(json.loads(brotli.decompress(response.content)), json.loads(plano.content))
+
+        response = self.client.get('/api/vacunos/', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(json.loads(gzip.decompress(response.content)), json.loads(plano.content))
+
+    def test_respuestas_chicas_no_se_comprimen(self):
+        """Test que por debajo del umbral la respuesta va sin comprimir"""
+        response = self.client.get('/api/vacunas/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_streaming(self):
+        """Test que un StreamingHttpResponse se comprime por partes"""
+        filas = [f'{i};lote {i};Angus\n'.encode() for i in range(20000)]
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        middleware = CompresionMiddleware(lambda r: StreamingHttpResponse(iter(filas), content_type='text/csv'))
+        response = middleware(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        partes = list(response.streaming_content)
+        self.assertGreater(len(partes), 1)
+        self.assertEqual(gzip.decompress(b''.join(partes)), b''.join(filas))
+
+        # Los formatos ya comprimidos no se tocan
+        xlsx = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        middleware = CompresionMiddleware(lambda r: HttpResponse(b'x' * 5000, content_type=xlsx))
+        self.assertFalse(middleware(request).has_header('Content-Encoding'))
+
+
+class BootstrapTest(ApiAutenticadaTestCase):
+    """Tests del endpoint de carga inicial /api/bootstrap/"""
+
+    username = 'bootstrap'
+
+    def setUp(self):
+        super().setUp()
+        campo = Campo.objects.create(usuario=self.user, nombre="Norte", ubicacion="X", hectareas=50)
+        Vacuna.objects.create(usuario=self.user, nombre="Aftosa")
+        for i in range(4):
+            lote = Vacuno.objects.create(
+                usuario=self.user, lote_id=f'B{i}', raza='Hereford', sexo='H', cantidad=5,
+                fecha_ingreso=date(2024, 1, 1),
+            )
+            EstadoVacuno.objects.create(vacuno=lote, ciclo_productivo='vaca', estado_general='activo')
+            EstadiaAnimal.objects.create(animal=lote, campo=campo, fecha_entrada=date(2024, 1, 1))
+        Venta.objects.create(animal=lote, fecha=date(2024, 6, 1), precio=Decimal('1000'), comprador="Frigorífico")
+
+    def test_combina_recursos_iguales_a_sus_endpoints(self):
+        """Test que cada recurso devuelve lo mismo que su endpoint"""
+        response = self.client.get('/api/bootstrap/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data), ['campos', 'vacunos', 'vacunas', 'opciones', 'dashboard'])
+        for nombre, url in [('campos', '/api/campos/'), ('vacunas', '/api/vacunas/'),
+                            ('opciones', '/api/opciones/all/')]:
+            self.assertEqual(response.data[nombre]['status'], 200)
+            self.assertEqual(response.data[nombre]['data'], self.client.get(url).data)
+        # El lote vendido no se ofrece en los formularios
+        self.assertEqual(len(response.data['opciones']['data']['lotes']), 3)
+        self.assertEqual(response.data['dashboard']['data']['lotes_por_campo'][0]['total_animales'], 20)
+
+    def test_cache_compartido_entre_recursos(self):
+        """Test que opciones y dashboard consultan campos y lotes una sola vez"""
+        with CaptureQueriesContext(connection) as separadas:
+            self.client.get('/api/opciones/all/')
+            self.client.get('/api/dashboard/stats/')
+        with CaptureQueriesContext(connection) as juntas:
+            self.client.get('/api/bootstrap/?recursos=opciones,dashboard')
+        # Los campos (con su prefetch de estadías) se resuelven una vez en vez de dos
+        self.assertEqual(len(juntas), len(separadas) - 2)
+
+    def test_parametros_y_errores_por_recurso(self):
+        """Test de ?<recurso>.<param>= y de los recursos inválidos"""
+        response = self.client.get('/api/bootstrap/?recursos=vacunos,ventas'
+                                   '&vacunos.fields=id,lote_id&ventas.fecha_desde=mal')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['vacunos']['data']['results'][0]), {'id', 'lote_id'})
+        self.assertEqual(response.data['ventas']['status'], 400)
+
+        response = self.client.get('/api/bootstrap/?recursos=campos,usuarios')
+        self.assertEqual(response.status_code, 400)
+
+
+class SyncTest(ApiAutenticadaTestCase):
+    """Tests de la sincronización incremental /api/sync/"""
+
+    username = 'sync'
+
+    def setUp(self):
+        super().setUp()
+        self.norte = Campo.objects.create(usuario=self.user, nombre="Norte", ubicacion="X", hectareas=50)
+        self.sur = Campo.objects.create(usuario=self.user, nombre="Sur", ubicacion="Y", hectareas=50)
+        self.vacuna = Vacuna.objects.create(usuario=self.user, nombre="Aftosa")
+        self.lote = Vacuno.objects.create(
+            usuario=self.user, lote_id='S1', raza='Angus', sexo='M', fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadiaAnimal.objects.create(animal=self.lote, campo=self.norte, fecha_entrada=date(2024, 1, 1))
+
+    def test_token_devuelve_solo_cambios_y_bajas(self):
+        """Test que ?since= entrega las filas cambiadas y los tombstones posteriores al token"""
+        completo = self.client.get('/api/sync/').data
+        self.assertEqual(len(completo['cambios']['campos']), 2)
+        self.assertEqual(len(completo['cambios']['estadias']), 1)
+        token = completo['token']
+
+        sin_cambios = self.client.get(f'/api/sync/?since={token}').data
+        self.assertEqual(sin_cambios['token'], token)
+        self.assertEqual(sin_cambios['cambios']['campos'], [])
+
+        self.client.post('/api/transferencias/', {
+            'animal': self.lote.id, 'campo_origen': self.norte.id,
+            'campo_destino': self.sur.id, 'fecha': '2024-06-01',
+        }, format='json')
+        sur_id = self.sur.id
+        self.sur.delete()
+
+        delta = self.client.get(f'/api/sync/?since={token}').data
+        # La estadía cerrada con update() también figura como cambio
+        estadias = {fila['id']: fila['fecha_salida'] for fila in delta['cambios']['estadias']}
+        self.assertIn(date(2024, 6, 1), estadias.values())
+        self.assertEqual(delta['cambios']['campos'], [])
+        self.assertEqual(delta['eliminados']['campos'], [sur_id])
+        self.assertEqual(len(delta['eliminados']['transferencias']), 1)
+        self.assertGreater(delta['token'], token)
+
+        self.assertEqual(self.client.get('/api/sync/?since=abc').status_code, 400)
+
+    def test_paginacion_por_token(self):
+        """Test que los cambios se entregan en páginas encadenadas por token"""
+        recibidos = []
+        paginas = 0
+        token = 0
+        while True:
+            pagina = cambios_desde(self.user.id, token, limite=2)
+            paginas += 1
+            for filas in pagina['cambios'].values():
+                recibidos += [fila['id'] for fila in filas]
+            token = pagina['token']
+            if not pagina['hay_mas']:
+                break
+        # 2 campos, 1 lote y 1 estadía
+        self.assertEqual(paginas, 2)
+        self.assertEqual(len(recibidos), 4)
+
+    def test_actualizacion_masiva_invalida_cache(self):
+        """Test que actualizar() sube la versión de datos aunque update() no emita señales"""
+        version = version_datos(self.user.id)
+        filas = actualizar(Campo.objects.filter(usuario=self.user), self.user.id, ubicacion="Z")
+        self.assertEqual(filas, 2)
+        self.assertGreater(version_datos(self.user.id), version)
+
+    def test_operaciones_idempotentes(self):
+        """Test que reenviar una operación con la misma clave no la aplica dos veces"""
+        operaciones = {'operaciones': [
+            {'clave': 'dev1-1', 'recurso': 'vacunaciones', 'accion': 'crear',
+             'datos': {'animal': self.lote.id, 'vacuna': self.vacuna.id, 'fecha': '2024-05-01'}},
+            {'clave': 'dev1-2', 'recurso': 'vacunos', 'accion': 'actualizar', 'id': self.lote.id,
+             'datos': {'observaciones': 'Revisado'}},
+            {'clave': 'dev1-3', 'recurso': 'vacunaciones', 'accion': 'crear', 'datos': {'animal': self.lote.id}},
+        ]}
+        response = self.client.post('/api/sync/', operaciones, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['resultados']], [201, 200, 400])
+        self.assertFalse(any(r['repetida'] for r in response.data['resultados']))
+
+        response = self.client.post('/api/sync/', operaciones, format='json')
+        self.assertTrue(all(r['repetida'] for r in response.data['resultados']))
+        self.assertEqual(response.data['resultados'][0]['data']['fecha'], '2024-05-01')
+        self.assertEqual(Vacunacion.objects.filter(animal=self.lote).count(), 1)
+        self.lote.refresh_from_db()
+        self.assertEqual(self.lote.observaciones, 'Revisado')
+
+        response = self.client.post('/api/sync/', {'operaciones': [
+            {'clave': 'dev1-4', 'recurso': 'vacunos', 'accion': 'eliminar'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AdminTest(TestCase):
+    """Tests de rendimiento y búsqueda del admin de ganado"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin_ganado', password='test1234')
+        self.client.force_login(self.admin)
+        self.campo = Campo.objects.create(usuario=self.admin, nombre="Potrero", ubicacion="X", hectareas=10)
+        self._crear_lotes(0, 3)
+
+    def _crear_lotes(self, desde, hasta):
+        for i in range(desde, hasta):
+            lote = Vacuno.objects.create(
+                usuario=self.admin, lote_id=f'ADM{i:03d}', raza='Angus', sexo='M', cantidad=4,
+                fecha_ingreso=date(2024, 1, 1),
+            )
+            EstadoVacuno.objects.create(vacuno=lote, ciclo_productivo='ternero', estado_general='activo')
+            EstadiaAnimal.objects.create(animal=lote, campo=self.campo, fecha_entrada=date(2024, 1, 1))
+
+    def test_listados_sin_consultas_por_fila(self):
+        """Test que la cantidad de consultas del changelist no depende de las filas"""
+        urls = ['/admin/ganado/campo/', '/admin/ganado/vacuno/', '/admin/ganado/estadovacuno/',
+                '/admin/ganado/estadiaanimal/']
+        antes = {}
+        for url in urls:
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            antes[url] = len(consultas)
+
+        self._crear_lotes(3, 10)
+        for url in urls:
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(url)
+            self.assertEqual(len(consultas), antes[url], url)
+
+        response = self.client.get('/admin/ganado/campo/')
+        self.assertContains(response, '<td class="field-capacidad_actual">10</td>', html=True)
+        self.assertContains(response, '<td class="field-animales_actuales">40</td>', html=True)
+        self.assertContains(self.client.get('/admin/ganado/vacuno/'), 'Potrero')
+
+    def test_busqueda_por_lote(self):
+        """Test que la búsqueda de los modelos relacionados con lotes usa lote_id"""
+        for url in ['/admin/ganado/estadovacuno/', '/admin/ganado/estadiaanimal/', '/admin/ganado/vacuno/']:
+            response = self.client.get(url, {'q': 'ADM002'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['cl'].result_count, 1, url)
+
+        # Sin el tope de resultados rankeados de la API
+        with mock.patch('ganado.busqueda.LIMITE_RESULTADOS', 1):
+            response = self.client.get('/admin/ganado/vacuno/', {'q': 'ADM00'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_conteo_estimado_sin_filtros(self):
+        """Test que el listado sin filtros usa el conteo de las estadísticas de la base"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(filas_estimadas(EstadoVacuno, 'default'), 3)
+
+        with mock.patch('ganado.admin.UMBRAL_CONTEO_ESTIMADO', 1), self.assertNumQueries(1):
+            self.assertEqual(PaginadorEstimado(EstadoVacuno.objects.all(), 100).count, 3)
+        # Con filtros se cuenta de verdad
+        with self.assertNumQueries(1):
+            self.assertEqual(PaginadorEstimado(EstadoVacuno.objects.filter(vacuno__lote_id='ADM001'), 100).count, 1)
+
+
+class MovimientosTest(ApiAutenticadaTestCase):
+    """Tests de movimientos de lotes con una sola estadía abierta"""
+
+    username = 'movimientos'
+
+    def setUp(self):
+        super().setUp()
+        self.norte = Campo.objects.create(usuario=self.user, nombre="Norte", ubicacion="X", hectareas=10)
+        self.sur = Campo.objects.create(usuario=self.user, nombre="Sur", ubicacion="X", hectareas=10)
+        self.lote = Vacuno.objects.create(
+            usuario=self.user, lote_id='MOV1', raza='Angus', sexo='M', cantidad=5, fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadiaAnimal.objects.create(animal=self.lote, campo=self.norte, fecha_entrada=date(2024, 1, 1))
+
+    def test_restriccion_una_estadia_abierta(self):
+        """Test que la base rechaza una segunda estadía abierta del mismo lote"""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            EstadiaAnimal.objects.create(animal=self.lote, campo=self.sur, fecha_entrada=date(2024, 2, 1))
+        # Las estadías cerradas no cuentan
+        EstadiaAnimal.objects.create(
+            animal=self.lote, campo=self.sur, fecha_entrada=date(2023, 1, 1), fecha_salida=date(2023, 6, 1)
+        )
+
+    def test_api_rechaza_segunda_estadia_abierta(self):
+        """Test que la API responde 400 en vez de 500 ante una segunda estadía abierta"""
+        response = self.client.post('/api/estadias/', {
+            'animal': self.lote.id, 'campo': self.sur.id, 'fecha_entrada': '2024-02-01'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fecha_salida', response.data)
+
+        abierta = self.lote.estadias.get(fecha_salida__isnull=True)
+        response = self.client.patch(f'/api/estadias/{abierta.id}/', {'observaciones': 'ok'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_transferencias_dejan_una_estadia_abierta(self):
+        """Test que transferir, cambiar de campo, vender y cancelar la venta mantienen una estadía abierta"""
+        response = self.client.post('/api/transferencias/', {
+            'animal': self.lote.id, 'campo_origen': self.norte.id, 'campo_destino': self.sur.id,
+            'fecha': '2024-03-01'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.lote.estadias.get(fecha_salida__isnull=True).campo, self.sur)
+
+        response = self.client.post(f'/api/vacunos/{self.lote.id}/cambiar_campo/', {'campo_id': self.norte.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lote.estadias.get(fecha_salida__isnull=True).campo, self.norte)
+
+        response = self.client.post('/api/ventas/', {
+            'animal': self.lote.id, 'comprador': 'Frigorífico', 'precio': '1000.00', 'fecha': '2024-04-01'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(self.lote.estadias.filter(fecha_salida__isnull=True).exists())
+
+        response = self.client.delete(f"/api/ventas/{response.data['id']}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.lote.estadias.get(fecha_salida__isnull=True).campo, self.norte)
+
+
+class MovimientosConcurrentesTest(TransactionTestCase):
+    """
+    Tests de movimientos simultáneos del mismo lote: con bloqueo de filas
+    (PostgreSQL) o, en SQLite, con transacciones BEGIN IMMEDIATE
+    (DB_SQLITE_CONCURRENTE)
+    """
+
+    # Piso de rendimiento con los hilos compitiendo por el mismo lote (~100/s medido en SQLite)
+    MIN_TRANSFERENCIAS_POR_SEGUNDO = 20
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_transferencias_simultaneas(self):
+        """Test que transferencias en paralelo del mismo lote dejan exactamente una estadía abierta"""
+        self._transferir_en_paralelo()
+
+    def test_transferencias_simultaneas_sqlite(self):
+        """Test que en SQLite con BEGIN IMMEDIATE las transferencias en paralelo se serializan"""
+        if connection.vendor != 'sqlite':
+            self.skipTest("Solo SQLite")
+
+        def a_archivo():
+            # La base de test en memoria compartida bloquea por tabla sin esperar:
+            # los hilos usan una copia en archivo, como en producción
+            descriptor, ruta = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(descriptor)
+            self.addCleanup(os.remove, ruta)
+            destino = sqlite3.connect(ruta)
+            connection.ensure_connection()
+            connection.connection.backup(destino)
+            destino.close()
+
+            # Las conexiones de los hilos leen estos ajustes al conectarse
+            ajustes = connection.settings_dict
+            anteriores = ajustes['NAME'], ajustes['OPTIONS']
+            self.addCleanup(ajustes.update, {'NAME': anteriores[0], 'OPTIONS': anteriores[1]})
+            ajustes.update({
+                'NAME': ruta,
+                'OPTIONS': {**anteriores[1], 'transaction_mode': 'IMMEDIATE', 'timeout': 30},
+            })
+
+        self._transferir_en_paralelo(a_archivo)
+
+    def _en_hilo(self, funcion, *args):
+        """Ejecuta la función en un hilo nuevo, con sus propias conexiones"""
+        resultado = []
+
+        def ejecutar():
+            try:
+                resultado.append(funcion(*args))
+            finally:
+                connections.close_all()
+
+        hilo = threading.Thread(target=ejecutar)
+        hilo.start()
+        return hilo, resultado
+
+    def _transferir_en_paralelo(self, preparar=None):
+        user = User.objects.create_user(username='concurrente', password='test1234')
+        campos = [
+            Campo.objects.create(usuario=user, nombre=f"Potrero {i}", ubicacion="X", hectareas=10) for i in range(4)
+        ]
+        lote = Vacuno.objects.create(
+            usuario=user, lote_id='CONC1', raza='Angus', sexo='M', cantidad=5, fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadiaAnimal.objects.create(animal=lote, campo=campos[0], fecha_entrada=date(2024, 1, 1))
+        if preparar is not None:
+            preparar()
+
+        hilos, por_hilo = 8, 10
+
+        def transferir(numero):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            errores = []
+            for i in range(por_hilo):
+                response = client.post('/api/transferencias/', {
+                    'animal': lote.id, 'campo_origen': campos[0].id,
+                    'campo_destino': campos[(numero + i) % len(campos)].id, 'fecha': '2024-02-01'
+                }, format='json')
+                if response.status_code != 201:
+                    errores.append(response.status_code)
+            return errores
+
+        inicio = time.perf_counter()
+        ejecuciones = [self._en_hilo(transferir, numero) for numero in range(hilos)]
+        errores = []
+        for hilo, resultado in ejecuciones:
+            hilo.join()
+            errores.extend(resultado[0] if resultado else ['excepción'])
+        por_segundo = hilos * por_hilo / (time.perf_counter() - inicio)
+        self.assertEqual(errores, [])
+        self.assertGreater(por_segundo, self.MIN_TRANSFERENCIAS_POR_SEGUNDO)
+
+        # Desde otro hilo, para leer la misma base que escribieron los hilos
+        hilo, resultado = self._en_hilo(lambda: (
+            EstadiaAnimal.objects.filter(animal=lote, fecha_salida__isnull=True).count(),
+            Transferencia.objects.filter(animal=lote).count(),
+        ))
+        hilo.join()
+        self.assertEqual(resultado, [(1, hilos * por_hilo)])
+
+
+class GeoTest(ApiAutenticadaTestCase):
+    """Tests de geometría, índice espacial y mapa de campos"""
+
+    username = 'geo'
+
+    def setUp(self):
+        super().setUp()
+        # Campos de 1 km de lado cerca de General Pico, La Pampa
+        self.cerca = self._crear_campo("Cerca", -63.75, -35.65)
+        self.lejos = self._crear_campo("Lejos", -63.0, -35.0)
+        self.sin_geometria = Campo.objects.create(usuario=self.user, nombre="Sin mapa", ubicacion="X", hectareas=10)
+
+    def _cuadrado(self, lon, lat, lado_km=1.0):
+        dlat = lado_km / 111.32
+        dlon = lado_km / (111.32 * math.cos(math.radians(lat)))
+        anillo = [[lon, lat], [lon + dlon, lat], [lon + dlon, lat + dlat], [lon, lat + dlat], [lon, lat]]
+        return {'type': 'Polygon', 'coordinates': [anillo]}
+
+    def _crear_campo(self, nombre, lon, lat):
+        return Campo.objects.create(usuario=self.user, nombre=nombre, ubicacion="X", geometria=self._cuadrado(lon, lat))
+
+    def test_area_y_caja_desde_el_poligono(self):
+        """Test que las hectáreas y la caja envolvente se calculan de la geometría"""
+        self.assertAlmostEqual(float(self.cerca.hectareas), 100, delta=1)
+        self.assertAlmostEqual(self.cerca.bbox_oeste, -63.75)
+        self.assertAlmostEqual(self.cerca.bbox_sur, -35.65)
+
+        response = self.client.post('/api/campos/', {
+            'nombre': 'Nuevo', 'ubicacion': 'X', 'geometria': self._cuadrado(-64, -36, lado_km=2)
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertAlmostEqual(float(response.data['hectareas']), 400, delta=4)
+
+        response = self.client.post('/api/campos/', {
+            'nombre': 'Roto', 'ubicacion': 'X', 'geometria': {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1]]]}
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('geometria', response.data)
+
+        # 20° x 20°: la superficie no entra en el campo hectareas
+        response = self.client.post('/api/campos/', {
+            'nombre': 'Enorme', 'ubicacion': 'X',
+            'geometria': {'type': 'Polygon', 'coordinates': [[[-70, -40], [-50, -40], [-50, -20], [-70, -20], [-70, -40]]]},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('geometria', response.data)
+
+    def test_filtro_bbox_usa_el_indice(self):
+        """Test que ?bbox= devuelve los campos que se cruzan con la caja y sigue las ediciones"""
+        self.assertTrue(tiene_rtree(connection.alias))
+        response = self.client.get('/api/campos/', {'bbox': '-63.8,-35.7,-63.7,-35.6', 'fields': 'id'})
+        self.assertEqual([c['id'] for c in response.data['results']], [self.cerca.id])
+
+        # Mover el campo actualiza el índice
+        self.cerca.geometria = self._cuadrado(-63.0, -35.02)
+        self.cerca.save()
+        response = self.client.get('/api/campos/', {'bbox': '-63.1,-35.1,-62.9,-34.9', 'fields': 'id'})
+        self.assertEqual(sorted(c['id'] for c in response.data['results']), sorted([self.cerca.id, self.lejos.id]))
+        response = self.client.get('/api/campos/', {'bbox': '-63.8,-35.7,-63.7,-35.6'})
+        self.assertEqual(response.data['count'], 0)
+
+        response = self.client.get('/api/campos/', {'bbox': '10,20'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_mapa_geojson(self):
+        """Test que el mapa devuelve solo los campos de la vista coloreados por ocupación"""
+        lote = Vacuno.objects.create(
+            usuario=self.user, lote_id='GEO1', raza='Angus', sexo='M', cantidad=300, fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadiaAnimal.objects.create(animal=lote, campo=self.cerca, fecha_entrada=date(2024, 1, 1))
+
+        response = self.client.get('/api/campos/mapa/', {'bbox': '-64,-36,-63.5,-35.5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['type'], 'FeatureCollection')
+        self.assertFalse(response.data['truncado'])
+        [feature] = response.data['features']
+        self.assertEqual(feature['id'], self.cerca.id)
+        self.assertEqual(feature['geometry']['type'], 'Polygon')
+        self.assertEqual(feature['properties']['total_animales'], 300)
+        self.assertEqual(feature['properties']['estado_ocupacion'], 'alta')
+        self.assertEqual(feature['properties']['color'], '#c62828')
+
+        self.assertEqual(self.client.get('/api/campos/mapa/').status_code, 400)
+
+    def test_campos_cercanos(self):
+        """Test que los campos cercanos se ordenan por distancia al borde del polígono"""
+        response = self.client.get('/api/campos/cercanos/', {'lon': -63.745, 'lat': -35.645, 'cantidad': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['id'] for c in response.data], [self.cerca.id, self.lejos.id])
+        self.assertEqual(response.data[0]['distancia_km'], 0)
+        self.assertGreater(response.data[1]['distancia_km'], 80)
+
+        response = self.client.get('/api/campos/cercanos/', {'lon': -63.745, 'lat': -35.645, 'cantidad': 1})
+        self.assertEqual([c['id'] for c in response.data], [self.cerca.id])
+        self.assertEqual(self.client.get('/api/campos/cercanos/', {'lat': 1}).status_code, 400)
+
+
+class PastoreoTest(ApiAutenticadaTestCase):
+    """Tests del planificador de pastoreo y las transferencias masivas"""
+
+    username = 'pastoreo'
+
+    def setUp(self):
+        super().setUp()
+        # Rango de ocupación media: 80 a 200 cabezas en 100 ha
+        self.lleno = Campo.objects.create(usuario=self.user, nombre="Lleno", ubicacion="X", hectareas=100)
+        self.flaco = Campo.objects.create(usuario=self.user, nombre="Flaco", ubicacion="X", hectareas=100)
+        self.descanso = Campo.objects.create(usuario=self.user, nombre="Descanso", ubicacion="X", hectareas=100)
+        self.lotes = [self._lote(self.lleno, 100, i) for i in range(3)] + [self._lote(self.flaco, 30, 3)]
+        # Salió un lote del campo hace 10 días
+        viejo = self._lote(self.descanso, 10, 9)
+        EstadiaAnimal.objects.filter(animal=viejo).update(fecha_salida=date(2024, 5, 22))
+
+    def _lote(self, campo, cantidad, numero):
+        lote = Vacuno.objects.create(
+            usuario=self.user, lote_id=f'PAS{numero}', raza='Angus', sexo='M', cantidad=cantidad,
+            fecha_ingreso=date(2024, 1, 1),
+        )
+        EstadiaAnimal.objects.create(animal=lote, campo=campo, fecha_entrada=date(2024, 1, 1))
+        return lote
+
+    def test_plan_respeta_rango_y_descanso(self):
+        """Test que el plan deja los campos en rango con un movimiento y sin usar el campo en descanso"""
+        response = self.client.get('/api/campos/plan_pastoreo/', {'fecha': '2024-06-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['campos_fuera_de_rango'], 0)
+        self.assertEqual(response.data['movimientos'], 1)
+        [transferencia] = response.data['transferencias']
+        self.assertEqual(transferencia['campo_origen'], self.lleno.id)
+        self.assertEqual(transferencia['campo_destino'], self.flaco.id)
+        campos = {campo['id']: campo for campo in response.data['campos']}
+        self.assertTrue(campos[self.descanso.id]['en_descanso'])
+        self.assertEqual(campos[self.lleno.id]['actual']['estado_ocupacion'], 'alta')
+        self.assertEqual(campos[self.lleno.id]['propuesto']['estado_ocupacion'], 'media')
+
+        # Terminado el descanso, el campo vacío también es un destino posible
+        response = self.client.get('/api/campos/plan_pastoreo/', {'fecha': '2024-06-01', 'descanso': 5})
+        self.assertFalse({c['id']: c for c in response.data['campos']}[self.descanso.id]['en_descanso'])
+
+        for descanso in (-1, 1000000, 99999999999):
+            invalido = self.client.get('/api/campos/plan_pastoreo/', {'descanso': descanso})
+            self.assertEqual(invalido.status_code, 400)
+        self.assertEqual(response.data['campos_fuera_de_rango'], 0)
+
+    def test_planificador_en_memoria(self):
+        """Test que el planificador resuelve con pocos movimientos y deja todo en rango"""
+        aleatorio = random.Random(1)
+        hectareas = {campo: aleatorio.choice([50, 100, 200]) for campo in range(60)}
+        lotes = {lote: (aleatorio.choice([10, 20, 40]), aleatorio.randrange(60)) for lote in range(400)}
+        plan = PlanPastoreo(hectareas, set(), lotes).resolver()
+        self.assertEqual(plan.fuera_de_rango(), [])
+        self.assertEqual(plan.movimientos, len(plan.transferencias()))
+        self.assertLess(plan.movimientos, len(lotes) / 2)
+
+    def test_transferencia_masiva_del_plan(self):
+        """Test que las transferencias del plan se aplican juntas y un plan viejo se rechaza"""
+        plan = self.client.get('/api/campos/plan_pastoreo/', {'fecha': '2024-06-01'}).data
+        datos = {'fecha': '2024-06-01', 'transferencias': plan['transferencias']}
+
+        response = self.client.post('/api/transferencias/masiva/', datos, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 1)
+        lote = Vacuno.objects.get(pk=plan['transferencias'][0]['animal'])
+        self.assertEqual(lote.estadias.get(fecha_salida__isnull=True).campo, self.flaco)
+        self.assertEqual(lote.estado_actual().estado_general, 'transferido')
+
+        # El lote ya no está en el campo de origen: no se aplica nada
+        otro = {'animal': self.lotes[0].id, 'campo_origen': self.lleno.id, 'campo_destino': self.descanso.id}
+        if otro['animal'] == lote.id:
+            otro['animal'] = self.lotes[1].id
+        response = self.client.post('/api/transferencias/masiva/', {
+            'transferencias': [otro] + datos['transferencias']
+        }, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['lotes'], [lote.lote_id])
+        self.assertEqual(Transferencia.objects.count(), 1)
+
+        response = self.client.post('/api/transferencias/masiva/', {
+            'transferencias': [{'animal': 999999, 'campo_origen': self.lleno.id, 'campo_destino': self.flaco.id}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProyeccionTest(ApiAutenticadaTestCase):
+    """Tests de la proyección Monte Carlo del rodeo"""
+
+    username = 'proyeccion'
+
+    def setUp(self):
+        super().setUp()
+        self.campo = Campo.objects.create(usuario=self.user, nombre="Campo", ubicacion="X", hectareas=100)
+        hoy = date.today()
+        # 10 novillos de 18 meses y 20 vacas de 4 años
+        for lote_id, sexo, cantidad, dias in (('NOV', 'M', 10, 558), ('VAC', 'H', 20, 1470)):
+            lote = Vacuno.objects.create(
+                usuario=self.user, lote_id=lote_id, raza='Angus', sexo=sexo, cantidad=cantidad,
+                fecha_nacimiento=hoy - timedelta(days=dias), fecha_ingreso=hoy - timedelta(days=30),
+            )
+            EstadiaAnimal.objects.create(animal=lote, campo=self.campo, fecha_entrada=hoy - timedelta(days=30))
+        PrecioMercado.objects.create(
+            usuario=self.user, fecha=hoy - timedelta(days=1), categoria='Novillo', precio=Decimal('500000')
+        )
+
+    def test_proyeccion_determinista(self):
+        """Test que sin mortalidad ni preñez los novillos se venden a los 20 meses y las vacas quedan"""
+        response = self.client.get('/api/analytics/proyeccion/', {
+            'meses': 12, 'escenarios': 50, 'mortalidad_anual': 0, 'mortalidad_terneros_anual': 0,
+            'tasa_prenez': 0, 'semilla': 1,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['meses']), 12)
+        self.assertEqual(response.data['categoria_venta'], 'novillo')
+        [campo] = response.data['campos']
+        self.assertEqual(campo['cabezas']['p50'][:3], [30, 20, 20])
+        self.assertEqual(campo['densidad']['p10'][0], 0.3)
+        self.assertEqual(response.data['total']['ingresos']['p90'][:3], [0, 5000000, 0])
+        self.assertEqual(response.data['total']['ingresos_acumulados']['p50'][-1], 5000000)
+
+    def test_nacimientos_y_bandas(self):
+        """Test que las vacas paren, las bandas están ordenadas y la semilla hace la corrida reproducible"""
+        parametros = {'meses': 24, 'escenarios': 200, 'semilla': 7}
+        datos = self.client.get('/api/analytics/proyeccion/', parametros).data
+        total = datos['total']['cabezas']
+        self.assertGreater(total['p50'][-1], 20)
+        self.assertTrue(all(a <= b <= c for a, b, c in zip(total['p10'], total['p50'], total['p90'], strict=True)))
+        self.assertEqual(self.client.get('/api/analytics/proyeccion/', parametros).data['total'], datos['total'])
+
+    def test_escenarios_acotados_por_campos(self):
+        """Test que con muchos campos se corren menos escenarios y pedir más del máximo devuelve 400"""
+        with mock.patch('ganado.proyeccion.MAX_CELDAS_REQUEST', 12 * 2 * 100):
+            response = self.client.get('/api/analytics/proyeccion/', {'meses': 12})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['escenarios'], 100)
+            self.assertEqual(response.data['escenarios_maximos'], 100)
+
+            response = self.client.get('/api/analytics/proyeccion/', {'meses': 12, 'escenarios': 101})
+            self.assertEqual(response.status_code, 400)
+
+    def test_procesos_no_cambian_el_resultado(self):
+        """Test que con la misma semilla la simulación en procesos da lo mismo que en serie"""
+        cohortes = {
+            'campo': np.array([0, 1]), 'hembra': np.array([True, False]),
+            'edad': np.array([30, 10]), 'cantidad': np.array([50, 40]), 'n_campos': 2,
+        }
+        parametros = {
+            'meses': 12, 'mortalidad_anual': 0.02, 'mortalidad_terneros_anual': 0.08, 'tasa_prenez': 0.8,
+            'edad_primer_parto_meses': 24, 'edad_venta_meses': 20, 'precio_venta': 1.0,
+        }
+        with mock.patch('ganado.simulacion.ESCENARIOS_POR_BLOQUE', 30):
+            serie = simular(cohortes, parametros, 101, semilla=3)
+            paralelo = simular(cohortes, parametros, 101, semilla=3, procesos=2)
+        self.assertEqual(serie[0].shape, (12, 101, 2))
+        np.testing.assert_array_equal(serie[0], paralelo[0])
+        np.testing.assert_array_equal(serie[1], paralelo[1])
+
+    def test_comando_sin_tope_del_request(self):
+        """Test que el comando reparte en procesos, no se limita como el request y coincide con la API"""
+        parametros = {'meses': '12', 'escenarios': '200', 'semilla': 7}
+        salida = StringIO()
+        with mock.patch('ganado.simulacion.ESCENARIOS_POR_BLOQUE', 50):
+            with mock.patch('ganado.proyeccion.MAX_CELDAS_REQUEST', 12 * 2 * 100):
+                call_command('proyectar_rodeo', usuario=self.username, procesos=2, stdout=salida, **parametros)
+                self.assertEqual(self.client.get('/api/analytics/proyeccion/', parametros).status_code, 400)
+            datos = self.client.get('/api/analytics/proyeccion/', parametros).data
+        resultado = json.loads(salida.getvalue())
+        self.assertEqual(resultado['escenarios'], 200)
+        self.assertEqual(resultado['total'], datos['total'])
+
+        with self.assertRaises(CommandError):
+            call_command('proyectar_rodeo', usuario=self.username, procesos=0, stdout=StringIO())
+
+    def test_parametros_invalidos(self):
+        """Test que los parámetros fuera de rango devuelven 400"""
+        for parametros in ({'meses': 60}, {'escenarios': 'mil'}, {'tasa_prenez': 1.5}, {'semilla': -1}):
+            response = self.client.get('/api/analytics/proyeccion/', parametros)
+            self.assertEqual(response.status_code, 400, parametros)
+            self.assertIn('error', response.data)
+
+
+class PesadaTest(ApiAutenticadaTestCase):
+    """Tests de pesadas, su importación y la ganancia diaria de peso"""
+
+    username = 'pesadas'
+
+    def setUp(self):
+        super().setUp()
+        self.norte = Campo.objects.create(usuario=self.user, nombre="Norte", ubicacion="X", hectareas=100)
+        self.sur = Campo.objects.create(usuario=self.user, nombre="Sur", ubicacion="X", hectareas=100)
+        self.angus = Vacuno.objects.create(
+            usuario=self.user, lote_id='ANG', raza='Angus', sexo='M', cantidad=10, fecha_ingreso=date(2024, 1, 1)
+        )
+        self.hereford = Vacuno.objects.create(
+            usuario=self.user, lote_id='HER', raza='Hereford', sexo='M', cantidad=20, fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadiaAnimal.objects.create(
+            animal=self.angus, campo=self.norte, fecha_entrada=date(2024, 1, 1), fecha_salida=date(2024, 3, 1)
+        )
+        EstadiaAnimal.objects.create(animal=self.angus, campo=self.sur, fecha_entrada=date(2024, 3, 1))
+        EstadiaAnimal.objects.create(animal=self.hereford, campo=self.norte, fecha_entrada=date(2024, 1, 1))
+
+    def test_importar_csv_de_balanza(self):
+        """Test que la exportación por animal se promedia por lote y fecha y un reimporte reemplaza"""
+        contenido = (
+            b"lote;fecha;peso\n"
+            b"ANG;01/01/2024;200\n"
+            b"ANG;01/01/2024;210\n"
+            b"HER;01/01/2024;250,5\n"
+            b"XXX;01/01/2024;100\n"
+            b"ANG;31/02/2024;100\n"
+        )
+        archivo = SimpleUploadedFile('balanza.csv', contenido, content_type='text/csv')
+        response = self.client.post('/api/pesadas/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creadas'], 2)
+        self.assertEqual(response.data['total_errores'], 2)
+        pesada = Pesada.objects.get(animal=self.angus)
+        self.assertEqual((pesada.peso_promedio, pesada.cabezas), (Decimal('205.0'), 2))
+
+        response = self.client.post('/api/pesadas/importar/', {'pesadas': [
+            {'lote': 'ANG', 'fecha': '2024-01-01', 'peso': '190', 'cabezas': '10'},
+        ]}, format='json')
+        self.assertEqual(response.data['actualizadas'], 1)
+        pesada.refresh_from_db()
+        self.assertEqual((pesada.peso_promedio, pesada.cabezas), (Decimal('190.0'), 10))
+
+        # La importación queda registrada para la sincronización
+        cambios = self.client.get('/api/sync/').data['cambios']['pesadas']
+        self.assertEqual(len(cambios), 2)
+
+    def test_importar_valores_numericos_y_csv_no_utf8(self):
+        """Test que acepta peso, cabezas y lote numéricos en JSON y rechaza un CSV que no es UTF-8"""
+        Vacuno.objects.create(
+            usuario=self.user, lote_id='101', raza='Angus', sexo='M', cantidad=5, fecha_ingreso=date(2024, 1, 1)
+        )
+        response = self.client.post('/api/pesadas/importar/', {'pesadas': [
+            {'lote': 'ANG', 'fecha': '2024-03-01', 'peso': 350},
+            {'lote': 101, 'fecha': '2024-03-01', 'peso': 300.5, 'cabezas': 5},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creadas'], 2)
+
+        archivo = SimpleUploadedFile('balanza.csv', "lote;fecha;peso\nAÑO;01/01/2024;200\n".encode('latin-1'))
+        response = self.client.post('/api/pesadas/importar/', {'archivo': archivo}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_ganancia_diaria(self):
+        """Test que la GDP se calcula por lote, campo del tramo y raza ponderada por cabezas"""
+        for lote, fecha, peso, cabezas in (
+            (self.angus, date(2024, 1, 1), 200, 10),
+            (self.angus, date(2024, 3, 1), 260, 10),  # 60 días en Norte: 1 kg/día
+            (self.angus, date(2024, 5, 1), 290, 10),  # 61 días en Sur
+            (self.hereford, date(2024, 1, 1), 250, 20),
+            (self.hereford, date(2024, 3, 1), 280, 20),  # 60 días en Norte: 0,5 kg/día
+        ):
+            Pesada.objects.create(animal=lote, fecha=fecha, peso_promedio=peso, cabezas=cabezas)
+
+        response = self.client.get('/api/analytics/ganancia/')
+        self.assertEqual(response.status_code, 200)
+        lotes = {lote['lote_id']: lote for lote in response.data['lotes']}
+        self.assertEqual(lotes['ANG']['ganancia_diaria'], round(90 / 121, 3))
+        self.assertEqual(lotes['ANG']['campo'], 'Sur')
+        self.assertEqual(lotes['HER']['ganancia_diaria'], 0.5)
+        campos = {campo['nombre']: campo for campo in response.data['campos']}
+        # Norte: (60 kg * 10 + 30 kg * 20) / (60 días * 10 + 60 días * 20)
+        self.assertEqual(campos['Norte']['ganancia_diaria'], round(1200 / 1800, 3))
+        self.assertEqual(campos['Sur']['ganancia_diaria'], round(30 / 61, 3))
+        razas = {raza['raza']: raza for raza in response.data['razas']}
+        self.assertEqual(razas['Hereford']['dias_cabeza'], 1200)
+
+        # La ventana deja afuera el primer tramo
+        response = self.client.get('/api/analytics/ganancia/', {'fecha_desde': '2024-02-01'})
+        self.assertEqual(response.data['total']['tramos'], 1)
+        self.assertIsNone({lote['lote_id']: lote for lote in response.data['lotes']}['HER']['ganancia_diaria'])
+        self.assertEqual(self.client.get('/api/analytics/ganancia/', {'fecha_desde': 'x'}).status_code, 400)
+
+    def test_comando_rechaza_lote_no_positivo(self):
+        """Test que importar_pesadas --lote 0 falla con un error del comando"""
+        with self.assertRaisesMessage(CommandError, '--lote'):
+            call_command('importar_pesadas', 'balanza.csv', usuario=self.username, lote=0)
+
+    def test_una_pesada_por_lote_y_fecha(self):
+        """Test que no se aceptan dos pesadas del mismo lote el mismo día ni lotes de otro usuario"""
+        datos = {'animal': self.angus.id, 'fecha': '2024-01-01', 'peso_promedio': '200', 'cabezas': 10}
+        self.assertEqual(self.client.post('/api/pesadas/', datos, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/api/pesadas/', datos, format='json').status_code, 400)
+
+        otro = User.objects.create_user(username='otro_pesadas', password='test1234')
+        ajeno = Vacuno.objects.create(
+            usuario=otro, lote_id='AJE', raza='Angus', sexo='M', cantidad=5, fecha_ingreso=date(2024, 1, 1)
+        )
+        response = self.client.post('/api/pesadas/', {**datos, 'animal': ajeno.id}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class ReporteTest(ApiAutenticadaTestCase):
+    """Tests de los reportes XLSX/PDF generados por el worker"""
+
+    username = 'reportes'
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(REPORTES={'DIRECTORIO': directorio.name, 'PROCESANDO_SEGUNDOS': 600})
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        super().setUp()
+        campo = Campo.objects.create(usuario=self.user, nombre="Norte", ubicacion="X", hectareas=100)
+        lote = Vacuno.objects.create(
+            usuario=self.user, lote_id='L1', raza='Angus', sexo='M', cantidad=10, fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadiaAnimal.objects.create(animal=lote, campo=campo, fecha_entrada=date(2024, 1, 1))
+        Venta.objects.create(animal=lote, fecha=date(2024, 3, 10), comprador='Frigorífico', precio=Decimal('5000'))
+
+    def _pedir(self, **datos):
+        return self.client.post('/api/reportes/', {'reporte': 'ventas', 'periodo': '2024-03', **datos}, format='json')
+
+    def test_reporte_se_genera_una_vez_por_version(self):
+        """Test que el pedido queda en cola, el worker lo arma y se reutiliza hasta que cambian los datos"""
+        response = self._pedir()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['estado'], 'pendiente')
+        pedido = response.data['id']
+        self.assertEqual(self._pedir().data['id'], pedido)
+        self.assertEqual(self.client.get(f'/api/reportes/{pedido}/descargar/').status_code, 409)
+
+        self.assertEqual(procesar_pendientes(), 1)
+        response = self._pedir()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], pedido)
+        self.assertEqual(response.data['estado'], 'listo')
+        self.assertEqual(procesar_pendientes(), 0)
+
+        Campo.objects.create(usuario=self.user, nombre="Sur", ubicacion="X", hectareas=50)
+        response = self._pedir()
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.data['id'], pedido)
+
+    def test_version_cambia_con_precios(self):
+        """Test que editar la categoría o una fecha vieja de un precio cambia la versión del reporte"""
+        PrecioMercado.objects.create(usuario=self.user, fecha=date(2024, 1, 1), categoria='Novillo', precio=100)
+        precio = PrecioMercado.objects.create(
+            usuario=self.user, fecha=date(2024, 2, 1), categoria='Novillo', precio=110
+        )
+        version = version_reporte(self.user, 'ventas', '2024-03')
+        PrecioMercado.objects.filter(pk=precio.pk).update(categoria='Vaquillona')
+        self.assertNotEqual(version_reporte(self.user, 'ventas', '2024-03'), version)
+        version = version_reporte(self.user, 'ventas', '2024-03')
+        PrecioMercado.objects.filter(pk=precio.pk).update(fecha=date(2024, 1, 15))
+        self.assertNotEqual(version_reporte(self.user, 'ventas', '2024-03'), version)
+
+    def test_descargar_xlsx_y_pdf(self):
+        """Test que los archivos descargados son un XLSX y un PDF válidos"""
+        ids = {formato: self._pedir(formato=formato).data['id'] for formato in ('xlsx', 'pdf')}
+        procesar_pendientes()
+
+        response = self.client.get(f"/api/reportes/{ids['xlsx']}/descargar/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ventas-2024-03.xlsx', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as paquete:
+            self.assertIn('xl/workbook.xml', paquete.namelist())
+            self.assertIn('Frigorífico', paquete.read('xl/worksheets/sheet2.xml').decode())
+
+        response = self.client.get(f"/api/reportes/{ids['pdf']}/descargar/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_pedido_invalido(self):
+        """Test que un período inválido o futuro y otro usuario devuelven error"""
+        self.assertEqual(self._pedir(periodo='2024-13').status_code, 400)
+        self.assertEqual(self._pedir(periodo='2999-01').status_code, 400)
+        self.assertEqual(self._pedir(reporte='otro').status_code, 400)
+
+        pedido = self._pedir().data['id']
+        otro = APIClient()
+        otro.force_authenticate(user=User.objects.create_user(username='otro', password='test1234'))
+        self.assertEqual(otro.get(f'/api/reportes/{pedido}/').status_code, 404)
+
+
+class AuditoriaTest(ApiAutenticadaTestCase):
+    """Tests del registro de auditoría"""
+
+    username = 'auditado'
+
+    def test_historial_de_un_lote(self):
+        """Test que un alta y un cambio quedan con su autor y solo los campos modificados"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/vacunos/', {
+                'lote_id': 'AUD1', 'raza': 'Angus', 'sexo': 'M', 'cantidad': 10, 'fecha_ingreso': '2024-01-01',
+            }, format='json')
+            lote_id = response.data['id']
+            self.client.patch(f'/api/vacunos/{lote_id}/', {'cantidad': 12}, format='json')
+            # Guardar sin cambios no registra nada
+            Vacuno.objects.get(pk=lote_id).save()
+
+        response = self.client.get(f'/api/auditoria/?modelo=vacuno&objeto={lote_id}')
+        self.assertEqual(response.status_code, 200)
+        cambio, alta = response.data['results']
+        self.assertEqual(cambio['accion'], 'cambio')
+        self.assertEqual(cambio['cambios'], {'cantidad': [10, 12]})
+        self.assertEqual(cambio['autor_username'], 'auditado')
+        self.assertEqual(alta['accion'], 'alta')
+        self.assertEqual(alta['cambios']['lote_id'], 'AUD1')
+        self.assertNotIn('usuario_id', alta['cambios'])
+        self.assertEqual(self.client.get('/api/auditoria/?modelo=otro').status_code, 400)
+
+    def test_rollback_no_se_audita(self):
+        """Test que las escrituras deshechas por un savepoint no quedan en la auditoría"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Campo.objects.create(usuario=self.user, nombre="Queda", ubicacion="X")
+                try:
+                    with transaction.atomic():
+                        Campo.objects.create(usuario=self.user, nombre="Se deshace", ubicacion="X")
+                        raise IntegrityError
+                except IntegrityError:
+                    pass
+            # Todavía sin commit: nada registrado
+            self.assertFalse(Auditoria.objects.exists())
+
+        self.assertEqual(
+            [entrada.cambios['nombre'] for entrada in Auditoria.objects.filter(modelo='campo')], ['Queda']
+        )
+
+
+class AuditoriaLoteTest(TransactionTestCase):
+    """Tests de la auditoría acumulada por request (necesita commits reales)"""
+
+    def test_un_insert_por_request(self):
+        """Test que una venta (venta, estado y estadía cerrada) se audita con un solo INSERT"""
+        user = User.objects.create_user(username='lote_auditoria', password='test1234')
+        campo = Campo.objects.create(usuario=user, nombre="Norte", ubicacion="X")
+        lote = Vacuno.objects.create(
+            usuario=user, lote_id='AUD2', raza='Angus', sexo='M', cantidad=5, fecha_ingreso=date(2024, 1, 1)
+        )
+        EstadiaAnimal.objects.create(animal=lote, campo=campo, fecha_entrada=date(2024, 1, 1))
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.post('/api/ventas/', {
+                'animal': lote.id, 'fecha': '2024-05-01', 'comprador': 'Frigorífico', 'precio': '1000.00',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        inserts = [
+            consulta for consulta in consultas.captured_queries
+            if consulta['sql'].startswith('INSERT INTO "ganado_auditoria"')
+        ]
+        self.assertEqual(len(inserts), 1)
+
+        entradas = {(e.modelo, e.accion): e for e in Auditoria.objects.filter(usuario=user, autor=user)}
+        self.assertIn(('venta', 'alta'), entradas)
+        self.assertIn(('estadovacuno', 'alta'), entradas)
+        self.assertEqual(entradas[('estadiaanimal', 'cambio')].cambios, {'fecha_salida': [None, '2024-05-01']})
+
+
+class LimitesTest(TestCase):
+    """Tests del límite de requests con baldes de fichas"""
+
+    LIMITES = {
+        'ACTIVO': True,
+        'BACKEND': 'local',
+        'CACHE': 'default',
+        'CAPACIDAD': 25,
+        'RECARGA': 0.01,
+        'ENDPOINT_CAPACIDAD': 2,
+        'ENDPOINT_RECARGA': 0.01,
+        'COSTOS': {'dashboard.stats': 10},
+    }
+
+    def setUp(self):
+        self.clientes = []
+        for nombre in ('inunda', 'vecino'):
+            cliente = APIClient()
+            cliente.force_authenticate(user=User.objects.create_user(username=nombre, password='test1234'))
+            self.clientes.append(cliente)
+
+    def _estados(self, cliente, url, veces):
+        return [cliente.get(url).status_code for _ in range(veces)]
+
+    def test_endpoint_pesado_tiene_balde_propio(self):
+        """Test que un loop sobre un endpoint pesado recibe 429 sin cortar el resto de la API ni a otros usuarios"""
+        for backend in ('local', 'cache'):
+            with self.subTest(backend=backend), override_settings(LIMITES={**self.LIMITES, 'BACKEND': backend}):
+                inunda, vecino = self.clientes
+                self.assertEqual(self._estados(inunda, '/api/dashboard/stats/', 2), [200, 200])
+                response = inunda.get('/api/dashboard/stats/')
+                self.assertEqual(response.status_code, 429)
+                self.assertGreaterEqual(int(response['Retry-After']), 1)
+                # El rechazo no gastó fichas del balde del usuario
+                self.assertEqual(self._estados(inunda, '/api/campos/', 5), [200] * 5)
+                self.assertEqual(vecino.get('/api/dashboard/stats/').status_code, 200)
+
+    def test_costo_por_endpoint(self):
+        """Test que los endpoints pesados gastan más fichas del balde del usuario"""
+        with override_settings(LIMITES={**self.LIMITES, 'ENDPOINT_CAPACIDAD': 100}):
+            inunda, _ = self.clientes
+            # 25 fichas: dos stats (20) y cinco requests comunes
+            self.assertEqual(self._estados(inunda, '/api/dashboard/stats/', 2), [200, 200])
+            self.assertEqual(self._estados(inunda, '/api/campos/', 6), [200] * 5 + [429])
+            self.assertEqual(inunda.get('/api/dashboard/stats/').status_code, 429)
+
+        with override_settings(LIMITES={**self.LIMITES, 'ACTIVO': False}):
+            self.assertEqual(self._estados(inunda, '/api/dashboard/stats/', 5), [200] * 5)
+
+    def test_sync_no_limita_operaciones(self):
+        """Test que las operaciones de un sync no gastan fichas aparte ni guardan un 429"""
+        operaciones = {'operaciones': [
+            {'clave': f'dev1-{numero}', 'recurso': 'campos', 'accion': 'crear',
+             'datos': {'nombre': f'Campo {numero}', 'ubicacion': 'X'}}
+            for numero in range(8)
+        ]}
+        with override_settings(LIMITES={**self.LIMITES, 'CAPACIDAD': 5}):
+            inunda, _ = self.clientes
+            response = inunda.post('/api/sync/', operaciones, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([r['status'] for r in response.data['resultados']], [201] * 8)
+
+        # Un 429 de una operación no queda guardado como su respuesta
+
+        usuario = User.objects.get(username='inunda')
+        self.assertEqual(aplicar_una_vez(usuario, 'dev1-9', lambda: (429, None)), (429, None, False))
+        self.assertEqual(aplicar_una_vez(usuario, 'dev1-9', lambda: (201, {'id': 1})), (201, {'id': 1}, False))
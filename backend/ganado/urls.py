@@ -2,11 +2,18 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (
+    AnalyticsViewSet,
+    AuditoriaViewSet,
+    BootstrapViewSet,
     CampoViewSet,
     DashboardViewSet,
     EstadiaAnimalViewSet,
     EstadoVacunoViewSet,
     OpcionesViewSet,
+    PesadaViewSet,
+    PrecioMercadoViewSet,
+    ReporteViewSet,
+    SyncViewSet,
     TransferenciaViewSet,
     VacunacionViewSet,
     VacunaViewSet,
@@ -24,8 +31,15 @@ router.register(r'vacunas', VacunaViewSet, basename='vacunas')
 router.register(r'vacunaciones', VacunacionViewSet, basename='vacunaciones')
 router.register(r'transferencias', TransferenciaViewSet, basename='transferencias')
 router.register(r'ventas', VentaViewSet, basename='ventas')
+router.register(r'pesadas', PesadaViewSet, basename='pesadas')
+router.register(r'precios-mercado', PrecioMercadoViewSet, basename='precios-mercado')
 router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 router.register(r'opciones', OpcionesViewSet, basename='opciones')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+router.register(r'auditoria', AuditoriaViewSet, basename='auditoria')
+router.register(r'reportes', ReporteViewSet, basename='reportes')
+router.register(r'bootstrap', BootstrapViewSet, basename='bootstrap')
+router.register(r'sync', SyncViewSet, basename='sync')
 
 urlpatterns = [
     path('api/', include(router.urls)),
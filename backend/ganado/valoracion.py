@@ -0,0 +1,127 @@
+"""
+Valorización del rodeo a precios de mercado (mark-to-market).
+
+Los precios de cada categoría se cargan una sola vez en una curva
+ordenada por fecha y el precio vigente a cualquier fecha se resuelve
+con búsqueda binaria, evitando una consulta de "último precio" por lote.
+"""
+from bisect import bisect_right
+from datetime import date
+
+from django.db.models.functions import Coalesce, Lower
+
+from .consultas import campo_en_fecha, ciclo_en_fecha, estado_en_fecha
+from .models import PrecioMercado, Vacuno
+
+ESTADOS_FUERA_DEL_RODEO = ('vendido', 'muerto')
+
+
+class CurvaPrecios:
+    """Serie de precios de una categoría ordenada por fecha"""
+
+    def __init__(self):
+        self.fechas = []
+        self.precios = []
+
+    def agregar(self, fecha, precio):
+        """Agrega un punto; debe llamarse en orden creciente de fecha"""
+        self.fechas.append(fecha)
+        self.precios.append(precio)
+
+    def precio_en(self, fecha):
+        """Precio vigente a la fecha (último publicado en o antes de ella)"""
+        indice = bisect_right(self.fechas, fecha) - 1
+        if indice < 0:
+            return None
+        return self.precios[indice]
+
+
+def cargar_curvas(usuario, hasta=None):
+    """Carga en una sola consulta las curvas de precio del usuario por categoría"""
+    precios = PrecioMercado.objects.filter(usuario=usuario)
+    if hasta is not None:
+        precios = precios.filter(fecha__lte=hasta)
+
+    # Se ordena por la categoría en minúsculas para que las filas que se
+    # fusionan en una misma curva ("Novillo"/"novillo") queden por fecha
+    curvas = {}
+    filas = precios.order_by(Lower('categoria'), 'fecha', 'id').values_list('categoria', 'fecha', 'precio')
+    for categoria, fecha, precio in filas.iterator():
+        curvas.setdefault(categoria.lower(), CurvaPrecios()).agregar(fecha, precio)
+    return curvas
+
+
+def lotes_en_rodeo(usuario, fecha=None):
+    """Lotes activos a la fecha con su categoría y campo resueltos en una consulta"""
+    lotes = Vacuno.objects.filter(usuario=usuario)
+    fecha_historica = None
+    if fecha is not None and fecha < date.today():
+        fecha_historica = fecha
+        lotes = lotes.filter(fecha_ingreso__lte=fecha).exclude(venta__fecha__lte=fecha)
+
+    lotes = lotes.annotate(
+        estado_general=estado_en_fecha('estado_general', fecha=fecha_historica),
+        categoria=Coalesce(ciclo_en_fecha(fecha=fecha_historica), ciclo_en_fecha()),
+        campo_id=campo_en_fecha('campo_id', fecha=fecha_historica),
+        campo_nombre=campo_en_fecha('campo__nombre', fecha=fecha_historica),
+    ).values('id', 'lote_id', 'cantidad', 'estado_general', 'categoria', 'campo_id', 'campo_nombre')
+
+    return [
+        lote for lote in lotes
+        if lote['estado_general'] not in ESTADOS_FUERA_DEL_RODEO
+    ]
+
+
+def _acumular(grupos, clave, datos, cantidad, valor):
+    grupo = grupos.setdefault(clave, dict(datos, lotes=0, animales=0, valor=0.0))
+    grupo['lotes'] += 1
+    grupo['animales'] += cantidad
+    grupo['valor'] += valor
+
+
+def valorizar_rodeo(usuario, fecha=None):
+    """Valor del rodeo activo a la fecha, total y por campo y categoría"""
+    fecha = fecha or date.today()
+    curvas = cargar_curvas(usuario, hasta=fecha)
+
+    total = {'lotes': 0, 'animales': 0, 'valor': 0.0}
+    por_campo = {}
+    por_categoria = {}
+    sin_precio = []
+
+    for lote in lotes_en_rodeo(usuario, fecha):
+        categoria = lote['categoria'] or ''
+        curva = curvas.get(categoria.lower())
+        precio = curva.precio_en(fecha) if curva else None
+        if precio is None:
+            sin_precio.append({
+                'id': lote['id'],
+                'lote_id': lote['lote_id'],
+                'categoria': categoria or None,
+            })
+            continue
+
+        cantidad = lote['cantidad']
+        valor = float(precio) * cantidad
+        total['lotes'] += 1
+        total['animales'] += cantidad
+        total['valor'] += valor
+        _acumular(por_campo, lote['campo_id'], {
+            'campo_id': lote['campo_id'],
+            'campo': lote['campo_nombre'] or 'Sin campo',
+        }, cantidad, valor)
+        _acumular(por_categoria, categoria, {
+            'categoria': categoria,
+            'precio': float(precio),
+        }, cantidad, valor)
+
+    for grupo in [total, *por_campo.values(), *por_categoria.values()]:
+        grupo['valor'] = round(grupo['valor'], 2)
+
+    return {
+        'fecha': fecha.isoformat(),
+        'total': total,
+        'por_campo': sorted(por_campo.values(), key=lambda g: g['campo']),
+        'por_categoria': sorted(por_categoria.values(), key=lambda g: g['categoria']),
+        'lotes_sin_precio': sin_precio,
+    }
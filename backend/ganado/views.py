@@ -1,30 +1,77 @@
-from datetime import timedelta
+from contextlib import ExitStack
+from datetime import date
 from decimal import Decimal
+from functools import partial
 
-from django.db.models import Avg, Sum
+from django.db.models import Sum
+from django.http import FileResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .analytics import resumen_ventas
+from .bootstrap import cache_request, ejecutar_recurso, parametros_recursos
+from .consultas import prefetch_vacunos_actuales
+from .db import StatementTimeoutMixin
+from .filtros import (
+    AuditoriaFiltros,
+    CampoFiltros,
+    EstadiaAnimalFiltros,
+    EstadoVacunoFiltros,
+    PesadaFiltros,
+    PrecioMercadoFiltros,
+    TransferenciaFiltros,
+    VacunacionFiltros,
+    VacunoFiltros,
+    VentaFiltros,
+)
+from .ganancia import ganancia_diaria
+from .geo import LIMITE_MAPA, MAX_CERCANOS, PIXELES_MAPA, coleccion_mapa, mas_cercanos
+from .importacion import importar_pesadas, importar_precios, leer_csv
 from .models import (
+    Auditoria,
     Campo,
     EstadiaAnimal,
     EstadoVacuno,
+    Pesada,
+    PrecioMercado,
+    SolicitudReporte,
     Transferencia,
     Vacuna,
     Vacunacion,
     Vacuno,
     Venta,
 )
+from .movimientos import (
+    aplicar_transferencia,
+    cerrar_estadia,
+    lote_bloqueado,
+    lotes_bloqueados,
+    mover_lote,
+)
+from .pastoreo import DESCANSO_DIAS, MAX_DESCANSO_DIAS, plan_pastoreo
+from .proyeccion import leer_parametros, proyectar_rodeo
+from .reportes import TIPOS_CONTENIDO, nombre_descarga, ruta_archivo, solicitar_reporte
+from .routers import TenantMixin
+from .sanidad import HORIZONTE_DIAS, MAX_HORIZONTE_DIAS, calcular_pendientes
 from .serializers import (
+    AuditoriaSerializer,
     CampoSerializer,
     DashboardStatsSerializer,
     EstadiaAnimalSerializer,
     EstadoVacunoSerializer,
     OpcionesSerializer,
+    PedidoReporteSerializer,
+    PesadaSerializer,
+    PrecioMercadoSerializer,
+    SolicitudReporteSerializer,
+    SubidaSyncSerializer,
+    TransferenciaMasivaSerializer,
     TransferenciaSerializer,
     UserRegistrationSerializer,
     VacunacionSerializer,
@@ -32,10 +79,13 @@ from .serializers import (
     VacunoSerializer,
     VentaSerializer,
 )
+from .sync import aplicar_una_vez, cambios_desde
+from .valoracion import valorizar_rodeo
 
 
-class CampoViewSet(viewsets.ModelViewSet):
+class CampoViewSet(TenantMixin, viewsets.ModelViewSet):
     serializer_class = CampoSerializer
+    filtros = CampoFiltros
 
     def get_queryset(self):
         """Filtrar campos por usuario autenticado"""
@@ -45,27 +95,74 @@ class CampoViewSet(viewsets.ModelViewSet):
         """Asignar el usuario actual al crear un campo"""
         serializer.save(usuario=self.request.user)
 
-class VacunoViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def mapa(self, request):
+        """
+        GeoJSON de los campos con geometría dentro de la vista
+        (?bbox=oeste,sur,este,norte), coloreados por ocupación
+        """
+        if not request.query_params.get('bbox'):
+            return Response({'bbox': ['Requerido: oeste,sur,este,norte']}, status=status.HTTP_400_BAD_REQUEST)
+        # Valida bbox y aplica también ?ocupacion= y ?q=
+        campos = CampoFiltros(request.query_params).filtrar(self.get_queryset())
+        campos = list(
+            campos.prefetch_related(prefetch_vacunos_actuales()).order_by('-hectareas', 'id')[:LIMITE_MAPA + 1]
+        )
+        oeste, _, este, _ = CampoFiltros.bbox.convertir(request.query_params['bbox'])
+        coleccion = coleccion_mapa(campos[:LIMITE_MAPA], tolerancia=(este - oeste) / PIXELES_MAPA)
+        # Con más campos que el límite se devuelven los más grandes: acercar la vista
+        coleccion['truncado'] = len(campos) > LIMITE_MAPA
+        return Response(coleccion)
+
+    @action(detail=False, methods=['get'])
+    def plan_pastoreo(self, request):
+        """
+        Transferencias que dejan cada campo vacío o con ocupación media con la
+        menor cantidad de movimientos (?descanso=días, ?fecha=YYYY-MM-DD)
+        """
+        try:
+            fecha = _fecha_param(request, 'fecha')
+            descanso = int(request.query_params.get('descanso', DESCANSO_DIAS))
+            if not 0 <= descanso <= MAX_DESCANSO_DIAS:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'fecha debe tener formato YYYY-MM-DD y descanso ser un número de días '
+                          f'entre 0 y {MAX_DESCANSO_DIAS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(plan_pastoreo(request.user, fecha, descanso))
+
+    @action(detail=False, methods=['get'])
+    def cercanos(self, request):
+        """Campos más cercanos a un punto (?lon=&lat=&cantidad=5), con la distancia en km"""
+        try:
+            lon = float(request.query_params['lon'])
+            lat = float(request.query_params['lat'])
+            cantidad = int(request.query_params.get('cantidad', 5))
+            if not (-180 <= lon <= 180 and -90 <= lat <= 90 and 1 <= cantidad <= MAX_CERCANOS):
+                raise ValueError
+        except (KeyError, ValueError):
+            return Response(
+                {'error': f'lon y lat son requeridos (grados) y cantidad debe estar entre 1 y {MAX_CERCANOS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cercanos = mas_cercanos(self.get_queryset().only('id', 'nombre', 'geometria'), lon, lat, cantidad)
+        return Response([
+            {'id': campo.id, 'nombre': campo.nombre, 'distancia_km': round(distancia, 3)}
+            for campo, distancia in cercanos
+        ])
+
+class VacunoViewSet(TenantMixin, viewsets.ModelViewSet):
     serializer_class = VacunoSerializer
+    filtros = VacunoFiltros
 
     def get_queryset(self):
         """Filtrar vacunos por usuario autenticado"""
-        queryset = Vacuno.objects.filter(usuario=self.request.user)
-        campo_id = self.request.query_params.get('campo', None)
-        raza = self.request.query_params.get('raza', None)
-        
-        if campo_id is not None:
-            # Filtrar por campo actual
-            queryset = queryset.filter(
-                estadias__campo_id=campo_id,
-                estadias__fecha_salida__isnull=True
-            )
-            
-        if raza is not None:
-            queryset = queryset.filter(raza__icontains=raza)
-            
-        return queryset
-    
+        return Vacuno.objects.filter(usuario=self.request.user)
+
     def perform_create(self, serializer):
         # Guardar el vacuno con el usuario actual
         # La lógica del campo_inicial y estado inicial se maneja en el serializer
@@ -91,39 +188,32 @@ class VacunoViewSet(viewsets.ModelViewSet):
             return Response({'error': 'campo_id es requerido'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            from .models import EstadiaAnimal, Transferencia
-            from datetime import date
-            
             nuevo_campo = Campo.objects.get(id=nuevo_campo_id, usuario=request.user)
-            campo_actual = vacuno.campo_actual()
-            
-            if campo_actual and campo_actual.id == nuevo_campo.id:
-                return Response({'message': 'El vacuno ya está en ese campo'}, status=status.HTTP_200_OK)
-            
-            # Cerrar estadia actual si existe
-            if campo_actual:
-                estadia_actual = vacuno.estadias.filter(fecha_salida__isnull=True).first()
-                if estadia_actual:
-                    estadia_actual.fecha_salida = date.today()
-                    estadia_actual.save()
-                
-                # Crear transferencia
-                Transferencia.objects.create(
-                    animal=vacuno,
-                    campo_origen=campo_actual,
-                    campo_destino=nuevo_campo,
-                    fecha=date.today(),
-                    observaciones=f"Transferencia automática via interfaz"
+
+            # El lote queda bloqueado hasta el commit: la estadía abierta que se
+            # lee no puede cambiar antes de cerrarla
+            with lote_bloqueado(vacuno.pk) as vacuno:
+                campo_actual = vacuno.campo_actual()
+
+                if campo_actual and campo_actual.id == nuevo_campo.id:
+                    return Response({'message': 'El vacuno ya está en ese campo'}, status=status.HTTP_200_OK)
+
+                if campo_actual:
+                    # Crear transferencia
+                    Transferencia.objects.create(
+                        animal=vacuno,
+                        campo_origen=campo_actual,
+                        campo_destino=nuevo_campo,
+                        fecha=date.today(),
+                        observaciones="Transferencia automática via interfaz"
+                    )
+
+                # Cerrar estadia actual (si existe) y crear la nueva
+                mover_lote(
+                    vacuno, nuevo_campo, date.today(),
+                    observaciones=f"Transferido desde {campo_actual.nombre if campo_actual else 'sin campo'}"
                 )
             
-            # Crear nueva estadia
-            EstadiaAnimal.objects.create(
-                animal=vacuno,
-                campo=nuevo_campo,
-                fecha_entrada=date.today(),
-                observaciones=f"Transferido desde {campo_actual.nombre if campo_actual else 'sin campo'}"
-            )
-            
             return Response({'message': 'Campo actualizado exitosamente'}, status=status.HTTP_200_OK)
             
         except Campo.DoesNotExist:
@@ -131,21 +221,23 @@ class VacunoViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class EstadoVacunoViewSet(viewsets.ModelViewSet):
+class EstadoVacunoViewSet(TenantMixin, viewsets.ModelViewSet):
     serializer_class = EstadoVacunoSerializer
+    filtros = EstadoVacunoFiltros
 
     def get_queryset(self):
         """Filtrar estados por vacunos del usuario autenticado"""
         return EstadoVacuno.objects.filter(vacuno__usuario=self.request.user)
 
-class EstadiaAnimalViewSet(viewsets.ModelViewSet):
+class EstadiaAnimalViewSet(TenantMixin, viewsets.ModelViewSet):
     serializer_class = EstadiaAnimalSerializer
+    filtros = EstadiaAnimalFiltros
 
     def get_queryset(self):
         """Filtrar estadias por animales del usuario autenticado"""
         return EstadiaAnimal.objects.filter(animal__usuario=self.request.user)
 
-class VacunaViewSet(viewsets.ModelViewSet):
+class VacunaViewSet(TenantMixin, viewsets.ModelViewSet):
     serializer_class = VacunaSerializer
 
     def get_queryset(self):
@@ -156,26 +248,13 @@ class VacunaViewSet(viewsets.ModelViewSet):
         """Asignar el usuario actual al crear una vacuna"""
         serializer.save(usuario=self.request.user)
 
-class VacunacionViewSet(viewsets.ModelViewSet):
+class VacunacionViewSet(TenantMixin, viewsets.ModelViewSet):
     serializer_class = VacunacionSerializer
+    filtros = VacunacionFiltros
 
     def get_queryset(self):
         """Filtrar vacunaciones por animales del usuario autenticado"""
-        queryset = Vacunacion.objects.filter(animal__usuario=self.request.user)
-        animal_id = self.request.query_params.get('animal', None)
-        fecha_desde = self.request.query_params.get('fecha_desde', None)
-        fecha_hasta = self.request.query_params.get('fecha_hasta', None)
-        
-        if animal_id is not None:
-            queryset = queryset.filter(animal_id=animal_id)
-            
-        if fecha_desde:
-            queryset = queryset.filter(fecha__gte=fecha_desde)
-            
-        if fecha_hasta:
-            queryset = queryset.filter(fecha__lte=fecha_hasta)
-            
-        return queryset.order_by('-fecha')
+        return Vacunacion.objects.filter(animal__usuario=self.request.user).order_by('-fecha')
 
     def perform_create(self, serializer):
         # Validar que el animal y la vacuna pertenecen al usuario
@@ -190,30 +269,30 @@ class VacunacionViewSet(viewsets.ModelViewSet):
         
         serializer.save()
 
-class TransferenciaViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def pendientes(self, request):
+        """Dosis vencidas y próximas de todos los lotes agrupadas por campo"""
+        try:
+            fecha = _fecha_param(request, 'fecha')
+            horizonte = int(request.query_params.get('horizonte', HORIZONTE_DIAS))
+            if not 0 <= horizonte <= MAX_HORIZONTE_DIAS:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'fecha debe tener formato YYYY-MM-DD y horizonte ser un número de días '
+                          f'entre 0 y {MAX_HORIZONTE_DIAS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(calcular_pendientes(request.user, fecha, horizonte))
+
+class TransferenciaViewSet(TenantMixin, viewsets.ModelViewSet):
     serializer_class = TransferenciaSerializer
+    filtros = TransferenciaFiltros
 
     def get_queryset(self):
         """Filtrar transferencias por animales del usuario autenticado"""
-        queryset = Transferencia.objects.filter(animal__usuario=self.request.user)
-        campo_origen = self.request.query_params.get('campo_origen', None)
-        campo_destino = self.request.query_params.get('campo_destino', None)
-        fecha_desde = self.request.query_params.get('fecha_desde', None)
-        fecha_hasta = self.request.query_params.get('fecha_hasta', None)
-        
-        if campo_origen is not None:
-            queryset = queryset.filter(campo_origen_id=campo_origen)
-            
-        if campo_destino is not None:
-            queryset = queryset.filter(campo_destino_id=campo_destino)
-            
-        if fecha_desde:
-            queryset = queryset.filter(fecha__gte=fecha_desde)
-            
-        if fecha_hasta:
-            queryset = queryset.filter(fecha__lte=fecha_hasta)
-            
-        return queryset.order_by('-fecha')
+        return Transferencia.objects.filter(animal__usuario=self.request.user).order_by('-fecha')
 
     def perform_create(self, serializer):
         # Validar que el animal pertenece al usuario
@@ -229,49 +308,59 @@ class TransferenciaViewSet(viewsets.ModelViewSet):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("No tienes permiso para usar estos campos")
             
-        transferencia = serializer.save()
-        
-        # Actualizar estadia del animal
-        # Cerrar estadia anterior
-        EstadiaAnimal.objects.filter(
-            animal=transferencia.animal,
-            fecha_salida__isnull=True
-        ).update(fecha_salida=transferencia.fecha)
-        
-        # Crear nueva estadia
-        EstadiaAnimal.objects.create(
-            animal=transferencia.animal,
-            campo=transferencia.campo_destino,
-            fecha_entrada=transferencia.fecha
-        )
-        
-        # Crear estado de transferido
-        EstadoVacuno.objects.create(
-            vacuno=transferencia.animal,
-            estado_general='transferido',
-            observaciones=f"Transferido de {transferencia.campo_origen} a {transferencia.campo_destino}"
-        )
+        with lote_bloqueado(animal.pk) as lote:
+            transferencia = serializer.save(animal=lote)
 
-class VentaViewSet(viewsets.ModelViewSet):
+            # Actualizar estadia del animal y crear estado de transferido
+            aplicar_transferencia(transferencia)
+
+    @action(detail=False, methods=['post'])
+    def masiva(self, request):
+        """
+        Varias transferencias en una transacción (ej. las propuestas por
+        /api/campos/plan_pastoreo/): se aplican todas o ninguna
+        """
+        serializer = TransferenciaMasivaSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        items = datos['transferencias']
+
+        with lotes_bloqueados([item['animal'].pk for item in items]) as lotes:
+            # El plan puede haber quedado viejo: cada lote tiene que seguir en su campo de origen
+            actuales = dict(EstadiaAnimal.objects.filter(
+                animal__in=list(lotes), fecha_salida__isnull=True
+            ).values_list('animal_id', 'campo_id'))
+            movidos = [
+                item['animal'].lote_id for item in items
+                if actuales.get(item['animal'].pk) != item['campo_origen'].pk
+            ]
+            if movidos:
+                return Response(
+                    {'error': 'Lotes que ya no están en su campo de origen', 'lotes': movidos},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            transferencias = []
+            for item in items:
+                transferencia = Transferencia.objects.create(
+                    animal=lotes[item['animal'].pk],
+                    campo_origen=item['campo_origen'],
+                    campo_destino=item['campo_destino'],
+                    fecha=datos['fecha'],
+                    observaciones=datos['observaciones'],
+                )
+                aplicar_transferencia(transferencia)
+                transferencias.append(transferencia)
+
+        return Response(TransferenciaSerializer(transferencias, many=True).data, status=status.HTTP_201_CREATED)
+
+class VentaViewSet(TenantMixin, viewsets.ModelViewSet):
     serializer_class = VentaSerializer
+    filtros = VentaFiltros
 
     def get_queryset(self):
         """Filtrar ventas por animales del usuario autenticado"""
-        queryset = Venta.objects.filter(animal__usuario=self.request.user)
-        fecha_desde = self.request.query_params.get('fecha_desde', None)
-        fecha_hasta = self.request.query_params.get('fecha_hasta', None)
-        comprador = self.request.query_params.get('comprador', None)
-        
-        if fecha_desde:
-            queryset = queryset.filter(fecha__gte=fecha_desde)
-            
-        if fecha_hasta:
-            queryset = queryset.filter(fecha__lte=fecha_hasta)
-            
-        if comprador:
-            queryset = queryset.filter(comprador__icontains=comprador)
-            
-        return queryset.order_by('-fecha')
+        return Venta.objects.filter(animal__usuario=self.request.user).order_by('-fecha')
 
     def perform_create(self, serializer):
         # Validar que el animal pertenece al usuario
@@ -280,20 +369,18 @@ class VentaViewSet(viewsets.ModelViewSet):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("No tienes permiso para vender este animal")
             
-        venta = serializer.save()
-        
-        # Marcar animal como vendido
-        EstadoVacuno.objects.create(
-            vacuno=venta.animal,
-            estado_general='vendido',
-            observaciones=f"Vendido a {venta.comprador} por ${venta.precio}"
-        )
-        
-        # Cerrar estadia actual
-        EstadiaAnimal.objects.filter(
-            animal=venta.animal,
-            fecha_salida__isnull=True
-        ).update(fecha_salida=venta.fecha)
+        with lote_bloqueado(animal.pk) as lote:
+            venta = serializer.save(animal=lote)
+
+            # Marcar animal como vendido
+            EstadoVacuno.objects.create(
+                vacuno=lote,
+                estado_general='vendido',
+                observaciones=f"Vendido a {venta.comprador} por ${venta.precio}"
+            )
+
+            # Cerrar estadia actual
+            cerrar_estadia(lote, venta.fecha)
 
     def destroy(self, request, *args, **kwargs):
         """Método personalizado para eliminar una venta y reactivar el lote"""
@@ -304,36 +391,120 @@ class VentaViewSet(viewsets.ModelViewSet):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("No tienes permiso para eliminar esta venta")
         
-        # Obtener el animal antes de eliminar la venta
-        animal = venta.animal
-        
-        # Eliminar la venta
-        venta.delete()
-        
-        # Crear un nuevo estado "activo" para el animal
-        EstadoVacuno.objects.create(
-            vacuno=animal,
-            estado_general='activo',
-            observaciones="Venta cancelada - Lote reactivado"
-        )
-        
-        # Reabrir la estadia en el campo actual si tenía una cerrada
-        # (buscar la última estadia y reabrirla si fue cerrada en la fecha de venta)
-        ultima_estadia = EstadiaAnimal.objects.filter(
-            animal=animal
-        ).order_by('-fecha_entrada').first()
-        
-        if ultima_estadia and ultima_estadia.fecha_salida:
-            ultima_estadia.fecha_salida = None
-            ultima_estadia.observaciones += " - Reabierta por cancelación de venta"
-            ultima_estadia.save()
+        with lote_bloqueado(venta.animal_id) as animal:
+            # Eliminar la venta
+            venta.delete()
+
+            # Crear un nuevo estado "activo" para el animal
+            EstadoVacuno.objects.create(
+                vacuno=animal,
+                estado_general='activo',
+                observaciones="Venta cancelada - Lote reactivado"
+            )
+
+            # Reabrir la última estadia si fue cerrada (por la venta) y el lote
+            # no tiene otra abierta
+            ultima_estadia = EstadiaAnimal.objects.filter(
+                animal=animal
+            ).order_by('-fecha_entrada', '-id').first()
+
+            abierta = EstadiaAnimal.objects.filter(animal=animal, fecha_salida__isnull=True).exists()
+            if ultima_estadia and ultima_estadia.fecha_salida and not abierta:
+                ultima_estadia.fecha_salida = None
+                ultima_estadia.observaciones += " - Reabierta por cancelación de venta"
+                ultima_estadia.save()
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class DashboardViewSet(viewsets.ViewSet):
+class PesadaViewSet(TenantMixin, viewsets.ModelViewSet):
+    serializer_class = PesadaSerializer
+    filtros = PesadaFiltros
+
+    def get_queryset(self):
+        """Filtrar pesadas por animales del usuario autenticado"""
+        return Pesada.objects.filter(animal__usuario=self.request.user).select_related('animal').order_by(
+            'animal_id', '-fecha'
+        )
+
+    def _validar_animal(self, serializer):
+        animal = serializer.validated_data.get('animal')
+        if animal is not None and animal.usuario != self.request.user:
+            from rest_framework.exceptions import PermissionDenied
+            raise PermissionDenied("No tienes permiso para pesar este animal")
+
+    def perform_create(self, serializer):
+        self._validar_animal(serializer)
+        serializer.save()
+
+    def perform_update(self, serializer):
+        self._validar_animal(serializer)
+        serializer.save()
+
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        """
+        Carga masiva de pesadas (insertar o reemplazar).
+        Acepta un CSV de la balanza en 'archivo' (columnas lote, fecha, peso y
+        opcionalmente cabezas) en UTF-8 o una lista JSON en 'pesadas'.
+        """
+        archivo = request.FILES.get('archivo')
+        if archivo is not None:
+            try:
+                filas = leer_csv(archivo.file)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data.get('pesadas'), list):
+            filas = request.data['pesadas']
+        else:
+            return Response(
+                {'error': 'Se requiere un archivo CSV en "archivo" o una lista en "pesadas"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultado = importar_pesadas(request.user, filas)
+        return Response(resultado, status=status.HTTP_200_OK)
+
+class PrecioMercadoViewSet(TenantMixin, viewsets.ModelViewSet):
+    serializer_class = PrecioMercadoSerializer
+    filtros = PrecioMercadoFiltros
+
+    def get_queryset(self):
+        """Filtrar precios por usuario autenticado"""
+        return PrecioMercado.objects.filter(usuario=self.request.user).order_by('-fecha', 'categoria')
+
+    def perform_create(self, serializer):
+        """Asignar el usuario actual al crear un precio"""
+        serializer.save(usuario=self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        """
+        Carga masiva de precios (insertar o actualizar).
+        Acepta un CSV en UTF-8 en 'archivo' (columnas fecha, categoria, precio)
+        o una lista JSON en 'precios'.
+        """
+        archivo = request.FILES.get('archivo')
+        if archivo is not None:
+            try:
+                filas = leer_csv(archivo.file)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data.get('precios'), list):
+            filas = request.data['precios']
+        else:
+            return Response(
+                {'error': 'Se requiere un archivo CSV en "archivo" o una lista en "precios"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultado = importar_precios(request.user, filas)
+        return Response(resultado, status=status.HTTP_200_OK)
+
+class DashboardViewSet(StatementTimeoutMixin, TenantMixin, viewsets.ViewSet):
     """
     ViewSet para estadísticas del dashboard
     """
+    statement_timeout_ms = 10000
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -346,8 +517,11 @@ class DashboardViewSet(viewsets.ViewSet):
         # Filtrar por usuario autenticado
         user = request.user
         
+        # Campos con sus lotes actuales, compartidos con /api/bootstrap/
+        campos = cache_request(request).campos()
+
         # Estadísticas básicas
-        total_campos = Campo.objects.filter(usuario=user).count()
+        total_campos = len(campos)
         total_lotes = Vacuno.objects.filter(usuario=user).count()  # Cada vacuno representa un lote
         
         # Lotes vendidos
@@ -380,7 +554,7 @@ class DashboardViewSet(viewsets.ViewSet):
         # Datos adicionales para el dashboard
         # Lotes por campo y animales por hectárea
         lotes_por_campo = []
-        for campo in Campo.objects.filter(usuario=user):
+        for campo in campos:
             total_animales = sum([vacuno.cantidad for vacuno in campo.vacunos_actuales()])
             total_lotes = campo.capacidad_actual()
             animales_por_hectarea = campo.animales_por_hectarea()
@@ -413,7 +587,7 @@ class DashboardViewSet(viewsets.ViewSet):
         
         # Densidad de animales por campo
         densidad_campos = []
-        for campo in Campo.objects.filter(usuario=user):
+        for campo in campos:
             total_animales = sum([vacuno.cantidad for vacuno in campo.vacunos_actuales()])
             animales_por_hectarea = campo.animales_por_hectarea()
             estado_ocupacion = campo.estado_ocupacion()
@@ -431,7 +605,7 @@ class DashboardViewSet(viewsets.ViewSet):
         
         # Campos por estado de ocupación
         campos_por_estado = {'baja': 0, 'media': 0, 'alta': 0}
-        for campo in Campo.objects.filter(usuario=user):
+        for campo in campos:
             estado = campo.estado_ocupacion()
             campos_por_estado[estado] += 1
         
@@ -465,10 +639,11 @@ class DashboardViewSet(viewsets.ViewSet):
         serializer = DashboardStatsSerializer(stats_data)
         return Response(serializer.data)
 
-class OpcionesViewSet(viewsets.ViewSet):
+class OpcionesViewSet(StatementTimeoutMixin, TenantMixin, viewsets.ViewSet):
     """
     ViewSet para opciones y datos de formularios
     """
+    statement_timeout_ms = 10000
     
     @action(detail=False, methods=['get'])
     def all(self, request):
@@ -477,19 +652,19 @@ class OpcionesViewSet(viewsets.ViewSet):
         # Filtrar por usuario autenticado
         user = request.user
         
-        # Campos disponibles del usuario
-        campos = Campo.objects.filter(usuario=user)
+        # Campos y lotes del usuario, compartidos con /api/bootstrap/
+        cache = cache_request(request)
+        campos = cache.campos()
         
         # Vacunas disponibles del usuario
         vacunas = Vacuna.objects.filter(usuario=user)
         
         # Lotes disponibles (vacunos activos y no vendidos)
         lotes = []
-        vacunos_activos = Vacuno.objects.filter(usuario=user)
-        for vacuno in vacunos_activos:
+        for vacuno in cache.lotes():
             # Verificar que no está vendido usando múltiples métodos
             estado = vacuno.estado_actual()
-            tiene_venta = Venta.objects.filter(animal=vacuno).exists()
+            tiene_venta = vacuno.tiene_venta
             
             # Un lote está disponible si:
             # 1. No tiene estado "vendido" en su estado actual
@@ -563,15 +738,13 @@ class OpcionesViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def lotes_debug(self, request):
         """Endpoint de debug para verificar el estado de los lotes"""
-        user = request.user
-        
         # Obtener todos los vacunos del usuario
-        todos_vacunos = Vacuno.objects.filter(usuario=user)
+        todos_vacunos = cache_request(request).lotes()
         
         debug_info = []
         for vacuno in todos_vacunos:
             estado = vacuno.estado_actual()
-            tiene_venta = Venta.objects.filter(animal=vacuno).exists()
+            tiene_venta = vacuno.tiene_venta
             
             debug_info.append({
                 'id': vacuno.id,
@@ -589,6 +762,270 @@ class OpcionesViewSet(viewsets.ViewSet):
         })
 
 
+def _fecha_param(request, nombre):
+    """Lee un parámetro de fecha (YYYY-MM-DD); lanza ValueError si es inválido"""
+    valor = request.query_params.get(nombre)
+    if not valor:
+        return None
+    fecha = parse_date(valor)
+    if fecha is None:
+        raise ValueError(f"{nombre} debe tener formato YYYY-MM-DD")
+    return fecha
+
+
+class AnalyticsViewSet(StatementTimeoutMixin, TenantMixin, viewsets.ViewSet):
+    """
+    ViewSet para analítica de ventas y valorización del rodeo
+    """
+    statement_timeout_ms = 30000
+
+    @action(detail=False, methods=['get'])
+    def ventas(self, request):
+        """Ingresos por mes, comprador, raza y campo de origen, comparados con el mercado"""
+        try:
+            fecha_desde = _fecha_param(request, 'fecha_desde')
+            fecha_hasta = _fecha_param(request, 'fecha_hasta')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(resumen_ventas(request.user, fecha_desde, fecha_hasta))
+
+    @action(detail=False, methods=['get'])
+    def valoracion(self, request):
+        """Valor de mercado del rodeo activo por campo y categoría (?fecha= para histórico)"""
+        try:
+            fecha = _fecha_param(request, 'fecha')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(valorizar_rodeo(request.user, fecha))
+
+    @action(detail=False, methods=['get'])
+    def ganancia(self, request):
+        """Ganancia diaria de peso por lote, campo y raza entre pesadas (?fecha_desde=&fecha_hasta=)"""
+        try:
+            fecha_desde = _fecha_param(request, 'fecha_desde')
+            fecha_hasta = _fecha_param(request, 'fecha_hasta')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ganancia_diaria(request.user, fecha_desde, fecha_hasta))
+
+    @action(detail=False, methods=['get'])
+    def proyeccion(self, request):
+        """
+        Proyección Monte Carlo de cabezas y densidad por campo e ingresos por
+        ventas, en bandas de percentiles (?meses=, ?escenarios=, ?semilla= y
+        tasas del rodeo; ver ganado.proyeccion)
+        """
+        try:
+            parametros = leer_parametros(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            semilla = request.query_params.get('semilla')
+            semilla = int(semilla) if semilla else None
+            if semilla is not None and semilla < 0:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'semilla debe ser un entero positivo'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            return Response(proyectar_rodeo(request.user, parametros, semilla))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ReporteViewSet(TenantMixin, viewsets.ViewSet):
+    """
+    Reportes mensuales en XLSX/PDF (inventario, ventas, sanidad).
+
+    POST pide un reporte: si ya existe el archivo para la versión actual de
+    los datos responde 200 y se descarga al instante; si no, queda en la
+    cola del worker (procesar_reportes) y responde 202. GET /{id}/ informa
+    el estado y /{id}/descargar/ entrega el archivo.
+    """
+    LIMITE_LISTADO = 50
+
+    def _solicitudes(self, request):
+        return SolicitudReporte.objects.filter(usuario=request.user)
+
+    def list(self, request):
+        """Últimos reportes pedidos por el usuario"""
+        solicitudes = self._solicitudes(request).order_by('-id')[:self.LIMITE_LISTADO]
+        return Response(SolicitudReporteSerializer(solicitudes, many=True).data)
+
+    def create(self, request):
+        serializer = PedidoReporteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        solicitud = solicitar_reporte(request.user, **serializer.validated_data)
+        codigo = status.HTTP_200_OK if solicitud.estado == 'listo' else status.HTTP_202_ACCEPTED
+        return Response(SolicitudReporteSerializer(solicitud).data, status=codigo)
+
+    def retrieve(self, request, pk=None):
+        solicitud = self._solicitudes(request).filter(pk=pk).first()
+        if solicitud is None:
+            return Response({'error': 'Reporte no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(SolicitudReporteSerializer(solicitud).data)
+
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        """Archivo del reporte; 409 si todavía no está listo"""
+        solicitud = self._solicitudes(request).filter(pk=pk).first()
+        if solicitud is None:
+            return Response({'error': 'Reporte no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        if solicitud.estado != 'listo':
+            return Response(
+                {'error': f'El reporte está {solicitud.estado}', 'estado': solicitud.estado},
+                status=status.HTTP_409_CONFLICT
+            )
+        with ExitStack() as pila:
+            try:
+                archivo = pila.enter_context(open(ruta_archivo(solicitud), 'rb'))
+            except FileNotFoundError:
+                # Lo reemplazó una versión más nueva: se pide de nuevo con los datos actuales
+                nueva = solicitar_reporte(request.user, solicitud.reporte, solicitud.periodo, solicitud.formato)
+                return Response(SolicitudReporteSerializer(nueva).data, status=status.HTTP_202_ACCEPTED)
+            respuesta = FileResponse(
+                archivo, as_attachment=True, filename=nombre_descarga(solicitud),
+                content_type=TIPOS_CONTENIDO[solicitud.formato],
+            )
+            # Armada la respuesta, el archivo lo cierra FileResponse al terminar de enviarlo
+            pila.pop_all()
+            return respuesta
+
+class PaginacionAuditoria(CursorPagination):
+    """Páginas por id descendente: sin COUNT sobre un registro que solo crece"""
+    ordering = '-id'
+    page_size = 100
+
+
+class AuditoriaViewSet(TenantMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Registro de auditoría del usuario, del más reciente al más viejo.
+    Historial de un objeto: ?modelo=vacuno&objeto=<id>; de un autor: ?autor=<id>
+    """
+    serializer_class = AuditoriaSerializer
+    filtros = AuditoriaFiltros
+    pagination_class = PaginacionAuditoria
+
+    def get_queryset(self):
+        return Auditoria.objects.filter(usuario=self.request.user).select_related('autor')
+
+class BootstrapViewSet(TenantMixin, viewsets.ViewSet):
+    """
+    ViewSet para la carga inicial del frontend en un solo request.
+
+    ?recursos=campos,vacunos elige los recursos (por defecto los que pide
+    la app al iniciar) y ?<recurso>.<param>=valor pasa parámetros a cada
+    uno, p. ej. ?vacunos.fields=id,lote_id. Cada recurso responde
+    {status, data} igual que su endpoint.
+    """
+    # nombre -> (viewset, acción, nombre de la URL)
+    recursos = {
+        'campos': (CampoViewSet, 'list', 'campos-list'),
+        'vacunos': (VacunoViewSet, 'list', 'vacunos-list'),
+        'vacunas': (VacunaViewSet, 'list', 'vacunas-list'),
+        'vacunaciones': (VacunacionViewSet, 'list', 'vacunaciones-list'),
+        'pendientes': (VacunacionViewSet, 'pendientes', 'vacunaciones-pendientes'),
+        'transferencias': (TransferenciaViewSet, 'list', 'transferencias-list'),
+        'ventas': (VentaViewSet, 'list', 'ventas-list'),
+        'pesadas': (PesadaViewSet, 'list', 'pesadas-list'),
+        'precios-mercado': (PrecioMercadoViewSet, 'list', 'precios-mercado-list'),
+        'opciones': (OpcionesViewSet, 'all', 'opciones-all'),
+        'dashboard': (DashboardViewSet, 'stats', 'dashboard-stats'),
+    }
+    recursos_por_defecto = ['campos', 'vacunos', 'vacunas', 'opciones', 'dashboard']
+
+    def list(self, request):
+        """Ejecuta los recursos pedidos y devuelve sus respuestas combinadas"""
+        pedidos = request.query_params.get('recursos')
+        nombres = list(dict.fromkeys(
+            nombre.strip() for nombre in pedidos.split(',') if nombre.strip()
+        )) if pedidos else self.recursos_por_defecto
+        desconocidos = [nombre for nombre in nombres if nombre not in self.recursos]
+        if desconocidos:
+            return Response(
+                {'recursos': [f"Recursos desconocidos: {', '.join(desconocidos)}"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        params = parametros_recursos(request.query_params, nombres)
+        resultado = {}
+        for nombre in nombres:
+            viewset, accion, url_name = self.recursos[nombre]
+            codigo, data = ejecutar_recurso(request, viewset, accion, url_name, params[nombre])
+            resultado[nombre] = {'status': codigo, 'data': data}
+        return Response(resultado)
+
+
+class SyncViewSet(TenantMixin, viewsets.ViewSet):
+    """
+    ViewSet de sincronización incremental para dispositivos sin conexión.
+
+    GET ?since=<token> devuelve las filas cambiadas y borradas desde el
+    token (ver ganado.sync). POST aplica en orden las operaciones grabadas
+    sin conexión a través de los endpoints de cada recurso, una sola vez
+    por clave de idempotencia.
+    """
+    viewsets_sync = {
+        'campos': CampoViewSet,
+        'vacunos': VacunoViewSet,
+        'estados-vacuno': EstadoVacunoViewSet,
+        'estadias': EstadiaAnimalViewSet,
+        'vacunaciones': VacunacionViewSet,
+        'transferencias': TransferenciaViewSet,
+        'ventas': VentaViewSet,
+        'pesadas': PesadaViewSet,
+    }
+    # acción de la operación -> (método HTTP, acción del viewset, ruta)
+    acciones = {
+        'crear': ('post', 'create', 'list'),
+        'actualizar': ('patch', 'partial_update', 'detail'),
+        'eliminar': ('delete', 'destroy', 'detail'),
+    }
+
+    def list(self, request):
+        """Cambios y bajas posteriores a ?since= (sin token, todos los datos del usuario)"""
+        try:
+            token = int(request.query_params.get('since') or 0)
+            if token < 0:
+                raise ValueError(token)
+        except ValueError:
+            return Response(
+                {'since': ["Token inválido, usar el valor 'token' de la última sincronización"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(cambios_desde(request.user.id, token))
+
+    def create(self, request):
+        """Aplica las operaciones grabadas sin conexión y devuelve el resultado de cada una"""
+        serializer = SubidaSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        resultados = []
+        for operacion in serializer.validated_data['operaciones']:
+            metodo, accion, ruta = self.acciones[operacion['accion']]
+            recurso = operacion['recurso']
+            aplicar = partial(
+                ejecutar_recurso, request, self.viewsets_sync[recurso], accion, f'{recurso}-{ruta}',
+                metodo=metodo,
+                datos=operacion['datos'] if metodo != 'delete' else None,
+                **({'pk': operacion['id']} if ruta == 'detail' else {}),
+            )
+            codigo, data, repetida = aplicar_una_vez(request.user, operacion['clave'], aplicar)
+            resultados.append({
+                'clave': operacion['clave'],
+                'status': codigo,
+                'data': data,
+                'repetida': repetida,
+            })
+        return Response({'resultados': resultados})
+
+
 class UserRegistrationView(APIView):
     permission_classes = [AllowAny]
     
@@ -19,6 +19,7 @@ from ganado.models import (
     Vacunacion,
     Vacuno,
     Venta,
+    ciclo_para_edad,
 )
 
 # Limpiar datos existentes (opcional)
@@ -93,24 +94,9 @@ for i in range(15):  # Crear 15 lotes
     vacunos.append(vacuno)
     
     # Crear estado inicial
-    if vacuno.sexo == "M":
-        if dias_atras < 365:
-            ciclo = "ternero"
-        elif dias_atras < 730:
-            ciclo = "novillo"
-        else:
-            ciclo = "toro"
-    else:
-        if dias_atras < 365:
-            ciclo = "ternera"
-        elif dias_atras < 1095:
-            ciclo = "vaquillona"
-        else:
-            ciclo = "vaca"
-    
     EstadoVacuno.objects.create(
         vacuno=vacuno,
-        ciclo_productivo=ciclo,
+        ciclo_productivo=ciclo_para_edad(vacuno.sexo, dias_atras),
         estado_salud="sano",
         estado_general="activo",
         observaciones="Estado inicial"
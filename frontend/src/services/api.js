@@ -89,6 +89,16 @@ export const camposApi = {
   delete: (id) => apiRequest(`/campos/${id}/`, {
     method: 'DELETE',
   }),
+  // GeoJSON de los campos en la vista; bbox: [oeste, sur, este, norte]
+  getMapa: (bbox, params = {}) => {
+    const queryString = new URLSearchParams({ ...params, bbox: bbox.join(',') }).toString();
+    return apiRequest(`/campos/mapa/?${queryString}`);
+  },
+  getCercanos: (lon, lat, cantidad = 5) => apiRequest(`/campos/cercanos/?lon=${lon}&lat=${lat}&cantidad=${cantidad}`),
+  getPlanPastoreo: (params = {}) => {
+    const queryString = new URLSearchParams(params).toString();
+    return apiRequest(`/campos/plan_pastoreo/${queryString ? `?${queryString}` : ''}`);
+  },
 };
 
 // API para Vacunos
@@ -183,6 +193,11 @@ export const transferenciasApi = {
     method: 'POST',
     body: JSON.stringify(data),
   }),
+  // data: { fecha, observaciones, transferencias: plan.transferencias }
+  createMasiva: (data) => apiRequest('/transferencias/masiva/', {
+    method: 'POST',
+    body: JSON.stringify(data),
+  }),
   update: (id, data) => apiRequest(`/transferencias/${id}/`, {
     method: 'PUT',
     body: JSON.stringify(data),
@@ -212,11 +227,86 @@ export const ventasApi = {
   }),
 };
 
+// API para Pesadas
+export const pesadasApi = {
+  getAll: (params = {}) => {
+    const queryString = new URLSearchParams(params).toString();
+    return apiRequest(`/pesadas/${queryString ? `?${queryString}` : ''}`);
+  },
+  getById: (id) => apiRequest(`/pesadas/${id}/`),
+  create: (data) => apiRequest('/pesadas/', {
+    method: 'POST',
+    body: JSON.stringify(data),
+  }),
+  update: (id, data) => apiRequest(`/pesadas/${id}/`, {
+    method: 'PUT',
+    body: JSON.stringify(data),
+  }),
+  delete: (id) => apiRequest(`/pesadas/${id}/`, {
+    method: 'DELETE',
+  }),
+  // pesadas: [{ lote, fecha, peso, cabezas }]
+  importar: (pesadas) => apiRequest('/pesadas/importar/', {
+    method: 'POST',
+    body: JSON.stringify({ pesadas }),
+  }),
+};
+
+// API para el registro de auditoría
+export const auditoriaApi = {
+  // params: { modelo, objeto, autor, accion, cursor }
+  getAll: (params = {}) => {
+    const queryString = new URLSearchParams(params).toString();
+    return apiRequest(`/auditoria/${queryString ? `?${queryString}` : ''}`);
+  },
+  getHistorial: (modelo, objeto) => apiRequest(`/auditoria/?modelo=${modelo}&objeto=${objeto}`),
+};
+
+// API para reportes XLSX/PDF (los arma el worker procesar_reportes)
+export const reportesApi = {
+  getAll: () => apiRequest('/reportes/'),
+  getById: (id) => apiRequest(`/reportes/${id}/`),
+  // reporte: inventario | ventas | sanidad, periodo: 'YYYY-MM', formato: xlsx | pdf
+  solicitar: (reporte, periodo, formato = 'xlsx') => apiRequest('/reportes/', {
+    method: 'POST',
+    body: JSON.stringify({ reporte, periodo, formato }),
+  }),
+  // Devuelve el archivo como Blob cuando el reporte está listo
+  descargar: async (id) => {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API_BASE_URL}/reportes/${id}/descargar/`, {
+      headers: token ? { 'Authorization': `Bearer ${token}` } : {},
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.blob();
+  },
+};
+
 // API para Dashboard (estadísticas)
 export const dashboardApi = {
   getStats: () => apiRequest('/dashboard/stats/'),
 };
 
+// API de analítica
+export const analyticsApi = {
+  getVentas: (params = {}) => {
+    const queryString = new URLSearchParams(params).toString();
+    return apiRequest(`/analytics/ventas/${queryString ? `?${queryString}` : ''}`);
+  },
+  getValoracion: (fecha) => apiRequest(`/analytics/valoracion/${fecha ? `?fecha=${fecha}` : ''}`),
+  getGanancia: (params = {}) => {
+    const queryString = new URLSearchParams(params).toString();
+    return apiRequest(`/analytics/ganancia/${queryString ? `?${queryString}` : ''}`);
+  },
+  // params: { meses, escenarios, semilla, mortalidad_anual, tasa_prenez, edad_venta_meses, ... }
+  getProyeccion: (params = {}) => {
+    const queryString = new URLSearchParams(params).toString();
+    return apiRequest(`/analytics/proyeccion/${queryString ? `?${queryString}` : ''}`);
+  },
+};
+
 // API para opciones (datos de selects, etc.)
 export const opcionesApi = {
   getAll: () => apiRequest('/opciones/all/'),
@@ -231,3 +321,17 @@ export const opcionesApi = {
     generales: data?.estados_generales || []
   })),
 };
+
+// API de carga inicial: varios recursos en un solo request
+// recursos: ['campos', 'vacunos', ...]; params: { vacunos: { fields: 'id,lote_id' } }
+export const bootstrapApi = {
+  get: (recursos = [], params = {}) => {
+    const query = new URLSearchParams();
+    if (recursos.length) query.set('recursos', recursos.join(','));
+    Object.entries(params).forEach(([recurso, valores]) => {
+      Object.entries(valores).forEach(([nombre, valor]) => query.set(`${recurso}.${nombre}`, valor));
+    });
+    const queryString = query.toString();
+    return apiRequest(`/bootstrap/${queryString ? `?${queryString}` : ''}`);
+  },
+};